@@ -174,7 +174,7 @@ def _get_mock_suggestions(template_type: str, merchant_name: str) -> list[DealSu
     return suggestions
 
 
-async def _generate_with_openai(
+def _generate_with_openai(
     api_key: str,
     merchant_name: str,
     merchant_category: Optional[str],
@@ -242,7 +242,7 @@ Only output the JSON array, nothing else."""
 
 
 @router.post("/deals/generate-copy", response_model=GenerateCopyResponse)
-async def generate_deal_copy(
+def generate_deal_copy(
     data: GenerateCopyRequest,
     user=Depends(get_current_user),
 ):
@@ -283,7 +283,7 @@ async def generate_deal_copy(
     api_key = os.getenv("OPENAI_API_KEY")
 
     if api_key:
-        suggestions = await _generate_with_openai(
+        suggestions = _generate_with_openai(
             api_key=api_key,
             merchant_name=merchant_name,
             merchant_category=merchant_category,
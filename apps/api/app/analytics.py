@@ -1,4 +1,4 @@
-"""Analytics endpoints: retention cohorts, deal performance, LTV distribution, insights."""
+"""Analytics endpoints: retention cohorts, daily stats, deal performance, LTV distribution, insights."""
 
 import logging
 import os
@@ -8,9 +8,14 @@ from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
 
 from .auth import require_staff_or_above
-from .db import get_db, CONSUMER_VISITS, OFFERS, REDEMPTIONS, INSIGHT_CACHE
+from .cohorts import RETENTION_WEEKS, week_start
+from .counters import day_start
+from .daily_stats import MAX_RANGE_DAYS, get_daily_stats
+from .db import get_db, OFFERS, REDEMPTIONS, INSIGHT_CACHE, RETENTION_COHORTS
 from .deps import get_current_user
 from .models import (
+    DailyStat,
+    DailyStatsResponse,
     DealPerformance,
     InsightResponse,
     LtvBucket,
@@ -19,6 +24,7 @@ from .models import (
     DealPerformanceResponse,
     LtvResponse,
 )
+from .visit_frame import VisitFrame, merchant_visits, visit_snapshots
 
 logger = logging.getLogger("boost")
 
@@ -26,12 +32,28 @@ router = APIRouter(tags=["analytics"])
 
 DEFAULT_AVG_TICKET = 12.0
 
+# Return stats of an offer nobody has redeemed
+_NO_RETURNS = {"redemptions": 0, "unique_customers": 0, "returned": {}}
 
-def _week_start(dt: datetime) -> datetime:
-    """Return the Monday 00:00 UTC of the week containing *dt*."""
-    d = dt.replace(hour=0, minute=0, second=0, microsecond=0)
-    d -= timedelta(days=d.weekday())  # back to Monday
-    return d
+# Retention cohort fields the heatmap reads
+_COHORT_FIELDS = ["week_start", "new_customers"] + [f"returned_{n}" for n in range(1, RETENTION_WEEKS + 1)]
+
+
+def _utc(dt: Optional[datetime]) -> Optional[datetime]:
+    if dt is not None and dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def analytics_window(
+    start: Optional[datetime] = Query(None, description="Window start (inclusive), ISO date or datetime; UTC if no offset"),
+    end: Optional[datetime] = Query(None, description="Window end (exclusive), ISO date or datetime; UTC if no offset"),
+) -> tuple[Optional[datetime], Optional[datetime]]:
+    """Optional ``[start, end)`` window, pushed into the Firestore queries as timestamp bounds."""
+    start, end = _utc(start), _utc(end)
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return start, end
 
 
 # ---------------------------------------------------------------------------
@@ -43,81 +65,54 @@ def _week_start(dt: datetime) -> datetime:
     "/merchants/{merchant_id}/analytics/retention",
     response_model=RetentionResponse,
 )
-async def get_retention_cohorts(
+def get_retention_cohorts(
     merchant_id: str,
-    weeks: int = Query(6, ge=1, le=52, description="Number of cohort weeks"),
+    weeks: int = Query(6, ge=1, le=52, description="Number of cohort weeks (the newest in the window)"),
+    window=Depends(analytics_window),
     user=Depends(get_current_user),
 ):
     """Cohort retention heatmap data.
 
     Groups first-visit customers by week, computes return rates at week 1-5.
+    Reads the materialized cohort docs (see cohorts.py): one per week shown,
+    limited to cohort weeks starting in the window.
     Auth: staff_or_above.
     """
     require_staff_or_above(user, merchant_id)
 
     db = get_db()
-
-    # Fetch all visits for this merchant
-    visits_query = db.collection(CONSUMER_VISITS).where(
-        "merchant_id", "==", merchant_id
+    start, end = window
+
+    # The most recent cohort weeks in the window, newest first
+    query = db.collection(RETENTION_COHORTS).where("merchant_id", "==", merchant_id)
+    if start is not None:
+        query = query.where("week_start", ">=", week_start(start))
+    if end is not None:
+        query = query.where("week_start", "<", end)
+    cohort_docs = list(
+        query.order_by("week_start", direction="DESCENDING")
+        .limit(weeks)
+        .select(_COHORT_FIELDS)
+        .stream()
     )
-    visits = list(visits_query.stream())
-
-    # Group visits by consumer_id
-    consumer_visits: dict[str, list[datetime]] = {}
-    for v in visits:
-        vdata = v.to_dict()
-        cid = vdata.get("consumer_id")
-        ts = vdata.get("timestamp")
-        if cid and ts:
-            consumer_visits.setdefault(cid, []).append(ts)
-
-    # Determine first visit per consumer and cohort week
-    now = datetime.now(timezone.utc)
-    cohort_consumers: dict[datetime, dict[str, list[datetime]]] = {}
-
-    for cid, timestamps in consumer_visits.items():
-        timestamps.sort()
-        first = timestamps[0]
-        ws = _week_start(first)
-        cohort_consumers.setdefault(ws, {})[cid] = timestamps
-
-    # Build cohorts for the last N weeks
-    current_week_start = _week_start(now)
-    cohort_weeks = sorted(cohort_consumers.keys())
-
-    # Only keep the requested number of most recent cohort weeks
-    if len(cohort_weeks) > weeks:
-        cohort_weeks = cohort_weeks[-weeks:]
 
+    now = datetime.now(timezone.utc)
     cohorts: list[RetentionCohort] = []
 
-    for ws in cohort_weeks:
-        consumers = cohort_consumers.get(ws, {})
-        new_customers = len(consumers)
-        if new_customers == 0:
+    for doc in reversed(cohort_docs):
+        data = doc.to_dict()
+        ws = data["week_start"]
+        new_customers = data.get("new_customers", 0)
+        if new_customers <= 0:
             continue
 
-        # Compute retention for weeks 1-5 after cohort week
+        # Return rates for weeks 1-5 after the cohort week, up to this week
         retention_rates: list[float] = []
-        for week_offset in range(1, 6):
-            target_week_start = ws + timedelta(weeks=week_offset)
-            target_week_end = target_week_start + timedelta(weeks=1)
-
-            # Don't compute future weeks
-            if target_week_start > now:
+        for week_offset in range(1, RETENTION_WEEKS + 1):
+            if ws + timedelta(weeks=week_offset) > now:
                 break
-
-            # Count consumers who had a visit in the target week
-            retained = 0
-            for cid, timestamps in consumers.items():
-                for ts in timestamps:
-                    if target_week_start <= ts < target_week_end:
-                        retained += 1
-                        break
-
-            rate = round(retained / new_customers, 3) if new_customers > 0 else 0.0
-            retention_rates.append(rate)
+            retained = data.get(f"returned_{week_offset}", 0)
+            retention_rates.append(round(retained / new_customers, 3))
 
         cohorts.append(
             RetentionCohort(
@@ -130,6 +125,53 @@ async def get_retention_cohorts(
     return RetentionResponse(cohorts=cohorts)
 
 
+# ---------------------------------------------------------------------------
+# GET /merchants/{merchant_id}/analytics/daily
+# ---------------------------------------------------------------------------
+
+
+@router.get(
+    "/merchants/{merchant_id}/analytics/daily",
+    response_model=DailyStatsResponse,
+)
+def get_daily_time_series(
+    merchant_id: str,
+    days: int = Query(30, ge=1, le=MAX_RANGE_DAYS, description="Number of days, ending today"),
+    user=Depends(get_current_user),
+):
+    """Daily visits, redemptions, customers, ledger amount and rewards for charts.
+
+    Reads the daily rollup (see daily_stats.py): at most one doc per shard
+    and day shown. Days without activity are returned as zeros.
+    Auth: staff_or_above.
+    """
+    require_staff_or_above(user, merchant_id)
+
+    db = get_db()
+    end = day_start(datetime.now(timezone.utc)) + timedelta(days=1)
+    start = end - timedelta(days=days)
+    by_day = {doc["date"]: doc for doc in get_daily_stats(db, merchant_id, start, end)}
+
+    series: list[DailyStat] = []
+    for i in range(days):
+        day = start + timedelta(days=i)
+        data = by_day.get(day, {})
+        series.append(
+            DailyStat(
+                date=day.strftime("%Y-%m-%d"),
+                visits=data.get("visits", 0),
+                redemptions=data.get("redemptions", 0),
+                new_customers=data.get("new_customers", 0),
+                returning_customers=data.get("returning_customers", 0),
+                ledger_amount=round(data.get("ledger_amount", 0), 2),
+                rewards_issued=data.get("rewards_issued", 0),
+                offers=data.get("offers") or {},
+            )
+        )
+
+    return DailyStatsResponse(days=series)
+
+
 # ---------------------------------------------------------------------------
 # GET /merchants/{merchant_id}/analytics/deals
 # ---------------------------------------------------------------------------
@@ -139,89 +181,35 @@ async def get_retention_cohorts(
     "/merchants/{merchant_id}/analytics/deals",
     response_model=DealPerformanceResponse,
 )
-async def get_deal_performance(
+def get_deal_performance(
     merchant_id: str,
+    window=Depends(analytics_window),
     user=Depends(get_current_user),
 ):
     """Per-deal comparison: redemption count, 14d/30d return rates, estimated ROI.
 
+    Computed over the visits in the window (all time by default).
     Auth: staff_or_above.
     """
     require_staff_or_above(user, merchant_id)
 
     db = get_db()
 
-    # Fetch active offers for this merchant
-    offers_query = db.collection(OFFERS).where("merchant_id", "==", merchant_id)
-    offer_docs = list(offers_query.stream())
-
-    # Fetch all visits for this merchant (for return rate computation)
-    visits_query = db.collection(CONSUMER_VISITS).where(
-        "merchant_id", "==", merchant_id
-    )
-    all_visits = list(visits_query.stream())
-
-    # Build lookup: consumer_id -> sorted list of visit timestamps
-    consumer_all_visits: dict[str, list[datetime]] = {}
-    for v in all_visits:
-        vdata = v.to_dict()
-        cid = vdata.get("consumer_id")
-        ts = vdata.get("timestamp")
-        if cid and ts:
-            consumer_all_visits.setdefault(cid, []).append(ts)
-
-    for cid in consumer_all_visits:
-        consumer_all_visits[cid].sort()
-
-    # Also group visits by offer_id -> list of (consumer_id, timestamp)
-    offer_visits: dict[str, list[tuple[str, datetime]]] = {}
-    for v in all_visits:
-        vdata = v.to_dict()
-        oid = vdata.get("offer_id")
-        cid = vdata.get("consumer_id")
-        ts = vdata.get("timestamp")
-        if oid and cid and ts:
-            offer_visits.setdefault(oid, []).append((cid, ts))
+    # Offers, and return rates computed over the merchant's visits in the window
+    offer_docs = _offer_docs(db, merchant_id, ["name", "value_per_redemption"])
+    returns = merchant_visits(db, merchant_id, *window).offer_returns(windows=(14, 30))
 
     deals: list[DealPerformance] = []
 
     for odoc in offer_docs:
         odata = odoc.to_dict()
         offer_id = odoc.id
-        offer_name = odata.get("name", "Unknown")
         value_per = odata.get("value_per_redemption", 2.0)
+        stats = returns.get(offer_id, _NO_RETURNS)
 
-        visits_for_offer = offer_visits.get(offer_id, [])
-        redemption_count = len(visits_for_offer)
-
-        # Compute return rates: for each consumer who used this offer,
-        # did they come back to the merchant within 14d / 30d?
-        returned_14d = 0
-        returned_30d = 0
-        unique_consumers = set()
-
-        for cid, visit_ts in visits_for_offer:
-            if cid in unique_consumers:
-                continue
-            unique_consumers.add(cid)
-
-            # Check if they had a subsequent visit (any offer) within 14d/30d
-            all_ts = consumer_all_visits.get(cid, [])
-            for later_ts in all_ts:
-                if later_ts <= visit_ts:
-                    continue
-                delta_days = (later_ts - visit_ts).days
-                if delta_days <= 14:
-                    returned_14d += 1
-                    returned_30d += 1
-                    break
-                elif delta_days <= 30:
-                    returned_30d += 1
-                    break
-
-        total_unique = len(unique_consumers) or 1
-        return_rate_14d = round(returned_14d / total_unique, 3)
-        return_rate_30d = round(returned_30d / total_unique, 3)
+        redemption_count = stats["redemptions"]
+        returned_30d = stats["returned"].get(30, 0)
+        total_unique = stats["unique_customers"] or 1
 
         # Estimated ROI: (return visits revenue - cost) / cost
         cost = redemption_count * value_per
@@ -231,10 +219,10 @@ async def get_deal_performance(
         deals.append(
             DealPerformance(
                 offer_id=offer_id,
-                offer_name=offer_name,
+                offer_name=odata.get("name", "Unknown"),
                 redemption_count=redemption_count,
-                return_rate_14d=return_rate_14d,
-                return_rate_30d=return_rate_30d,
+                return_rate_14d=round(stats["returned"].get(14, 0) / total_unique, 3),
+                return_rate_30d=round(returned_30d / total_unique, 3),
                 estimated_roi=estimated_roi,
             )
         )
@@ -259,11 +247,12 @@ LTV_BUCKETS = [
     "/merchants/{merchant_id}/analytics/ltv",
     response_model=LtvResponse,
 )
-async def get_ltv_distribution(
+def get_ltv_distribution(
     merchant_id: str,
+    window=Depends(analytics_window),
     user=Depends(get_current_user),
 ):
-    """LTV distribution histogram.
+    """LTV distribution histogram, over the visits in the window (all time by default).
 
     Auth: staff_or_above.
     """
@@ -271,33 +260,13 @@ async def get_ltv_distribution(
 
     db = get_db()
 
-    # Fetch all visits for this merchant
-    visits_query = db.collection(CONSUMER_VISITS).where(
-        "merchant_id", "==", merchant_id
-    )
-    visits = list(visits_query.stream())
-
-    # Count visits per consumer
-    consumer_visit_counts: dict[str, int] = {}
-    for v in visits:
-        vdata = v.to_dict()
-        cid = vdata.get("consumer_id")
-        if cid:
-            consumer_visit_counts[cid] = consumer_visit_counts.get(cid, 0) + 1
-
-    # Compute LTV per consumer and bucket
-    bucket_counts = {label: 0 for label, _, _ in LTV_BUCKETS}
-
-    for cid, count in consumer_visit_counts.items():
-        ltv = count * DEFAULT_AVG_TICKET
-        for label, low, high in LTV_BUCKETS:
-            if low <= ltv < high:
-                bucket_counts[label] += 1
-                break
+    # Customers bucketed by visits x average ticket
+    edges = [low for _, low, _ in LTV_BUCKETS] + [LTV_BUCKETS[-1][2]]
+    counts = merchant_visits(db, merchant_id, *window).ltv_histogram(edges, DEFAULT_AVG_TICKET)
 
     buckets = [
-        LtvBucket(bucket_label=label, count=bucket_counts[label])
-        for label, _, _ in LTV_BUCKETS
+        LtvBucket(bucket_label=label, count=count)
+        for (label, _, _), count in zip(LTV_BUCKETS, counts)
     ]
 
     return LtvResponse(buckets=buckets)
@@ -308,104 +277,33 @@ async def get_ltv_distribution(
 # ---------------------------------------------------------------------------
 
 
-def _build_deal_summary(db, merchant_id: str) -> list[dict]:
+def _offer_docs(db, merchant_id: str, fields: list[str]) -> list:
+    """The merchant's offers, projected to *fields*."""
+    return list(db.collection(OFFERS).where("merchant_id", "==", merchant_id).select(fields).stream())
+
+
+def _build_deal_summary(db, merchant_id: str, visits: VisitFrame) -> list[dict]:
     """Fetch deal performance data for insight generation."""
-    offers_query = db.collection(OFFERS).where("merchant_id", "==", merchant_id)
-    offer_docs = list(offers_query.stream())
-
-    visits_query = db.collection(CONSUMER_VISITS).where("merchant_id", "==", merchant_id)
-    all_visits = list(visits_query.stream())
-
-    # Build consumer visit lookup
-    consumer_all_visits: dict[str, list[datetime]] = {}
-    for v in all_visits:
-        vdata = v.to_dict()
-        cid = vdata.get("consumer_id")
-        ts = vdata.get("timestamp")
-        if cid and ts:
-            consumer_all_visits.setdefault(cid, []).append(ts)
-    for cid in consumer_all_visits:
-        consumer_all_visits[cid].sort()
-
-    # Group visits by offer
-    offer_visits: dict[str, list[tuple[str, datetime]]] = {}
-    for v in all_visits:
-        vdata = v.to_dict()
-        oid = vdata.get("offer_id")
-        cid = vdata.get("consumer_id")
-        ts = vdata.get("timestamp")
-        if oid and cid and ts:
-            offer_visits.setdefault(oid, []).append((cid, ts))
+    offer_docs = _offer_docs(db, merchant_id, ["name"])
+    returns = visits.offer_returns(windows=(14,))
 
     deals = []
     for odoc in offer_docs:
-        odata = odoc.to_dict()
-        offer_id = odoc.id
-        visits_for_offer = offer_visits.get(offer_id, [])
-        redemption_count = len(visits_for_offer)
-
-        returned_14d = 0
-        unique_consumers = set()
-        for cid, visit_ts in visits_for_offer:
-            if cid in unique_consumers:
-                continue
-            unique_consumers.add(cid)
-            all_ts = consumer_all_visits.get(cid, [])
-            for later_ts in all_ts:
-                if later_ts <= visit_ts:
-                    continue
-                if (later_ts - visit_ts).days <= 14:
-                    returned_14d += 1
-                    break
-
-        total_unique = len(unique_consumers) or 1
-        return_rate = round(returned_14d / total_unique, 3)
-
+        stats = returns.get(odoc.id, _NO_RETURNS)
+        unique_customers = stats["unique_customers"]
         deals.append({
-            "offer_name": odata.get("name", "Unknown"),
-            "redemption_count": redemption_count,
-            "return_rate_14d": return_rate,
-            "unique_customers": len(unique_consumers),
+            "offer_name": odoc.to_dict().get("name", "Unknown"),
+            "redemption_count": stats["redemptions"],
+            "return_rate_14d": round(stats["returned"].get(14, 0) / (unique_customers or 1), 3),
+            "unique_customers": unique_customers,
         })
 
     return deals
 
 
-def _build_segment_summary(db, merchant_id: str) -> dict[str, int]:
-    """Count customers by visit recency segment."""
-    visits_query = db.collection(CONSUMER_VISITS).where("merchant_id", "==", merchant_id)
-    all_visits = list(visits_query.stream())
-
-    now = datetime.now(timezone.utc)
-    consumer_last_visit: dict[str, datetime] = {}
-    consumer_visit_count: dict[str, int] = {}
-
-    for v in all_visits:
-        vdata = v.to_dict()
-        cid = vdata.get("consumer_id")
-        ts = vdata.get("timestamp")
-        if cid and ts:
-            consumer_visit_count[cid] = consumer_visit_count.get(cid, 0) + 1
-            if cid not in consumer_last_visit or ts > consumer_last_visit[cid]:
-                consumer_last_visit[cid] = ts
-
-    segments: dict[str, int] = {"new": 0, "returning": 0, "vip": 0, "at_risk": 0, "lost": 0}
-    for cid, last in consumer_last_visit.items():
-        days_since = (now - last).days
-        count = consumer_visit_count.get(cid, 1)
-
-        if count == 1 and days_since <= 14:
-            segments["new"] += 1
-        elif days_since > 30:
-            segments["lost"] += 1
-        elif days_since > 14:
-            segments["at_risk"] += 1
-        elif count >= 5:
-            segments["vip"] += 1
-        else:
-            segments["returning"] += 1
-
-    return segments
+def _build_segment_summary(visits: VisitFrame, as_of: Optional[datetime] = None) -> dict[str, int]:
+    """Count customers by visit recency segment, as of *as_of* (default now)."""
+    return visits.segments(as_of or datetime.now(timezone.utc))
 
 
 def _generate_rule_based_insights(deals: list[dict], segments: dict[str, int]) -> list[str]:
@@ -455,7 +353,7 @@ def _generate_rule_based_insights(deals: list[dict], segments: dict[str, int]) -
     return insights[:2]
 
 
-async def _generate_ai_insights(deals: list[dict], segments: dict[str, int]) -> list[str]:
+def _generate_ai_insights(deals: list[dict], segments: dict[str, int]) -> list[str]:
     """Generate insights via OpenAI (if key is available)."""
     try:
         import openai
@@ -500,26 +398,56 @@ async def _generate_ai_insights(deals: list[dict], segments: dict[str, int]) ->
 INSIGHT_CACHE_TTL = timedelta(hours=24)
 
 
+def _insight_window(
+    start: Optional[datetime], end: Optional[datetime], now: datetime,
+) -> tuple[Optional[datetime], Optional[datetime]]:
+    """The window widened to whole UTC days, ending no later than tomorrow.
+
+    A given start is kept within ``MAX_RANGE_DAYS`` of the end, so a merchant
+    has a bounded number of distinct cached windows.
+    """
+    tomorrow = day_start(now) + timedelta(days=1)
+    if end is not None:
+        end_day = day_start(end)
+        end = min(end_day if end_day == end else end_day + timedelta(days=1), tomorrow)
+    if start is not None:
+        limit = end or tomorrow
+        start = min(max(day_start(start), limit - timedelta(days=MAX_RANGE_DAYS)), limit - timedelta(days=1))
+    return start, end
+
+
+def _insight_cache_id(merchant_id: str, start: Optional[datetime], end: Optional[datetime]) -> str:
+    """Cache doc ID: the merchant ID for all-time insights, plus the window's days otherwise."""
+    if start is None and end is None:
+        return merchant_id
+    bounds = [dt.strftime("%Y-%m-%d") if dt else "" for dt in (start, end)]
+    return "_".join([merchant_id, *bounds])
+
+
 @router.get(
     "/merchants/{merchant_id}/insights",
     response_model=InsightResponse,
 )
-async def get_merchant_insights(
+def get_merchant_insights(
     merchant_id: str,
+    window=Depends(analytics_window),
     user=Depends(get_current_user),
 ):
-    """AI-generated or rule-based insights for a merchant.
+    """AI-generated or rule-based insights for a merchant, over the visits in the window.
 
-    Caches results in Firestore for 24h.
+    The window is widened to whole UTC days and limited to ``MAX_RANGE_DAYS``
+    days (see ``_insight_window``). Caches results in Firestore for 24h, per
+    window.
     Auth: staff_or_above.
     """
     require_staff_or_above(user, merchant_id)
 
     db = get_db()
     now = datetime.now(timezone.utc)
+    start, end = _insight_window(*window, now)
 
     # Check cache
-    cache_ref = db.collection(INSIGHT_CACHE).document(merchant_id)
+    cache_ref = db.collection(INSIGHT_CACHE).document(_insight_cache_id(merchant_id, start, end))
     cache_doc = cache_ref.get()
 
     if cache_doc.exists:
@@ -533,11 +461,13 @@ async def get_merchant_insights(
             )
 
     # Generate fresh insights
-    deals = _build_deal_summary(db, merchant_id)
-    segments = _build_segment_summary(db, merchant_id)
+    with visit_snapshots():
+        visits = merchant_visits(db, merchant_id, start, end)
+        deals = _build_deal_summary(db, merchant_id, visits)
+        segments = _build_segment_summary(visits, min(end, now) if end else None)
 
     if os.getenv("OPENAI_API_KEY"):
-        insights = await _generate_ai_insights(deals, segments)
+        insights = _generate_ai_insights(deals, segments)
     else:
         insights = _generate_rule_based_insights(deals, segments)
 
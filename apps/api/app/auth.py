@@ -1,14 +1,36 @@
 """Firebase authentication utilities and role management."""
 
+import asyncio
+import copy
+import hashlib
 import json
+import logging
 import os
+import time
 from functools import lru_cache
 from typing import Any, Dict, Optional
 
 import firebase_admin
+import google.auth.transport.requests
 from fastapi import HTTPException
 from firebase_admin import auth, credentials
 
+from .cache import TTLCache
+from .dal import run_db
+
+logger = logging.getLogger("boost")
+
+# Verified ID tokens, keyed by SHA-256 of the token and kept until the
+# token's own ``exp``. Scanners and dashboards resend the same token on every
+# request for up to an hour, so most requests skip RSA verification.
+ID_TOKEN_CACHE_SIZE = int(os.getenv("ID_TOKEN_CACHE_SIZE", "10000"))
+# How often the token signing certificates are re-fetched in the background.
+SIGNING_KEY_REFRESH_SECONDS = float(os.getenv("SIGNING_KEY_REFRESH_SECONDS", "1800"))
+# Public certificates Firebase ID tokens are signed with.
+ID_TOKEN_CERT_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+
+_verified_tokens = TTLCache(maxsize=ID_TOKEN_CACHE_SIZE, ttl=3600, name="id_tokens")
+
 
 @lru_cache(maxsize=1)
 def _init_firebase_admin() -> None:
@@ -47,9 +69,94 @@ def verify_bearer_token(authorization: Optional[str]) -> Dict[str, Any]:
     if len(parts) != 2 or parts[0].lower() != "bearer":
         raise ValueError("Invalid Authorization header format")
 
-    token = parts[1]
-    decoded = auth.verify_id_token(token)
-    return decoded
+    return verify_id_token_cached(parts[1])
+
+
+def verify_id_token_cached(token: str) -> Dict[str, Any]:
+    """``auth.verify_id_token`` with verified claims cached until the token expires.
+
+    Revocation is not checked (as with the plain call), so serving a cached
+    result is equivalent to verifying again before ``exp``. Returns a copy
+    the caller may modify.
+    """
+    key = hashlib.sha256(token.encode()).hexdigest()
+    decoded = _verified_tokens.get(key)
+    if decoded is None:
+        decoded = auth.verify_id_token(token)
+        ttl = decoded.get("exp", 0) - time.time()
+        if ttl > 0:
+            _verified_tokens.set(key, decoded, ttl=ttl)
+    return copy.deepcopy(decoded)
+
+
+def token_cache_stats() -> Dict[str, int]:
+    """Hit / miss counts and size of the verified-token cache."""
+    return {
+        "hits": _verified_tokens.hits,
+        "misses": _verified_tokens.misses,
+        "size": len(_verified_tokens),
+    }
+
+
+# --- Signing key refresh ---
+
+
+def _certificate_session():
+    """The HTTP-caching session firebase_admin verifies ID tokens with, or None.
+
+    firebase_admin exposes no public handle on it; the lookup matches the
+    pinned firebase-admin (see requirements.txt) and returns None, logged, if
+    a release moves it.
+    """
+    try:
+        return auth._get_client(None)._token_verifier.request.session
+    except Exception as e:
+        logger.warning("Signing key refresh unavailable, certificates are fetched on demand: %s", e)
+        return None
+
+
+def refresh_signing_keys() -> None:
+    """Re-fetch the ID token signing certificates into the verifier's HTTP cache.
+
+    firebase_admin caches the certificates per their Cache-Control header and
+    otherwise fetches them inline on the first verification after expiry;
+    refreshing ahead of that keeps the fetch off the request path.
+    """
+    _init_firebase_admin()
+    session = _certificate_session()
+    if session is None:
+        return
+    request = google.auth.transport.requests.Request(session)
+    request(ID_TOKEN_CERT_URL, headers={"Cache-Control": "no-cache"})
+
+
+_key_refresher: Optional[asyncio.Task] = None
+
+
+async def _refresh_keys_forever(interval: float) -> None:
+    while True:
+        try:
+            await run_db(refresh_signing_keys)
+        except Exception as e:
+            logger.warning("Signing key refresh failed: %s", e)
+        await asyncio.sleep(interval)
+
+
+def start_key_refresher(interval: float = SIGNING_KEY_REFRESH_SECONDS) -> None:
+    """Prefetch the signing certificates now and refresh them every *interval* seconds."""
+    global _key_refresher
+    _key_refresher = asyncio.get_running_loop().create_task(_refresh_keys_forever(interval))
+
+
+async def stop_key_refresher() -> None:
+    global _key_refresher
+    if _key_refresher is not None:
+        _key_refresher.cancel()
+        try:
+            await _key_refresher
+        except asyncio.CancelledError:
+            pass
+        _key_refresher = None
 
 
 # --- Role Management ---
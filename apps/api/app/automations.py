@@ -10,7 +10,8 @@ from .db import (
     get_db,
     AUTOMATED_MESSAGES,
     CONSUMERS,
-    CONSUMER_VISITS,
+    CONSUMER_CLAIMS,
+    CONSUMER_MERCHANT_STATS,
     LOYALTY_CONFIGS,
     LOYALTY_PROGRESS,
     MERCHANTS,
@@ -22,6 +23,8 @@ from .models import (
     AutomationRule,
     AutomationTrigger,
 )
+from .doc_cache import loyalty_config_cache, merchant_cache
+from .outbox import register_handler
 
 logger = logging.getLogger("boost")
 
@@ -85,12 +88,14 @@ def create_automated_message(
     trigger: str,
     message_body: str,
     consumer_phone: str | None = None,
+    doc_id: str | None = None,
 ) -> str | None:
     """Create an automated message record. Returns doc ID or None if skipped.
 
     Logs the message instead of actually sending SMS.
     Skips consumers without a phone number.
     Respects quiet hours.
+    Pass a deterministic ``doc_id`` to make retries overwrite instead of duplicate.
     """
     if not consumer_phone:
         logger.info(
@@ -101,7 +106,7 @@ def create_automated_message(
     now = datetime.now(timezone.utc)
     send_at = _compute_send_at(now)
 
-    doc_ref = db.collection(AUTOMATED_MESSAGES).document()
+    doc_ref = db.collection(AUTOMATED_MESSAGES).document(doc_id)
     doc_ref.set({
         "merchant_id": merchant_id,
         "consumer_id": consumer_id,
@@ -124,6 +129,100 @@ def create_automated_message(
     return doc_ref.id
 
 
+# ---------------------------------------------------------------------------
+# Post-redemption side effects (outbox handler)
+# ---------------------------------------------------------------------------
+
+REDEMPTION_COMPLETED = "redemption.completed"
+
+
+def _fill_template(template: str, template_vars: dict) -> str:
+    try:
+        return template.format(**template_vars)
+    except (KeyError, IndexError):
+        return template
+
+
+@register_handler(REDEMPTION_COMPLETED)
+def run_redemption_side_effects(db, payload: dict) -> None:
+    """Claim marking, message attribution and visit-triggered automations.
+
+    Runs out of band after a personal-QR redemption commits. Safe to re-run:
+    every write is either an idempotent update or a deterministic message ID.
+    """
+    merchant_id = payload["merchant_id"]
+    consumer_id = payload["consumer_id"]
+    redemption_id = payload["redemption_id"]
+    redeemed_at = payload["redeemed_at"]
+
+    # Mark today's claim as redeemed
+    claim_docs = list(
+        db.collection(CONSUMER_CLAIMS)
+        .where("consumer_uid", "==", consumer_id)
+        .where("offer_id", "==", payload["offer_id"])
+        .where("claimed_at", ">=", payload["claimed_since"])
+        .limit(1)
+        .stream()
+    )
+    if claim_docs:
+        claim_docs[0].reference.update({"redeemed": True})
+
+    # Attribution: mark recent automated messages as resulted_in_visit.
+    # Messages this event creates below are excluded on re-runs.
+    recent_msgs = list(
+        db.collection(AUTOMATED_MESSAGES)
+        .where("merchant_id", "==", merchant_id)
+        .where("consumer_id", "==", consumer_id)
+        .where("resulted_in_visit", "==", False)
+        .where("sent_at", ">=", redeemed_at - timedelta(days=7))
+        .stream()
+    )
+    for msg_doc in recent_msgs:
+        if not msg_doc.id.startswith(f"{redemption_id}_"):
+            msg_doc.reference.update({"resulted_in_visit": True})
+
+    # Automation triggers: first_visit & reward_earned
+    reward_description = payload.get("reward_description")
+    if payload.get("visit_number") != 1 and reward_description is None:
+        return
+
+    lconfig = loyalty_config_cache.get(db, merchant_id) or {}
+    auto_rules = {r["trigger"]: r for r in lconfig.get("automations", []) if r.get("enabled")}
+
+    due_triggers = []
+    if payload.get("visit_number") == 1 and "first_visit" in auto_rules:
+        due_triggers.append("first_visit")
+    if reward_description is not None and "reward_earned" in auto_rules:
+        due_triggers.append("reward_earned")
+    if not due_triggers:
+        return
+
+    merchant = merchant_cache.get(db, merchant_id)
+    merchant_name = merchant.get("name", "Local Business") if merchant is not None else "Local Business"
+
+    stamps_required = lconfig.get("stamps_required", 10)
+    current_stamps = payload.get("current_stamps", 0)
+    template_vars = {
+        "merchant_name": merchant_name,
+        "customer_name": payload.get("consumer_name") or "there",
+        "reward_description": lconfig.get("reward_description", "a reward"),
+        "current_stamps": current_stamps,
+        "stamps_required": stamps_required,
+        "stamps_remaining": max(0, stamps_required - current_stamps),
+    }
+
+    for trigger in due_triggers:
+        create_automated_message(
+            db=db,
+            merchant_id=merchant_id,
+            consumer_id=consumer_id,
+            trigger=trigger,
+            message_body=_fill_template(auto_rules[trigger].get("message_template", ""), template_vars),
+            consumer_phone=payload.get("consumer_phone"),
+            doc_id=f"{redemption_id}_{trigger}",
+        )
+
+
 # ---------------------------------------------------------------------------
 # GET /merchants/{merchant_id}/automations
 # ---------------------------------------------------------------------------
@@ -133,7 +232,7 @@ def create_automated_message(
     "/merchants/{merchant_id}/automations",
     response_model=AutomationConfigResponse,
 )
-async def get_automations(merchant_id: str, user=Depends(get_current_user)):
+def get_automations(merchant_id: str, user=Depends(get_current_user)):
     """Get automation config for a merchant.
 
     Auth: merchant_admin or owner.
@@ -166,7 +265,7 @@ async def get_automations(merchant_id: str, user=Depends(get_current_user)):
     "/merchants/{merchant_id}/automations",
     response_model=AutomationConfigResponse,
 )
-async def update_automations(
+def update_automations(
     merchant_id: str,
     body: AutomationConfigUpdate,
     user=Depends(get_current_user),
@@ -183,6 +282,7 @@ async def update_automations(
 
     rules_data = [r.model_dump() for r in body.rules]
     doc_ref.set({"automations": rules_data}, merge=True)
+    loyalty_config_cache.invalidate(merchant_id)
 
     return AutomationConfigResponse(merchant_id=merchant_id, rules=body.rules)
 
@@ -193,7 +293,7 @@ async def update_automations(
 
 
 @router.post("/automations/run-daily")
-async def run_daily_automations():
+def run_daily_automations():
     """Run daily automation jobs (at_risk re-engagement messages).
 
     No auth (intended for Cloud Scheduler with a simple API key — for now, open).
@@ -238,44 +338,30 @@ async def run_daily_automations():
         stamps_required = config_data.get("stamps_required", 10)
         reward_description = config_data.get("reward_description", "a reward")
 
-        # Find all visits for this merchant
-        visits = list(
-            db.collection(CONSUMER_VISITS)
-            .where("merchant_id", "==", merchant_id)
-            .stream()
-        )
-
-        # Group visits by consumer
-        consumer_visits: dict[str, list[dict]] = {}
-        for v in visits:
-            vdata = v.to_dict()
-            cid = vdata.get("consumer_id")
-            if cid:
-                consumer_visits.setdefault(cid, []).append(vdata)
-
         # Cutoff: last visit must be older than at_risk_days ago
         cutoff = now - timedelta(days=at_risk_days)
         # Don't re-send within 30 days
         thirty_days_ago = now - timedelta(days=30)
 
-        for consumer_id, vlist in consumer_visits.items():
-            # Must have 2+ visits
-            if len(vlist) < 2:
-                continue
-
-            # Check last visit is older than cutoff
-            timestamps = [
-                v["timestamp"]
-                for v in vlist
-                if v.get("timestamp") is not None
-            ]
-            if not timestamps:
-                continue
+        # Customers whose last visit here is before the cutoff
+        lapsed = (
+            db.collection(CONSUMER_MERCHANT_STATS)
+            .where("merchant_id", "==", merchant_id)
+            .where("last_visit", "<=", cutoff)
+            .stream()
+        )
 
-            last_visit = max(timestamps)
-            if last_visit > cutoff:
+        for stats_doc in lapsed:
+            stats = stats_doc.to_dict()
+            consumer_id = stats.get("consumer_id")
+            last_visit = stats.get("last_visit")
+            if not consumer_id or last_visit is None or last_visit > cutoff:
                 continue  # Still active, not at risk
 
+            # Must have 2+ visits
+            if stats.get("visit_count", 0) < 2:
+                continue
+
             # Check: no at_risk message in the last 30 days
             recent_messages = list(
                 db.collection(AUTOMATED_MESSAGES)
@@ -0,0 +1,81 @@
+"""Bounded in-process caches.
+
+``TTLCache`` is a thread-safe LRU whose entries also expire after a TTL. It is
+per process: every API instance has its own, so anything cached here must be
+safe to serve slightly stale or be backed by Firestore for correctness.
+"""
+
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+# Every cache, so tests (and admin tooling) can reset process state at once.
+_registry: "weakref.WeakSet[TTLCache]" = weakref.WeakSet()
+
+
+class TTLCache:
+    """LRU cache with per-entry expiry.
+
+    ``get`` returns *default* for missing or expired keys. ``hits`` and
+    ``misses`` count lookups since creation (or the last ``clear``).
+    """
+
+    def __init__(self, maxsize: int, ttl: float, name: str = ""):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        _registry.add(self)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[0] > time.monotonic()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+def clear_caches() -> None:
+    """Empty every TTLCache in the process."""
+    for cache in list(_registry):
+        cache.clear()
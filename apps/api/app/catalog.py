@@ -0,0 +1,343 @@
+"""Live in-memory catalog of merchants, offers and loyalty configs.
+
+``Catalog`` holds an ``on_snapshot`` listener per collection and keeps every
+document in memory, with offers indexed by merchant. Once a collection has
+received its first snapshot, reads of it are served from memory and reflect
+writes from any instance within the listener's lag, so the TTL-based
+``doc_cache`` and the per-request queries in ``list_offers`` and the zone
+endpoints fall back to Firestore only while the catalog is not synced (at
+startup, after a reconnect, or when ``CATALOG_LISTENER=0``).
+
+Writes made by this instance are applied at once through ``DocCache``
+(see doc_cache.py): ``apply_local`` stores the written data, and ``evict``
+stops serving a document whose new data is unknown until its change arrives
+(or ``CATALOG_EVICT_SECONDS`` pass), so an endpoint never reads back its own
+write from before it.
+
+``version`` increases with every applied snapshot and can be folded into
+ETags. ``stats()`` reports listener lag, reconnects and approximate memory
+use.
+
+The Firestore client re-establishes a dropped stream itself; a supervisor task
+started with the app (``start_catalog``) additionally re-subscribes any
+listener that has stopped for good.
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from .dal import run_db
+from .db import LOYALTY_CONFIGS, MERCHANTS, OFFERS, get_db
+from .metrics import register_collector
+
+logger = logging.getLogger("boost")
+
+CATALOG_COLLECTIONS = (MERCHANTS, OFFERS, LOYALTY_CONFIGS)
+CATALOG_CHECK_SECONDS = float(os.getenv("CATALOG_CHECK_SECONDS", "30"))
+# How long an evicted document is served from Firestore if no change for it
+# arrives (e.g. a write that left it unchanged).
+CATALOG_EVICT_SECONDS = float(os.getenv("CATALOG_EVICT_SECONDS", "10"))
+
+ACTIVE = "active"
+
+
+def _approx_size(value) -> int:
+    """Rough deep size of a document in bytes."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_approx_size(k) + _approx_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_approx_size(v) for v in value)
+    return size
+
+
+def _load(docs) -> tuple[dict[str, dict], dict[str, int]]:
+    """Data and approximate size of every existing document in a full snapshot."""
+    loaded = {snap.id: snap.to_dict() or {} for snap in docs if snap.exists}
+    return loaded, {doc_id: _approx_size(doc_id) + _approx_size(data) for doc_id, data in loaded.items()}
+
+
+class Catalog:
+    """In-memory mirror of ``CATALOG_COLLECTIONS``, fed by snapshot listeners.
+
+    Listener callbacks run on Firestore's threads and readers on handler
+    threads; all state is guarded by one lock and readers get copies.
+    """
+
+    def __init__(self, collections: tuple[str, ...] = CATALOG_COLLECTIONS):
+        self.collections = collections
+        self._lock = threading.Lock()
+        self._docs: dict[str, dict[str, dict]] = {name: {} for name in collections}
+        # Approximate bytes per document and per collection, kept up to date
+        # by _on_snapshot so stats() never walks the documents.
+        self._sizes: dict[str, dict[str, int]] = {name: {} for name in collections}
+        self._bytes: dict[str, int] = {name: 0 for name in collections}
+        # merchant_id -> {offer_id: offer data}
+        self._offers_by_merchant: dict[str, dict[str, dict]] = {}
+        self._synced: set[str] = set()
+        # name -> {doc_id: monotonic deadline} of documents evicted by local writes
+        self._evicted: dict[str, dict[str, float]] = {name: {} for name in collections}
+        self._watches: dict[str, object] = {}
+        self.version = 0
+        self.reconnects = 0
+        self.last_lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+        self.last_snapshot_at: Optional[datetime] = None
+
+    # --- Listening ---
+
+    def subscribe(self, db) -> None:
+        """Start a listener on every catalog collection."""
+        for name in self.collections:
+            self._subscribe(db, name)
+
+    def _subscribe(self, db, name: str) -> None:
+        with self._lock:
+            # The first snapshot of a new listener carries the full collection.
+            self._synced.discard(name)
+        callback = functools.partial(self._on_snapshot, name)
+        self._watches[name] = db.collection(name).on_snapshot(callback)
+
+    def check(self, db) -> int:
+        """Re-subscribe listeners that have stopped. Returns how many were restarted."""
+        restarted = 0
+        for name in self.collections:
+            watch = self._watches.get(name)
+            if watch is not None and watch.is_active:
+                continue
+            if watch is not None:
+                try:
+                    watch.unsubscribe()
+                except Exception as e:
+                    logger.warning("Closing %s listener failed: %s", name, e)
+            logger.warning("Catalog listener on %s stopped; re-subscribing", name)
+            self._subscribe(db, name)
+            self.reconnects += 1
+            restarted += 1
+        return restarted
+
+    def close(self) -> None:
+        for watch in self._watches.values():
+            try:
+                watch.unsubscribe()
+            except Exception as e:
+                logger.warning("Closing catalog listener failed: %s", e)
+        self._watches = {}
+        with self._lock:
+            self._synced.clear()
+
+    def _on_snapshot(self, name: str, docs, changes, read_time) -> None:
+        # Documents are decoded and sized before taking the lock.
+        full_sync = name not in self._synced
+        if full_sync:
+            loaded, sizes = _load(docs)
+        else:
+            updates = []
+            for change in changes:
+                snap = change.document
+                new = None if change.type.name == "REMOVED" else snap.to_dict() or {}
+                size = 0 if new is None else _approx_size(snap.id) + _approx_size(new)
+                updates.append((snap.id, new, size))
+
+        with self._lock:
+            store = self._docs[name]
+            store_sizes = self._sizes[name]
+            if not full_sync and name not in self._synced:
+                # Re-subscribed since the check above: this snapshot is the full collection.
+                full_sync = True
+                loaded, sizes = _load(docs)
+            if full_sync:
+                store.clear()
+                store.update(loaded)
+                store_sizes.clear()
+                store_sizes.update(sizes)
+                self._bytes[name] = sum(sizes.values())
+                self._evicted[name].clear()
+                if name == OFFERS:
+                    self._reindex_offers()
+                self._synced.add(name)
+            else:
+                for doc_id, new, size in updates:
+                    self._apply(name, doc_id, new, size)
+            self.version += 1
+
+            now = datetime.now(timezone.utc)
+            self.last_snapshot_at = now
+            if read_time is not None:
+                self.last_lag_seconds = max(0.0, (now - read_time).total_seconds())
+                self.max_lag_seconds = max(self.max_lag_seconds, self.last_lag_seconds)
+
+    def _apply(self, name: str, doc_id: str, new: Optional[dict], size: int) -> None:
+        """Replace (or remove, for None) one document. Caller holds the lock."""
+        store, store_sizes = self._docs[name], self._sizes[name]
+        old = store.pop(doc_id, None)
+        self._bytes[name] -= store_sizes.pop(doc_id, 0)
+        if new is not None:
+            store[doc_id] = new
+            store_sizes[doc_id] = size
+            self._bytes[name] += size
+        if name == OFFERS:
+            self._index_offer(doc_id, old, new)
+        self._evicted[name].pop(doc_id, None)
+
+    # --- Local writes ---
+
+    def apply_local(self, name: str, doc_id: str, data: Optional[dict]) -> None:
+        """Apply a write made by this instance (None for a delete) ahead of its snapshot."""
+        if name not in self.collections:
+            return
+        new = dict(data) if data is not None else None
+        size = 0 if new is None else _approx_size(doc_id) + _approx_size(new)
+        with self._lock:
+            if name in self._synced:
+                self._apply(name, doc_id, new, size)
+                self.version += 1
+
+    def evict(self, name: str, doc_id: str) -> None:
+        """Stop serving *doc_id* until its next change arrives (or ``CATALOG_EVICT_SECONDS``)."""
+        if name not in self.collections:
+            return
+        with self._lock:
+            if name in self._synced:
+                self._evicted[name][doc_id] = time.monotonic() + CATALOG_EVICT_SECONDS
+
+    def _pending(self, name: str) -> dict[str, float]:
+        """Evicted documents of *name* still awaiting their change. Caller holds the lock."""
+        evicted = self._evicted[name]
+        now = time.monotonic()
+        for doc_id in [doc_id for doc_id, deadline in evicted.items() if deadline <= now]:
+            del evicted[doc_id]
+        return evicted
+
+    def _reindex_offers(self) -> None:
+        self._offers_by_merchant = {}
+        for offer_id, data in self._docs[OFFERS].items():
+            self._index_offer(offer_id, None, data)
+
+    def _index_offer(self, offer_id: str, old: Optional[dict], new: Optional[dict]) -> None:
+        if old is not None:
+            offers = self._offers_by_merchant.get(old.get("merchant_id", ""), {})
+            offers.pop(offer_id, None)
+            if not offers:
+                self._offers_by_merchant.pop(old.get("merchant_id", ""), None)
+        if new is not None:
+            self._offers_by_merchant.setdefault(new.get("merchant_id", ""), {})[offer_id] = new
+
+    # --- Reading ---
+
+    def is_synced(self, name: str) -> bool:
+        """True when every document of *name* can be served from memory."""
+        with self._lock:
+            return name in self._synced and not self._pending(name)
+
+    @property
+    def ready(self) -> bool:
+        """True once every catalog collection is synced."""
+        return all(name in self._synced for name in self.collections)
+
+    def lookup(self, name: str, doc_id: str) -> tuple[bool, Optional[dict]]:
+        """(hit, data) from memory; no hit unless *name* is synced. data is None for absent docs."""
+        with self._lock:
+            if name not in self._synced or doc_id in self._pending(name):
+                return False, None
+            data = self._docs[name].get(doc_id)
+            return True, dict(data) if data is not None else None
+
+    def offers(self, merchant_id: Optional[str] = None, active_only: bool = False) -> list[tuple[str, dict]]:
+        """(offer_id, data) pairs in document ID order, optionally for one merchant."""
+        with self._lock:
+            if merchant_id is None:
+                source = self._docs[OFFERS]
+            else:
+                source = self._offers_by_merchant.get(merchant_id, {})
+            return [
+                (offer_id, dict(data))
+                for offer_id, data in sorted(source.items())
+                if not active_only or data.get("status") == ACTIVE
+            ]
+
+    def active_merchants_in_zone(self, zone_id: str) -> list[tuple[str, dict]]:
+        """(merchant_id, data) pairs of the zone's active merchants, in ID order."""
+        with self._lock:
+            return [
+                (merchant_id, dict(data))
+                for merchant_id, data in sorted(self._docs[MERCHANTS].items())
+                if data.get("zone_id") == zone_id and data.get("status") == ACTIVE
+            ]
+
+    def stats(self) -> dict:
+        """Listener health and memory metrics."""
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "version": self.version,
+                "reconnects": self.reconnects,
+                "last_lag_seconds": round(self.last_lag_seconds, 3),
+                "max_lag_seconds": round(self.max_lag_seconds, 3),
+                "last_snapshot_at": self.last_snapshot_at.isoformat() if self.last_snapshot_at else None,
+                "documents": {name: len(docs) for name, docs in self._docs.items()},
+                "approx_bytes": sum(self._bytes.values()),
+            }
+
+
+catalog = Catalog()
+
+
+def _catalog_metrics():
+    stats = catalog.stats()
+    yield ("catalog_ready", "1 when every catalog listener is synced.", "gauge", [({}, int(stats["ready"]))])
+    yield ("catalog_version", "Snapshots applied to the catalog.", "counter", [({}, stats["version"])])
+    yield ("catalog_reconnects_total", "Catalog listeners re-subscribed.", "counter", [({}, stats["reconnects"])])
+    yield ("catalog_lag_seconds", "Lag of the last applied snapshot.", "gauge", [({}, stats["last_lag_seconds"])])
+    yield ("catalog_documents", "Documents held by the catalog.", "gauge",
+           [({"collection": name}, n) for name, n in stats["documents"].items()])
+    yield ("catalog_bytes", "Approximate memory held by the catalog.", "gauge", [({}, stats["approx_bytes"])])
+
+
+register_collector(_catalog_metrics)
+
+
+# ---------------------------------------------------------------------------
+# Supervisor
+# ---------------------------------------------------------------------------
+
+_supervisor: Optional[asyncio.Task] = None
+
+
+async def _supervise(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_db(catalog.check, get_db())
+        except Exception as e:
+            logger.error("Catalog listener check failed: %s", e)
+
+
+async def start_catalog(interval: float = CATALOG_CHECK_SECONDS) -> None:
+    """Subscribe the catalog listeners and start the supervisor task."""
+    global _supervisor
+    try:
+        await run_db(catalog.subscribe, get_db())
+    except Exception as e:
+        # The supervisor retries; until then reads fall back to Firestore.
+        logger.error("Catalog listener start failed: %s", e)
+    _supervisor = asyncio.get_running_loop().create_task(_supervise(interval))
+
+
+async def stop_catalog() -> None:
+    global _supervisor
+    if _supervisor is not None:
+        _supervisor.cancel()
+        try:
+            await _supervisor
+        except asyncio.CancelledError:
+            pass
+        _supervisor = None
+    catalog.close()
@@ -0,0 +1,118 @@
+"""Materialized weekly retention cohorts.
+
+One document per (merchant, cohort week) in ``retention_cohorts``, keyed
+``{merchant_id}_{YYYY-MM-DD}`` (the cohort's Monday), holding
+``new_customers`` (customers whose first visit fell in that week) and
+``returned_1`` .. ``returned_5`` (how many of them visited again in week N
+after it). The retention endpoint reads at most one document per week shown
+instead of streaming the merchant's whole visit history.
+
+``record_cohort_visit`` stages the increments in the redemption commit. It
+works from the consumer x merchant stats read in the same transaction (see
+visit_stats.py): no first visit means a new customer, and a return counts
+once per week because only the first visit of a week finds ``last_visit``
+before that week's start. A visit replayed out of order (earlier than the
+customer's last visit) is not counted; ``rebuild_cohorts`` recomputes the
+tables from ``consumer_visits`` (scripts/backfill_retention_cohorts.py).
+"""
+
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from google.cloud.firestore_v1 import Increment
+
+from .db import CONSUMER_VISITS, RETENTION_COHORTS
+from .visit_frame import VisitFrame
+
+# Weeks after the cohort week that return counts are kept for.
+RETENTION_WEEKS = 5
+
+# Firestore caps a WriteBatch at 500 writes.
+_BATCH_LIMIT = 400
+
+
+def week_start(dt: datetime) -> datetime:
+    """Return the Monday 00:00 UTC of the week containing *dt*."""
+    d = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    d -= timedelta(days=d.weekday())  # back to Monday
+    return d
+
+
+def cohort_id(merchant_id: str, week: datetime) -> str:
+    return f"{merchant_id}_{week.strftime('%Y-%m-%d')}"
+
+
+def cohort_ref(db, merchant_id: str, week: datetime):
+    return db.collection(RETENTION_COHORTS).document(cohort_id(merchant_id, week))
+
+
+def record_cohort_visit(db, writer, stats: Optional[dict], merchant_id: str, when: datetime) -> None:
+    """Stage this visit's cohort increment on *writer*, if it changes any count.
+
+    ``stats`` is the consumer x merchant stats doc as it was before this
+    visit (None for a first-time customer).
+    """
+    stats = stats or {}
+    first_visit = stats.get("first_visit")
+    visit_week = week_start(when)
+    if first_visit is None:
+        week, field = visit_week, "new_customers"
+    else:
+        week = week_start(first_visit)
+        offset = (visit_week - week).days // 7
+        last_visit = stats.get("last_visit")
+        if not 1 <= offset <= RETENTION_WEEKS:
+            return
+        if last_visit is not None and last_visit >= visit_week:
+            return  # already counted this week
+        field = f"returned_{offset}"
+    writer.set(cohort_ref(db, merchant_id, week), {
+        "merchant_id": merchant_id,
+        "week_start": week,
+        field: Increment(1),
+    }, merge=True)
+
+
+def compute_cohorts(visits: Iterable[tuple[str, datetime]]) -> dict[datetime, dict]:
+    """Cohort counts, by cohort week, from (consumer_id, timestamp) pairs of one merchant."""
+    frame = VisitFrame.from_dicts({"consumer_id": cid, "timestamp": ts} for cid, ts in visits)
+    return frame.cohorts(RETENTION_WEEKS)
+
+
+def rebuild_cohorts(db, merchant_id: Optional[str] = None) -> int:
+    """Recompute cohort docs from ``consumer_visits`` (one merchant, or all). Returns docs written.
+
+    Backfill / repair job. Cohort docs with no customers left are deleted.
+    Visits that land while it runs can be overwritten for their week, so run
+    it off-peak.
+    """
+    visits_query = db.collection(CONSUMER_VISITS)
+    cohorts_query = db.collection(RETENTION_COHORTS)
+    if merchant_id is not None:
+        visits_query = visits_query.where("merchant_id", "==", merchant_id)
+        cohorts_query = cohorts_query.where("merchant_id", "==", merchant_id)
+
+    by_merchant: dict[str, list[tuple[str, datetime]]] = {}
+    for doc in visits_query.select(["merchant_id", "consumer_id", "timestamp"]).stream():
+        data = doc.to_dict()
+        if data.get("merchant_id"):
+            by_merchant.setdefault(data["merchant_id"], []).append((data.get("consumer_id"), data.get("timestamp")))
+
+    writes = []
+    for mid, visits in by_merchant.items():
+        for week, counts in compute_cohorts(visits).items():
+            writes.append((cohort_ref(db, mid, week), {"merchant_id": mid, "week_start": week, **counts}))
+    written = {ref.id for ref, _ in writes}
+    stale = [doc.reference for doc in cohorts_query.stream() if doc.id not in written]
+
+    ops = [("set", ref, data) for ref, data in writes] + [("delete", ref, None) for ref in stale]
+    for i in range(0, len(ops), _BATCH_LIMIT):
+        batch = db.batch()
+        for op, ref, data in ops[i : i + _BATCH_LIMIT]:
+            if op == "set":
+                batch.set(ref, data)
+            else:
+                batch.delete(ref)
+        batch.commit()
+
+    return len(writes)
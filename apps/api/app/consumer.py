@@ -7,10 +7,15 @@ import random
 import string
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from google.api_core.exceptions import AlreadyExists
 
-from .db import get_db, CONSUMERS, CONSUMER_CLAIMS, CONSUMER_VISITS, OFFERS, MERCHANTS, REDEMPTIONS, REWARDS, LOYALTY_PROGRESS, LOYALTY_CONFIGS, ZONES
+from .counters import get_daily_redemption_count
+from .dal import gather_db
+from .doc_cache import loyalty_config_cache, merchant_cache, offer_cache
+from .db import get_db, CONSUMERS, CONSUMER_CLAIMS, CONSUMER_VISITS, OFFERS, MERCHANTS, REWARDS, LOYALTY_PROGRESS, LOYALTY_CONFIGS, ZONES
 from .deps import get_current_user, get_current_consumer
+from .idempotency import find_response, get_idempotency_key, idempotency_id, store_response
 from .models import (
     ConsumerRegisterRequest,
     ConsumerProfile,
@@ -55,7 +60,7 @@ def _unique_referral_code(db) -> str:
 
 
 @router.post("/register", response_model=ConsumerProfile)
-async def register_consumer(
+def register_consumer(
     data: ConsumerRegisterRequest,
     user=Depends(get_current_user),
 ):
@@ -126,7 +131,7 @@ async def register_consumer(
 
 
 @router.get("/profile", response_model=ConsumerProfile)
-async def get_consumer_profile(user=Depends(get_current_consumer)):
+def get_consumer_profile(user=Depends(get_current_consumer)):
     """Get the current consumer's profile."""
     db = get_db()
     uid = user.get("uid")
@@ -196,11 +201,12 @@ def parse_personal_qr(qr_data: str) -> dict | None:
 
 
 @router.post("/claim/{offer_id}", response_model=ConsumerClaimResponse)
-async def claim_offer(offer_id: str, user=Depends(get_current_consumer)):
+def claim_offer(offer_id: str, request: Request, user=Depends(get_current_consumer)):
     """Claim an offer — generates a personal, HMAC-signed QR code.
 
     Rate limited to 1 claim per consumer per offer per day.
     The claim is a "reservation"; redemption happens when staff scans.
+    Honors an Idempotency-Key header: retries replay the first response.
     """
     db = get_db()
     uid = user.get("uid")
@@ -208,6 +214,12 @@ async def claim_offer(offer_id: str, user=Depends(get_current_consumer)):
     if not uid:
         raise HTTPException(status_code=400, detail="User UID not found in token")
 
+    idempotency_key = get_idempotency_key(request)
+    if idempotency_key:
+        replay = find_response(db, "consumer_claim", uid, idempotency_key)
+        if replay is not None:
+            return ConsumerClaimResponse(**replay)
+
     # Verify consumer profile exists
     consumer_doc = db.collection(CONSUMERS).document(uid).get()
     if not consumer_doc.exists:
@@ -217,22 +229,16 @@ async def claim_offer(offer_id: str, user=Depends(get_current_consumer)):
         )
 
     # Verify offer exists and is active
-    offer_doc = db.collection(OFFERS).document(offer_id).get()
-    if not offer_doc.exists:
+    offer_data = offer_cache.get(db, offer_id)
+    if offer_data is None:
         raise HTTPException(status_code=404, detail="Offer not found")
 
-    offer_data = offer_doc.to_dict()
     if offer_data.get("status") != OfferStatus.active.value:
         raise HTTPException(status_code=410, detail="This offer is no longer active")
 
     # Check daily cap on the offer
     today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    redemptions_query = (
-        db.collection(REDEMPTIONS)
-        .where("offer_id", "==", offer_id)
-        .where("timestamp", ">=", today_start)
-    )
-    today_count = len(list(redemptions_query.stream()))
+    today_count = get_daily_redemption_count(db, offer_id, today_start)
     if today_count >= offer_data.get("cap_daily", 50):
         raise HTTPException(status_code=429, detail="Daily cap reached for this offer")
 
@@ -247,21 +253,14 @@ async def claim_offer(offer_id: str, user=Depends(get_current_consumer)):
     )
     if existing_claims:
         # Return the existing claim instead of creating a new one
-        claim_data = existing_claims[0].to_dict()
-        return ConsumerClaimResponse(
-            qr_data=claim_data["qr_data"],
-            short_code=claim_data["short_code"],
-            expires_at=claim_data["expires_at"],
-            offer_name=claim_data["offer_name"],
-            merchant_name=claim_data["merchant_name"],
-            points_preview=claim_data.get("points_preview", 50),
-        )
+        response = _claim_response(existing_claims[0].to_dict())
+        if idempotency_key:
+            store_response(db, "consumer_claim", uid, idempotency_key, response.model_dump(), datetime.now(timezone.utc))
+        return response
 
     # Get merchant name
-    merchant_doc = db.collection(MERCHANTS).document(offer_data["merchant_id"]).get()
-    merchant_name = (
-        merchant_doc.to_dict().get("name", "Local Business") if merchant_doc.exists else "Local Business"
-    )
+    merchant = merchant_cache.get(db, offer_data["merchant_id"])
+    merchant_name = merchant.get("name", "Local Business") if merchant is not None else "Local Business"
 
     # Generate personal QR
     now = datetime.now(timezone.utc)
@@ -275,8 +274,10 @@ async def claim_offer(offer_id: str, user=Depends(get_current_consumer)):
     # Expires at end of day (UTC)
     expires_at = today_start.replace(hour=23, minute=59, second=59)
 
-    # Store claim
-    claim_ref = db.collection(CONSUMER_CLAIMS).document()
+    # Store claim (keyed by the Idempotency-Key, if any, so a concurrent
+    # duplicate request cannot create a second claim)
+    claim_id = "idem_" + idempotency_id("consumer_claim", uid, idempotency_key) if idempotency_key else None
+    claim_ref = db.collection(CONSUMER_CLAIMS).document(claim_id)
     claim_doc = {
         "consumer_uid": uid,
         "offer_id": offer_id,
@@ -290,15 +291,27 @@ async def claim_offer(offer_id: str, user=Depends(get_current_consumer)):
         "claimed_at": now,
         "redeemed": False,
     }
-    claim_ref.set(claim_doc)
+    if not idempotency_key:
+        claim_ref.set(claim_doc)
+        return _claim_response(claim_doc)
 
+    try:
+        claim_ref.create(claim_doc)
+    except AlreadyExists:
+        claim_doc = claim_ref.get().to_dict()
+    response = _claim_response(claim_doc)
+    store_response(db, "consumer_claim", uid, idempotency_key, response.model_dump(), now)
+    return response
+
+
+def _claim_response(claim_data: dict) -> ConsumerClaimResponse:
     return ConsumerClaimResponse(
-        qr_data=qr_data,
-        short_code=short_code,
-        expires_at=expires_at,
-        offer_name=offer_data["name"],
-        merchant_name=merchant_name,
-        points_preview=50,
+        qr_data=claim_data["qr_data"],
+        short_code=claim_data["short_code"],
+        expires_at=claim_data["expires_at"],
+        offer_name=claim_data["offer_name"],
+        merchant_name=claim_data["merchant_name"],
+        points_preview=claim_data.get("points_preview", 50),
     )
 
 
@@ -308,7 +321,7 @@ async def claim_offer(offer_id: str, user=Depends(get_current_consumer)):
 
 
 @router.get("/wallet", response_model=ConsumerWalletResponse)
-async def get_wallet(user=Depends(get_current_consumer)):
+def get_wallet(user=Depends(get_current_consumer)):
     """Get the consumer's wallet: active claims, visit history, and points.
 
     Returns all unredeemed/unexpired claims, last 30 visits, and total points.
@@ -319,8 +332,35 @@ async def get_wallet(user=Depends(get_current_consumer)):
     if not uid:
         raise HTTPException(status_code=400, detail="User UID not found in token")
 
-    # Get consumer profile for total_points
-    consumer_doc = db.collection(CONSUMERS).document(uid).get()
+    now = datetime.now(timezone.utc)
+
+    # The profile and the four wallet queries are independent: issue them together.
+    consumer_doc, claim_docs, visit_docs, progress_docs, reward_docs = gather_db(
+        db.collection(CONSUMERS).document(uid).get,
+        lambda: list(
+            db.collection(CONSUMER_CLAIMS)
+            .where("consumer_uid", "==", uid)
+            .where("redeemed", "==", False)
+            .stream()
+        ),
+        # Visit history: last 30, most recent first
+        lambda: list(
+            db.collection(CONSUMER_VISITS)
+            .where("consumer_id", "==", uid)
+            .order_by("timestamp", direction="DESCENDING")
+            .limit(30)
+            .stream()
+        ),
+        lambda: list(db.collection(LOYALTY_PROGRESS).where("consumer_id", "==", uid).stream()),
+        # Rewards: earned, unredeemed (expiry is checked below)
+        lambda: list(
+            db.collection(REWARDS)
+            .where("consumer_id", "==", uid)
+            .where("status", "==", "earned")
+            .stream()
+        ),
+    )
+
     if not consumer_doc.exists:
         raise HTTPException(
             status_code=404,
@@ -329,16 +369,38 @@ async def get_wallet(user=Depends(get_current_consumer)):
     consumer_data = consumer_doc.to_dict()
     total_points = consumer_data.get("global_points", 0)
 
-    now = datetime.now(timezone.utc)
+    visits = [doc.to_dict() for doc in visit_docs]
+    progress_rows = [doc.to_dict() for doc in progress_docs]
+    reward_rows = [(doc.id, doc.to_dict()) for doc in reward_docs]
+
+    # Merchant and offer names plus loyalty configs: from the document cache,
+    # with one get_all per collection for misses, issued together.
+    merchant_ids = {v.get("merchant_id", "") for v in visits}
+    merchant_ids.update(lp.get("merchant_id", "") for lp in progress_rows)
+    merchant_ids.update(
+        r.get("merchant_id") for _, r in reward_rows
+        if not r.get("is_universal", False) and r.get("merchant_id") is not None
+    )
+    offer_ids = {v.get("offer_id", "") for v in visits}
+    config_ids = {lp.get("merchant_id", "") for lp in progress_rows}
 
-    # --- Active claims: unredeemed AND not expired ---
-    claims_query = (
-        db.collection(CONSUMER_CLAIMS)
-        .where("consumer_uid", "==", uid)
-        .where("redeemed", "==", False)
+    merchant_docs, offer_docs, config_docs = gather_db(
+        lambda: merchant_cache.get_many(db, merchant_ids),
+        lambda: offer_cache.get_many(db, offer_ids),
+        lambda: loyalty_config_cache.get_many(db, config_ids),
     )
+    merchant_names = {
+        mid: merchant_docs[mid].get("name", "Local Business") if mid in merchant_docs else "Local Business"
+        for mid in merchant_ids
+    }
+    offer_names = {
+        oid: offer_docs[oid].get("name", "Deal") if oid in offer_docs else "Deal"
+        for oid in offer_ids
+    }
+
+    # --- Active claims: unredeemed AND not expired ---
     active_claims: list[ActiveClaim] = []
-    for doc in claims_query.stream():
+    for doc in claim_docs:
         data = doc.to_dict()
         expires_at = data.get("expires_at")
         # Skip expired claims
@@ -354,42 +416,13 @@ async def get_wallet(user=Depends(get_current_consumer)):
             )
         )
 
-    # --- Visit history: last 30, most recent first ---
-    visits_query = (
-        db.collection(CONSUMER_VISITS)
-        .where("consumer_id", "==", uid)
-        .order_by("timestamp", direction="DESCENDING")
-        .limit(30)
-    )
-
-    # Build lookup caches for merchant and offer names
-    merchant_cache: dict[str, str] = {}
-    offer_cache: dict[str, str] = {}
-
+    # --- Visit history ---
     visit_history: list[VisitHistoryItem] = []
-    for doc in visits_query.stream():
-        data = doc.to_dict()
-
-        # Look up merchant name (with cache)
-        merchant_id = data.get("merchant_id", "")
-        if merchant_id not in merchant_cache:
-            m_doc = db.collection(MERCHANTS).document(merchant_id).get()
-            merchant_cache[merchant_id] = (
-                m_doc.to_dict().get("name", "Local Business") if m_doc.exists else "Local Business"
-            )
-
-        # Look up offer name (with cache)
-        offer_id = data.get("offer_id", "")
-        if offer_id not in offer_cache:
-            o_doc = db.collection(OFFERS).document(offer_id).get()
-            offer_cache[offer_id] = (
-                o_doc.to_dict().get("name", "Deal") if o_doc.exists else "Deal"
-            )
-
+    for data in visits:
         visit_history.append(
             VisitHistoryItem(
-                merchant_name=merchant_cache[merchant_id],
-                offer_name=offer_cache[offer_id],
+                merchant_name=merchant_names[data.get("merchant_id", "")],
+                offer_name=offer_names[data.get("offer_id", "")],
                 timestamp=data.get("timestamp", now),
                 visit_number=data.get("visit_number", 1),
                 points_earned=data.get("points_earned", 0),
@@ -398,27 +431,13 @@ async def get_wallet(user=Depends(get_current_consumer)):
         )
 
     # --- Merchant loyalty progress ---
-    loyalty_progress_query = (
-        db.collection(LOYALTY_PROGRESS)
-        .where("consumer_id", "==", uid)
-    )
-
     merchant_loyalty: list[MerchantLoyaltyProgress] = []
-    for doc in loyalty_progress_query.stream():
-        lp_data = doc.to_dict()
+    for lp_data in progress_rows:
         lp_merchant_id = lp_data.get("merchant_id", "")
 
-        # Look up merchant name (reuse cache)
-        if lp_merchant_id not in merchant_cache:
-            m_doc = db.collection(MERCHANTS).document(lp_merchant_id).get()
-            merchant_cache[lp_merchant_id] = (
-                m_doc.to_dict().get("name", "Local Business") if m_doc.exists else "Local Business"
-            )
-
-        # Look up loyalty config for stamps_required and reward_description
-        lc_doc = db.collection(LOYALTY_CONFIGS).document(lp_merchant_id).get()
-        if lc_doc.exists:
-            lc_data = lc_doc.to_dict()
+        # Loyalty config for stamps_required and reward_description
+        lc_data = config_docs.get(lp_merchant_id)
+        if lc_data is not None:
             stamps_required = lc_data.get("stamps_required", 10)
             reward_description = lc_data.get("reward_description", "Free reward")
         else:
@@ -431,7 +450,7 @@ async def get_wallet(user=Depends(get_current_consumer)):
         merchant_loyalty.append(
             MerchantLoyaltyProgress(
                 merchant_id=lp_merchant_id,
-                merchant_name=merchant_cache[lp_merchant_id],
+                merchant_name=merchant_names[lp_merchant_id],
                 current_stamps=current_stamps,
                 stamps_required=stamps_required,
                 reward_description=reward_description,
@@ -440,14 +459,8 @@ async def get_wallet(user=Depends(get_current_consumer)):
         )
 
     # --- Rewards: earned, unredeemed, unexpired ---
-    rewards_query = (
-        db.collection(REWARDS)
-        .where("consumer_id", "==", uid)
-        .where("status", "==", "earned")
-    )
     rewards: list[WalletReward] = []
-    for doc in rewards_query.stream():
-        data = doc.to_dict()
+    for reward_id, data in reward_rows:
         expires_at = data.get("expires_at")
         # Skip expired rewards
         if isinstance(expires_at, datetime) and expires_at < now:
@@ -459,17 +472,11 @@ async def get_wallet(user=Depends(get_current_consumer)):
         if is_universal or merchant_id is None:
             merchant_name = "Any Boost merchant"
         else:
-            # Look up merchant name (reuse cache from visit history)
-            if merchant_id not in merchant_cache:
-                m_doc = db.collection(MERCHANTS).document(merchant_id).get()
-                merchant_cache[merchant_id] = (
-                    m_doc.to_dict().get("name", "Local Business") if m_doc.exists else "Local Business"
-                )
-            merchant_name = merchant_cache[merchant_id]
+            merchant_name = merchant_names[merchant_id]
 
         rewards.append(
             WalletReward(
-                id=doc.id,
+                id=reward_id,
                 description=data.get("description", ""),
                 status=data.get("status", "earned"),
                 merchant_name=merchant_name,
@@ -0,0 +1,214 @@
+"""Sharded per-offer redemption counters: daily, and all-time totals.
+
+Each (offer, UTC day) pair owns ``DAILY_COUNTER_SHARDS`` counter documents in
+``daily_redemption_counters``. A redemption increments one random shard in the
+same commit that writes the redemption, so reading today's count costs one
+``get_all`` over the shards instead of streaming every redemption of the day.
+
+The same increment also lands on one of the offer's ``DAILY_COUNTER_SHARDS``
+all-time shards in ``offer_redemption_totals``, so an offer's total costs a
+fixed number of reads however long its history
+(scripts/backfill_redemption_totals.py seeds it from existing redemptions).
+"""
+
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from google.cloud.firestore_v1 import Increment
+
+from .db import DAILY_REDEMPTION_COUNTERS, OFFER_REDEMPTION_TOTALS, REDEMPTIONS
+
+# Spreads increments so a busy offer is not limited to ~1 write/sec on one doc.
+# Changing this orphans existing shards, so treat it as fixed.
+DAILY_COUNTER_SHARDS = 10
+
+# Keep get_all requests comfortably small.
+_GET_ALL_CHUNK = 300
+
+# Firestore caps a WriteBatch at 500 writes.
+_BATCH_LIMIT = 400
+
+
+def day_key(dt: datetime) -> str:
+    """Return the UTC calendar day of *dt* as YYYY-MM-DD."""
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%d")
+
+
+def day_start(dt: datetime) -> datetime:
+    """Return 00:00 UTC of the day containing *dt*."""
+    return dt.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _shard_id(offer_id: str, day: str, shard: int) -> str:
+    return f"{offer_id}_{day}_{shard}"
+
+
+def _total_shard_id(offer_id: str, shard: int) -> str:
+    return f"{offer_id}_{shard}"
+
+
+def shard_refs(db, offer_id: str, when: datetime) -> list:
+    """Document references for every counter shard of an offer on a day."""
+    day = day_key(when)
+    col = db.collection(DAILY_REDEMPTION_COUNTERS)
+    return [col.document(_shard_id(offer_id, day, i)) for i in range(DAILY_COUNTER_SHARDS)]
+
+
+def sum_shards(snapshots) -> int:
+    """Sum the ``count`` field over counter shard snapshots (missing shards count 0)."""
+    total = 0
+    for snap in snapshots:
+        if snap.exists:
+            total += (snap.to_dict() or {}).get("count", 0)
+    return total
+
+
+def increment_daily_redemptions(db, writer, offer_id: str, when: datetime, amount: int = 1) -> None:
+    """Stage the daily and all-time counter increments on *writer* (a WriteBatch or Transaction).
+
+    Callers commit them together with the redemption document so the
+    counters never drift from the redemptions they count.
+    """
+    day = day_key(when)
+    shard = random.randrange(DAILY_COUNTER_SHARDS)
+    ref = db.collection(DAILY_REDEMPTION_COUNTERS).document(_shard_id(offer_id, day, shard))
+    writer.set(
+        ref,
+        {
+            "offer_id": offer_id,
+            "day": day,
+            "shard": shard,
+            "count": Increment(amount),
+        },
+        merge=True,
+    )
+    shard = random.randrange(DAILY_COUNTER_SHARDS)
+    writer.set(
+        db.collection(OFFER_REDEMPTION_TOTALS).document(_total_shard_id(offer_id, shard)),
+        {
+            "offer_id": offer_id,
+            "shard": shard,
+            "count": Increment(amount),
+        },
+        merge=True,
+    )
+
+
+def get_daily_redemption_counts(db, offer_ids: list[str], when: datetime) -> dict[str, int]:
+    """Return today's redemption count for each offer in *offer_ids*.
+
+    Costs O(offers x shards) document reads regardless of redemption volume.
+    """
+    counts: dict[str, int] = {oid: 0 for oid in offer_ids}
+    if not offer_ids:
+        return counts
+
+    day = day_key(when)
+    col = db.collection(DAILY_REDEMPTION_COUNTERS)
+    refs = [
+        col.document(_shard_id(oid, day, i))
+        for oid in offer_ids
+        for i in range(DAILY_COUNTER_SHARDS)
+    ]
+
+    for i in range(0, len(refs), _GET_ALL_CHUNK):
+        for snap in db.get_all(refs[i : i + _GET_ALL_CHUNK]):
+            if not snap.exists:
+                continue
+            data = snap.to_dict() or {}
+            oid = data.get("offer_id")
+            if oid in counts:
+                counts[oid] += data.get("count", 0)
+
+    return counts
+
+
+def get_daily_redemption_count(db, offer_id: str, when: datetime) -> int:
+    """Return the redemption count of a single offer on the day of *when*."""
+    return get_daily_redemption_counts(db, [offer_id], when)[offer_id]
+
+
+def get_redemption_totals(db, offer_ids: list[str]) -> dict[str, int]:
+    """Return the all-time redemption count of each offer in *offer_ids*.
+
+    Costs O(offers x shards) document reads regardless of redemption volume.
+    """
+    counts: dict[str, int] = {oid: 0 for oid in offer_ids}
+    col = db.collection(OFFER_REDEMPTION_TOTALS)
+    refs = [col.document(_total_shard_id(oid, i)) for oid in counts for i in range(DAILY_COUNTER_SHARDS)]
+
+    for i in range(0, len(refs), _GET_ALL_CHUNK):
+        for snap in db.get_all(refs[i : i + _GET_ALL_CHUNK]):
+            if not snap.exists:
+                continue
+            data = snap.to_dict() or {}
+            oid = data.get("offer_id")
+            if oid in counts:
+                counts[oid] += data.get("count", 0)
+
+    return counts
+
+
+def rebuild_daily_redemption_counter(db, offer_id: str, when: datetime) -> int:
+    """Recount an offer's redemptions for a day and rewrite its shards.
+
+    Reconciliation path for counters that drifted (e.g. redemptions written
+    before counters existed, or manual data fixes). Increments that land while
+    the rebuild runs can be overwritten, so run it off-peak or for past days.
+    Returns the rebuilt count.
+    """
+    start = day_start(when)
+    end = start + timedelta(days=1)
+    day = day_key(start)
+
+    redemptions_query = (
+        db.collection(REDEMPTIONS)
+        .where("offer_id", "==", offer_id)
+        .where("timestamp", ">=", start)
+        .where("timestamp", "<", end)
+    )
+    total = sum(1 for _ in redemptions_query.stream())
+
+    batch = db.batch()
+    for i, ref in enumerate(shard_refs(db, offer_id, start)):
+        batch.set(ref, {
+            "offer_id": offer_id,
+            "day": day,
+            "shard": i,
+            "count": total if i == 0 else 0,
+        })
+    batch.commit()
+
+    return total
+
+
+def rebuild_redemption_totals(db, offer_id: Optional[str] = None) -> int:
+    """Recount all-time redemptions (one offer, or all) and rewrite their total shards.
+
+    Backfill / repair job: each offer's total goes on shard 0 and the other
+    shards are zeroed. Increments that land while it runs can be overwritten,
+    so run it off-peak. Returns the number of offers written.
+    """
+    query = db.collection(REDEMPTIONS)
+    if offer_id is not None:
+        query = query.where("offer_id", "==", offer_id)
+    totals: dict[str, int] = {} if offer_id is None else {offer_id: 0}
+    for doc in query.select(["offer_id"]).stream():
+        oid = (doc.to_dict() or {}).get("offer_id")
+        if oid:
+            totals[oid] = totals.get(oid, 0) + 1
+
+    col = db.collection(OFFER_REDEMPTION_TOTALS)
+    writes = [
+        (col.document(_total_shard_id(oid, i)), {"offer_id": oid, "shard": i, "count": total if i == 0 else 0})
+        for oid, total in totals.items()
+        for i in range(DAILY_COUNTER_SHARDS)
+    ]
+    for i in range(0, len(writes), _BATCH_LIMIT):
+        batch = db.batch()
+        for ref, data in writes[i : i + _BATCH_LIMIT]:
+            batch.set(ref, data)
+        batch.commit()
+
+    return len(totals)
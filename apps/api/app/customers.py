@@ -15,6 +15,8 @@ from .db import (
     OFFERS,
 )
 from .deps import get_current_user
+from .loader import DocLoader
+from .visit_stats import get_visit_stats
 from .models import (
     CustomerDetail,
     CustomerListResponse,
@@ -92,7 +94,7 @@ def _compute_segment(
     "/merchants/{merchant_id}/customers",
     response_model=CustomerListResponse,
 )
-async def list_customers(
+def list_customers(
     merchant_id: str,
     segment: Optional[str] = Query(None, description="Filter by segment"),
     search: Optional[str] = Query(None, description="Search by name substring"),
@@ -155,24 +157,26 @@ async def list_customers(
     # 5. Compute segments & lookup consumer names
     consumer_ids = [s["consumer_id"] for s in summaries]
 
-    # Batch lookup consumer display names
+    # Consumer profiles and loyalty progress are batched through the loader:
+    # a few get_all calls instead of two point reads per customer
+    loader = DocLoader(db)
+    loader.prime(CONSUMERS, consumer_ids)
+    loyalty_config = loader.get(LOYALTY_CONFIGS, merchant_id)
+
     name_map: dict[str, str] = {}
     for cid in consumer_ids:
-        cdoc = db.collection(CONSUMERS).document(cid).get()
-        if cdoc.exists:
-            name_map[cid] = cdoc.to_dict().get("display_name", "")
+        consumer = loader.get(CONSUMERS, cid)
+        if consumer is not None:
+            name_map[cid] = consumer.get("display_name", "")
 
     # Lookup loyalty progress
     loyalty_map: dict[str, LoyaltyStamps] = {}
-    loyalty_config_doc = db.collection(LOYALTY_CONFIGS).document(merchant_id).get()
-    stamps_required = 0
-    if loyalty_config_doc.exists:
-        stamps_required = loyalty_config_doc.to_dict().get("stamps_required", 10)
+    if loyalty_config is not None:
+        stamps_required = loyalty_config.get("stamps_required", 10)
+        loader.prime(LOYALTY_PROGRESS, [f"{cid}_{merchant_id}" for cid in consumer_ids])
         for cid in consumer_ids:
-            progress_id = f"{cid}_{merchant_id}"
-            pdoc = db.collection(LOYALTY_PROGRESS).document(progress_id).get()
-            if pdoc.exists:
-                pdata = pdoc.to_dict()
+            pdata = loader.get(LOYALTY_PROGRESS, f"{cid}_{merchant_id}")
+            if pdata is not None:
                 loyalty_map[cid] = LoyaltyStamps(
                     current=pdata.get("current_stamps", 0),
                     required=stamps_required,
@@ -230,7 +234,7 @@ async def list_customers(
     "/merchants/{merchant_id}/customers/{consumer_id}",
     response_model=CustomerDetail,
 )
-async def get_customer_detail(
+def get_customer_detail(
     merchant_id: str,
     consumer_id: str,
     user=Depends(get_current_user),
@@ -243,55 +247,46 @@ async def get_customer_detail(
 
     db = get_db()
 
-    # Fetch visits for this consumer at this merchant
+    # Visit count, first and last visit come from the stats doc
+    stats = get_visit_stats(db, consumer_id, merchant_id)
+    if not stats:
+        raise HTTPException(status_code=404, detail="Customer not found for this merchant")
+
+    visit_count = stats.get("visit_count", 0)
+    last_visit = stats.get("last_visit")
+    first_visit = stats.get("first_visit")
+    estimated_ltv = visit_count * DEFAULT_AVG_TICKET
+
+    # Timeline: every visit at this merchant
     visits_query = (
         db.collection(CONSUMER_VISITS)
         .where("merchant_id", "==", merchant_id)
         .where("consumer_id", "==", consumer_id)
     )
-    visits = list(visits_query.stream())
-
-    if not visits:
-        raise HTTPException(status_code=404, detail="Customer not found for this merchant")
-
-    # Build timeline & compute metrics
-    visit_count = len(visits)
-    timestamps = []
-    timeline: list[VisitTimelineItem] = []
-
-    # Fetch offer names for timeline
-    offer_cache: dict[str, str] = {}
-
-    for v in visits:
-        vdata = v.to_dict()
-        ts = vdata.get("timestamp")
-        if ts:
-            timestamps.append(ts)
-
-        offer_id = vdata.get("offer_id", "")
-        if offer_id and offer_id not in offer_cache:
-            odoc = db.collection(OFFERS).document(offer_id).get()
+    visits = [v.to_dict() for v in visits_query.stream()]
+
+    # Fetch offer names for timeline in one round trip
+    offer_ids = list({v["offer_id"] for v in visits if v.get("offer_id")})
+    offer_names: dict[str, str] = {}
+    if offer_ids:
+        offer_refs = [db.collection(OFFERS).document(oid) for oid in offer_ids]
+        for odoc in db.get_all(offer_refs):
             if odoc.exists:
-                offer_cache[offer_id] = odoc.to_dict().get("name", "Unknown Offer")
-            else:
-                offer_cache[offer_id] = "Unknown Offer"
-
-        timeline.append(
-            VisitTimelineItem(
-                timestamp=ts or datetime.now(timezone.utc),
-                offer_name=offer_cache.get(offer_id, "Unknown Offer"),
-                points_earned=vdata.get("points_earned", 0),
-                stamp_earned=vdata.get("stamp_earned", False),
-            )
+                offer_names[odoc.id] = odoc.to_dict().get("name", "Unknown Offer")
+
+    timeline = [
+        VisitTimelineItem(
+            timestamp=vdata.get("timestamp") or datetime.now(timezone.utc),
+            offer_name=offer_names.get(vdata.get("offer_id", ""), "Unknown Offer"),
+            points_earned=vdata.get("points_earned", 0),
+            stamp_earned=vdata.get("stamp_earned", False),
         )
+        for vdata in visits
+    ]
 
     # Sort timeline by timestamp descending
     timeline.sort(key=lambda t: t.timestamp, reverse=True)
 
-    last_visit = max(timestamps) if timestamps else None
-    first_visit = min(timestamps) if timestamps else None
-    estimated_ltv = visit_count * DEFAULT_AVG_TICKET
-
     # Consumer display name
     consumer_doc = db.collection(CONSUMERS).document(consumer_id).get()
     raw_name = ""
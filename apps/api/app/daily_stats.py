@@ -0,0 +1,234 @@
+"""Per merchant daily rollup.
+
+``DAILY_STATS_SHARDS`` documents per (merchant, UTC day) in
+``merchant_daily_stats``, keyed ``{merchant_id}_{YYYY-MM-DD}_{shard}``, whose
+sums hold:
+
+- ``redemptions``, ``ledger_amount`` and ``offers.{offer_id}`` (redemptions
+  per offer): every redemption, universal token or personal QR;
+- ``visits``, ``new_customers`` (first visit ever at the merchant),
+  ``returning_customers`` (first visit of the day by a customer seen on an
+  earlier day) and ``week_returning_customers`` (first visit of the
+  Monday-based week by a customer seen in an earlier week): personal QR
+  visits only;
+- ``rewards_issued``: loyalty rewards earned.
+
+The redemption commit stages the increments on one random shard
+(``stage_daily_stats``), like the offer counters (see counters.py), so a busy
+merchant is not limited to ~1 write/sec on one document; ``get_daily_stats``
+sums the shards back into one dict per day. The customer counts come from
+the consumer x merchant stats read in the same transaction, like the
+retention cohorts (see cohorts.py). Summing ``new_customers`` and
+``week_returning_customers`` over a week's days gives that week's distinct
+new and returning customers exactly, so reports and time series read at
+most ``DAILY_STATS_SHARDS`` small documents per day instead of the raw
+history.
+
+A visit replayed offline from before the customer's last visit still counts
+as a visit, but not as a return for its day or week, since the stats doc's
+``last_visit`` never moves backwards (see visit_stats.py);
+``rebuild_daily_stats`` recomputes the rollup from the raw collections
+(scripts/backfill_daily_stats.py).
+"""
+
+import random
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from google.cloud.firestore_v1 import Increment
+
+from .cohorts import week_start
+from .counters import day_start
+from .db import CONSUMER_VISITS, LEDGER, MERCHANT_DAILY_STATS, REDEMPTIONS, REWARDS
+from .visit_frame import VisitFrame
+
+# Counters kept on every daily doc (``offers`` and ``ledger_amount`` aside)
+COUNT_FIELDS = (
+    "visits",
+    "redemptions",
+    "new_customers",
+    "returning_customers",
+    "week_returning_customers",
+    "rewards_issued",
+)
+
+# Spreads a merchant's increments over several docs per day.
+# Changing this orphans existing shards, so treat it as fixed.
+DAILY_STATS_SHARDS = 10
+
+# Longest range the analytics read in one query
+MAX_RANGE_DAYS = 365
+
+# Firestore caps a WriteBatch at 500 writes.
+_BATCH_LIMIT = 400
+
+
+def daily_stats_id(merchant_id: str, day: datetime, shard: int) -> str:
+    return f"{merchant_id}_{day.strftime('%Y-%m-%d')}_{shard}"
+
+
+def daily_stats_ref(db, merchant_id: str, day: datetime, shard: int):
+    return db.collection(MERCHANT_DAILY_STATS).document(daily_stats_id(merchant_id, day_start(day), shard))
+
+
+# ---------------------------------------------------------------------------
+# Write path
+# ---------------------------------------------------------------------------
+
+
+def redemption_fields(offers: dict[str, int], amount: float) -> dict:
+    """Increments for redemptions (count per offer ID) worth *amount* in total."""
+    return {
+        "redemptions": Increment(sum(offers.values())),
+        "ledger_amount": Increment(amount),
+        "offers": {offer_id: Increment(count) for offer_id, count in offers.items()},
+    }
+
+
+def visit_fields(stats: Optional[dict], when: datetime, rewards_issued: int = 0) -> dict:
+    """Increments for one visit at *when*.
+
+    ``stats`` is the consumer x merchant stats doc as it was before this
+    visit (None for a first-time customer).
+    """
+    fields = {"visits": Increment(1)}
+    first_visit = (stats or {}).get("first_visit")
+    last_visit = (stats or {}).get("last_visit")
+    if first_visit is None:
+        fields["new_customers"] = Increment(1)
+    else:
+        if last_visit is None or last_visit < day_start(when):
+            fields["returning_customers"] = Increment(1)
+        if last_visit is None or last_visit < week_start(when):
+            fields["week_returning_customers"] = Increment(1)
+    if rewards_issued:
+        fields["rewards_issued"] = Increment(rewards_issued)
+    return fields
+
+
+def stage_daily_stats(db, writer, merchant_id: str, when: datetime, *field_sets: dict) -> None:
+    """Stage the given increments on a random shard of *when*'s day, as one write."""
+    shard = random.randrange(DAILY_STATS_SHARDS)
+    data = {"merchant_id": merchant_id, "date": day_start(when), "shard": shard}
+    for fields in field_sets:
+        data.update(fields)
+    writer.set(daily_stats_ref(db, merchant_id, when, shard), data, merge=True)
+
+
+# ---------------------------------------------------------------------------
+# Range reads
+# ---------------------------------------------------------------------------
+
+
+def get_daily_stats(db, merchant_id: str, start: datetime, end: datetime) -> list[dict]:
+    """The merchant's daily stats for days in ``[start, end)``, oldest first.
+
+    One dict per day (``merchant_id``, ``date`` and the summed shards); days
+    without activity are absent. The range is clamped to ``MAX_RANGE_DAYS``
+    days ending at *end*.
+    """
+    start = max(day_start(start), end - timedelta(days=MAX_RANGE_DAYS))
+    query = (
+        db.collection(MERCHANT_DAILY_STATS)
+        .where("merchant_id", "==", merchant_id)
+        .where("date", ">=", start)
+        .where("date", "<", end)
+        .order_by("date")
+    )
+    shards_by_day: dict[datetime, list[dict]] = {}
+    for doc in query.stream():
+        data = doc.to_dict()
+        shards_by_day.setdefault(data["date"], []).append(data)
+    return [
+        {"merchant_id": merchant_id, "date": day, **sum_daily_stats(shards)}
+        for day, shards in shards_by_day.items()
+    ]
+
+
+def sum_daily_stats(days: Iterable[dict]) -> dict:
+    """Totals over daily docs: every count field, ``ledger_amount`` and ``offers``."""
+    totals: dict = {field: 0 for field in COUNT_FIELDS}
+    totals["ledger_amount"] = 0.0
+    totals["offers"] = {}
+    for day in days:
+        for field in COUNT_FIELDS:
+            totals[field] += day.get(field, 0)
+        totals["ledger_amount"] += day.get("ledger_amount", 0)
+        for offer_id, count in (day.get("offers") or {}).items():
+            totals["offers"][offer_id] = totals["offers"].get(offer_id, 0) + count
+    totals["ledger_amount"] = round(totals["ledger_amount"], 2)
+    return totals
+
+
+# ---------------------------------------------------------------------------
+# Rebuild
+# ---------------------------------------------------------------------------
+
+
+def _stream(db, collection: str, merchant_id: Optional[str], fields: list[str]):
+    query = db.collection(collection)
+    if merchant_id is not None:
+        query = query.where("merchant_id", "==", merchant_id)
+    return (doc.to_dict() for doc in query.select(fields).stream())
+
+
+def rebuild_daily_stats(db, merchant_id: Optional[str] = None) -> int:
+    """Recompute daily stats from redemptions, ledger, visits and rewards (one merchant, or all).
+
+    Backfill / repair job; returns the number of days written. Each day's
+    totals go on shard 0 and its other shards are deleted, as are days with
+    no activity left. Redemptions that land while it runs can be overwritten
+    for their day, so run it off-peak.
+    """
+    days: dict[tuple[str, datetime], dict] = {}
+
+    def _day(mid: str, when: datetime) -> dict:
+        key = (mid, day_start(when))
+        if key not in days:
+            days[key] = {"merchant_id": mid, "date": key[1], "ledger_amount": 0.0, "offers": {},
+                         **{field: 0 for field in COUNT_FIELDS}}
+        return days[key]
+
+    for data in _stream(db, REDEMPTIONS, merchant_id, ["merchant_id", "offer_id", "timestamp"]):
+        if data.get("merchant_id") and data.get("timestamp"):
+            day = _day(data["merchant_id"], data["timestamp"])
+            day["redemptions"] += 1
+            offer_id = data.get("offer_id")
+            if offer_id:
+                day["offers"][offer_id] = day["offers"].get(offer_id, 0) + 1
+
+    for data in _stream(db, LEDGER, merchant_id, ["merchant_id", "amount", "created_at"]):
+        if data.get("merchant_id") and data.get("created_at"):
+            _day(data["merchant_id"], data["created_at"])["ledger_amount"] += data.get("amount", 0)
+
+    for data in _stream(db, REWARDS, merchant_id, ["merchant_id", "earned_at"]):
+        if data.get("merchant_id") and data.get("earned_at"):
+            _day(data["merchant_id"], data["earned_at"])["rewards_issued"] += 1
+
+    visits_by_merchant: dict[str, list[dict]] = {}
+    for data in _stream(db, CONSUMER_VISITS, merchant_id, ["merchant_id", "consumer_id", "timestamp"]):
+        if data.get("merchant_id"):
+            visits_by_merchant.setdefault(data["merchant_id"], []).append(data)
+    for mid, visits in visits_by_merchant.items():
+        for when, counts in VisitFrame.from_dicts(visits).daily_customers().items():
+            _day(mid, when).update(counts)
+
+    # Totals go on shard 0; any other shard of the day is removed below.
+    writes = [(daily_stats_ref(db, mid, day, 0), {**data, "shard": 0}) for (mid, day), data in days.items()]
+    written = {ref.id for ref, _ in writes}
+    stats_query = db.collection(MERCHANT_DAILY_STATS)
+    if merchant_id is not None:
+        stats_query = stats_query.where("merchant_id", "==", merchant_id)
+    stale = [doc.reference for doc in stats_query.stream() if doc.id not in written]
+
+    ops = [("set", ref, data) for ref, data in writes] + [("delete", ref, None) for ref in stale]
+    for i in range(0, len(ops), _BATCH_LIMIT):
+        batch = db.batch()
+        for op, ref, data in ops[i : i + _BATCH_LIMIT]:
+            if op == "set":
+                batch.set(ref, data)
+            else:
+                batch.delete(ref)
+        batch.commit()
+
+    return len(writes)
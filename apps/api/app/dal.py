@@ -0,0 +1,65 @@
+"""Non-blocking access to the synchronous Firestore client.
+
+The Firestore client returned by ``db.get_db()`` blocks the calling thread on
+every RPC, so it must never run on the event loop. Route handlers that touch
+Firestore are therefore plain ``def`` functions, which FastAPI runs on its
+worker thread pool, and async code (e.g. the outbox worker) hands blocking
+calls to the same pool through ``run_db``.
+
+Both paths share anyio's default capacity limiter, sized by ``DB_THREADS``,
+so the number of in-flight Firestore calls per instance is bounded and
+explicit rather than the library default of 40.
+
+Inside a handler, ``gather_db`` issues independent reads concurrently on a
+separate fan-out pool, so a handler's latency approaches its slowest read
+rather than the sum of them.
+"""
+
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+import anyio.to_thread
+
+T = TypeVar("T")
+
+# Threads available for blocking Firestore work per process. Each in-flight
+# request holds one while it runs; size it above the expected per-instance
+# concurrency (Cloud Run's --concurrency).
+DB_THREADS = int(os.getenv("DB_THREADS", "100"))
+# Threads for concurrent reads within one handler (see gather_db). Separate
+# from the handler pool so handlers waiting on fan-out can never starve it.
+DB_FANOUT_THREADS = int(os.getenv("DB_FANOUT_THREADS", "64"))
+
+_fanout = ThreadPoolExecutor(max_workers=DB_FANOUT_THREADS, thread_name_prefix="db-fanout")
+
+
+def configure_thread_pool(threads: int = DB_THREADS) -> None:
+    """Size the worker pool shared by sync route handlers and ``run_db``.
+
+    Must be called from the running event loop (e.g. the app lifespan).
+    """
+    anyio.to_thread.current_default_thread_limiter().total_tokens = threads
+
+
+async def run_db(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking Firestore call on the worker pool and await its result."""
+    return await anyio.to_thread.run_sync(functools.partial(fn, *args, **kwargs))
+
+
+def gather_db(*calls: Callable[[], Any]) -> list:
+    """Run independent blocking reads concurrently; return their results in order.
+
+    For sync handlers. The first call runs on the calling thread, the rest on
+    the fan-out pool, each in a copy of the caller's context (so per-request
+    state such as Firestore accounting follows them). Calls must not use
+    ``gather_db`` themselves. The first exception raised (in call order)
+    propagates.
+    """
+    if len(calls) <= 1:
+        return [call() for call in calls]
+    futures = [_fanout.submit(contextvars.copy_context().run, call) for call in calls[1:]]
+    first = calls[0]()
+    return [first, *(future.result() for future in futures)]
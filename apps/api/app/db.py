@@ -1,20 +1,33 @@
 """Firestore database client."""
 
+import os
 from functools import lru_cache
 
 from firebase_admin import firestore
 
 from .auth import _init_firebase_admin
+from .instrumented_db import InstrumentedClient
+from .memory_db import MemoryFirestore
 
 
 @lru_cache(maxsize=1)
 def get_db() -> firestore.client:
     """Get Firestore client (singleton).
 
-    Reuses Firebase Admin initialization from auth module.
+    Reuses Firebase Admin initialization from auth module. With
+    FIRESTORE_BACKEND=memory the client is an in-process MemoryFirestore
+    (see memory_db.py) that sleeps MEMORY_DB_LATENCY_MS per RPC, for local
+    load tests and benchmarks. The client counts per-request reads and writes
+    (see instrumented_db.py) unless FIRESTORE_INSTRUMENTATION=0.
     """
-    _init_firebase_admin()
-    return firestore.client()
+    if os.getenv("FIRESTORE_BACKEND", "firestore") == "memory":
+        client = MemoryFirestore(latency=float(os.getenv("MEMORY_DB_LATENCY_MS", "0")) / 1000)
+    else:
+        _init_firebase_admin()
+        client = firestore.client()
+    if os.getenv("FIRESTORE_INSTRUMENTATION", "1") == "0":
+        return client
+    return InstrumentedClient(client)
 
 
 # Collection names
@@ -37,3 +50,12 @@ ZONES = "zones"
 WEEKLY_REPORTS = "weekly_reports"
 REFERRALS = "referrals"
 MERCHANT_INVITES = "merchant_invites"
+DAILY_REDEMPTION_COUNTERS = "daily_redemption_counters"
+OFFER_REDEMPTION_TOTALS = "offer_redemption_totals"
+OUTBOX = "outbox"
+CONSUMER_MERCHANT_STATS = "consumer_merchant_stats"
+IDEMPOTENCY_KEYS = "idempotency_keys"
+SHORT_CODES = "short_codes"
+TOKEN_ACTIVITY = "token_activity"
+RETENTION_COHORTS = "retention_cohorts"
+MERCHANT_DAILY_STATS = "merchant_daily_stats"
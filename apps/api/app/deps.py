@@ -1,15 +1,17 @@
 from typing import Any, Dict
 
-from fastapi import Header, HTTPException
+from fastapi import Depends, Header, HTTPException
 
 from .auth import verify_bearer_token
 
 
-async def get_current_user(authorization: str | None = Header(default=None)) -> Dict[str, Any]:
+def get_current_user(authorization: str | None = Header(default=None)) -> Dict[str, Any]:
     """Get the current authenticated user from the Authorization header.
 
     Works for both merchant users (with custom claims) and consumer users
-    (who may not have custom claims set yet).
+    (who may not have custom claims set yet). A plain ``def``: verification
+    can fetch signing certificates, so FastAPI runs it on the worker pool
+    rather than the event loop (see dal.py).
     """
     try:
         decoded = verify_bearer_token(authorization)
@@ -24,12 +26,12 @@ async def get_current_user(authorization: str | None = Header(default=None)) ->
     return decoded
 
 
-async def get_current_consumer(authorization: str | None = Header(default=None)) -> Dict[str, Any]:
+async def get_current_consumer(user: Dict[str, Any] = Depends(get_current_user)) -> Dict[str, Any]:
     """Get the current authenticated consumer user.
 
-    Raises 403 if the user is not a consumer.
+    Raises 403 if the user is not a consumer. Declared as a dependency on
+    ``get_current_user`` so the token is verified once per request.
     """
-    user = await get_current_user(authorization)
     if user.get("role") != "consumer":
         raise HTTPException(status_code=403, detail="Consumer access required")
     return user
@@ -0,0 +1,115 @@
+"""Process-wide read-through cache for slow-changing documents.
+
+Offers, merchants and loyalty configs are read on almost every request but
+change rarely. ``DocCache`` keeps them in a bounded per-process TTL cache
+(missing documents included, so merchants without a loyalty program don't
+cost a read either). Endpoints that modify one of these documents call
+``put(..., written=True)`` with the written data (or ``invalidate`` when
+they do not have it)
+so this instance sees the change at once, in the live catalog too; other
+instances see it within ``DOC_CACHE_TTL``. While the live catalog (see
+catalog.py) is synced for a collection, lookups are answered from it
+instead.
+
+Anything that must be exact (cap counters, token status, balances) is not
+cached here.
+"""
+
+import os
+from typing import Iterable, Optional
+
+from .cache import TTLCache
+from .catalog import catalog
+from .db import LOYALTY_CONFIGS, MERCHANTS, OFFERS
+from .loader import GET_ALL_CHUNK
+
+DOC_CACHE_TTL = float(os.getenv("DOC_CACHE_TTL_SECONDS", "60"))
+
+# Cached value for "document does not exist" (TTLCache returns None for misses).
+_ABSENT = object()
+_MISS = object()
+
+
+class DocCache:
+    """Read-through cache of the documents of one collection.
+
+    Returned dicts are copies, so callers may modify them freely.
+    """
+
+    def __init__(self, collection: str, maxsize: int = 5_000, ttl: float = DOC_CACHE_TTL):
+        self.collection = collection
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl, name=collection)
+
+    def lookup(self, doc_id: str) -> tuple[bool, Optional[dict]]:
+        """(hit, data) without reading Firestore; data is None for absent docs."""
+        hit, data = catalog.lookup(self.collection, doc_id)
+        if hit:
+            return hit, data
+        value = self._cache.get(doc_id, _MISS)
+        if value is _MISS:
+            return False, None
+        return True, None if value is _ABSENT else dict(value)
+
+    def put(self, doc_id: str, data: Optional[dict], written: bool = False) -> None:
+        """Record a document read elsewhere (None if it does not exist).
+
+        With ``written`` the data is what this instance just wrote, and the
+        catalog copy is replaced too; a plain read may be older than the
+        catalog's and leaves it alone.
+        """
+        self._cache.set(doc_id, _ABSENT if data is None else dict(data))
+        if written:
+            catalog.apply_local(self.collection, doc_id, data)
+
+    def put_snapshot(self, snap) -> Optional[dict]:
+        """Record a snapshot read elsewhere; returns its data (None if absent)."""
+        data = (snap.to_dict() or {}) if snap is not None and snap.exists else None
+        self.put(snap.id, data)
+        return dict(data) if data is not None else None
+
+    def get(self, db, doc_id: str) -> Optional[dict]:
+        """The document's data (None if it does not exist), reading it on a miss."""
+        hit, data = self.lookup(doc_id)
+        if hit:
+            return data
+        snap = db.collection(self.collection).document(doc_id).get()
+        data = (snap.to_dict() or {}) if snap.exists else None
+        self.put(doc_id, data)
+        return data
+
+    def get_many(self, db, doc_ids: Iterable[str]) -> dict[str, dict]:
+        """Existing documents among *doc_ids*, keyed by ID. Misses cost one get_all."""
+        found: dict[str, dict] = {}
+        missing: list[str] = []
+        for doc_id in dict.fromkeys(doc_ids):
+            if not doc_id:
+                continue
+            hit, data = self.lookup(doc_id)
+            if not hit:
+                missing.append(doc_id)
+            elif data is not None:
+                found[doc_id] = data
+
+        col = db.collection(self.collection)
+        for i in range(0, len(missing), GET_ALL_CHUNK):
+            chunk = missing[i : i + GET_ALL_CHUNK]
+            seen = set()
+            for snap in db.get_all([col.document(doc_id) for doc_id in chunk]):
+                seen.add(snap.id)
+                data = self.put_snapshot(snap)
+                if data is not None:
+                    found[snap.id] = data
+            for doc_id in chunk:
+                if doc_id not in seen:
+                    self.put(doc_id, None)
+        return found
+
+    def invalidate(self, doc_id: str) -> None:
+        """Forget a document written elsewhere; the next lookup reads Firestore."""
+        self._cache.pop(doc_id)
+        catalog.evict(self.collection, doc_id)
+
+
+offer_cache = DocCache(OFFERS)
+merchant_cache = DocCache(MERCHANTS)
+loyalty_config_cache = DocCache(LOYALTY_CONFIGS)
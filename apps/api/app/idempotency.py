@@ -0,0 +1,71 @@
+"""Idempotency-Key support for retry-prone POST endpoints.
+
+A client sends ``Idempotency-Key: <unique value>`` with a request. The first
+response for a (scope, principal, key) triple is stored in the
+``idempotency_keys`` collection and in an in-process LRU; a retry with the
+same key gets the stored response back without re-running the endpoint: zero
+reads on an LRU hit, one point read otherwise.
+
+Stored records carry ``expire_at``; a Firestore TTL policy on that field
+removes them after ``IDEMPOTENCY_TTL``.
+"""
+
+import hashlib
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException, Request
+
+from .cache import TTLCache
+from .db import IDEMPOTENCY_KEYS
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_TTL = timedelta(hours=24)
+MAX_KEY_LENGTH = 255
+
+_responses = TTLCache(maxsize=10_000, ttl=IDEMPOTENCY_TTL.total_seconds(), name="idempotency")
+
+
+def get_idempotency_key(request: Request) -> Optional[str]:
+    """Return the request's Idempotency-Key header, or None. 400 if malformed."""
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if key is None:
+        return None
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Invalid {IDEMPOTENCY_HEADER} header")
+    return key
+
+
+def idempotency_id(scope: str, principal: str, key: str) -> str:
+    """Stable document ID for a key; also used to derive resource IDs."""
+    return hashlib.sha256(f"{scope}:{principal}:{key}".encode()).hexdigest()[:40]
+
+
+def find_response(db, scope: str, principal: str, key: str) -> Optional[dict]:
+    """The stored response for this key, or None if it has not been seen."""
+    doc_id = idempotency_id(scope, principal, key)
+    cached = _responses.get(doc_id)
+    if cached is not None:
+        return cached
+
+    snap = db.collection(IDEMPOTENCY_KEYS).document(doc_id).get()
+    if not snap.exists:
+        return None
+    response = (snap.to_dict() or {}).get("response")
+    if response is not None:
+        _responses.set(doc_id, response)
+    return response
+
+
+def store_response(db, scope: str, principal: str, key: str, response: dict, now: datetime) -> None:
+    """Record the response for this key (Firestore + LRU)."""
+    doc_id = idempotency_id(scope, principal, key)
+    db.collection(IDEMPOTENCY_KEYS).document(doc_id).set({
+        "scope": scope,
+        "principal": principal,
+        "response": response,
+        "created_at": now,
+        "expire_at": now + IDEMPOTENCY_TTL,
+    })
+    _responses.set(doc_id, response)
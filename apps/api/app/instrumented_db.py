@@ -0,0 +1,270 @@
+"""Per-request Firestore accounting.
+
+``InstrumentedClient`` wraps the Firestore client returned by ``get_db()``
+and counts, for the request being served, the documents read, the documents
+written, the queries run and the time spent waiting on Firestore. Every
+reference, query, batch and transaction handed out by the client is wrapped
+the same way; anything not intercepted is delegated unchanged, and wrapped
+objects are unwrapped before they reach the real client.
+
+Counts go to the ``RequestStats`` installed by ``start_request_stats`` (the
+metrics middleware does this per request). Outside a request (background
+workers, scripts) nothing is recorded. Reads follow Firestore billing:
+one per document returned, and one for a query that returns nothing.
+Transactional writes are counted when staged, so a retried transaction
+counts its writes once per attempt.
+"""
+
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+
+class RequestStats:
+    """Firestore totals for one request. Safe to update from several threads."""
+
+    __slots__ = ("reads", "writes", "queries", "seconds", "_lock")
+
+    def __init__(self):
+        self.reads = 0
+        self.writes = 0
+        self.queries = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, reads: int = 0, writes: int = 0, queries: int = 0, seconds: float = 0.0) -> None:
+        with self._lock:
+            self.reads += reads
+            self.writes += writes
+            self.queries += queries
+            self.seconds += seconds
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("firestore_request_stats", default=None)
+
+
+def start_request_stats() -> RequestStats:
+    """Install fresh stats for the current context (and threads it hands work to)."""
+    stats = RequestStats()
+    _current.set(stats)
+    return stats
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+def _record(started: float, reads: int = 0, writes: int = 0, queries: int = 0) -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.record(reads, writes, queries, time.perf_counter() - started)
+
+
+def _unwrap(obj):
+    return obj._target if isinstance(obj, _Proxy) else obj
+
+
+def _unwrap_kwargs(kwargs: dict) -> dict:
+    if "transaction" in kwargs:
+        kwargs["transaction"] = _unwrap(kwargs["transaction"])
+    return kwargs
+
+
+class _Proxy:
+    __slots__ = ("_target",)
+
+    def __init__(self, target):
+        object.__setattr__(self, "_target", target)
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._target, name, value)
+
+    def __eq__(self, other):
+        return self._target == _unwrap(other)
+
+    def __hash__(self):
+        return hash(self._target)
+
+    def __repr__(self):
+        return f"<instrumented {self._target!r}>"
+
+
+class _Snapshot(_Proxy):
+    """Snapshot whose ``reference`` is instrumented."""
+
+    __slots__ = ()
+
+    @property
+    def reference(self):
+        return _DocumentRef(self._target.reference)
+
+
+class _DocumentRef(_Proxy):
+    __slots__ = ()
+
+    def get(self, *args, **kwargs):
+        started = time.perf_counter()
+        snap = self._target.get(*args, **_unwrap_kwargs(kwargs))
+        _record(started, reads=1)
+        return _Snapshot(snap)
+
+    def _write(self, method: str, *args, **kwargs):
+        started = time.perf_counter()
+        result = getattr(self._target, method)(*args, **kwargs)
+        _record(started, writes=1)
+        return result
+
+    def set(self, *args, **kwargs):
+        return self._write("set", *args, **kwargs)
+
+    def create(self, *args, **kwargs):
+        return self._write("create", *args, **kwargs)
+
+    def update(self, *args, **kwargs):
+        return self._write("update", *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._write("delete", *args, **kwargs)
+
+    def collection(self, name: str):
+        return _Query(self._target.collection(name))
+
+
+class _Aggregation(_Proxy):
+    __slots__ = ()
+
+    def get(self, *args, **kwargs):
+        started = time.perf_counter()
+        result = self._target.get(*args, **_unwrap_kwargs(kwargs))
+        _record(started, reads=1, queries=1)
+        return result
+
+
+class _Query(_Proxy):
+    """Collection reference or query."""
+
+    __slots__ = ()
+
+    def _chain(method: str):
+        def _call(self, *args, **kwargs):
+            args = [_unwrap(a) for a in args]
+            return _Query(getattr(self._target, method)(*args, **kwargs))
+
+        _call.__name__ = method
+        return _call
+
+    where = _chain("where")
+    order_by = _chain("order_by")
+    limit = _chain("limit")
+    limit_to_last = _chain("limit_to_last")
+    offset = _chain("offset")
+    select = _chain("select")
+    start_at = _chain("start_at")
+    start_after = _chain("start_after")
+    end_at = _chain("end_at")
+    end_before = _chain("end_before")
+    del _chain
+
+    def document(self, *args, **kwargs):
+        return _DocumentRef(self._target.document(*args, **kwargs))
+
+    def count(self, *args, **kwargs):
+        return _Aggregation(self._target.count(*args, **kwargs))
+
+    def stream(self, *args, **kwargs):
+        started = time.perf_counter()
+        return _counted_stream(self._target.stream(*args, **_unwrap_kwargs(kwargs)), started)
+
+    def get(self, *args, **kwargs):
+        return list(self.stream(*args, **kwargs))
+
+    def add(self, *args, **kwargs):
+        started = time.perf_counter()
+        result = self._target.add(*args, **kwargs)
+        _record(started, writes=1)
+        return result
+
+
+class _WriteBatch(_Proxy):
+    """Batch (or the write side of a transaction); counts writes at commit."""
+
+    __slots__ = ()
+
+    def _stage(self, method: str, ref, *args, **kwargs):
+        return getattr(self._target, method)(_unwrap(ref), *args, **kwargs)
+
+    def set(self, ref, *args, **kwargs):
+        return self._stage("set", ref, *args, **kwargs)
+
+    def create(self, ref, *args, **kwargs):
+        return self._stage("create", ref, *args, **kwargs)
+
+    def update(self, ref, *args, **kwargs):
+        return self._stage("update", ref, *args, **kwargs)
+
+    def delete(self, ref, *args, **kwargs):
+        return self._stage("delete", ref, *args, **kwargs)
+
+    def commit(self, *args, **kwargs):
+        started = time.perf_counter()
+        result = self._target.commit(*args, **kwargs)
+        _record(started, writes=len(result or []))
+        return result
+
+
+class _Transaction(_WriteBatch):
+    """Transaction; writes are counted as they are staged (see module docstring)."""
+
+    __slots__ = ()
+
+    def _stage(self, method: str, ref, *args, **kwargs):
+        result = super()._stage(method, ref, *args, **kwargs)
+        _record(time.perf_counter(), writes=1)
+        return result
+
+    def commit(self, *args, **kwargs):
+        return self._target.commit(*args, **kwargs)
+
+    def get(self, ref_or_query, *args, **kwargs):
+        started = time.perf_counter()
+        snaps = self._target.get(_unwrap(ref_or_query), *args, **kwargs)
+        return _counted_stream(snaps, started, queries=0 if isinstance(ref_or_query, _DocumentRef) else 1)
+
+
+def _counted_stream(snaps, started: float, queries: int = 1):
+    reads = 0
+    try:
+        for snap in snaps:
+            reads += 1
+            yield _Snapshot(snap)
+    finally:
+        _record(started, reads=max(reads, 1), queries=queries)
+
+
+class InstrumentedClient(_Proxy):
+    """Firestore client wrapper that records per-request reads, writes and time."""
+
+    __slots__ = ()
+
+    def collection(self, *args, **kwargs):
+        return _Query(self._target.collection(*args, **kwargs))
+
+    def document(self, *args, **kwargs):
+        return _DocumentRef(self._target.document(*args, **kwargs))
+
+    def get_all(self, references, *args, **kwargs):
+        started = time.perf_counter()
+        refs = [_unwrap(ref) for ref in references]
+        snaps = [_Snapshot(snap) for snap in self._target.get_all(refs, *args, **_unwrap_kwargs(kwargs))]
+        _record(started, reads=len(refs))
+        return snaps
+
+    def batch(self, *args, **kwargs):
+        return _WriteBatch(self._target.batch(*args, **kwargs))
+
+    def transaction(self, *args, **kwargs):
+        return _Transaction(self._target.transaction(*args, **kwargs))
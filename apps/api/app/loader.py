@@ -0,0 +1,69 @@
+"""Request-scoped batching loader for document point reads.
+
+Handlers that need one related document per row (a consumer per visit, an
+offer per ledger entry, ...) create a ``DocLoader`` for the request, ``prime``
+every key they will need, and then ``get`` them: the primed keys resolve in
+one ``get_all`` per collection and chunk, and every key is fetched at most
+once per request. A loader is never shared between requests, so it can't
+serve stale data across them.
+"""
+
+from typing import Iterable, Optional
+
+# Documents per get_all request.
+GET_ALL_CHUNK = 300
+
+
+class DocLoader:
+    """Batches and memoises ``(collection, doc_id)`` reads for one request."""
+
+    def __init__(self, db, chunk_size: int = GET_ALL_CHUNK):
+        self._db = db
+        self._chunk_size = chunk_size
+        # Loaded documents; None means "does not exist".
+        self._docs: dict[tuple[str, str], Optional[dict]] = {}
+        self._pending: dict[str, dict[str, None]] = {}
+
+    def prime(self, collection: str, doc_ids: Iterable[str]) -> None:
+        """Queue documents to be fetched with the next batch."""
+        pending = self._pending.setdefault(collection, {})
+        for doc_id in doc_ids:
+            if doc_id and (collection, doc_id) not in self._docs:
+                pending[doc_id] = None
+
+    def load(self) -> None:
+        """Fetch every queued document: one get_all per collection and chunk."""
+        pending, self._pending = self._pending, {}
+        for collection, ids in pending.items():
+            ids = [doc_id for doc_id in ids if (collection, doc_id) not in self._docs]
+            col = self._db.collection(collection)
+            for i in range(0, len(ids), self._chunk_size):
+                chunk = ids[i : i + self._chunk_size]
+                for doc_id in chunk:
+                    self._docs[(collection, doc_id)] = None
+                for snap in self._db.get_all([col.document(doc_id) for doc_id in chunk]):
+                    if snap.exists:
+                        self._docs[(collection, snap.id)] = snap.to_dict() or {}
+
+    def get(self, collection: str, doc_id: str) -> Optional[dict]:
+        """The document's data, or None if it does not exist.
+
+        Resolves along with every other queued key if it is not loaded yet.
+        """
+        if not doc_id:
+            return None
+        if (collection, doc_id) not in self._docs:
+            self.prime(collection, [doc_id])
+            self.load()
+        return self._docs[(collection, doc_id)]
+
+    def get_many(self, collection: str, doc_ids: Iterable[str]) -> dict[str, dict]:
+        """Existing documents among *doc_ids*, keyed by ID."""
+        doc_ids = list(doc_ids)
+        self.prime(collection, doc_ids)
+        self.load()
+        return {
+            doc_id: self._docs[(collection, doc_id)]
+            for doc_id in doc_ids
+            if doc_id and self._docs.get((collection, doc_id)) is not None
+        }
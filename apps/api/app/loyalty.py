@@ -7,6 +7,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from .auth import require_merchant_admin, require_staff_or_above
 from .db import get_db, LOYALTY_CONFIGS, LOYALTY_PROGRESS, REWARDS
 from .deps import get_current_user
+from .doc_cache import loyalty_config_cache
 from .models import LoyaltyConfig, LoyaltyConfigCreate, RewardResponse, RewardStatus
 
 router = APIRouter(tags=["loyalty"])
@@ -18,7 +19,7 @@ router = APIRouter(tags=["loyalty"])
 
 
 @router.get("/merchants/{merchant_id}/loyalty", response_model=LoyaltyConfig)
-async def get_loyalty_config(merchant_id: str, user=Depends(get_current_user)):
+def get_loyalty_config(merchant_id: str, user=Depends(get_current_user)):
     """Get the loyalty stamp-card config for a merchant.
 
     Auth: merchant_admin or staff for this merchant (or owner).
@@ -40,7 +41,7 @@ async def get_loyalty_config(merchant_id: str, user=Depends(get_current_user)):
 
 
 @router.put("/merchants/{merchant_id}/loyalty", response_model=LoyaltyConfig)
-async def upsert_loyalty_config(
+def upsert_loyalty_config(
     merchant_id: str,
     body: LoyaltyConfigCreate,
     user=Depends(get_current_user),
@@ -64,6 +65,7 @@ async def upsert_loyalty_config(
         "birthday_reward": body.birthday_reward,
     }
     doc_ref.set(config_data, merge=True)
+    loyalty_config_cache.invalidate(merchant_id)
 
     return LoyaltyConfig(merchant_id=merchant_id, **config_data)
 
@@ -74,7 +76,7 @@ async def upsert_loyalty_config(
 
 
 @router.post("/rewards/{reward_id}/redeem", response_model=RewardResponse)
-async def redeem_reward(reward_id: str, user=Depends(get_current_user)):
+def redeem_reward(reward_id: str, user=Depends(get_current_user)):
     """Redeem an earned reward at the register.
 
     Auth: staff_or_above for the reward's merchant.
@@ -5,13 +5,14 @@ import io
 import logging
 import os
 import re
-import time
 import zipfile
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 import sentry_sdk
 from dotenv import load_dotenv
+from google.api_core.exceptions import AlreadyExists
 
 # --- Sentry Error Monitoring ---
 _sentry_dsn = os.getenv("SENTRY_DSN")
@@ -21,14 +22,13 @@ if _sentry_dsn:
         traces_sample_rate=0.1,
         profiles_sample_rate=0.1,
     )
-from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
-from starlette.middleware.base import BaseHTTPMiddleware
 
 from .auth import (
     require_owner,
@@ -38,21 +38,36 @@ from .auth import (
     clear_user_claims,
     get_user_by_email,
     can_delete_user,
+    start_key_refresher,
+    stop_key_refresher,
+    token_cache_stats,
 )
 from .ai_service import router as ai_router
 from .analytics import router as analytics_router
 from .consumer import router as consumer_router
 from .consumer import parse_personal_qr
 from .automations import router as automations_router
-from .automations import create_automated_message
+from .automations import REDEMPTION_COMPLETED
 from .customers import router as customers_router
 from .zones import router as zones_router
 from .loyalty import router as loyalty_router
 from .referrals import router as referrals_router
 from .reports import router as reports_router
 from .merchant_onboard import router as merchant_onboard_router
-from .db import get_db, MERCHANTS, OFFERS, TOKENS, REDEMPTIONS, LEDGER, USERS, PENDING_ROLES, CONSUMERS, CONSUMER_VISITS, CONSUMER_CLAIMS, LOYALTY_CONFIGS, LOYALTY_PROGRESS, REWARDS, AUTOMATED_MESSAGES, ZONES, WEEKLY_REPORTS, REFERRALS
+from .catalog import catalog, start_catalog, stop_catalog
+from .metrics import MetricsMiddleware, render as render_metrics
+from .dal import configure_thread_pool, gather_db
+from .db import get_db, MERCHANTS, OFFERS, TOKENS, REDEMPTIONS, LEDGER, USERS, PENDING_ROLES, CONSUMERS, CONSUMER_VISITS, CONSUMER_CLAIMS, LOYALTY_CONFIGS, LOYALTY_PROGRESS, REWARDS, AUTOMATED_MESSAGES, ZONES, WEEKLY_REPORTS, REFERRALS, OUTBOX
+from .counters import (
+    day_key,
+    day_start,
+    get_daily_redemption_count,
+    get_daily_redemption_counts,
+    increment_daily_redemptions,
+    rebuild_daily_redemption_counter,
+)
 from .deps import get_current_user
+from .doc_cache import loyalty_config_cache, merchant_cache, offer_cache
 from .models import (
     MerchantCreate,
     MerchantUpdate,
@@ -65,6 +80,10 @@ from .models import (
     TokenCreate,
     Token,
     TokenStatus,
+    RedeemBatchItem,
+    RedeemBatchItemResult,
+    RedeemBatchRequest,
+    RedeemBatchResponse,
     RedeemRequest,
     RedeemResponse,
     UserCreate,
@@ -75,11 +94,55 @@ from .models import (
     ClaimRoleResponse,
     UserResponse,
 )
-from .tokens import create_tokens, create_qr_data, get_token_by_id_or_code, mark_token_redeemed, generate_qr_image
+from .outbox import new_event as new_outbox_event
+from .outbox import notify_worker as notify_outbox_worker
+from .outbox import start_worker as start_outbox_worker
+from .outbox import stop_worker as stop_outbox_worker
+from .cohorts import record_cohort_visit
+from .daily_stats import redemption_fields, stage_daily_stats, visit_fields
+from .idempotency import find_response as find_idempotent_response
+from .idempotency import get_idempotency_key, idempotency_id
+from .idempotency import store_response as store_idempotent_response
+from .loader import DocLoader
+from .points import POINTS_PER_REDEMPTION, consumer_ref, stage_points
+from .redeem import CAP_REACHED_MESSAGE, RESERVATION_HEADROOM, commit_redemption, read_offer_with_daily_count
+from .token_activity import record_token_use
+from .tokens import create_tokens, create_qr_data, get_token_by_id_or_code, token_redeemed_fields, generate_qr_image
+from .uow import UnitOfWork
+from .visit_stats import record_visit, stats_from_snapshot
+from .visit_stats import stats_ref as visit_stats_ref
 
 load_dotenv()
 
-app = FastAPI(title="Boost API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Firestore calls run on the worker thread pool (see app/dal.py).
+    configure_thread_pool()
+    # Background drain of post-request side effects (see app/outbox.py).
+    # Disable with OUTBOX_WORKER=0 where CPU is throttled between requests
+    # and scripts/drain_outbox.py runs on Cloud Scheduler instead.
+    worker_enabled = os.getenv("OUTBOX_WORKER", "1") != "0"
+    if worker_enabled:
+        start_outbox_worker()
+    # Live offer / merchant / loyalty config catalog (see app/catalog.py).
+    catalog_enabled = os.getenv("CATALOG_LISTENER", "1") != "0"
+    if catalog_enabled:
+        await start_catalog()
+    # Keep ID token signing certificates fresh off the request path.
+    key_refresh_enabled = os.getenv("SIGNING_KEY_REFRESH", "1") != "0"
+    if key_refresh_enabled:
+        start_key_refresher()
+    yield
+    if key_refresh_enabled:
+        await stop_key_refresher()
+    if catalog_enabled:
+        await stop_catalog()
+    if worker_enabled:
+        await stop_outbox_worker()
+
+
+app = FastAPI(title="Boost API", lifespan=lifespan)
 
 # CORS: In production, CORS_ORIGINS must be set explicitly.
 # In dev (default), fall back to localhost.
@@ -120,24 +183,8 @@ logger.setLevel(logging.INFO)
 logger.addHandler(_json_log_handler)
 
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
-    """Log method, path, status_code, duration_ms for every request."""
-
-    async def dispatch(self, request: Request, call_next):
-        start = time.time()
-        response = await call_next(request)
-        duration_ms = round((time.time() - start) * 1000, 2)
-        logger.info(
-            '{"method":"%s","path":"%s","status_code":%d,"duration_ms":%.2f}',
-            request.method,
-            request.url.path,
-            response.status_code,
-            duration_ms,
-        )
-        return response
-
-
-app.add_middleware(RequestLoggingMiddleware)
+# Access log plus per-route latency / status metrics (see app/metrics.py).
+app.add_middleware(MetricsMiddleware)
 
 # --- AI Service Router ---
 app.include_router(ai_router, prefix="/api/v1")
@@ -178,22 +225,31 @@ def get_merchant_id_from_user(user: dict) -> Optional[str]:
 # --- Health ---
 
 @app.get("/health")
-async def health():
+def health():
     """Health check — verifies Firestore connectivity."""
     try:
         db = get_db()
         # Attempt to list a single collection to verify connectivity
         _cols = list(db.collections())  # noqa: F841
-        return {"ok": True}
+        return {"ok": True, "catalog": catalog.stats(), "id_tokens": token_cache_stats()}
     except Exception as e:
         logger.error("Health check failed: %s", str(e))
         return {"ok": False, "error": str(e)}
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics(authorization: Optional[str] = Header(default=None)):
+    """Prometheus metrics. Requires ``Bearer $METRICS_TOKEN`` when that is set."""
+    token = os.getenv("METRICS_TOKEN")
+    if token and authorization != f"Bearer {token}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 # --- Public Consumer Endpoints (no auth required) ---
 
 @app.get("/public/offers/{token_id_or_code}")
-async def get_public_offer_by_token(token_id_or_code: str):
+def get_public_offer_by_token(token_id_or_code: str):
     """Public endpoint: resolve a token/code to offer details for the consumer claim page.
     No auth required — this is what consumers see when they scan a QR code.
     """
@@ -215,27 +271,19 @@ async def get_public_offer_by_token(token_id_or_code: str):
 
     # Get offer details
     db = get_db()
-    offer_doc = db.collection(OFFERS).document(token_data["offer_id"]).get()
-    if not offer_doc.exists:
+    offer_data = offer_cache.get(db, token_data["offer_id"])
+    if offer_data is None:
         raise HTTPException(status_code=404, detail="Offer not found")
 
-    offer_data = offer_doc.to_dict()
-
     if offer_data["status"] != OfferStatus.active.value:
         raise HTTPException(status_code=410, detail="This offer is no longer active")
 
     # Get merchant name
-    merchant_doc = db.collection(MERCHANTS).document(offer_data["merchant_id"]).get()
-    merchant_name = merchant_doc.to_dict().get("name", "Local Business") if merchant_doc.exists else "Local Business"
+    merchant = merchant_cache.get(db, offer_data["merchant_id"])
+    merchant_name = merchant.get("name", "Local Business") if merchant is not None else "Local Business"
 
     # Check daily cap
-    today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    redemptions_query = (
-        db.collection(REDEMPTIONS)
-        .where("offer_id", "==", token_data["offer_id"])
-        .where("timestamp", ">=", today_start)
-    )
-    today_count = len(list(redemptions_query.stream()))
+    today_count = get_daily_redemption_count(db, token_data["offer_id"], datetime.now(timezone.utc))
     cap_remaining = max(0, offer_data["cap_daily"] - today_count)
 
     return {
@@ -254,7 +302,7 @@ async def get_public_offer_by_token(token_id_or_code: str):
 # --- Merchants ---
 
 @app.post("/merchants", response_model=Merchant)
-async def create_merchant(data: MerchantCreate, user=Depends(get_current_user)):
+def create_merchant(data: MerchantCreate, user=Depends(get_current_user)):
     """Create a new merchant (owner only)."""
     require_owner(user)
 
@@ -277,7 +325,7 @@ async def create_merchant(data: MerchantCreate, user=Depends(get_current_user)):
 
 
 @app.get("/merchants")
-async def list_merchants(
+def list_merchants(
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
     user=Depends(get_current_user),
@@ -310,7 +358,7 @@ async def list_merchants(
 
 
 @app.get("/merchants/{merchant_id}", response_model=Merchant)
-async def get_merchant(merchant_id: str, user=Depends(get_current_user)):
+def get_merchant(merchant_id: str, user=Depends(get_current_user)):
     """Get merchant by ID.
 
     Owner: can view any merchant.
@@ -319,16 +367,16 @@ async def get_merchant(merchant_id: str, user=Depends(get_current_user)):
     require_staff_or_above(user, merchant_id)
 
     db = get_db()
-    doc = db.collection(MERCHANTS).document(merchant_id).get()
+    data = merchant_cache.get(db, merchant_id)
 
-    if not doc.exists:
+    if data is None:
         raise HTTPException(status_code=404, detail="Merchant not found")
 
-    return Merchant(id=doc.id, **doc.to_dict())
+    return Merchant(id=merchant_id, **data)
 
 
 @app.patch("/merchants/{merchant_id}", response_model=Merchant)
-async def update_merchant(merchant_id: str, data: MerchantUpdate, user=Depends(get_current_user)):
+def update_merchant(merchant_id: str, data: MerchantUpdate, user=Depends(get_current_user)):
     """Update merchant.
 
     Owner: can update any merchant.
@@ -348,13 +396,15 @@ async def update_merchant(merchant_id: str, data: MerchantUpdate, user=Depends(g
         doc_ref.update(update_data)
 
     updated = doc_ref.get()
+    if update_data:
+        merchant_cache.put(merchant_id, updated.to_dict(), written=True)
     return Merchant(id=updated.id, **updated.to_dict())
 
 
 # --- Offers ---
 
 @app.post("/offers", response_model=Offer)
-async def create_offer(data: OfferCreate, user=Depends(get_current_user)):
+def create_offer(data: OfferCreate, user=Depends(get_current_user)):
     """Create a new offer.
 
     Owner: can create for any merchant.
@@ -389,6 +439,7 @@ async def create_offer(data: OfferCreate, user=Depends(get_current_user)):
         "updated_at": now,
     }
     doc_ref.set(offer_data)
+    offer_cache.put(doc_ref.id, offer_data, written=True)
 
     return Offer(
         id=doc_ref.id,
@@ -407,39 +458,8 @@ async def create_offer(data: OfferCreate, user=Depends(get_current_user)):
     )
 
 
-def _batch_daily_redemption_counts(db, offer_ids: list[str], today_start: datetime) -> dict[str, int]:
-    """Batch-fetch today's redemption counts for multiple offers.
-
-    Caches results per-call to avoid repeated full scans (#8: bo-poh).
-    Groups offers into batches of 30 (Firestore 'in' query limit).
-    """
-    counts: dict[str, int] = {}
-    if not offer_ids:
-        return counts
-
-    # Firestore 'in' queries support up to 30 values
-    batch_size = 30
-    for i in range(0, len(offer_ids), batch_size):
-        batch = offer_ids[i : i + batch_size]
-        redemptions_query = (
-            db.collection(REDEMPTIONS)
-            .where("offer_id", "in", batch)
-            .where("timestamp", ">=", today_start)
-        )
-        for rdoc in redemptions_query.stream():
-            oid = rdoc.to_dict().get("offer_id")
-            if oid:
-                counts[oid] = counts.get(oid, 0) + 1
-
-    # Ensure all requested offer_ids have an entry
-    for oid in offer_ids:
-        counts.setdefault(oid, 0)
-
-    return counts
-
-
 @app.get("/offers")
-async def list_offers(
+def list_offers(
     merchant_id: Optional[str] = Query(None),
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
@@ -451,32 +471,33 @@ async def list_offers(
     Merchant admin/staff: sees only their merchant's offers.
     """
     db = get_db()
-    query = db.collection(OFFERS)
 
     # Filter by merchant based on role
     role = user.get("role")
     user_merchant_id = get_merchant_id_from_user(user)
 
     if role == "owner":
-        if merchant_id:
-            query = query.where("merchant_id", "==", merchant_id)
+        filter_merchant_id = merchant_id
     elif user_merchant_id:
-        query = query.where("merchant_id", "==", user_merchant_id)
+        filter_merchant_id = user_merchant_id
     else:
         return {"offers": [], "limit": limit, "offset": offset}
 
-    query = query.offset(offset).limit(limit)
-    docs = list(query.stream())
+    if catalog.is_synced(OFFERS):
+        rows = catalog.offers(filter_merchant_id)[offset : offset + limit]
+    else:
+        query = db.collection(OFFERS)
+        if filter_merchant_id:
+            query = query.where("merchant_id", "==", filter_merchant_id)
+        query = query.offset(offset).limit(limit)
+        rows = [(doc.id, doc.to_dict()) for doc in query.stream()]
 
-    # Batch-fetch today's redemption counts (#8: bo-poh)
-    today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    offer_ids = [doc.id for doc in docs]
-    daily_counts = _batch_daily_redemption_counts(db, offer_ids, today_start)
+    # Read today's redemption counts from the sharded counters
+    offer_ids = [offer_id for offer_id, _ in rows]
+    daily_counts = get_daily_redemption_counts(db, offer_ids, datetime.now(timezone.utc))
 
     offers = []
-    for doc in docs:
-        data = doc.to_dict()
-        offer_id = doc.id
+    for offer_id, data in rows:
         today_count = daily_counts.get(offer_id, 0)
 
         offers.append(
@@ -501,34 +522,30 @@ async def list_offers(
 
 
 @app.get("/offers/{offer_id}", response_model=Offer)
-async def get_offer(offer_id: str, user=Depends(get_current_user)):
+def get_offer(offer_id: str, user=Depends(get_current_user)):
     """Get offer by ID.
 
     Owner: can view any offer.
     Merchant admin/staff: can only view their merchant's offers.
     """
     db = get_db()
-    doc = db.collection(OFFERS).document(offer_id).get()
+    data = offer_cache.get(db, offer_id)
 
-    if not doc.exists:
+    if data is None:
         raise HTTPException(status_code=404, detail="Offer not found")
 
-    data = doc.to_dict()
-
     # Check access using role hierarchy
     require_staff_or_above(user, data["merchant_id"])
 
-    # Count today's redemptions
-    today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    redemptions_query = (
-        db.collection(REDEMPTIONS)
-        .where("offer_id", "==", offer_id)
-        .where("timestamp", ">=", today_start)
-    )
-    today_count = len(list(redemptions_query.stream()))
+    return _offer_response(db, offer_id, data)
+
+
+def _offer_response(db, offer_id: str, data: dict) -> Offer:
+    """Offer model for *data*, with today's redemption count."""
+    today_count = get_daily_redemption_count(db, offer_id, datetime.now(timezone.utc))
 
     return Offer(
-        id=doc.id,
+        id=offer_id,
         merchant_id=data["merchant_id"],
         name=data["name"],
         discount_text=data["discount_text"],
@@ -545,7 +562,7 @@ async def get_offer(offer_id: str, user=Depends(get_current_user)):
 
 
 @app.patch("/offers/{offer_id}", response_model=Offer)
-async def update_offer(offer_id: str, data: OfferUpdate, user=Depends(get_current_user)):
+def update_offer(offer_id: str, data: OfferUpdate, user=Depends(get_current_user)):
     """Update offer (pause/resume/edit).
 
     Owner: can update any offer.
@@ -569,14 +586,16 @@ async def update_offer(offer_id: str, data: OfferUpdate, user=Depends(get_curren
 
     update_data["updated_at"] = datetime.now(timezone.utc)
 
-    if update_data:
-        doc_ref.update(update_data)
+    doc_ref.update(update_data)
 
-    return await get_offer(offer_id, user)
+    # Respond with the written document, not a cached copy from before it
+    updated = doc_ref.get().to_dict()
+    offer_cache.put(offer_id, updated, written=True)
+    return _offer_response(db, offer_id, updated)
 
 
 @app.delete("/offers/{offer_id}")
-async def delete_offer(offer_id: str, user=Depends(get_current_user)):
+def delete_offer(offer_id: str, user=Depends(get_current_user)):
     """Delete offer.
 
     Owner: can delete any offer.
@@ -593,13 +612,44 @@ async def delete_offer(offer_id: str, user=Depends(get_current_user)):
     require_merchant_admin(user, offer_data["merchant_id"])
 
     doc_ref.delete()
+    offer_cache.put(offer_id, None, written=True)
     return {"deleted": True, "id": offer_id}
 
 
+@app.post("/offers/{offer_id}/redemption-counter/reconcile")
+def reconcile_redemption_counter(
+    offer_id: str,
+    day: Optional[str] = Query(None, description="UTC day as YYYY-MM-DD (defaults to today)"),
+    user=Depends(get_current_user),
+):
+    """Rebuild an offer's daily redemption counter from raw redemptions.
+
+    Owner only. Use when the sharded counter has drifted from the redemptions
+    collection (e.g. after a manual data fix).
+    """
+    require_owner(user)
+
+    if day:
+        try:
+            when = datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="day must be formatted as YYYY-MM-DD")
+    else:
+        when = datetime.now(timezone.utc)
+
+    db = get_db()
+    offer_doc = db.collection(OFFERS).document(offer_id).get()
+    if not offer_doc.exists:
+        raise HTTPException(status_code=404, detail="Offer not found")
+
+    count = rebuild_daily_redemption_counter(db, offer_id, when)
+    return {"offer_id": offer_id, "day": when.strftime("%Y-%m-%d"), "count": count}
+
+
 # --- Tokens ---
 
 @app.post("/offers/{offer_id}/tokens")
-async def generate_tokens(offer_id: str, data: TokenCreate, user=Depends(get_current_user)):
+def generate_tokens(offer_id: str, data: TokenCreate, user=Depends(get_current_user)):
     """Generate redemption tokens for an offer.
 
     Owner: can generate for any offer.
@@ -625,7 +675,7 @@ async def generate_tokens(offer_id: str, data: TokenCreate, user=Depends(get_cur
 
 
 @app.get("/offers/{offer_id}/tokens")
-async def list_tokens(
+def list_tokens(
     offer_id: str,
     status: Optional[str] = Query(None),
     limit: int = Query(100, le=1000),
@@ -666,7 +716,7 @@ async def list_tokens(
 
 
 @app.get("/tokens/{token_id}/qr")
-async def get_token_qr(token_id: str, user=Depends(get_current_user)):
+def get_token_qr(token_id: str, user=Depends(get_current_user)):
     """Get QR code image for a token.
 
     Owner: can get QR for any token.
@@ -796,7 +846,7 @@ def _sanitize_filename(name: str) -> str:
 
 
 @app.get("/offers/{offer_id}/qr/download")
-async def download_offer_qr_pdf(offer_id: str, user=Depends(get_current_user)):
+def download_offer_qr_pdf(offer_id: str, user=Depends(get_current_user)):
     """Download a single offer's QR code as a styled PDF.
 
     Auth: require merchant_admin or above for the offer's merchant.
@@ -815,7 +865,7 @@ async def download_offer_qr_pdf(offer_id: str, user=Depends(get_current_user)):
 
 
 @app.get("/offers/{offer_id}/qr/png")
-async def download_offer_qr_png(offer_id: str, user=Depends(get_current_user)):
+def download_offer_qr_png(offer_id: str, user=Depends(get_current_user)):
     """Download the raw QR code PNG for an offer.
 
     Auth: require merchant_admin or above for the offer's merchant.
@@ -839,7 +889,7 @@ class BulkQrDownloadRequest(BaseModel):
 
 
 @app.post("/qr/bulk-download")
-async def bulk_download_qr(data: BulkQrDownloadRequest, user=Depends(get_current_user)):
+def bulk_download_qr(data: BulkQrDownloadRequest, user=Depends(get_current_user)):
     """Download multiple offers' QR codes as a ZIP file of styled PDFs.
 
     Auth: require merchant_admin, all offers must belong to user's merchant (or owner).
@@ -876,9 +926,32 @@ async def bulk_download_qr(data: BulkQrDownloadRequest, user=Depends(get_current
 
 # --- Redemptions ---
 
+def _token_rejection(token_data: dict, now: datetime) -> Optional[str]:
+    """Why a universal/single-use token cannot be redeemed at *now*, or None."""
+    # Universal tokens can be reused, so skip the "redeemed" check for them
+    is_universal = token_data.get("is_universal", False)
+    if not is_universal and token_data["status"] == TokenStatus.redeemed.value:
+        return "This code has already been redeemed"
+
+    if token_data["status"] == TokenStatus.expired.value:
+        return "This code has expired"
+
+    expires_at = token_data["expires_at"]
+    if isinstance(expires_at, datetime) and expires_at < now:
+        return "This code has expired"
+    return None
+
+
+def _offer_rejection(offer_data: dict) -> Optional[str]:
+    """Why an offer cannot be redeemed right now, or None."""
+    if offer_data["status"] != OfferStatus.active.value:
+        return "This offer is no longer active"
+    return None
+
+
 @app.post("/redeem", response_model=RedeemResponse)
 @limiter.limit("10/minute")
-async def redeem_token(request: Request, data: RedeemRequest, user=Depends(get_current_user)):
+def redeem_token(request: Request, data: RedeemRequest, user=Depends(get_current_user)):
     """Redeem a token (scan QR or enter code).
 
     Supports two flows:
@@ -889,348 +962,298 @@ async def redeem_token(request: Request, data: RedeemRequest, user=Depends(get_c
     Merchant admin/staff: can redeem tokens for their merchant.
     """
     db = get_db()
+    now = datetime.now(timezone.utc)
+
+    # A retried request with the same Idempotency-Key replays the first response
+    idempotency_key = get_idempotency_key(request)
+    redemption_id = None
+    if idempotency_key:
+        replay = find_idempotent_response(db, "redeem", user["uid"], idempotency_key)
+        if replay is not None:
+            return RedeemResponse(**replay)
+        # Pinning the redemption ID makes a concurrent duplicate fail at commit
+        redemption_id = "idem_" + idempotency_id("redeem", user["uid"], idempotency_key)
 
     # --------------- Detect personal QR vs universal token ---------------
     personal = parse_personal_qr(data.token)
-
-    if personal:
-        # --- Personal QR flow ---
-        consumer_uid = personal["consumer_uid"]
-        offer_id = personal["offer_id"]
-        claim_ts = personal["timestamp"]
-
-        # Get offer details
-        offer_doc = db.collection(OFFERS).document(offer_id).get()
-        if not offer_doc.exists:
-            raise HTTPException(status_code=404, detail="Offer not found")
-        offer_data = offer_doc.to_dict()
-
-        # Check staff access for this merchant
-        require_staff_or_above(user, offer_data["merchant_id"])
-
-        # Check offer is still active
-        if offer_data["status"] != OfferStatus.active.value:
-            return RedeemResponse(success=False, message="This offer is no longer active")
-
-        # Check the claim hasn't expired (end of day it was created)
-        claim_time = datetime.fromtimestamp(claim_ts, tz=timezone.utc)
-        claim_eod = claim_time.replace(hour=23, minute=59, second=59)
-        now = datetime.now(timezone.utc)
-        if now > claim_eod:
-            return RedeemResponse(success=False, message="This personal QR code has expired")
-
-        # Check daily cap
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        redemptions_query = (
-            db.collection(REDEMPTIONS)
-            .where("offer_id", "==", offer_id)
-            .where("timestamp", ">=", today_start)
+    try:
+        if personal:
+            response = _redeem_personal_qr(db, user, data, personal, now, redemption_id)
+        else:
+            response = _redeem_universal_token(db, user, data, now, redemption_id)
+    except AlreadyExists:
+        # The same key was committed by a request whose response never arrived
+        response = RedeemResponse(
+            success=True,
+            message="Redemption already recorded",
+            redemption_id=redemption_id,
         )
-        today_count = len(list(redemptions_query.stream()))
-        if today_count >= offer_data["cap_daily"]:
-            return RedeemResponse(success=False, message="Daily redemption limit reached for this offer")
 
-        # Check if this personal claim was already redeemed
-        existing_redemptions = list(
+    if idempotency_key:
+        store_idempotent_response(db, "redeem", user["uid"], idempotency_key, response.model_dump(), now)
+    return response
+
+
+def _redeem_personal_qr(
+    db, user: dict, data: RedeemRequest, personal: dict, now: datetime,
+    redemption_id: Optional[str] = None,
+) -> RedeemResponse:
+    """Personal QR flow: consumer identity, visit record, loyalty and points.
+
+    ``now`` is the scan time; ``redemption_id`` pins the redemption doc ID
+    (used by batch replays for idempotency).
+    """
+    consumer_uid = personal["consumer_uid"]
+    offer_id = personal["offer_id"]
+    claim_ts = personal["timestamp"]
+
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    # Offer plus today's count (one get_all) and the duplicate-redemption
+    # check only depend on the QR payload, so they are issued together.
+    (offer_data, today_count), existing_redemptions = gather_db(
+        lambda: read_offer_with_daily_count(db, offer_id, now),
+        lambda: list(
             db.collection(REDEMPTIONS)
             .where("consumer_id", "==", consumer_uid)
             .where("offer_id", "==", offer_id)
             .where("timestamp", ">=", today_start)
+            .where("timestamp", "<", today_start + timedelta(days=1))
             .limit(1)
             .stream()
-        )
-        if existing_redemptions:
-            return RedeemResponse(success=False, message="This offer has already been redeemed by this customer today")
+        ),
+    )
+    if offer_data is None:
+        raise HTTPException(status_code=404, detail="Offer not found")
 
-        # Get consumer profile
-        consumer_doc = db.collection(CONSUMERS).document(consumer_uid).get()
-        consumer_name = None
-        if consumer_doc.exists:
-            consumer_name = consumer_doc.to_dict().get("display_name")
+    # Check staff access for this merchant
+    require_staff_or_above(user, offer_data["merchant_id"])
 
-        value = offer_data.get("value_per_redemption", 2.0)
+    # Check offer is still active
+    rejection = _offer_rejection(offer_data)
+    if rejection:
+        return RedeemResponse(success=False, message=rejection)
 
-        # Create redemption record (with consumer_id)
-        redemption_ref = db.collection(REDEMPTIONS).document()
-        redemption_data = {
-            "token_id": None,  # personal QR, no universal token
-            "offer_id": offer_id,
-            "merchant_id": offer_data["merchant_id"],
-            "method": data.method.value,
-            "location": data.location,
-            "value": value,
-            "timestamp": now,
-            "consumer_id": consumer_uid,
-        }
-        redemption_ref.set(redemption_data)
+    # Check the claim hasn't expired (end of day it was created)
+    claim_time = datetime.fromtimestamp(claim_ts, tz=timezone.utc)
+    claim_eod = claim_time.replace(hour=23, minute=59, second=59)
+    if now > claim_eod:
+        return RedeemResponse(success=False, message="This personal QR code has expired")
 
-        # Create ledger entry
-        ledger_ref = db.collection(LEDGER).document()
-        ledger_ref.set({
-            "merchant_id": offer_data["merchant_id"],
-            "redemption_id": redemption_ref.id,
-            "offer_id": offer_id,
-            "amount": value,
-            "created_at": now,
-        })
+    # Check daily cap
+    if today_count >= offer_data["cap_daily"]:
+        return RedeemResponse(success=False, message=CAP_REACHED_MESSAGE)
+
+    # Check if this personal claim was already redeemed
+    if existing_redemptions:
+        return RedeemResponse(success=False, message="This offer has already been redeemed by this customer today")
+
+    # All writes below are collected in a unit of work and committed once,
+    # together with the daily counter increment.
+    merchant_id = offer_data["merchant_id"]
+    progress_id = f"{consumer_uid}_{merchant_id}"
+    uow = UnitOfWork(db)
+
+    # Consumer profile, loyalty config (unless cached) and loyalty progress
+    # in one round trip
+    config_cached, lconfig = loyalty_config_cache.lookup(merchant_id)
+    uow.load(
+        (CONSUMERS, consumer_uid),
+        *(() if config_cached else ((LOYALTY_CONFIGS, merchant_id),)),
+        (LOYALTY_PROGRESS, progress_id),
+    )
+    consumer = uow.get(CONSUMERS, consumer_uid)
+    consumer_name = consumer.get("display_name") if consumer else None
+    if not config_cached:
+        lconfig = uow.get(LOYALTY_CONFIGS, merchant_id)
+        loyalty_config_cache.put(merchant_id, lconfig)
 
-        # Count previous visits for this consumer at this merchant
-        prev_visits = list(
-            db.collection(CONSUMER_VISITS)
-            .where("consumer_id", "==", consumer_uid)
-            .where("merchant_id", "==", offer_data["merchant_id"])
-            .stream()
-        )
-        visit_number = len(prev_visits) + 1
+    value = offer_data.get("value_per_redemption", 2.0)
 
-        # Create consumer_visit record
-        stamp_earned = False
-        visit_ref = db.collection(CONSUMER_VISITS).document()
+    # Create redemption record (with consumer_id)
+    redemption_ref = uow.create(REDEMPTIONS, doc_id=redemption_id, data={
+        "token_id": None,  # personal QR, no universal token
+        "offer_id": offer_id,
+        "merchant_id": merchant_id,
+        "method": data.method.value,
+        "location": data.location,
+        "value": value,
+        "timestamp": now,
+        "consumer_id": consumer_uid,
+    })
 
-        # --- Loyalty stamp tracking ---
-        merchant_id = offer_data["merchant_id"]
-        loyalty_doc = db.collection(LOYALTY_CONFIGS).document(merchant_id).get()
-        reward_earned_msg = None
+    # Create ledger entry
+    uow.create(LEDGER, {
+        "merchant_id": merchant_id,
+        "redemption_id": redemption_ref.id,
+        "offer_id": offer_id,
+        "amount": value,
+        "created_at": now,
+    })
 
-        if loyalty_doc.exists:
-            lconfig = loyalty_doc.to_dict()
-            stamps_to_add = 1
+    # --- Loyalty stamp tracking ---
+    stamp_earned = False
+    reward_earned_msg = None
 
-            # Double stamp day? (0=Monday .. 6=Sunday)
-            current_weekday = now.weekday()  # Python: 0=Monday
-            if current_weekday in lconfig.get("double_stamp_days", []):
-                stamps_to_add = 2
+    if lconfig is not None:
+        stamps_to_add = 1
 
-            # Look up or create loyalty_progress
-            progress_id = f"{consumer_uid}_{merchant_id}"
-            progress_ref = db.collection(LOYALTY_PROGRESS).document(progress_id)
-            progress_doc = progress_ref.get()
+        # Double stamp day? (0=Monday .. 6=Sunday)
+        current_weekday = now.weekday()  # Python: 0=Monday
+        if current_weekday in lconfig.get("double_stamp_days", []):
+            stamps_to_add = 2
 
-            if progress_doc.exists:
-                progress = progress_doc.to_dict()
-            else:
-                progress = {
-                    "consumer_id": consumer_uid,
-                    "merchant_id": merchant_id,
-                    "current_stamps": 0,
-                    "total_stamps": 0,
-                    "rewards_earned": 0,
-                    "rewards_redeemed": 0,
-                    "last_visit": None,
-                }
-
-            progress["current_stamps"] += stamps_to_add
-            progress["total_stamps"] += stamps_to_add
-            progress["last_visit"] = now
-            stamp_earned = True
-
-            # Check if reward threshold reached
-            stamps_required = lconfig.get("stamps_required", 10)
-            if progress["current_stamps"] >= stamps_required:
-                # Create a reward
-                from datetime import timedelta as _td
-
-                reward_ref = db.collection(REWARDS).document()
-                reward_ref.set({
-                    "consumer_id": consumer_uid,
-                    "merchant_id": merchant_id,
-                    "description": lconfig.get("reward_description", "Free reward"),
-                    "value": lconfig.get("reward_value", 0),
-                    "status": "earned",
-                    "earned_at": now,
-                    "redeemed_at": None,
-                    "expires_at": now + _td(days=30),
-                })
-
-                progress["rewards_earned"] = progress.get("rewards_earned", 0) + 1
-
-                # Reset stamps if configured
-                if lconfig.get("reset_on_reward", True):
-                    progress["current_stamps"] = progress["current_stamps"] - stamps_required
-                    # Handle case where double stamps could exceed threshold by more
-                    if progress["current_stamps"] < 0:
-                        progress["current_stamps"] = 0
-
-                reward_earned_msg = lconfig.get("reward_description", "Free reward")
-
-            # Persist loyalty progress
-            progress_ref.set(progress)
-
-        visit_ref.set({
+        # Look up or create loyalty_progress
+        progress = uow.get(LOYALTY_PROGRESS, progress_id) or {
             "consumer_id": consumer_uid,
-            "merchant_id": offer_data["merchant_id"],
+            "merchant_id": merchant_id,
+            "current_stamps": 0,
+            "total_stamps": 0,
+            "rewards_earned": 0,
+            "rewards_redeemed": 0,
+            "last_visit": None,
+        }
+
+        progress["current_stamps"] += stamps_to_add
+        progress["total_stamps"] += stamps_to_add
+        progress["last_visit"] = now
+        stamp_earned = True
+
+        # Check if reward threshold reached
+        stamps_required = lconfig.get("stamps_required", 10)
+        if progress["current_stamps"] >= stamps_required:
+            # Create a reward
+            uow.create(REWARDS, {
+                "consumer_id": consumer_uid,
+                "merchant_id": merchant_id,
+                "description": lconfig.get("reward_description", "Free reward"),
+                "value": lconfig.get("reward_value", 0),
+                "status": "earned",
+                "earned_at": now,
+                "redeemed_at": None,
+                "expires_at": now + timedelta(days=30),
+            })
+
+            progress["rewards_earned"] = progress.get("rewards_earned", 0) + 1
+
+            # Reset stamps if configured
+            if lconfig.get("reset_on_reward", True):
+                progress["current_stamps"] = progress["current_stamps"] - stamps_required
+                # Handle case where double stamps could exceed threshold by more
+                if progress["current_stamps"] < 0:
+                    progress["current_stamps"] = 0
+
+            reward_earned_msg = lconfig.get("reward_description", "Free reward")
+
+        # Persist loyalty progress
+        uow.set(LOYALTY_PROGRESS, progress_id, progress)
+
+    final_progress = uow.get(LOYALTY_PROGRESS, progress_id) if lconfig is not None else None
+    final_stamps = (final_progress or {}).get("current_stamps", 0)
+
+    # The visit number and the retention cohort update come from the
+    # consumer x merchant stats doc, and global points from the consumer doc,
+    # both read inside the redemption transaction so concurrent scans of the
+    # same customer cannot share a number or convert the same points twice.
+    # The visit record and the outbox event carry the visit number, so they
+    # are staged alongside.
+    visit_stats_doc = visit_stats_ref(db, consumer_uid, merchant_id)
+    consumer_doc = consumer_ref(db, consumer_uid)
+    visit_ref = db.collection(CONSUMER_VISITS).document()
+    event_ref = db.collection(OUTBOX).document()
+    visit_number = None
+
+    def _stage(writer, snaps):
+        nonlocal visit_number
+        visit_stats = stats_from_snapshot(snaps[0])
+        visit_number = record_visit(writer, visit_stats_doc, visit_stats, consumer_uid, merchant_id, now)
+        record_cohort_visit(db, writer, visit_stats, merchant_id, now)
+        stage_daily_stats(
+            db, writer, merchant_id, now,
+            redemption_fields({offer_id: 1}, value),
+            visit_fields(visit_stats, now, rewards_issued=1 if reward_earned_msg else 0),
+        )
+        stage_points(db, writer, snaps[1], POINTS_PER_REDEMPTION, now)
+        writer.set(visit_ref, {
+            "consumer_id": consumer_uid,
+            "merchant_id": merchant_id,
             "offer_id": offer_id,
             "redemption_id": redemption_ref.id,
             "zone_id": None,
             "visit_number": visit_number,
-            "points_earned": 50,
+            "points_earned": POINTS_PER_REDEMPTION,
             "stamp_earned": stamp_earned,
             "referred_by": None,
             "timestamp": now,
         })
+        # Claim marking, attribution and automations run out of band
+        writer.set(event_ref, new_outbox_event(REDEMPTION_COMPLETED, {
+            "redemption_id": redemption_ref.id,
+            "merchant_id": merchant_id,
+            "consumer_id": consumer_uid,
+            "offer_id": offer_id,
+            "redeemed_at": now,
+            "claimed_since": today_start,
+            "visit_number": visit_number,
+            "consumer_name": consumer_name,
+            "consumer_phone": consumer.get("phone") if consumer else None,
+            "current_stamps": final_stamps,
+            "reward_description": reward_earned_msg,
+        }, now))
+        uow.apply(writer)
+
+    # Reserve the daily cap and commit every write above at once
+    rejection = commit_redemption(
+        db,
+        offer_id=offer_id,
+        cap_daily=offer_data["cap_daily"],
+        today_count=today_count,
+        now=now,
+        stage=_stage,
+        guard_refs=[visit_stats_doc, consumer_doc],
+    )
+    if rejection:
+        return RedeemResponse(success=False, message=rejection)
 
-        # --- Global points tracking ---
-        from google.cloud.firestore_v1 import Increment as _Increment
-
-        db.collection(CONSUMERS).document(consumer_uid).update({
-            "global_points": _Increment(50),
-        })
+    notify_outbox_worker()
 
-        # Read updated points and check for universal reward threshold
-        updated_consumer = db.collection(CONSUMERS).document(consumer_uid).get()
-        if updated_consumer.exists:
-            current_points = updated_consumer.to_dict().get("global_points", 0)
-            while current_points >= 500:
-                # Create a universal reward
-                universal_reward_ref = db.collection(REWARDS).document()
-                universal_reward_ref.set({
-                    "consumer_id": consumer_uid,
-                    "merchant_id": None,
-                    "description": "$5 credit at any Boost merchant",
-                    "status": "earned",
-                    "reward_value": 5.0,
-                    "is_universal": True,
-                    "earned_at": now,
-                    "expires_at": now + timedelta(days=30),
-                    "redeemed_at": None,
-                })
-                # Deduct 500 points
-                db.collection(CONSUMERS).document(consumer_uid).update({
-                    "global_points": _Increment(-500),
-                })
-                current_points -= 500
-
-        # Mark claim as redeemed
-        claim_docs = list(
-            db.collection(CONSUMER_CLAIMS)
-            .where("consumer_uid", "==", consumer_uid)
-            .where("offer_id", "==", offer_id)
-            .where("claimed_at", ">=", today_start)
-            .limit(1)
-            .stream()
-        )
-        if claim_docs:
-            claim_docs[0].reference.update({"redeemed": True})
+    # Build loyalty fields for the response
+    resp_stamp_progress = None
+    resp_reward_earned = None
+    resp_reward_description = None
 
-        # --- Attribution: mark recent automated messages as resulted_in_visit ---
-        seven_days_ago = now - timedelta(days=7)
-        try:
-            recent_auto_msgs = list(
-                db.collection(AUTOMATED_MESSAGES)
-                .where("merchant_id", "==", merchant_id)
-                .where("consumer_id", "==", consumer_uid)
-                .where("resulted_in_visit", "==", False)
-                .where("sent_at", ">=", seven_days_ago)
-                .stream()
-            )
-            for msg_doc in recent_auto_msgs:
-                msg_doc.reference.update({"resulted_in_visit": True})
-        except Exception as e:
-            logger.warning("Attribution tracking failed: %s", e)
+    if lconfig is not None:
+        stamps_required = lconfig.get("stamps_required", 10)
+        resp_stamp_progress = f"{final_stamps}/{stamps_required}"
+        resp_reward_earned = reward_earned_msg is not None
+        resp_reward_description = reward_earned_msg
 
-        # --- Automation triggers: first_visit & reward_earned ---
-        try:
-            # Get consumer phone for SMS
-            _consumer_phone = None
-            if consumer_doc.exists:
-                _consumer_phone = consumer_doc.to_dict().get("phone")
-
-            # Get merchant name for templates
-            _merchant_doc = db.collection(MERCHANTS).document(merchant_id).get()
-            _merchant_name = _merchant_doc.to_dict().get("name", "Local Business") if _merchant_doc.exists else "Local Business"
-
-            # Load automation rules
-            _automations_raw = []
-            if loyalty_doc.exists:
-                _automations_raw = loyalty_doc.to_dict().get("automations", [])
-
-            _auto_rules = {r["trigger"]: r for r in _automations_raw if r.get("enabled")}
-
-            # Get loyalty info for template placeholders
-            _lconfig = loyalty_doc.to_dict() if loyalty_doc.exists else {}
-            _stamps_required = _lconfig.get("stamps_required", 10)
-            _reward_desc = _lconfig.get("reward_description", "a reward")
-            _final_progress_doc = db.collection(LOYALTY_PROGRESS).document(f"{consumer_uid}_{merchant_id}").get()
-            _current_stamps = _final_progress_doc.to_dict().get("current_stamps", 0) if _final_progress_doc.exists else 0
-
-            _template_vars = {
-                "merchant_name": _merchant_name,
-                "customer_name": consumer_name or "there",
-                "reward_description": _reward_desc,
-                "current_stamps": _current_stamps,
-                "stamps_required": _stamps_required,
-                "stamps_remaining": max(0, _stamps_required - _current_stamps),
-            }
-
-            # First visit trigger
-            if visit_number == 1 and "first_visit" in _auto_rules:
-                _tpl = _auto_rules["first_visit"].get("message_template", "")
-                try:
-                    _msg = _tpl.format(**_template_vars)
-                except (KeyError, IndexError):
-                    _msg = _tpl
-                create_automated_message(
-                    db=db,
-                    merchant_id=merchant_id,
-                    consumer_id=consumer_uid,
-                    trigger="first_visit",
-                    message_body=_msg,
-                    consumer_phone=_consumer_phone,
-                )
+    return RedeemResponse(
+        success=True,
+        message="Redemption successful!",
+        offer_name=offer_data["name"],
+        discount_text=offer_data["discount_text"],
+        redemption_id=redemption_ref.id,
+        consumer_name=consumer_name,
+        visit_number=visit_number,
+        stamp_progress=resp_stamp_progress,
+        reward_earned=resp_reward_earned,
+        reward_description=resp_reward_description,
+    )
 
-            # Reward earned trigger
-            if reward_earned_msg is not None and "reward_earned" in _auto_rules:
-                _tpl = _auto_rules["reward_earned"].get("message_template", "")
-                try:
-                    _msg = _tpl.format(**_template_vars)
-                except (KeyError, IndexError):
-                    _msg = _tpl
-                create_automated_message(
-                    db=db,
-                    merchant_id=merchant_id,
-                    consumer_id=consumer_uid,
-                    trigger="reward_earned",
-                    message_body=_msg,
-                    consumer_phone=_consumer_phone,
-                )
-        except Exception as e:
-            logger.warning("Automation trigger failed: %s", e)
-
-        # Build loyalty fields for the response
-        resp_stamp_progress = None
-        resp_reward_earned = None
-        resp_reward_description = None
-
-        if loyalty_doc.exists:
-            lconfig = loyalty_doc.to_dict()
-            stamps_required = lconfig.get("stamps_required", 10)
-            # Re-read the persisted progress to get the final current_stamps
-            final_progress = db.collection(LOYALTY_PROGRESS).document(f"{consumer_uid}_{merchant_id}").get()
-            if final_progress.exists:
-                final_stamps = final_progress.to_dict().get("current_stamps", 0)
-            else:
-                final_stamps = 0
-            resp_stamp_progress = f"{final_stamps}/{stamps_required}"
-            resp_reward_earned = reward_earned_msg is not None
-            resp_reward_description = reward_earned_msg
 
-        return RedeemResponse(
-            success=True,
-            message="Redemption successful!",
-            offer_name=offer_data["name"],
-            discount_text=offer_data["discount_text"],
-            redemption_id=redemption_ref.id,
-            consumer_name=consumer_name,
-            visit_number=visit_number,
-            stamp_progress=resp_stamp_progress,
-            reward_earned=resp_reward_earned,
-            reward_description=resp_reward_description,
-        )
 
-    # --------------- Universal token flow (existing) ---------------
+def _redeem_universal_token(
+    db, user: dict, data: RedeemRequest, now: datetime,
+    redemption_id: Optional[str] = None, token: Optional[tuple] = None, replay: bool = False,
+) -> RedeemResponse:
+    """Universal token flow (UUID / short code).
 
+    ``token`` is an already-resolved (token_id, token_data) pair, if any;
+    ``replay`` marks a scan recorded offline at the past time *now*.
+    """
     # Look up token
-    result = get_token_by_id_or_code(data.token)
+    result = token or get_token_by_id_or_code(data.token)
     if not result:
         raise HTTPException(status_code=404, detail="Token not found")
 
@@ -1239,90 +1262,77 @@ async def redeem_token(request: Request, data: RedeemRequest, user=Depends(get_c
     # Check if this is a universal (reusable) token
     is_universal = token_data.get("is_universal", False)
 
-    # Check token status - universal tokens can be reused, so skip "redeemed" check
-    if not is_universal and token_data["status"] == TokenStatus.redeemed.value:
-        return RedeemResponse(
-            success=False,
-            message="This code has already been redeemed",
-        )
-
-    if token_data["status"] == TokenStatus.expired.value:
-        return RedeemResponse(
-            success=False,
-            message="This code has expired",
-        )
-
-    # Check expiry
-    expires_at = token_data["expires_at"]
-    if isinstance(expires_at, datetime):
-        if expires_at < datetime.now(timezone.utc):
-            return RedeemResponse(
-                success=False,
-                message="This code has expired",
-            )
+    # Check token status and expiry
+    rejection = _token_rejection(token_data, now)
+    if rejection:
+        return RedeemResponse(success=False, message=rejection)
 
-    # Get offer details
-    offer_doc = db.collection(OFFERS).document(token_data["offer_id"]).get()
-    if not offer_doc.exists:
+    # Get offer details and today's redemption count in one round trip
+    offer_id = token_data["offer_id"]
+    offer_data, today_count = read_offer_with_daily_count(db, offer_id, now)
+    if offer_data is None:
         raise HTTPException(status_code=404, detail="Offer not found")
 
-    offer_data = offer_doc.to_dict()
-
     # Check user has permission to redeem for this merchant
     require_staff_or_above(user, offer_data["merchant_id"])
 
     # Check offer status
-    if offer_data["status"] != OfferStatus.active.value:
-        return RedeemResponse(
-            success=False,
-            message="This offer is no longer active",
-        )
-
-    # Check daily cap
-    today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    redemptions_query = (
-        db.collection(REDEMPTIONS)
-        .where("offer_id", "==", token_data["offer_id"])
-        .where("timestamp", ">=", today_start)
-    )
-    today_count = len(list(redemptions_query.stream()))
-
-    if today_count >= offer_data["cap_daily"]:
-        return RedeemResponse(
-            success=False,
-            message="Daily redemption limit reached for this offer",
-        )
+    rejection = _offer_rejection(offer_data)
+    if rejection:
+        return RedeemResponse(success=False, message=rejection)
 
-    # All checks passed - process redemption
-    now = datetime.now(timezone.utc)
     value = offer_data.get("value_per_redemption", 2.0)
-
-    # Mark token as redeemed
-    mark_token_redeemed(token_id, data.location)
-
-    # Create redemption record
-    redemption_ref = db.collection(REDEMPTIONS).document()
-    redemption_data = {
-        "token_id": token_id,
-        "offer_id": token_data["offer_id"],
-        "merchant_id": offer_data["merchant_id"],
-        "method": data.method.value,
-        "location": data.location,
-        "value": value,
-        "timestamp": now,
-    }
-    redemption_ref.set(redemption_data)
-
-    # Create ledger entry
+    token_ref = db.collection(TOKENS).document(token_id)
+    redemption_ref = db.collection(REDEMPTIONS).document(redemption_id)
     ledger_ref = db.collection(LEDGER).document()
-    ledger_data = {
-        "merchant_id": offer_data["merchant_id"],
-        "redemption_id": redemption_ref.id,
-        "offer_id": token_data["offer_id"],
-        "amount": value,
-        "created_at": now,
-    }
-    ledger_ref.set(ledger_data)
+
+    def _stage(writer, _snaps):
+        if is_universal:
+            # Shared by every redemption of the offer: keep writes off the token doc
+            record_token_use(db, writer, token_id, data.location, now, replay=replay)
+        else:
+            writer.update(token_ref, token_redeemed_fields(token_data, data.location, now))
+        writer.create(redemption_ref, {
+            "token_id": token_id,
+            "offer_id": offer_id,
+            "merchant_id": offer_data["merchant_id"],
+            "method": data.method.value,
+            "location": data.location,
+            "value": value,
+            "timestamp": now,
+        })
+        writer.set(ledger_ref, {
+            "merchant_id": offer_data["merchant_id"],
+            "redemption_id": redemption_ref.id,
+            "offer_id": offer_id,
+            "amount": value,
+            "created_at": now,
+        })
+        stage_daily_stats(db, writer, offer_data["merchant_id"], now, redemption_fields({offer_id: 1}, value))
+
+    def _guard_single_use(snaps):
+        # Single-use tokens are re-read inside the transaction so two
+        # concurrent scans cannot both redeem the same code.
+        token_snap = snaps[0]
+        if token_snap is None or not token_snap.exists:
+            return "This code is no longer valid"
+        if token_snap.to_dict().get("status") == TokenStatus.redeemed.value:
+            return "This code has already been redeemed"
+        return None
+
+    # Reserve the daily cap and write token, redemption and ledger in one commit
+    rejection = commit_redemption(
+        db,
+        offer_id=offer_id,
+        cap_daily=offer_data["cap_daily"],
+        today_count=today_count,
+        now=now,
+        stage=_stage,
+        guard_refs=[] if is_universal else [token_ref],
+        guard=None if is_universal else _guard_single_use,
+    )
+    if rejection:
+        return RedeemResponse(success=False, message=rejection)
 
     return RedeemResponse(
         success=True,
@@ -1333,10 +1343,236 @@ async def redeem_token(request: Request, data: RedeemRequest, user=Depends(get_c
     )
 
 
+# --- Batch redemption (offline POS replay) ---
+
+# Replays older than this are rejected instead of back-dating redemptions.
+MAX_REPLAY_AGE = timedelta(days=7)
+# Tolerated device clock drift into the future.
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+# Items per WriteBatch: 2 writes each, plus token and counter updates.
+_BATCH_CHUNK_ITEMS = 150
+
+
+def _batch_redemption_id(uid: str, idempotency_key: str) -> str:
+    """Deterministic redemption doc ID for a scan replayed by this user."""
+    return "pos_" + idempotency_id("redeem_batch", uid, idempotency_key)
+
+
+def _batch_result(item: RedeemBatchItem, response: RedeemResponse) -> RedeemBatchItemResult:
+    return RedeemBatchItemResult(idempotency_key=item.idempotency_key, **response.model_dump())
+
+
+@app.post("/redeem/batch", response_model=RedeemBatchResponse)
+@limiter.limit("20/minute")
+def redeem_batch(request: Request, data: RedeemBatchRequest, user=Depends(get_current_user)):
+    """Replay scans recorded while a staff device was offline.
+
+    Each item carries the device's ``idempotency_key`` and ``client_timestamp``;
+    the redemption is recorded at the scan time, and replaying a key that was
+    already recorded returns success without writing again. Universal tokens
+    are grouped by offer and day: one counter read per group, then chunked
+    batch writes. Personal QR codes, single-use tokens and groups close to
+    their daily cap go through the same per-scan path as /redeem.
+    Returns one result per item, in request order.
+    """
+    db = get_db()
+    now = datetime.now(timezone.utc)
+
+    # First occurrence of each key wins; repeats get its result.
+    items: dict[str, RedeemBatchItem] = {}
+    for item in data.items:
+        items.setdefault(item.idempotency_key, item)
+
+    results: dict[str, RedeemResponse] = {}
+
+    # Scans recorded by an earlier (partially) successful replay from this user
+    redemption_ids = {key: _batch_redemption_id(user["uid"], key) for key in items}
+    recorded: set[str] = set()
+    id_list = list(redemption_ids.values())
+    for i in range(0, len(id_list), 300):
+        refs = [db.collection(REDEMPTIONS).document(rid) for rid in id_list[i : i + 300]]
+        recorded.update(snap.id for snap in db.get_all(refs) if snap.exists)
+
+    # --- Classify: grouped fast path vs per-scan path ---
+    fast_groups: dict[tuple[str, str], list] = {}
+    per_scan: list = []
+    resolved_tokens: dict[str, Optional[tuple]] = {}
+
+    def _scan_time(item: RedeemBatchItem) -> datetime:
+        ts = item.client_timestamp
+        return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
+
+    for key, item in sorted(items.items(), key=lambda kv: _scan_time(kv[1])):
+        at = _scan_time(item)
+        if redemption_ids[key] in recorded:
+            results[key] = RedeemResponse(
+                success=True, message="Already recorded", redemption_id=redemption_ids[key],
+            )
+            continue
+        if at > now + MAX_CLOCK_SKEW:
+            results[key] = RedeemResponse(success=False, message="Scan time is in the future")
+            continue
+        if at < now - MAX_REPLAY_AGE:
+            results[key] = RedeemResponse(success=False, message="Scan is too old to replay")
+            continue
+
+        personal = parse_personal_qr(item.token)
+        if personal:
+            per_scan.append((key, item, at, personal, None))
+            continue
+
+        if item.token not in resolved_tokens:
+            resolved_tokens[item.token] = get_token_by_id_or_code(item.token)
+        token = resolved_tokens[item.token]
+        if not token:
+            results[key] = RedeemResponse(success=False, message="Token not found")
+            continue
+
+        token_id, token_data = token
+        if not token_data.get("is_universal", False):
+            per_scan.append((key, item, at, None, token))
+            continue
+
+        rejection = _token_rejection(token_data, at)
+        if rejection:
+            results[key] = RedeemResponse(success=False, message=rejection)
+            continue
+
+        group = (token_data["offer_id"], day_key(at))
+        fast_groups.setdefault(group, []).append((key, item, at, token))
+
+    # --- Offers and counters: one read per offer, one counter read per offer/day ---
+    offers = offer_cache.get_many(db, {offer_id for offer_id, _ in fast_groups})
+
+    days: dict[str, list[str]] = {}
+    for offer_id, day in fast_groups:
+        days.setdefault(day, []).append(offer_id)
+    counts: dict[tuple[str, str], int] = {}
+    for day, day_offer_ids in days.items():
+        day_dt = datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        for offer_id, count in get_daily_redemption_counts(db, day_offer_ids, day_dt).items():
+            counts[(offer_id, day)] = count
+
+    accepted: list = []
+    for group, group_items in fast_groups.items():
+        offer_id, _day = group
+        offer_data = offers.get(offer_id)
+        if offer_data is None:
+            for key, *_ in group_items:
+                results[key] = RedeemResponse(success=False, message="Offer not found")
+            continue
+        try:
+            require_staff_or_above(user, offer_data["merchant_id"])
+        except HTTPException as e:
+            for key, *_ in group_items:
+                results[key] = RedeemResponse(success=False, message=e.detail)
+            continue
+        rejection = _offer_rejection(offer_data)
+        if rejection:
+            for key, *_ in group_items:
+                results[key] = RedeemResponse(success=False, message=rejection)
+            continue
+
+        remaining = offer_data["cap_daily"] - counts[group]
+        if remaining - len(group_items) <= RESERVATION_HEADROOM:
+            # Near the cap: reserve scan by scan, transactionally
+            per_scan.extend((key, item, at, None, token) for key, item, at, token in group_items)
+            continue
+        accepted.extend((key, item, at, token, offer_data) for key, item, at, token in group_items)
+
+    # --- Chunked commits for the grouped fast path ---
+    for i in range(0, len(accepted), _BATCH_CHUNK_ITEMS):
+        chunk = accepted[i : i + _BATCH_CHUNK_ITEMS]
+        batch = db.batch()
+        token_updates: dict[str, tuple] = {}
+        counter_increments: dict[tuple[str, datetime], int] = {}
+        daily_increments: dict[tuple[str, datetime], tuple[dict[str, int], float]] = {}
+
+        for key, item, at, (token_id, token_data), offer_data in chunk:
+            value = offer_data.get("value_per_redemption", 2.0)
+            redemption_ref = db.collection(REDEMPTIONS).document(redemption_ids[key])
+            batch.create(redemption_ref, {
+                "token_id": token_id,
+                "offer_id": token_data["offer_id"],
+                "merchant_id": offer_data["merchant_id"],
+                "method": item.method.value,
+                "location": item.location,
+                "value": value,
+                "timestamp": at,
+            })
+            batch.set(db.collection(LEDGER).document(), {
+                "merchant_id": offer_data["merchant_id"],
+                "redemption_id": redemption_ref.id,
+                "offer_id": token_data["offer_id"],
+                "amount": value,
+                "created_at": at,
+            })
+            latest = token_updates.get(token_id)
+            if latest is None or at > latest[1]:
+                token_updates[token_id] = (item.location, at)
+            day = day_start(at)
+            counter_increments[(token_data["offer_id"], day)] = counter_increments.get((token_data["offer_id"], day), 0) + 1
+            offer_counts, amount = daily_increments.get((offer_data["merchant_id"], day), ({}, 0.0))
+            offer_counts[token_data["offer_id"]] = offer_counts.get(token_data["offer_id"], 0) + 1
+            daily_increments[(offer_data["merchant_id"], day)] = (offer_counts, amount + value)
+
+        for token_id, (location, at) in token_updates.items():
+            record_token_use(db, batch, token_id, location, at, replay=True)
+        for (offer_id, day), amount in counter_increments.items():
+            increment_daily_redemptions(db, batch, offer_id, day, amount)
+        for (merchant_id, day), (offer_counts, amount) in daily_increments.items():
+            stage_daily_stats(db, batch, merchant_id, day, redemption_fields(offer_counts, amount))
+
+        try:
+            batch.commit()
+        except Exception as e:
+            logger.error("Batch redemption chunk failed: %s", e)
+            for key, *_ in chunk:
+                results[key] = RedeemResponse(success=False, message="Could not record this scan, please retry")
+            continue
+
+        for key, item, at, _token, offer_data in chunk:
+            results[key] = RedeemResponse(
+                success=True,
+                message="Redemption successful!",
+                offer_name=offer_data["name"],
+                discount_text=offer_data["discount_text"],
+                redemption_id=redemption_ids[key],
+            )
+
+    # --- Per-scan path: same code as /redeem, at the scan time ---
+    for key, item, at, personal, token in per_scan:
+        try:
+            if personal:
+                results[key] = _redeem_personal_qr(db, user, item, personal, at, redemption_ids[key])
+            else:
+                results[key] = _redeem_universal_token(
+                    db, user, item, at, redemption_ids[key], token, replay=True,
+                )
+        except HTTPException as e:
+            results[key] = RedeemResponse(success=False, message=e.detail)
+        except AlreadyExists:
+            # Recorded by a concurrent replay of the same key
+            results[key] = RedeemResponse(
+                success=True, message="Already recorded", redemption_id=redemption_ids[key],
+            )
+        except Exception as e:
+            logger.error("Batch redemption scan failed: %s", e)
+            results[key] = RedeemResponse(success=False, message="Could not record this scan, please retry")
+
+    response_items = [_batch_result(item, results[item.idempotency_key]) for item in data.items]
+    succeeded = sum(1 for r in response_items if r.success)
+    return RedeemBatchResponse(
+        results=response_items,
+        succeeded=succeeded,
+        failed=len(response_items) - succeeded,
+    )
+
+
 # --- Redemptions List ---
 
 @app.get("/redemptions")
-async def list_redemptions(
+def list_redemptions(
     merchant_id: Optional[str] = Query(None),
     offer_id: Optional[str] = Query(None),
     limit: int = Query(50, ge=1, le=200),
@@ -1384,7 +1620,7 @@ async def list_redemptions(
 # --- Ledger (placeholder - will be expanded in Step 6) ---
 
 @app.get("/ledger")
-async def get_ledger(
+def get_ledger(
     merchant_id: Optional[str] = Query(None),
     user=Depends(get_current_user),
 ):
@@ -1427,7 +1663,7 @@ async def get_ledger(
 
 
 @app.get("/ledger/export")
-async def export_ledger_csv(
+def export_ledger_csv(
     merchant_id: str = Query(...),
     user=Depends(get_current_user),
 ):
@@ -1451,34 +1687,32 @@ async def export_ledger_csv(
     query = db.collection(LEDGER).where("merchant_id", "==", target_merchant_id)
     ledger_docs = list(query.stream())
 
-    # Build lookup for offer names and redemption locations
+    # Offer names and redemption locations: batched get_all calls instead
+    # of two point reads per ledger row
+    ledger_rows = [ldoc.to_dict() for ldoc in ledger_docs]
+    loader = DocLoader(db)
+    loader.prime(OFFERS, (ld.get("offer_id") for ld in ledger_rows))
+    loader.prime(REDEMPTIONS, (ld.get("redemption_id") for ld in ledger_rows))
+    loader.load()
+
     offer_names: dict[str, str] = {}
     redemption_locations: dict[str, str] = {}
-
-    for ldoc in ledger_docs:
-        ld = ldoc.to_dict()
+    for ld in ledger_rows:
         oid = ld.get("offer_id")
         rid = ld.get("redemption_id")
         if oid and oid not in offer_names:
-            offer_doc = db.collection(OFFERS).document(oid).get()
-            if offer_doc.exists:
-                offer_names[oid] = offer_doc.to_dict().get("name", "Unknown")
-            else:
-                offer_names[oid] = "Deleted Offer"
+            offer = loader.get(OFFERS, oid)
+            offer_names[oid] = offer.get("name", "Unknown") if offer is not None else "Deleted Offer"
         if rid and rid not in redemption_locations:
-            r_doc = db.collection(REDEMPTIONS).document(rid).get()
-            if r_doc.exists:
-                redemption_locations[rid] = r_doc.to_dict().get("location", "")
-            else:
-                redemption_locations[rid] = ""
+            redemption = loader.get(REDEMPTIONS, rid)
+            redemption_locations[rid] = redemption.get("location", "") if redemption is not None else ""
 
     # Write CSV
     output = io.StringIO()
     writer = csv.writer(output)
     writer.writerow(["date", "offer_name", "redemption_id", "amount", "location"])
 
-    for ldoc in ledger_docs:
-        ld = ldoc.to_dict()
+    for ld in ledger_rows:
         created_at = ld.get("created_at", "")
         if isinstance(created_at, datetime):
             created_at = created_at.strftime("%Y-%m-%d %H:%M:%S")
@@ -1502,7 +1736,7 @@ async def export_ledger_csv(
 
 
 @app.post("/admin/users", response_model=UserResponse)
-async def create_user(data: UserCreate, user=Depends(get_current_user)):
+def create_user(data: UserCreate, user=Depends(get_current_user)):
     """Create or invite a user with a role.
 
     Owner only. If user exists in Firebase, claims are set immediately.
@@ -1580,7 +1814,7 @@ async def create_user(data: UserCreate, user=Depends(get_current_user)):
 
 
 @app.post("/auth/claim-role", response_model=ClaimRoleResponse)
-async def claim_role(user=Depends(get_current_user)):
+def claim_role(user=Depends(get_current_user)):
     """Claim a pending role for the authenticated user.
 
     Checks for pending roles matching the user's email and applies them.
@@ -1654,7 +1888,7 @@ async def claim_role(user=Depends(get_current_user)):
 
 
 @app.get("/admin/users")
-async def list_users(
+def list_users(
     merchant_id: Optional[str] = Query(None),
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
@@ -1702,7 +1936,7 @@ async def list_users(
 
 
 @app.delete("/admin/users/{uid}")
-async def delete_user(uid: str, user=Depends(get_current_user)):
+def delete_user(uid: str, user=Depends(get_current_user)):
     """Delete (soft delete) a user.
 
     Owner: can delete any user except primary owner.
@@ -1738,7 +1972,7 @@ async def delete_user(uid: str, user=Depends(get_current_user)):
 
 
 @app.patch("/merchants/{merchant_id}/restore", response_model=Merchant)
-async def restore_merchant(merchant_id: str, user=Depends(get_current_user)):
+def restore_merchant(merchant_id: str, user=Depends(get_current_user)):
     """Restore a soft-deleted merchant.
 
     Owner only. Note: Does not restore orphaned users - they must be re-invited.
@@ -1763,11 +1997,12 @@ async def restore_merchant(merchant_id: str, user=Depends(get_current_user)):
     })
 
     updated = doc_ref.get()
+    merchant_cache.put(merchant_id, updated.to_dict(), written=True)
     return Merchant(id=updated.id, **updated.to_dict())
 
 
 @app.delete("/merchants/{merchant_id}")
-async def delete_merchant(merchant_id: str, user=Depends(get_current_user)):
+def delete_merchant(merchant_id: str, user=Depends(get_current_user)):
     """Soft delete a merchant.
 
     Owner only. Orphans all users associated with the merchant.
@@ -1789,11 +2024,13 @@ async def delete_merchant(merchant_id: str, user=Depends(get_current_user)):
         raise HTTPException(status_code=400, detail="Merchant is already deleted")
 
     # Soft delete the merchant
-    doc_ref.update({
+    deleted_fields = {
         "status": MerchantStatus.deleted.value,
         "deleted_at": now,
         "deleted_by": user_uid,
-    })
+    }
+    doc_ref.update(deleted_fields)
+    merchant_cache.put(merchant_id, {**merchant_data, **deleted_fields}, written=True)
 
     # Orphan all users associated with this merchant
     orphaned_count = 0
@@ -1814,10 +2051,12 @@ async def delete_merchant(merchant_id: str, user=Depends(get_current_user)):
     paused_offers = 0
     offers_query = db.collection(OFFERS).where("merchant_id", "==", merchant_id).where("status", "==", OfferStatus.active.value)
     for offer_doc in offers_query.stream():
-        offer_doc.reference.update({
+        paused_fields = {
             "status": OfferStatus.paused.value,
             "updated_at": now,
-        })
+        }
+        offer_doc.reference.update(paused_fields)
+        offer_cache.put(offer_doc.id, {**offer_doc.to_dict(), **paused_fields}, written=True)
         paused_offers += 1
 
     # Expire all active tokens for this merchant's offers
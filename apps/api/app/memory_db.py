@@ -0,0 +1,515 @@
+"""In-memory Firestore for local load tests and benchmarks.
+
+``MemoryFirestore`` implements the part of the Firestore client this API
+uses, with Firestore's semantics rather than a mock's: ``where`` (==, !=,
+<, <=, >, >=, in, not-in, array-contains), ``order_by``, ``limit``,
+``offset`` and ``start_after`` filter and sort for real; ``set(merge=True)``,
+dotted-path ``update`` and ``Increment`` / ``ArrayUnion`` / ``DELETE_FIELD``
+are applied; batches commit atomically; ``create`` raises ``AlreadyExists``
+and ``update`` of a missing document ``NotFound``; transactions work with
+``@transactional`` and abort (and so retry) when a document they read was
+written concurrently; ``on_snapshot`` feeds the live catalog.
+
+Every RPC (document get, ``get_all``, query, commit, transaction begin)
+sleeps ``latency`` seconds first, so a laptop run pays realistic round-trip
+costs. Select it with ``FIRESTORE_BACKEND=memory`` and
+``MEMORY_DB_LATENCY_MS`` (see db.get_db). Data lives in the process only.
+
+Totals of documents read (one per document returned, one for an empty
+query), written, queries run and RPCs issued are kept on the client for
+benchmarks and read-budget tests.
+"""
+
+import copy
+import itertools
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional
+
+from google.api_core.exceptions import Aborted, AlreadyExists, NotFound
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.watch import ChangeType
+
+_OPS: dict[str, Callable[[Any, Any], bool]] = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "in": lambda a, b: a in b,
+    "not-in": lambda a, b: a not in b,
+    "array_contains": lambda a, b: isinstance(a, list) and b in a,
+    "array_contains_any": lambda a, b: isinstance(a, list) and any(v in a for v in b),
+}
+_MISSING = object()
+
+# (op, ref, data, merge) staged by a batch or transaction.
+Write = tuple[str, "MemoryDocumentRef", Optional[dict], bool]
+
+
+def _get_path(data: dict, path: str):
+    value: Any = data
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _resolve(value, current):
+    """Apply a transform sentinel against the field's current value."""
+    if isinstance(value, transforms.Increment):
+        return (current if isinstance(current, (int, float)) else 0) + value.value
+    if isinstance(value, transforms.ArrayUnion):
+        base = list(current) if isinstance(current, list) else []
+        return base + [v for v in value.values if v not in base]
+    if isinstance(value, transforms.ArrayRemove):
+        return [v for v in current if v not in value.values] if isinstance(current, list) else []
+    if value is transforms.SERVER_TIMESTAMP:
+        return datetime.now(timezone.utc)
+    if isinstance(value, dict):
+        base = current if isinstance(current, dict) else {}
+        return {
+            k: _resolve(v, base.get(k, _MISSING)) for k, v in value.items() if v is not transforms.DELETE_FIELD
+        }
+    return copy.deepcopy(value)
+
+
+def _set_path(data: dict, path: str, value) -> None:
+    parts = path.split(".")
+    for part in parts[:-1]:
+        if not isinstance(data.get(part), dict):
+            data[part] = {}
+        data = data[part]
+    if value is transforms.DELETE_FIELD:
+        data.pop(parts[-1], None)
+    else:
+        data[parts[-1]] = _resolve(value, data.get(parts[-1], _MISSING))
+
+
+def _project(data: dict, fields) -> dict:
+    projected: dict = {}
+    for path in fields:
+        value = _get_path(data, path)
+        if value is not _MISSING:
+            _set_path(projected, path, value)
+    return projected
+
+
+def _merge(target: dict, updates: dict) -> None:
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        elif value is transforms.DELETE_FIELD:
+            target.pop(key, None)
+        else:
+            target[key] = _resolve(value, target.get(key, _MISSING))
+
+
+class MemorySnapshot:
+    def __init__(self, reference: "MemoryDocumentRef", data: Optional[dict]):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self) -> Optional[dict]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field: str):
+        value = _get_path(self._data or {}, field)
+        return None if value is _MISSING else copy.deepcopy(value)
+
+
+class MemoryDocumentRef:
+    def __init__(self, db: "MemoryFirestore", collection: str, doc_id: str):
+        self._db = db
+        self._collection = collection
+        self.id = doc_id
+        self.path = f"{collection}/{doc_id}"
+
+    @property
+    def _key(self) -> tuple[str, str]:
+        return (self._collection, self.id)
+
+    def __eq__(self, other):
+        return isinstance(other, MemoryDocumentRef) and other._key == self._key
+
+    def __hash__(self):
+        return hash(self._key)
+
+    def get(self, transaction=None, **kwargs) -> MemorySnapshot:
+        return self._db.get_all([self], transaction=transaction)[0]
+
+    def set(self, data: dict, merge: bool = False):
+        return self._db._commit([("set", self, data, merge)])[0]
+
+    def create(self, data: dict):
+        return self._db._commit([("create", self, data, False)])[0]
+
+    def update(self, data: dict):
+        return self._db._commit([("update", self, data, False)])[0]
+
+    def delete(self):
+        return self._db._commit([("delete", self, None, False)])[0]
+
+    def collection(self, name: str) -> "MemoryQuery":
+        return MemoryQuery(self._db, f"{self.path}/{name}")
+
+
+class MemoryWatch:
+    """Handle returned by ``on_snapshot``."""
+
+    def __init__(self, db: "MemoryFirestore", query: "MemoryQuery", callback):
+        self._db = db
+        self._query = query
+        self._callback = callback
+        self.is_active = True
+
+    def unsubscribe(self) -> None:
+        self.is_active = False
+        with self._db._lock:
+            if self in self._db._watches:
+                self._db._watches.remove(self)
+
+
+class MemoryQuery:
+    """Collection reference or query. Immutable: each call returns a new query."""
+
+    def __init__(self, db: "MemoryFirestore", collection: str, filters=(), orders=(), limit=None, offset=0,
+                 start_after=None, fields=None):
+        self._db = db
+        self._collection = collection
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit
+        self._offset = offset
+        self._start_after = start_after
+        self._fields = fields
+
+    def _with(self, **changes) -> "MemoryQuery":
+        state = dict(filters=self._filters, orders=self._orders, limit=self._limit, offset=self._offset,
+                     start_after=self._start_after, fields=self._fields)
+        state.update(changes)
+        return MemoryQuery(self._db, self._collection, **state)
+
+    @property
+    def id(self) -> str:
+        return self._collection.rsplit("/", 1)[-1]
+
+    def document(self, doc_id: Optional[str] = None) -> MemoryDocumentRef:
+        return MemoryDocumentRef(self._db, self._collection, doc_id or uuid.uuid4().hex[:20])
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None) -> "MemoryQuery":
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        if op_string not in _OPS:
+            raise ValueError(f"Unsupported operator {op_string!r}")
+        return self._with(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> "MemoryQuery":
+        return self._with(orders=self._orders + ((field_path, direction == "DESCENDING"),))
+
+    def limit(self, count: int) -> "MemoryQuery":
+        return self._with(limit=count)
+
+    def offset(self, count: int) -> "MemoryQuery":
+        return self._with(offset=count)
+
+    def start_after(self, snapshot) -> "MemoryQuery":
+        return self._with(start_after=snapshot.id)
+
+    def select(self, field_paths) -> "MemoryQuery":
+        """Project results down to *field_paths* (reads are still one per document)."""
+        return self._with(fields=tuple(field_paths))
+
+    def add(self, data: dict):
+        ref = self.document()
+        return ref.set(data), ref
+
+    def _matches(self, data: dict) -> bool:
+        for field, op, value in self._filters:
+            current = _get_path(data, field)
+            if current is _MISSING:
+                return False
+            try:
+                if not _OPS[op](current, value):
+                    return False
+            except TypeError:
+                # Firestore never matches across types
+                return False
+        # Documents missing an order_by field are left out, as in Firestore.
+        return all(_get_path(data, field) is not _MISSING for field, _ in self._orders)
+
+    def _results(self) -> list[MemorySnapshot]:
+        """Matching documents, sorted and paged. Caller holds the lock."""
+        rows = [
+            (doc_id, data) for (col, doc_id), data in self._db._docs.items()
+            if col == self._collection and self._matches(data)
+        ]
+        rows.sort(key=lambda row: row[0])
+        for field, descending in reversed(self._orders):
+            rows.sort(key=lambda row: _get_path(row[1], field), reverse=descending)
+        if self._start_after is not None:
+            ids = [doc_id for doc_id, _ in rows]
+            if self._start_after in ids:
+                rows = rows[ids.index(self._start_after) + 1:]
+        rows = rows[self._offset:]
+        if self._limit is not None:
+            rows = rows[: self._limit]
+        if self._fields is not None:
+            rows = [(doc_id, _project(data, self._fields)) for doc_id, data in rows]
+        return [MemorySnapshot(self.document(doc_id), copy.deepcopy(data)) for doc_id, data in rows]
+
+    def stream(self, transaction=None, **kwargs):
+        return iter(self.get(transaction=transaction))
+
+    def get(self, transaction=None, **kwargs) -> list[MemorySnapshot]:
+        self._db._rpc()
+        with self._db._lock:
+            snaps = self._results()
+            if transaction is not None:
+                transaction._record_reads(snaps)
+        self._db._count(reads=max(len(snaps), 1), queries=1)
+        return snaps
+
+    def on_snapshot(self, callback) -> MemoryWatch:
+        """Call ``callback(docs, changes, read_time)`` now and after every commit that changes the results."""
+        watch = MemoryWatch(self._db, self, callback)
+        with self._db._lock:
+            snaps = self._results()
+            self._db._watches.append(watch)
+            watch._last = {snap.id: snap for snap in snaps}
+        callback(snaps, [_Change(ChangeType.ADDED, snap) for snap in snaps], datetime.now(timezone.utc))
+        return watch
+
+
+class _Change:
+    def __init__(self, change_type: ChangeType, document: MemorySnapshot):
+        self.type = change_type
+        self.document = document
+
+
+class MemoryWriteBatch:
+    def __init__(self, db: "MemoryFirestore"):
+        self._db = db
+        self._writes: list[Write] = []
+
+    def set(self, ref, data, merge=False):
+        self._writes.append(("set", ref, data, merge))
+
+    def create(self, ref, data):
+        self._writes.append(("create", ref, data, False))
+
+    def update(self, ref, data):
+        self._writes.append(("update", ref, data, False))
+
+    def delete(self, ref):
+        self._writes.append(("delete", ref, None, False))
+
+    def commit(self):
+        writes, self._writes = self._writes, []
+        return self._db._commit(writes)
+
+
+class MemoryTransaction(MemoryWriteBatch):
+    """Optimistic transaction: commit aborts if a document it read has been written since."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, db: "MemoryFirestore", max_attempts: int = 5, read_only: bool = False):
+        super().__init__(db)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+        self._read_versions: dict[tuple[str, str], int] = {}
+
+    @property
+    def in_progress(self) -> bool:
+        return self._id is not None
+
+    def _record_reads(self, snaps) -> None:
+        """Remember the version each snapshot was read at. Caller holds the db lock taken for the read."""
+        for snap in snaps:
+            key = snap.reference._key
+            self._read_versions.setdefault(key, self._db._versions.get(key, 0))
+
+    # The hooks google.cloud.firestore_v1.transactional drives.
+
+    def _clean_up(self):
+        self._writes = []
+        self._read_versions = {}
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._db._rpc()
+        self._id = next(self._ids)
+
+    def _commit(self):
+        writes, self._writes = self._writes, []
+        try:
+            return self._db._commit(writes, read_versions=self._read_versions)
+        finally:
+            self._clean_up()
+
+    def _rollback(self):
+        self._clean_up()
+
+    def commit(self):
+        return self._commit()
+
+    def get(self, ref_or_query):
+        if isinstance(ref_or_query, MemoryDocumentRef):
+            return iter(self._db.get_all([ref_or_query], transaction=self))
+        return ref_or_query.stream(transaction=self)
+
+
+class MemoryFirestore:
+    """In-memory Firestore client with real query semantics, RPC latency and counters."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self._docs: dict[tuple[str, str], dict] = {}
+        self._versions: dict[tuple[str, str], int] = {}
+        self._watches: list[MemoryWatch] = []
+        self._lock = threading.RLock()
+        self.reads = 0
+        self.writes = 0
+        self.queries = 0
+        self.rpcs = 0
+
+    # --- Seeding and inspection (no latency, not counted) ---
+
+    def seed(self, collection: str, docs: dict[str, dict]) -> None:
+        """Insert or replace documents directly."""
+        with self._lock:
+            for doc_id, data in docs.items():
+                key = (collection, doc_id)
+                self._docs[key] = copy.deepcopy(data)
+                self._versions[key] = self._versions.get(key, 0) + 1
+        self._notify({collection})
+
+    def data(self, collection: str, doc_id: str) -> Optional[dict]:
+        with self._lock:
+            data = self._docs.get((collection, doc_id))
+            return copy.deepcopy(data) if data is not None else None
+
+    def documents(self, collection: str) -> dict[str, dict]:
+        with self._lock:
+            return {doc_id: copy.deepcopy(data) for (col, doc_id), data in self._docs.items() if col == collection}
+
+    def reset_counts(self) -> None:
+        with self._lock:
+            self.reads = self.writes = self.queries = self.rpcs = 0
+
+    def _count(self, reads: int = 0, writes: int = 0, queries: int = 0) -> None:
+        with self._lock:
+            self.reads += reads
+            self.writes += writes
+            self.queries += queries
+
+    def _rpc(self) -> None:
+        with self._lock:
+            self.rpcs += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    # --- Client API ---
+
+    def collection(self, name: str) -> MemoryQuery:
+        return MemoryQuery(self, name)
+
+    def collections(self) -> list[MemoryQuery]:
+        self._rpc()
+        with self._lock:
+            names = sorted({col for col, _ in self._docs if "/" not in col})
+        return [MemoryQuery(self, name) for name in names]
+
+    def document(self, path: str) -> MemoryDocumentRef:
+        collection, doc_id = path.rsplit("/", 1)
+        return MemoryDocumentRef(self, collection, doc_id)
+
+    def get_all(self, references, field_paths=None, transaction=None) -> list[MemorySnapshot]:
+        refs = list(references)
+        self._rpc()
+        with self._lock:
+            snaps = [MemorySnapshot(ref, copy.deepcopy(self._docs.get(ref._key))) for ref in refs]
+            if transaction is not None:
+                transaction._record_reads(snaps)
+        self._count(reads=len(refs))
+        return snaps
+
+    def batch(self) -> MemoryWriteBatch:
+        return MemoryWriteBatch(self)
+
+    def transaction(self, max_attempts: int = 5, read_only: bool = False) -> MemoryTransaction:
+        return MemoryTransaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    def _commit(self, writes: list[Write], read_versions: Optional[dict] = None) -> list:
+        """Apply *writes* atomically, or raise without applying any."""
+        self._rpc()
+        with self._lock:
+            for key, version in (read_versions or {}).items():
+                if self._versions.get(key, 0) != version:
+                    raise Aborted("Transaction lock timeout or conflict; retry")
+            pending = {key for key in self._docs}
+            for op, ref, _data, _flag in writes:
+                if op == "create" and ref._key in pending:
+                    raise AlreadyExists(f"Document already exists: {ref.path}")
+                if op == "update" and ref._key not in pending:
+                    raise NotFound(f"No document to update: {ref.path}")
+                if op == "delete":
+                    pending.discard(ref._key)
+                else:
+                    pending.add(ref._key)
+            now = datetime.now(timezone.utc)
+            for op, ref, data, merge in writes:
+                key = ref._key
+                if op == "delete":
+                    self._docs.pop(key, None)
+                elif op == "update":
+                    for path, value in data.items():
+                        _set_path(self._docs[key], path, value)
+                elif op == "set" and merge and key in self._docs:
+                    _merge(self._docs[key], data)
+                else:
+                    self._docs[key] = _resolve(data, _MISSING)
+                self._versions[key] = self._versions.get(key, 0) + 1
+            self.writes += len(writes)
+        if writes:
+            self._notify({ref._collection for _op, ref, _data, _flag in writes})
+        return [_WriteResult(now) for _ in writes]
+
+    def _notify(self, collections: set[str]) -> None:
+        """Deliver changes to listeners on *collections* (synchronously, after the commit)."""
+        with self._lock:
+            deliveries = []
+            for watch in list(self._watches):
+                if watch._query._collection not in collections:
+                    continue
+                snaps = watch._query._results()
+                current = {snap.id: snap for snap in snaps}
+                changes = [
+                    _Change(ChangeType.REMOVED, old) for doc_id, old in watch._last.items() if doc_id not in current
+                ]
+                for doc_id, snap in current.items():
+                    old = watch._last.get(doc_id)
+                    if old is None:
+                        changes.append(_Change(ChangeType.ADDED, snap))
+                    elif old._data != snap._data:
+                        changes.append(_Change(ChangeType.MODIFIED, snap))
+                watch._last = current
+                if changes:
+                    deliveries.append((watch, snaps, changes))
+        read_time = datetime.now(timezone.utc)
+        for watch, snaps, changes in deliveries:
+            if watch.is_active:
+                watch._callback(snaps, changes, read_time)
+
+
+class _WriteResult:
+    def __init__(self, update_time: datetime):
+        self.update_time = update_time
@@ -46,7 +46,7 @@ def _require_platform_admin(user: dict) -> None:
 
 
 @router.post("/merchants/request-invite")
-async def request_invite(data: MerchantInviteRequest):
+def request_invite(data: MerchantInviteRequest):
     """Submit a merchant invite request. Public — no auth required."""
     db = get_db()
     now = datetime.now(timezone.utc)
@@ -80,7 +80,7 @@ async def request_invite(data: MerchantInviteRequest):
 
 
 @router.get("/admin/invites", response_model=InviteListResponse)
-async def list_invites(
+def list_invites(
     status: Optional[str] = None,
     user: dict = Depends(get_current_user),
 ):
@@ -108,7 +108,7 @@ async def list_invites(
 
 
 @router.post("/admin/invites/{invite_id}/approve")
-async def approve_invite(invite_id: str, user: dict = Depends(get_current_user)):
+def approve_invite(invite_id: str, user: dict = Depends(get_current_user)):
     """Approve a merchant invite — creates merchant + user records. Platform admin only."""
     _require_platform_admin(user)
 
@@ -209,7 +209,7 @@ async def approve_invite(invite_id: str, user: dict = Depends(get_current_user))
 
 
 @router.post("/admin/invites/{invite_id}/reject")
-async def reject_invite(
+def reject_invite(
     invite_id: str,
     body: InviteRejectBody = InviteRejectBody(),
     user: dict = Depends(get_current_user),
@@ -0,0 +1,284 @@
+"""Request metrics in Prometheus text format.
+
+``MetricsMiddleware`` is a pure ASGI middleware: it wraps ``send`` to see the
+response status and times the request with ``perf_counter``, without the
+extra task and body streaming ``BaseHTTPMiddleware`` adds. Requests are
+labelled by route template (``/merchants/{merchant_id}``), never the raw path,
+so label cardinality stays bounded. It also installs per-request Firestore
+accounting (see instrumented_db.py), reports it in a ``Server-Timing``
+response header and the structured access log, and aggregates it per route.
+
+``render()`` produces the ``/metrics`` payload: the request metrics below,
+every ``TTLCache``'s hit/miss counts, and any gauges contributed through
+``register_collector``.
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+from . import cache
+from .instrumented_db import start_request_stats
+
+logger = logging.getLogger("boost")
+
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds of the documents-read-per-request histogram buckets.
+READ_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+# Label for requests that matched no route (404s, scanners).
+UNMATCHED_ROUTE = "unmatched"
+
+Labels = tuple[tuple[str, str], ...]
+# A collector returns (name, help, type, [(labels, value), ...]) entries.
+Collector = Callable[[], Iterable[tuple[str, str, str, list[tuple[dict, float]]]]]
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in sorted(items)]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Gauge(Counter):
+    """Value that goes up and down."""
+
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets) + (float("inf"),)
+        # labels -> [per-bucket counts..., sum, count]
+        self._values: dict[Labels, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+                    break
+            row[-2] += value
+            row[-1] += 1
+
+    def count(self, **labels: str) -> int:
+        row = self._values.get(tuple(sorted(labels.items())))
+        return int(row[-1]) if row else 0
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = []
+        for key, row in sorted(items):
+            cumulative = 0
+            for bound, n in zip(self.buckets, row):
+                cumulative += n
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(key + (('le', _format_value(bound)),))} {int(cumulative)}"
+                )
+            lines.append(f"{self.name}_sum{_format_labels(key)} {row[-2]!r}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {int(row[-1])}")
+        return lines
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+REQUESTS = Counter("http_requests_total", "HTTP requests by route and status.")
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route.")
+IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served.")
+FIRESTORE_READS = Counter("firestore_reads_total", "Firestore documents read, by route.")
+FIRESTORE_WRITES = Counter("firestore_writes_total", "Firestore documents written, by route.")
+FIRESTORE_QUERIES = Counter("firestore_queries_total", "Firestore queries run, by route.")
+FIRESTORE_SECONDS = Counter("firestore_seconds_total", "Time spent waiting on Firestore, by route.")
+FIRESTORE_READS_PER_REQUEST = Histogram(
+    "firestore_reads_per_request", "Firestore documents read per request, by route.", buckets=READ_BUCKETS
+)
+
+_METRICS: list = [
+    REQUESTS,
+    REQUEST_LATENCY,
+    IN_FLIGHT,
+    FIRESTORE_READS,
+    FIRESTORE_WRITES,
+    FIRESTORE_QUERIES,
+    FIRESTORE_SECONDS,
+    FIRESTORE_READS_PER_REQUEST,
+]
+_collectors: list[Collector] = []
+
+
+def register_metric(metric) -> None:
+    """Include a Counter / Gauge / Histogram in ``render()``."""
+    _METRICS.append(metric)
+
+
+def register_collector(collector: Collector) -> None:
+    """Include values computed at scrape time (e.g. cache sizes) in ``render()``."""
+    _collectors.append(collector)
+
+
+def _cache_samples():
+    caches = sorted(cache._registry, key=lambda c: c.name)
+    yield ("cache_hits_total", "In-process cache hits.", "counter",
+           [({"cache": c.name}, c.hits) for c in caches])
+    yield ("cache_misses_total", "In-process cache misses.", "counter",
+           [({"cache": c.name}, c.misses) for c in caches])
+    yield ("cache_entries", "In-process cache entries.", "gauge",
+           [({"cache": c.name}, len(c)) for c in caches])
+
+
+def render() -> str:
+    """All metrics in Prometheus text exposition format."""
+    lines = []
+    for metric in _METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    for collector in [_cache_samples, *_collectors]:
+        try:
+            families = list(collector())
+        except Exception as e:
+            logger.warning("Metrics collector failed: %s", e)
+            continue
+        for name, help, kind, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(tuple(sorted(labels.items())))} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def reset_metrics() -> None:
+    """Zero every registered metric (tests)."""
+    for metric in _METRICS:
+        metric.reset()
+
+
+# ---------------------------------------------------------------------------
+# Middleware
+# ---------------------------------------------------------------------------
+
+
+def route_template(scope) -> str:
+    """The matched route's path template, or ``UNMATCHED_ROUTE``."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+def server_timing(stats, elapsed: float) -> str:
+    """``Server-Timing`` header value for a request's Firestore stats."""
+    return (
+        f'db;dur={stats.seconds * 1000:.2f};desc="reads={stats.reads} writes={stats.writes} '
+        f'queries={stats.queries}", app;dur={elapsed * 1000:.2f}'
+    )
+
+
+class MetricsMiddleware:
+    """Record per-route latency, status counts, in-flight requests and Firestore use; log each request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status: Optional[int] = None
+        # Sync handlers run in a copy of this context, so they record into it.
+        stats = start_request_stats()
+
+        async def _send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timing = server_timing(stats, time.perf_counter() - start).encode()
+                message = {**message, "headers": [*message.get("headers", []), (b"server-timing", timing)]}
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            IN_FLIGHT.dec()
+            elapsed = time.perf_counter() - start
+            method = scope["method"]
+            route = route_template(scope)
+            status_code = status or 500
+            REQUESTS.inc(method=method, route=route, status=str(status_code))
+            REQUEST_LATENCY.observe(elapsed, method=method, route=route)
+            FIRESTORE_READS.inc(stats.reads, route=route)
+            FIRESTORE_WRITES.inc(stats.writes, route=route)
+            FIRESTORE_QUERIES.inc(stats.queries, route=route)
+            FIRESTORE_SECONDS.inc(stats.seconds, route=route)
+            FIRESTORE_READS_PER_REQUEST.observe(stats.reads, route=route)
+            logger.info(
+                '{"method":"%s","path":"%s","route":"%s","status_code":%d,"duration_ms":%.2f,'
+                '"db_reads":%d,"db_writes":%d,"db_queries":%d,"db_ms":%.2f}',
+                method,
+                scope["path"],
+                route,
+                status_code,
+                elapsed * 1000,
+                stats.reads,
+                stats.writes,
+                stats.queries,
+                stats.seconds * 1000,
+            )
@@ -141,7 +141,7 @@ class Token(BaseModel):
     redeemed_by_location: Optional[str] = None
     created_at: datetime
     is_universal: bool = False  # True for reusable tokens (one per offer)
-    last_redeemed_at: Optional[datetime] = None  # Track last use for universal tokens
+    last_redeemed_at: Optional[datetime] = None  # Last use of universal tokens, coalesced periodically
     last_redeemed_by_location: Optional[str] = None
 
 
@@ -166,6 +166,26 @@ class RedeemResponse(BaseModel):
     reward_description: Optional[str] = None
 
 
+class RedeemBatchItem(RedeemRequest):
+    """One offline scan replayed through /redeem/batch."""
+    idempotency_key: str = Field(..., min_length=8, max_length=100)  # generated on the device per scan
+    client_timestamp: datetime  # when the scan happened on the device
+
+
+class RedeemBatchRequest(BaseModel):
+    items: list[RedeemBatchItem] = Field(..., min_length=1, max_length=500)
+
+
+class RedeemBatchItemResult(RedeemResponse):
+    idempotency_key: str
+
+
+class RedeemBatchResponse(BaseModel):
+    results: list[RedeemBatchItemResult]  # same order as the request items
+    succeeded: int
+    failed: int
+
+
 class Redemption(BaseModel):
     id: str
     token_id: str
@@ -568,6 +588,22 @@ class LtvResponse(BaseModel):
     buckets: list[LtvBucket]
 
 
+class DailyStat(BaseModel):
+    """One day of the merchant daily rollup."""
+    date: str  # ISO date string, e.g. "2025-01-06"
+    visits: int
+    redemptions: int
+    new_customers: int
+    returning_customers: int
+    ledger_amount: float
+    rewards_issued: int
+    offers: dict[str, int]  # Redemptions per offer ID
+
+
+class DailyStatsResponse(BaseModel):
+    days: list[DailyStat]
+
+
 class InsightResponse(BaseModel):
     """AI-generated or rule-based insights for a merchant."""
     insights: list[str]
@@ -0,0 +1,247 @@
+"""Transactional outbox for side effects that run after a request commits.
+
+Request handlers stage an outbox event in the same commit as the data it
+describes (see ``enqueue``), so an event exists if and only if its write
+happened. Events are then processed out of band by:
+
+- ``OutboxWorker``: an asyncio task started with the app that drains the
+  outbox shortly after each enqueue and on a fixed poll interval.
+- ``scripts/drain_outbox.py``: a one-shot drain for Cloud Scheduler, which
+  also covers instances whose CPU is throttled between requests.
+
+Each event is claimed with a short lease before its handler runs, so the
+worker and the CLI never process the same event concurrently. Failed events
+are retried with exponential backoff up to ``MAX_ATTEMPTS``. Handlers must be
+idempotent: an event can run more than once if a lease expires mid-handler.
+
+Query index: outbox (status ASC, next_attempt_at ASC).
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from google.cloud.firestore_v1 import transactional
+
+from .dal import run_db
+from .db import OUTBOX, get_db
+
+logger = logging.getLogger("boost")
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+MAX_ATTEMPTS = 8
+# How long a claimed event is hidden from other drainers.
+LEASE = timedelta(seconds=60)
+RETRY_BASE = timedelta(seconds=30)
+RETRY_MAX = timedelta(hours=1)
+# Processed events carry expire_at; a Firestore TTL policy on it prunes them.
+DONE_RETENTION = timedelta(days=7)
+
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "15"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+
+Handler = Callable[[object, dict], None]
+
+_HANDLERS: dict[str, Handler] = {}
+
+
+# ---------------------------------------------------------------------------
+# Producing events
+# ---------------------------------------------------------------------------
+
+
+def register_handler(kind: str):
+    """Decorator registering ``handler(db, payload)`` for events of *kind*."""
+
+    def _register(fn: Handler) -> Handler:
+        _HANDLERS[kind] = fn
+        return fn
+
+    return _register
+
+
+def new_event(kind: str, payload: dict, now: datetime) -> dict:
+    """Document data for a pending outbox event."""
+    return {
+        "kind": kind,
+        "payload": payload,
+        "status": PENDING,
+        "attempts": 0,
+        "created_at": now,
+        "next_attempt_at": now,
+        "last_error": None,
+    }
+
+
+def enqueue(uow, kind: str, payload: dict, now: datetime):
+    """Stage an outbox event on a UnitOfWork; it commits with the rest of the request."""
+    return uow.create(OUTBOX, new_event(kind, payload, now))
+
+
+# ---------------------------------------------------------------------------
+# Draining
+# ---------------------------------------------------------------------------
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    return min(RETRY_BASE * (2 ** max(0, attempts - 1)), RETRY_MAX)
+
+
+def _claim(db, ref, now: datetime) -> Optional[dict]:
+    """Lease a due event; returns its data, or None if someone else has it."""
+
+    @transactional
+    def _txn(transaction) -> Optional[dict]:
+        snap = next(iter(db.get_all([ref], transaction=transaction)), None)
+        if snap is None or not snap.exists:
+            return None
+        event = snap.to_dict()
+        if event.get("status") != PENDING or event.get("next_attempt_at", now) > now:
+            return None
+        event["attempts"] = event.get("attempts", 0) + 1
+        transaction.update(ref, {
+            "attempts": event["attempts"],
+            "next_attempt_at": now + LEASE,
+        })
+        return event
+
+    return _txn(db.transaction())
+
+
+def process_event(db, event_id: str, now: Optional[datetime] = None) -> Optional[str]:
+    """Claim and run one event. Returns its resulting status, or None if not claimed."""
+    now = now or datetime.now(timezone.utc)
+    ref = db.collection(OUTBOX).document(event_id)
+    event = _claim(db, ref, now)
+    if event is None:
+        return None
+
+    kind = event.get("kind")
+    handler = _HANDLERS.get(kind)
+    try:
+        if handler is None:
+            raise LookupError(f"No outbox handler for {kind!r}")
+        handler(db, event.get("payload") or {})
+    except Exception as e:
+        attempts = event["attempts"]
+        give_up = handler is None or attempts >= MAX_ATTEMPTS
+        logger.warning(
+            "Outbox event %s (%s) failed on attempt %d: %s", event_id, kind, attempts, e
+        )
+        ref.update({
+            "status": FAILED if give_up else PENDING,
+            "next_attempt_at": now + _retry_delay(attempts),
+            "last_error": str(e)[:500],
+        })
+        return FAILED if give_up else PENDING
+
+    done_at = datetime.now(timezone.utc)
+    ref.update({
+        "status": DONE,
+        "processed_at": done_at,
+        "expire_at": done_at + DONE_RETENTION,
+        "last_error": None,
+    })
+    return DONE
+
+
+def drain_outbox(db, limit: int = OUTBOX_BATCH_SIZE, now: Optional[datetime] = None) -> dict:
+    """Process up to *limit* due events. Returns counts by resulting status."""
+    now = now or datetime.now(timezone.utc)
+    due = (
+        db.collection(OUTBOX)
+        .where("status", "==", PENDING)
+        .where("next_attempt_at", "<=", now)
+        .order_by("next_attempt_at")
+        .limit(limit)
+        .stream()
+    )
+
+    counts = {DONE: 0, PENDING: 0, FAILED: 0, "skipped": 0}
+    for snap in due:
+        status = process_event(db, snap.id, now)
+        counts[status or "skipped"] += 1
+    return counts
+
+
+# ---------------------------------------------------------------------------
+# In-process worker
+# ---------------------------------------------------------------------------
+
+
+class OutboxWorker:
+    """Drains the outbox in the background of the API process.
+
+    Draining runs on the shared worker pool (``run_db``) so the blocking
+    Firestore client never stalls the event loop. ``notify`` wakes the
+    worker right after an enqueue instead of waiting for the next poll.
+    """
+
+    def __init__(self, poll_interval: float = OUTBOX_POLL_SECONDS, batch_size: int = OUTBOX_BATCH_SIZE):
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def notify(self) -> None:
+        """Wake the worker. Safe to call from any thread."""
+        if self._loop is not None and self._wake is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _run(self) -> None:
+        while True:
+            self._wake.clear()
+            try:
+                counts = await run_db(drain_outbox, get_db(), self.batch_size)
+                if counts[DONE] + counts[PENDING] + counts[FAILED] >= self.batch_size:
+                    continue  # more due events are likely waiting
+            except Exception as e:
+                logger.error("Outbox drain failed: %s", e)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+_worker: Optional[OutboxWorker] = None
+
+
+def start_worker() -> OutboxWorker:
+    global _worker
+    _worker = OutboxWorker()
+    _worker.start()
+    return _worker
+
+
+async def stop_worker() -> None:
+    global _worker
+    if _worker is not None:
+        await _worker.stop()
+        _worker = None
+
+
+def notify_worker() -> None:
+    """Nudge the in-process worker, if one is running."""
+    if _worker is not None:
+        _worker.notify()
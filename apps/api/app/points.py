@@ -0,0 +1,80 @@
+"""Universal (cross-merchant) points.
+
+Consumers earn ``global_points`` on personal-QR redemptions and referrals.
+Every full ``UNIVERSAL_REWARD_THRESHOLD`` points converts into a universal
+reward. The balance is read and rewritten inside the caller's transaction, so
+two concurrent awards can never both convert the same points into a reward.
+"""
+
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from google.cloud.firestore_v1 import transactional
+
+from .db import CONSUMERS, REWARDS
+
+POINTS_PER_REDEMPTION = 50
+UNIVERSAL_REWARD_THRESHOLD = 500
+UNIVERSAL_REWARD_VALUE = 5.0
+UNIVERSAL_REWARD_DESCRIPTION = "$5 credit at any Boost merchant"
+UNIVERSAL_REWARD_TTL = timedelta(days=30)
+
+
+def consumer_ref(db, consumer_id: str):
+    return db.collection(CONSUMERS).document(consumer_id)
+
+
+def stage_points(db, writer, consumer_snap, delta: int, now: datetime) -> Optional[int]:
+    """Stage *delta* points plus any universal rewards they complete.
+
+    *consumer_snap* must have been read in the same transaction as *writer*.
+    Costs one consumer write plus one write per reward; returns the number
+    of rewards created, or None if the consumer does not exist.
+    """
+    if consumer_snap is None or not consumer_snap.exists:
+        return None
+    consumer_id = consumer_snap.id
+    balance = (consumer_snap.to_dict() or {}).get("global_points", 0) + delta
+    rewards = max(0, balance // UNIVERSAL_REWARD_THRESHOLD)
+    for _ in range(rewards):
+        writer.set(db.collection(REWARDS).document(), {
+            "consumer_id": consumer_id,
+            "merchant_id": None,
+            "description": UNIVERSAL_REWARD_DESCRIPTION,
+            "status": "earned",
+            "reward_value": UNIVERSAL_REWARD_VALUE,
+            "is_universal": True,
+            "earned_at": now,
+            "expires_at": now + UNIVERSAL_REWARD_TTL,
+            "redeemed_at": None,
+        })
+    writer.update(consumer_ref(db, consumer_id), {
+        "global_points": balance - UNIVERSAL_REWARD_THRESHOLD * rewards,
+    })
+    return rewards
+
+
+def award_points(
+    db, awards: dict[str, int], now: datetime, stage: Optional[Callable] = None,
+) -> dict[str, Optional[int]]:
+    """Award points to several consumers in one transaction.
+
+    ``awards`` maps consumer IDs to point deltas. ``stage(transaction)``
+    stages any other writes that must commit with the award (e.g. the
+    referral record). Returns rewards created per consumer (None if the
+    consumer does not exist).
+    """
+    refs = [consumer_ref(db, cid) for cid in awards]
+
+    @transactional
+    def _txn(transaction) -> dict[str, Optional[int]]:
+        snaps = {snap.id: snap for snap in db.get_all(refs, transaction=transaction)}
+        result = {
+            cid: stage_points(db, transaction, snaps.get(cid), delta, now)
+            for cid, delta in awards.items()
+        }
+        if stage is not None:
+            stage(transaction)
+        return result
+
+    return _txn(db.transaction())
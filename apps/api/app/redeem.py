@@ -0,0 +1,114 @@
+"""Redemption commit engine.
+
+Reserves an offer's daily cap and writes every document of a redemption in a
+single commit:
+
+- Far from the cap, the staged writes and the counter increment go out in one
+  WriteBatch (one RPC, no contention).
+- Within ``RESERVATION_HEADROOM`` of the cap, or when the caller needs to
+  re-check documents (e.g. a single-use token), the counter shards are re-read
+  inside a Firestore transaction, so concurrent scans retry instead of pushing
+  the offer past ``cap_daily``.
+"""
+
+from datetime import datetime
+from typing import Callable, Iterable, Optional
+
+from google.cloud.firestore_v1 import transactional
+
+from .counters import increment_daily_redemptions, shard_refs, sum_shards
+from .db import OFFERS
+from .doc_cache import offer_cache
+
+CAP_REACHED_MESSAGE = "Daily redemption limit reached for this offer"
+
+# Below this many remaining redemptions the cap is reserved transactionally.
+# Above it, more scans than this would have to land between the count read
+# and the commit for an offer to overshoot.
+RESERVATION_HEADROOM = 20
+
+# stage(writer, guard_snapshots) stages the redemption's writes on a batch or
+# transaction. It may run more than once when a transaction retries.
+StageFn = Callable[[object, list], None]
+# guard(guard_snapshots) returns a rejection message, or None to proceed.
+GuardFn = Callable[[list], Optional[str]]
+
+
+def read_offer_with_daily_count(db, offer_id: str, now: datetime):
+    """Fetch an offer and today's redemption count in one ``get_all`` round trip.
+
+    The offer comes from the process-wide offer cache when it is there.
+    Returns (offer_data_or_None, today_count).
+    """
+    hit, offer_data = offer_cache.lookup(offer_id)
+    refs = shard_refs(db, offer_id, now)
+    if not hit:
+        refs.insert(0, db.collection(OFFERS).document(offer_id))
+
+    offer_snap = None
+    counter_snaps = []
+    for snap in db.get_all(refs):
+        if snap.id == offer_id:
+            offer_snap = snap
+        else:
+            counter_snaps.append(snap)
+    if not hit:
+        if offer_snap is None:
+            offer_cache.put(offer_id, None)
+        else:
+            offer_data = offer_cache.put_snapshot(offer_snap)
+    return offer_data, sum_shards(counter_snaps)
+
+
+def commit_redemption(
+    db,
+    *,
+    offer_id: str,
+    cap_daily: int,
+    today_count: int,
+    now: datetime,
+    stage: StageFn,
+    guard_refs: Iterable = (),
+    guard: Optional[GuardFn] = None,
+) -> Optional[str]:
+    """Reserve one unit of the offer's daily cap and commit the staged writes.
+
+    ``today_count`` is the (possibly stale) count the caller already read.
+    Returns None on success, or a rejection message when the cap is exhausted
+    or ``guard`` rejects the re-read ``guard_refs``.
+    """
+    guard_refs = list(guard_refs)
+
+    if today_count >= cap_daily:
+        return CAP_REACHED_MESSAGE
+
+    if not guard_refs and cap_daily - today_count > RESERVATION_HEADROOM:
+        batch = db.batch()
+        stage(batch, [])
+        increment_daily_redemptions(db, batch, offer_id, now)
+        batch.commit()
+        return None
+
+    counter_refs = shard_refs(db, offer_id, now)
+
+    @transactional
+    def _reserve(transaction) -> Optional[str]:
+        snaps = list(db.get_all([*guard_refs, *counter_refs], transaction=transaction))
+        by_id = {snap.id: snap for snap in snaps}
+        guard_snaps = [by_id.get(ref.id) for ref in guard_refs]
+
+        if guard is not None:
+            rejection = guard(guard_snaps)
+            if rejection:
+                return rejection
+
+        counter_ids = {ref.id for ref in counter_refs}
+        count = sum_shards(snap for snap in snaps if snap.id in counter_ids)
+        if count >= cap_daily:
+            return CAP_REACHED_MESSAGE
+
+        stage(transaction, guard_snaps)
+        increment_daily_redemptions(db, transaction, offer_id, now)
+        return None
+
+    return _reserve(db.transaction())
@@ -6,10 +6,11 @@ import string
 from datetime import datetime, timezone
 
 from fastapi import APIRouter, Depends, HTTPException
-from google.cloud.firestore_v1 import Increment as _Increment
 
 from .db import get_db, CONSUMERS, REFERRALS
 from .deps import get_current_consumer
+from .loader import DocLoader
+from .points import award_points
 from .models import (
     ReferralCodeResponse,
     ReferralListItem,
@@ -65,7 +66,7 @@ def _mask_name(display_name: str) -> str:
 
 
 @router.get("/referral-code", response_model=ReferralCodeResponse)
-async def get_referral_code(user=Depends(get_current_consumer)):
+def get_referral_code(user=Depends(get_current_consumer)):
     """Return the consumer's unique referral code, generating one if needed."""
     db = get_db()
     uid = user.get("uid")
@@ -99,7 +100,7 @@ async def get_referral_code(user=Depends(get_current_consumer)):
 
 
 @router.post("/referral")
-async def submit_referral(data: ReferralSubmit, user=Depends(get_current_consumer)):
+def submit_referral(data: ReferralSubmit, user=Depends(get_current_consumer)):
     """Submit a referral code. Awards points to both referrer and referred."""
     db = get_db()
     uid = user.get("uid")
@@ -154,25 +155,20 @@ async def submit_referral(data: ReferralSubmit, user=Depends(get_current_consume
 
     now = datetime.now(timezone.utc)
 
-    # Create referral record
+    # Referral record and both awards commit in one transaction; rewards for
+    # crossing the universal threshold are created in the same commit.
     ref_doc = db.collection(REFERRALS).document()
-    ref_doc.set({
-        "referrer_id": referrer_id,
-        "referred_id": uid,
-        "status": "completed",
-        "points_earned": REFERRER_POINTS,
-        "created_at": now,
-    })
-
-    # Award points to referrer
-    db.collection(CONSUMERS).document(referrer_id).update({
-        "global_points": _Increment(REFERRER_POINTS),
-    })
-
-    # Award points to referred (current user)
-    db.collection(CONSUMERS).document(uid).update({
-        "global_points": _Increment(REFERRED_POINTS),
-    })
+
+    def _stage_referral(transaction):
+        transaction.set(ref_doc, {
+            "referrer_id": referrer_id,
+            "referred_id": uid,
+            "status": "completed",
+            "points_earned": REFERRER_POINTS,
+            "created_at": now,
+        })
+
+    award_points(db, {referrer_id: REFERRER_POINTS, uid: REFERRED_POINTS}, now, stage=_stage_referral)
 
     return {
         "success": True,
@@ -188,7 +184,7 @@ async def submit_referral(data: ReferralSubmit, user=Depends(get_current_consume
 
 
 @router.get("/referrals", response_model=ReferralListResponse)
-async def list_referrals(user=Depends(get_current_consumer)):
+def list_referrals(user=Depends(get_current_consumer)):
     """List people this consumer has referred."""
     db = get_db()
     uid = user.get("uid")
@@ -206,6 +202,10 @@ async def list_referrals(user=Depends(get_current_consumer)):
     referrals: list[ReferralListItem] = []
     total_points = 0
 
+    # Referred consumers' names in batched get_all calls, not one read per referral
+    loader = DocLoader(db)
+    loader.prime(CONSUMERS, (rdoc.to_dict().get("referred_id", "") for rdoc in referral_docs))
+
     for rdoc in referral_docs:
         rdata = rdoc.to_dict()
         referred_id = rdata.get("referred_id", "")
@@ -214,10 +214,10 @@ async def list_referrals(user=Depends(get_current_consumer)):
 
         # Look up referred consumer name (masked)
         referred_name = "User"
-        referred_consumer = db.collection(CONSUMERS).document(referred_id).get()
-        if referred_consumer.exists:
+        referred_consumer = loader.get(CONSUMERS, referred_id)
+        if referred_consumer is not None:
             referred_name = _mask_name(
-                referred_consumer.to_dict().get("display_name", "User")
+                referred_consumer.get("display_name", "User")
             )
 
         referrals.append(
@@ -12,8 +12,6 @@ from .db import (
     get_db,
     MERCHANTS,
     OFFERS,
-    CONSUMER_VISITS,
-    REWARDS,
     WEEKLY_REPORTS,
 )
 from .deps import get_current_user
@@ -23,6 +21,8 @@ from .analytics import (
     _build_segment_summary,
     _generate_rule_based_insights,
 )
+from .daily_stats import get_daily_stats, sum_daily_stats
+from .visit_frame import merchant_visits, visit_snapshots
 
 logger = logging.getLogger("boost")
 
@@ -166,91 +166,31 @@ def _compute_weekly_report(db, merchant_id: str, merchant_data: dict, week_start
     merchant_name = merchant_data.get("name", "Business")
     merchant_email = merchant_data.get("email", "")
 
-    # Fetch visits in this week
-    visits_query = (
-        db.collection(CONSUMER_VISITS)
-        .where("merchant_id", "==", merchant_id)
-        .where("timestamp", ">=", week_start_dt)
-        .where("timestamp", "<", week_end_dt)
-    )
-    week_visits = list(visits_query.stream())
-
-    # Fetch visits from last week for trend comparison
+    # This week's and last week's numbers come from the daily rollup
     prev_week_start = week_start_dt - timedelta(weeks=1)
-    prev_visits_query = (
-        db.collection(CONSUMER_VISITS)
-        .where("merchant_id", "==", merchant_id)
-        .where("timestamp", ">=", prev_week_start)
-        .where("timestamp", "<", week_start_dt)
-    )
-    prev_week_visits = list(prev_visits_query.stream())
+    days = get_daily_stats(db, merchant_id, prev_week_start, week_end_dt)
+    week = sum_daily_stats(d for d in days if d["date"] >= week_start_dt)
+    prev_week = sum_daily_stats(d for d in days if d["date"] < week_start_dt)
 
-    # Count unique consumers and categorise new vs returning
     # A "new" customer this week = their first ever visit at this merchant was this week
-    all_visits_query = (
-        db.collection(CONSUMER_VISITS)
-        .where("merchant_id", "==", merchant_id)
-        .where("timestamp", "<", week_start_dt)
-    )
-    prior_visitors = set()
-    for v in all_visits_query.stream():
-        vd = v.to_dict()
-        cid = vd.get("consumer_id")
-        if cid:
-            prior_visitors.add(cid)
-
-    week_consumers: dict[str, int] = {}
-    for v in week_visits:
-        vd = v.to_dict()
-        cid = vd.get("consumer_id")
-        if cid:
-            week_consumers[cid] = week_consumers.get(cid, 0) + 1
-
-    new_customers = sum(1 for c in week_consumers if c not in prior_visitors)
-    returning_customers = sum(1 for c in week_consumers if c in prior_visitors)
-    total_visits = len(week_visits)
+    new_customers = week["new_customers"]
+    returning_customers = week["week_returning_customers"]
+    total_visits = week["visits"]
 
     # Top deal by redemptions this week
-    offer_counts: dict[str, int] = {}
-    for v in week_visits:
-        vd = v.to_dict()
-        oid = vd.get("offer_id")
-        if oid:
-            offer_counts[oid] = offer_counts.get(oid, 0) + 1
-
     top_deal_name = None
-    if offer_counts:
-        top_offer_id = max(offer_counts, key=offer_counts.get)  # type: ignore[arg-type]
+    if week["offers"]:
+        top_offer_id = max(week["offers"], key=week["offers"].get)
         offer_doc = db.collection(OFFERS).document(top_offer_id).get()
         if offer_doc.exists:
             top_deal_name = offer_doc.to_dict().get("name", "Unknown Deal")
 
     # Return rate: of this week's consumers, how many had prior visits?
-    return_rate = returning_customers / max(len(week_consumers), 1)
+    return_rate = returning_customers / max(new_customers + returning_customers, 1)
 
     # Previous week return rate for trend
-    prev_consumers: dict[str, int] = {}
-    for v in prev_week_visits:
-        vd = v.to_dict()
-        cid = vd.get("consumer_id")
-        if cid:
-            prev_consumers[cid] = prev_consumers.get(cid, 0) + 1
-
-    # Visitors before the previous week
-    before_prev_visitors = set()
-    before_prev_query = (
-        db.collection(CONSUMER_VISITS)
-        .where("merchant_id", "==", merchant_id)
-        .where("timestamp", "<", prev_week_start)
-    )
-    for v in before_prev_query.stream():
-        vd = v.to_dict()
-        cid = vd.get("consumer_id")
-        if cid:
-            before_prev_visitors.add(cid)
-
-    prev_returning = sum(1 for c in prev_consumers if c in before_prev_visitors)
-    prev_return_rate = prev_returning / max(len(prev_consumers), 1)
+    prev_returning = prev_week["week_returning_customers"]
+    prev_return_rate = prev_returning / max(prev_week["new_customers"] + prev_returning, 1)
 
     if return_rate > prev_return_rate + 0.02:
         return_rate_trend = "up"
@@ -260,20 +200,15 @@ def _compute_weekly_report(db, merchant_id: str, merchant_data: dict, week_start
         return_rate_trend = "flat"
 
     # Rewards earned this week
-    rewards_query = (
-        db.collection(REWARDS)
-        .where("merchant_id", "==", merchant_id)
-        .where("earned_at", ">=", week_start_dt)
-        .where("earned_at", "<", week_end_dt)
-    )
-    rewards_earned = len(list(rewards_query.stream()))
+    rewards_earned = week["rewards_issued"]
 
     # Estimated revenue
     estimated_revenue = round(total_visits * DEFAULT_AVG_TICKET, 2)
 
-    # Generate insights
-    deals = _build_deal_summary(db, merchant_id)
-    segments = _build_segment_summary(db, merchant_id)
+    # Generate insights from one snapshot of the merchant's visits
+    visits = merchant_visits(db, merchant_id)
+    deals = _build_deal_summary(db, merchant_id, visits)
+    segments = _build_segment_summary(visits)
     insights = _generate_rule_based_insights(deals, segments)
 
     if not insights:
@@ -330,7 +265,7 @@ def _compute_weekly_report(db, merchant_id: str, merchant_data: dict, week_start
 
 
 @router.post("/reports/weekly")
-async def generate_weekly_reports(
+def generate_weekly_reports(
     api_key: Optional[str] = Query(None),
 ):
     """Generate weekly reports for all active merchants.
@@ -370,7 +305,8 @@ async def generate_weekly_reports(
             logger.info("Skipping duplicate report for merchant %s week %s", merchant_id, week_start_str)
             continue
 
-        report_data = _compute_weekly_report(db, merchant_id, merchant_data, week_start_dt, week_end_dt)
+        with visit_snapshots():
+            report_data = _compute_weekly_report(db, merchant_id, merchant_data, week_start_dt, week_end_dt)
 
         # Store in Firestore
         doc_ref = db.collection(WEEKLY_REPORTS).document()
@@ -390,7 +326,7 @@ async def generate_weekly_reports(
     "/merchants/{merchant_id}/reports",
     response_model=WeeklyReportList,
 )
-async def list_merchant_reports(
+def list_merchant_reports(
     merchant_id: str,
     limit: int = Query(12, ge=1, le=52),
     user=Depends(get_current_user),
@@ -446,7 +382,7 @@ async def list_merchant_reports(
     "/merchants/{merchant_id}/reports/{report_id}",
     response_model=WeeklyReportSummary,
 )
-async def get_merchant_report(
+def get_merchant_report(
     merchant_id: str,
     report_id: str,
     user=Depends(get_current_user),
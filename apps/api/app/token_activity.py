@@ -0,0 +1,101 @@
+"""Sharded "last used" tracking for universal tokens.
+
+A universal token is shared by every redemption of its offer, so writing
+``last_redeemed_at`` onto the token document on each redemption caps an offer
+at Firestore's ~1 sustained write/sec per document. Instead each redemption
+writes to one of ``TOKEN_ACTIVITY_SHARDS`` activity docs in ``token_activity``
+(in the same commit as the redemption), and ``coalesce_token_activity`` copies
+the newest value onto the token document periodically (see
+scripts/coalesce_token_activity.py). Token documents therefore lag real use by
+up to one coalescing interval.
+
+Live redemptions are recorded at server time, so each shard sees them in
+order. Replayed offline scans carry their (older) scan time; they read the
+shard first and leave it alone if it already holds a newer use, so a shard
+never moves backwards.
+
+Query index: token_activity (last_redeemed_at ASC) - single-field, automatic.
+"""
+
+import random
+from datetime import datetime
+
+from .db import TOKEN_ACTIVITY, TOKENS
+
+# Changing this orphans existing shards, so treat it as fixed.
+TOKEN_ACTIVITY_SHARDS = 10
+
+# Firestore caps a WriteBatch at 500 writes; get_all requests stay small.
+_BATCH_LIMIT = 400
+
+
+def _shard_id(token_id: str, shard: int) -> str:
+    return f"{token_id}_{shard}"
+
+
+def record_token_use(
+    db, writer, token_id: str, location: str, when: datetime, replay: bool = False,
+) -> None:
+    """Stage a "last used" update for a universal token on *writer*.
+
+    With ``replay`` (a scan recorded at a past time) the shard is read first
+    and nothing is staged if it already holds a use at or after *when*.
+    """
+    shard = random.randrange(TOKEN_ACTIVITY_SHARDS)
+    ref = db.collection(TOKEN_ACTIVITY).document(_shard_id(token_id, shard))
+    if replay:
+        snap = ref.get()
+        current = (snap.to_dict() or {}).get("last_redeemed_at") if snap.exists else None
+        if current is not None and current >= when:
+            return
+    writer.set(
+        ref,
+        {
+            "token_id": token_id,
+            "shard": shard,
+            "last_redeemed_at": when,
+            "last_redeemed_by_location": location,
+        },
+        merge=True,
+    )
+
+
+def coalesce_token_activity(db, since: datetime) -> int:
+    """Copy the newest activity since *since* onto token docs. Returns tokens updated.
+
+    Each token doc gets at most one write per run, and never moves backwards:
+    an out-of-order (e.g. replayed offline) scan cannot overwrite a newer use.
+    """
+    latest: dict[str, tuple[datetime, str]] = {}
+    for snap in db.collection(TOKEN_ACTIVITY).where("last_redeemed_at", ">=", since).stream():
+        data = snap.to_dict() or {}
+        token_id = data.get("token_id")
+        used_at = data.get("last_redeemed_at")
+        if not token_id or used_at is None:
+            continue
+        if token_id not in latest or used_at > latest[token_id][0]:
+            latest[token_id] = (used_at, data.get("last_redeemed_by_location"))
+
+    updated = 0
+    token_ids = list(latest)
+    for i in range(0, len(token_ids), _BATCH_LIMIT):
+        refs = [db.collection(TOKENS).document(tid) for tid in token_ids[i : i + _BATCH_LIMIT]]
+        batch = db.batch()
+        staged = 0
+        for snap in db.get_all(refs):
+            if not snap.exists:
+                continue
+            used_at, location = latest[snap.id]
+            current = (snap.to_dict() or {}).get("last_redeemed_at")
+            if current is not None and current >= used_at:
+                continue
+            batch.update(db.collection(TOKENS).document(snap.id), {
+                "last_redeemed_at": used_at,
+                "last_redeemed_by_location": location,
+            })
+            staged += 1
+        if staged:
+            batch.commit()
+            updated += staged
+
+    return updated
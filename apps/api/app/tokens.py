@@ -1,4 +1,11 @@
-"""Token generation and QR code utilities."""
+"""Token generation and QR code utilities.
+
+Short codes are resolved through the ``short_codes`` index collection: one
+document per code, keyed by the code itself, pointing at its token. The index
+doc is created in the same batch as the token, and ``create`` fails if the
+code is taken, so codes are unique. Resolved code -> token ID mappings never
+change and are cached in-process.
+"""
 
 import io
 import os
@@ -8,11 +15,19 @@ import uuid
 from datetime import datetime, timedelta, timezone
 
 import qrcode
+from google.api_core.exceptions import AlreadyExists
 from qrcode.image.pure import PyPNGImage
 
-from .db import get_db, TOKENS, OFFERS
+from .cache import TTLCache
+from .db import get_db, TOKENS, OFFERS, SHORT_CODES
 from .models import TokenStatus
 
+# Attempts at drawing an unused short code before giving up.
+SHORT_CODE_ATTEMPTS = 5
+
+# short code -> token ID
+_short_code_ids = TTLCache(maxsize=10_000, ttl=3600, name="short_codes")
+
 
 def generate_short_code(length: int = 6) -> str:
     """Generate a human-readable short code (uppercase letters + digits, no ambiguous chars)."""
@@ -105,12 +120,10 @@ def create_tokens(offer_id: str, count: int = 1, expires_days: int = 30) -> list
 
     # Create new universal token
     token_id = generate_token_id()
-    short_code = generate_short_code()
     qr_data = create_qr_data(token_id)
 
     token_doc = {
         "offer_id": offer_id,
-        "short_code": short_code,
         "qr_data": qr_data,
         "status": TokenStatus.active.value,
         "expires_at": expires_at,
@@ -122,8 +135,7 @@ def create_tokens(offer_id: str, count: int = 1, expires_days: int = 30) -> list
         "last_redeemed_by_location": None,
     }
 
-    doc_ref = db.collection(TOKENS).document(token_id)
-    doc_ref.set(token_doc)
+    token_doc["short_code"] = _create_with_short_code(db, token_id, token_doc, now)
 
     return [{
         "id": token_id,
@@ -131,6 +143,92 @@ def create_tokens(offer_id: str, count: int = 1, expires_days: int = 30) -> list
     }]
 
 
+def _create_with_short_code(db, token_id: str, token_doc: dict, now: datetime) -> str:
+    """Write a token and its short-code index entry atomically. Returns the code.
+
+    A collision on the index doc aborts the whole batch, so a retry with a
+    fresh code never leaves a token without a unique code.
+    """
+    token_ref = db.collection(TOKENS).document(token_id)
+    for _ in range(SHORT_CODE_ATTEMPTS):
+        short_code = generate_short_code()
+        batch = db.batch()
+        batch.create(db.collection(SHORT_CODES).document(short_code), {
+            "token_id": token_id,
+            "offer_id": token_doc["offer_id"],
+            "created_at": now,
+        })
+        batch.set(token_ref, {**token_doc, "short_code": short_code})
+        try:
+            batch.commit()
+        except AlreadyExists:
+            continue
+        _short_code_ids.set(short_code, token_id)
+        return short_code
+    raise RuntimeError("Could not allocate a unique short code")
+
+
+def _resolve_short_code(db, short_code: str) -> str | None:
+    """Token ID for a short code: cache, then one index read, then legacy query.
+
+    Tokens created before the index existed are found by querying
+    ``short_code`` and are indexed on the way out (see
+    scripts/backfill_short_codes.py to index them all up front).
+    """
+    token_id = _short_code_ids.get(short_code)
+    if token_id is not None:
+        return token_id
+
+    index_doc = db.collection(SHORT_CODES).document(short_code).get()
+    if index_doc.exists:
+        token_id = index_doc.to_dict().get("token_id")
+    else:
+        docs = list(db.collection(TOKENS).where("short_code", "==", short_code).limit(1).stream())
+        if not docs:
+            return None
+        token_id = docs[0].id
+        index_short_code(db, short_code, token_id, docs[0].to_dict())
+
+    if token_id:
+        _short_code_ids.set(short_code, token_id)
+    return token_id
+
+
+def index_short_code(db, short_code: str, token_id: str, token_data: dict) -> bool:
+    """Add a pre-index token to ``short_codes``. False if the code is already taken."""
+    try:
+        db.collection(SHORT_CODES).document(short_code).create({
+            "token_id": token_id,
+            "offer_id": token_data.get("offer_id"),
+            "created_at": token_data.get("created_at") or datetime.now(timezone.utc),
+        })
+    except AlreadyExists:
+        return False
+    return True
+
+
+def backfill_short_codes(db) -> tuple[int, list[str]]:
+    """Index every token's short code. Returns (indexed, duplicate codes).
+
+    When legacy tokens share a code, the oldest keeps it; the rest stay
+    reachable by token ID and are reported for manual reissue.
+    """
+    tokens = sorted(
+        (doc for doc in db.collection(TOKENS).stream() if (doc.to_dict() or {}).get("short_code")),
+        key=lambda doc: doc.to_dict().get("created_at") or datetime.min.replace(tzinfo=timezone.utc),
+    )
+    indexed, duplicates = 0, []
+    for doc in tokens:
+        data = doc.to_dict()
+        if index_short_code(db, data["short_code"], doc.id, data):
+            indexed += 1
+        else:
+            existing = db.collection(SHORT_CODES).document(data["short_code"]).get()
+            if existing.exists and existing.to_dict().get("token_id") != doc.id:
+                duplicates.append(data["short_code"])
+    return indexed, duplicates
+
+
 def get_token_by_id_or_code(token_input: str) -> tuple[str, dict] | None:
     """Look up token by ID or short code.
 
@@ -149,36 +247,30 @@ def get_token_by_id_or_code(token_input: str) -> tuple[str, dict] | None:
             return doc.id, doc.to_dict()
 
     # Try as short code
-    query = db.collection(TOKENS).where("short_code", "==", token_input.upper()).limit(1)
-    docs = list(query.stream())
-    if docs:
-        return docs[0].id, docs[0].to_dict()
+    token_id = _resolve_short_code(db, token_input.upper())
+    if token_id is None:
+        return None
+    doc = db.collection(TOKENS).document(token_id).get()
+    if doc.exists:
+        return doc.id, doc.to_dict()
 
     return None
 
 
-def mark_token_redeemed(token_id: str, location: str) -> None:
-    """Mark a token as redeemed (or track last use for universal tokens)."""
-    db = get_db()
-    doc_ref = db.collection(TOKENS).document(token_id)
-    doc = doc_ref.get()
-
-    if not doc.exists:
-        return
-
-    token_data = doc.to_dict()
-    now = datetime.now(timezone.utc)
+def token_redeemed_fields(token_data: dict, location: str, now: datetime) -> dict:
+    """Fields to update on a token when it is redeemed.
 
-    # Universal tokens stay active - only track last redemption
+    Universal tokens stay active and only track their last use; legacy
+    single-use tokens flip to redeemed.
+    """
     if token_data.get("is_universal", False):
-        doc_ref.update({
+        return {
             "last_redeemed_at": now,
             "last_redeemed_by_location": location,
-        })
-    else:
-        # Legacy single-use tokens
-        doc_ref.update({
-            "status": TokenStatus.redeemed.value,
-            "redeemed_at": now,
-            "redeemed_by_location": location,
-        })
+        }
+    return {
+        "status": TokenStatus.redeemed.value,
+        "redeemed_at": now,
+        "redeemed_by_location": location,
+    }
+
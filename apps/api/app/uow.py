@@ -0,0 +1,146 @@
+"""Request-scoped unit of work for multi-document writes.
+
+Collects the writes of one request in memory and stages them onto a single
+WriteBatch or Transaction, so a flow that touches many documents costs one
+commit instead of one RPC per write. Reads go through the unit of work too:
+documents are fetched once (``load`` batches them into one ``get_all``) and
+later reads see the request's own pending writes, so nothing has to be
+re-read after it is written.
+"""
+
+from typing import Optional
+
+from google.cloud.firestore_v1 import Increment
+
+
+class UnitOfWork:
+    """Pending writes plus a read-your-writes view of the documents they touch.
+
+    Documents are addressed by (collection, doc_id). ``apply`` may be called
+    more than once (e.g. by a retried transaction); it re-stages the same
+    writes each time.
+    """
+
+    def __init__(self, db):
+        self._db = db
+        self._refs: dict[tuple[str, str], object] = {}
+        # Current view of each loaded/written document; None means "does not exist".
+        self._docs: dict[tuple[str, str], Optional[dict]] = {}
+        self._writes: list[tuple] = []
+        # Field writes to documents not loaded yet, replayed onto them on load.
+        self._unloaded: dict[tuple[str, str], list[tuple[dict, bool]]] = {}
+
+    # --- References ---
+
+    def ref(self, collection: str, doc_id: str):
+        key = (collection, doc_id)
+        if key not in self._refs:
+            self._refs[key] = self._db.collection(collection).document(doc_id)
+        return self._refs[key]
+
+    def new_ref(self, collection: str):
+        """Reference to a new auto-id document in *collection*."""
+        ref = self._db.collection(collection).document()
+        self._refs[(collection, ref.id)] = ref
+        return ref
+
+    # --- Reads ---
+
+    def load(self, *keys: tuple[str, str]) -> None:
+        """Fetch the not-yet-seen documents among *keys* with one ``get_all``."""
+        missing = [key for key in dict.fromkeys(keys) if key not in self._docs]
+        # get_all results are matched back by document id, so ids must be
+        # unique within one call; collisions across collections go in a
+        # follow-up call.
+        while missing:
+            batch, rest, ids = [], [], set()
+            for key in missing:
+                (rest if key[1] in ids else batch).append(key)
+                ids.add(key[1])
+            by_id = {snap.id: snap for snap in self._db.get_all([self.ref(*key) for key in batch])}
+            for key in batch:
+                snap = by_id.get(key[1])
+                exists = snap is not None and snap.exists
+                doc = dict(snap.to_dict() or {}) if exists else None
+                for data, is_update in self._unloaded.pop(key, []):
+                    if doc is not None or not is_update:
+                        doc = _apply_fields(doc or {}, data)
+                self._docs[key] = doc
+            missing = rest
+
+    def get(self, collection: str, doc_id: str) -> Optional[dict]:
+        """Return the document as this request currently sees it, or None."""
+        key = (collection, doc_id)
+        self.load(key)
+        doc = self._docs[key]
+        return dict(doc) if doc is not None else None
+
+    # --- Writes ---
+
+    def set(self, collection: str, doc_id: str, data: dict, merge: bool = False) -> None:
+        key = (collection, doc_id)
+        self._writes.append(("set", self.ref(collection, doc_id), data, merge))
+        if merge and key not in self._docs:
+            self._unloaded.setdefault(key, []).append((data, False))
+            return
+        base = (self._docs[key] or {}) if merge else {}
+        self._unloaded.pop(key, None)
+        self._docs[key] = _apply_fields(base, data)
+
+    def create(self, collection: str, data: dict, doc_id: Optional[str] = None):
+        """Stage a new document (auto-id unless *doc_id* is given); returns its reference.
+
+        The commit fails with AlreadyExists if the document exists.
+        """
+        ref = self.ref(collection, doc_id) if doc_id else self.new_ref(collection)
+        self._writes.append(("create", ref, data, False))
+        self._docs[(collection, ref.id)] = _apply_fields({}, data)
+        return ref
+
+    def update(self, collection: str, doc_id: str, data: dict) -> None:
+        key = (collection, doc_id)
+        self._writes.append(("update", self.ref(collection, doc_id), data, False))
+        if key not in self._docs:
+            self._unloaded.setdefault(key, []).append((data, True))
+        elif self._docs[key] is not None:
+            self._docs[key] = _apply_fields(self._docs[key], data)
+
+    def update_ref(self, ref, data: dict) -> None:
+        """Stage an update on a reference obtained elsewhere (e.g. a query result)."""
+        self._writes.append(("update", ref, data, False))
+
+    # --- Commit ---
+
+    def apply(self, writer, *_args) -> None:
+        """Stage every pending write on *writer* (a WriteBatch or Transaction)."""
+        for op, ref, data, merge in self._writes:
+            if op == "update":
+                writer.update(ref, data)
+            elif op == "create":
+                writer.create(ref, data)
+            elif merge:
+                writer.set(ref, data, merge=True)
+            else:
+                writer.set(ref, data)
+
+    def commit(self) -> None:
+        """Write everything in one batch."""
+        if not self._writes:
+            return
+        batch = self._db.batch()
+        self.apply(batch)
+        batch.commit()
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+
+def _apply_fields(base: dict, data: dict) -> dict:
+    """Merge *data* into a copy of *base*, resolving Increment transforms."""
+    doc = dict(base)
+    for field, value in data.items():
+        if isinstance(value, Increment):
+            doc[field] = (doc.get(field) or 0) + value.value
+        else:
+            doc[field] = value
+    return doc
@@ -0,0 +1,321 @@
+"""Columnar analytics over one merchant's visits.
+
+``VisitFrame`` holds a merchant's ``consumer_visits`` as NumPy columns:
+consumer index, offer index and timestamp (integer microseconds since the
+epoch, so day arithmetic is exact), one row per visit in stream order. The
+analytics endpoints, weekly reports and cohort rebuilds compute from it with
+sorting, ``searchsorted`` and ``bincount`` instead of per-consumer Python
+loops; e.g. "did this customer come back within 14 days" is one
+``searchsorted`` over all visits sorted by (consumer, time) rather than a
+scan of every later visit.
+
+Build one with ``load_visits(db, merchant_id)`` or ``VisitFrame.from_dicts``.
+Rows without a consumer are ignored; rows without a timestamp only count
+towards per-consumer visit totals (LTV), as before. ``merchant_visits``
+memoises the frame inside a ``visit_snapshots()`` block, so a request or a
+report run that needs the same merchant's visits several times streams them
+once.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+
+import numpy as np
+
+from .db import CONSUMER_VISITS
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_US = timedelta(microseconds=1)
+DAY_US = 86_400_000_000
+# 1970-01-01 was a Thursday: the Monday-based week of day d is (d + 3) // 7.
+_MONDAY_OFFSET_DAYS = 3
+
+# The only visit fields the analytics read
+VISIT_FIELDS = ["consumer_id", "offer_id", "timestamp"]
+
+
+def _to_us(ts: datetime) -> int:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return (ts - EPOCH) // _US
+
+
+def _from_us(us: int) -> datetime:
+    return EPOCH + timedelta(microseconds=int(us))
+
+
+def _week_index(ts_us: np.ndarray) -> np.ndarray:
+    """Monday-based week number of each timestamp."""
+    return (ts_us // DAY_US + _MONDAY_OFFSET_DAYS) // 7
+
+
+class VisitFrame:
+    """A merchant's visits as columns: ``consumer``, ``offer`` (indexes, -1 if absent) and ``ts``."""
+
+    def __init__(self, consumer_ids: list[str], offer_ids: list[str], consumer: np.ndarray,
+                 offer: np.ndarray, ts: np.ndarray, has_ts: np.ndarray):
+        self.consumer_ids = consumer_ids
+        self.offer_ids = offer_ids
+        self.consumer = consumer
+        self.offer = offer
+        self.ts = ts
+        self.has_ts = has_ts
+
+    @classmethod
+    def from_dicts(cls, rows: Iterable[dict]) -> "VisitFrame":
+        """Build from visit dicts (``consumer_id``, ``offer_id``, ``timestamp``), keeping their order."""
+        consumer_index: dict[str, int] = {}
+        offer_index: dict[str, int] = {}
+        consumer, offer, ts, has_ts = [], [], [], []
+        for row in rows:
+            cid = row.get("consumer_id")
+            if not cid:
+                continue
+            oid = row.get("offer_id")
+            when = row.get("timestamp")
+            consumer.append(consumer_index.setdefault(cid, len(consumer_index)))
+            offer.append(offer_index.setdefault(oid, len(offer_index)) if oid else -1)
+            ts.append(_to_us(when) if when else 0)
+            has_ts.append(bool(when))
+        return cls(
+            list(consumer_index),
+            list(offer_index),
+            np.array(consumer, dtype=np.int64),
+            np.array(offer, dtype=np.int64),
+            np.array(ts, dtype=np.int64),
+            np.array(has_ts, dtype=bool),
+        )
+
+    def __len__(self) -> int:
+        return len(self.consumer)
+
+    @property
+    def consumer_count(self) -> int:
+        return len(self.consumer_ids)
+
+    def _timed(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(row indexes, consumer, ts) of rows with a timestamp."""
+        rows = np.nonzero(self.has_ts)[0]
+        return rows, self.consumer[rows], self.ts[rows]
+
+    # --- Per-consumer totals ---
+
+    def visit_counts(self, timed_only: bool = False) -> np.ndarray:
+        """Visits per consumer index."""
+        consumer = self.consumer[self.has_ts] if timed_only else self.consumer
+        return np.bincount(consumer, minlength=self.consumer_count)
+
+    def last_visits(self) -> np.ndarray:
+        """Latest timestamp per consumer index (int64 us; minimum int64 if none)."""
+        _, consumer, ts = self._timed()
+        last = np.full(self.consumer_count, np.iinfo(np.int64).min, dtype=np.int64)
+        np.maximum.at(last, consumer, ts)
+        return last
+
+    def ltv_histogram(self, edges: list[float], avg_ticket: float) -> list[int]:
+        """Customers per LTV bucket ``[edges[i], edges[i + 1])``; LTV is visits x *avg_ticket*."""
+        counts = self.visit_counts()
+        ltv = counts[counts > 0] * avg_ticket
+        bucket = np.searchsorted(np.asarray(edges, dtype=float), ltv, side="right") - 1
+        bucket = bucket[(bucket >= 0) & (bucket < len(edges) - 1)]
+        return np.bincount(bucket, minlength=len(edges) - 1).tolist()
+
+    def segments(self, now: datetime) -> dict[str, int]:
+        """Customers by recency segment (new / returning / vip / at_risk / lost)."""
+        counts = self.visit_counts(timed_only=True)
+        present = counts > 0
+        count = counts[present]
+        days = (_to_us(now) - self.last_visits()[present]) // DAY_US
+
+        new = (count == 1) & (days <= 14)
+        lost = ~new & (days > 30)
+        at_risk = ~new & ~lost & (days > 14)
+        vip = ~new & ~lost & ~at_risk & (count >= 5)
+        returning = ~new & ~lost & ~at_risk & ~vip
+        return {
+            "new": int(new.sum()),
+            "returning": int(returning.sum()),
+            "vip": int(vip.sum()),
+            "at_risk": int(at_risk.sum()),
+            "lost": int(lost.sum()),
+        }
+
+    # --- Return rates ---
+
+    def _next_visit_after(self, consumer: np.ndarray, ts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """(found, next ts) of each (consumer, ts) query's next visit by that consumer strictly after ts.
+
+        Query timestamps must be timestamps of visits in the frame.
+        """
+        _, all_consumer, all_ts = self._timed()
+        order = np.lexsort((all_ts, all_consumer))
+        sorted_consumer, sorted_ts = all_consumer[order], all_ts[order]
+        # Dense time ranks keep (consumer, time) in one int64 sort key.
+        times = np.unique(sorted_ts)
+        span = len(times)
+        keys = sorted_consumer * span + np.searchsorted(times, sorted_ts)
+        query = consumer * span + np.searchsorted(times, ts)
+        pos = np.searchsorted(keys, query, side="right")
+        found = pos < len(keys)
+        pos = np.minimum(pos, len(keys) - 1)
+        found &= sorted_consumer[pos] == consumer
+        return found, sorted_ts[pos]
+
+    def offer_returns(self, windows: tuple[int, ...] = (14, 30)) -> dict[str, dict]:
+        """Per offer ID: ``redemptions``, ``unique_customers`` and ``returned`` {days: customers}.
+
+        A customer counts as returned within N days when their next visit to
+        the merchant (any offer) after their first visit on the offer (in
+        stream order) is at most N whole days later.
+        """
+        rows = np.nonzero(self.has_ts & (self.offer >= 0))[0]
+        offer, consumer, ts = self.offer[rows], self.consumer[rows], self.ts[rows]
+        n_offers = len(self.offer_ids)
+        redemptions = np.bincount(offer, minlength=n_offers)
+
+        _, first = np.unique(offer * max(self.consumer_count, 1) + consumer, return_index=True)
+        first_offer, first_consumer, first_ts = offer[first], consumer[first], ts[first]
+        unique = np.bincount(first_offer, minlength=n_offers)
+
+        result = {
+            oid: {"redemptions": int(redemptions[i]), "unique_customers": int(unique[i]), "returned": {}}
+            for i, oid in enumerate(self.offer_ids)
+        }
+        if len(first):
+            found, following = self._next_visit_after(first_consumer, first_ts)
+            days = np.where(found, (following - first_ts) // DAY_US, np.iinfo(np.int64).max)
+        else:
+            days = np.zeros(0, dtype=np.int64)
+        for window in windows:
+            returned = np.bincount(first_offer[days <= window], minlength=n_offers)
+            for i, oid in enumerate(self.offer_ids):
+                result[oid]["returned"][window] = int(returned[i])
+        return result
+
+    # --- Cohorts ---
+
+    def cohorts(self, retention_weeks: int) -> dict[datetime, dict]:
+        """Cohort counts by cohort week (Monday 00:00 UTC) of each customer's first visit.
+
+        ``new_customers`` and ``returned_1`` .. ``returned_N``: how many of the
+        cohort visited in week N after it (each customer once per week).
+        """
+        _, consumer, ts = self._timed()
+        if not len(ts):
+            return {}
+        first = np.full(self.consumer_count, np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(first, consumer, ts)
+        present = np.nonzero(first != np.iinfo(np.int64).max)[0]
+        cohort_week = _week_index(first)
+
+        weeks, cohort_of = np.unique(cohort_week[present], return_inverse=True)
+        column = np.full(self.consumer_count, -1, dtype=np.int64)
+        column[present] = cohort_of
+        new = np.bincount(cohort_of, minlength=len(weeks))
+
+        offset = _week_index(ts) - cohort_week[consumer]
+        in_window = (offset >= 1) & (offset <= retention_weeks)
+        # Each customer once per week: unique (consumer, offset) pairs
+        pairs = np.unique(consumer[in_window] * (retention_weeks + 1) + offset[in_window])
+        pair_consumer, pair_offset = pairs // (retention_weeks + 1), pairs % (retention_weeks + 1)
+        returned = np.zeros((len(weeks), retention_weeks + 1), dtype=np.int64)
+        np.add.at(returned, (column[pair_consumer], pair_offset), 1)
+
+        result = {}
+        for i, week in enumerate(weeks):
+            start = _from_us((int(week) * 7 - _MONDAY_OFFSET_DAYS) * DAY_US)
+            result[start] = {
+                "new_customers": int(new[i]),
+                **{f"returned_{n}": int(returned[i, n]) for n in range(1, retention_weeks + 1)},
+            }
+        return result
+
+    # --- Daily rollup ---
+
+    def daily_customers(self) -> dict[datetime, dict]:
+        """Visit and customer counts by UTC day, as the redemption commit records them.
+
+        ``new_customers``: first visit ever. ``returning_customers``: first
+        visit of the day by a customer seen on an earlier day.
+        ``week_returning_customers``: first visit of the (Monday-based) week
+        by a customer seen in an earlier week.
+        """
+        _, consumer, ts = self._timed()
+        if not len(ts):
+            return {}
+        order = np.lexsort((ts, consumer))
+        consumer, ts = consumer[order], ts[order]
+        day = ts // DAY_US
+        week = _week_index(ts)
+
+        first_ever = np.ones(len(ts), dtype=bool)
+        first_ever[1:] = consumer[1:] != consumer[:-1]
+        new_day = first_ever.copy()
+        new_day[1:] |= day[1:] != day[:-1]
+        new_week = first_ever.copy()
+        new_week[1:] |= week[1:] != week[:-1]
+
+        days, column = np.unique(day, return_inverse=True)
+        counts = {
+            "visits": np.bincount(column, minlength=len(days)),
+            "new_customers": np.bincount(column, weights=first_ever, minlength=len(days)),
+            "returning_customers": np.bincount(column, weights=new_day & ~first_ever, minlength=len(days)),
+            "week_returning_customers": np.bincount(column, weights=new_week & ~first_ever, minlength=len(days)),
+        }
+        return {
+            _from_us(int(d) * DAY_US): {name: int(values[i]) for name, values in counts.items()}
+            for i, d in enumerate(days)
+        }
+
+
+def load_visits(db, merchant_id: str, start: Optional[datetime] = None,
+                end: Optional[datetime] = None) -> VisitFrame:
+    """Stream a merchant's visits into a VisitFrame, fetching only the fields it uses.
+
+    *start* / *end* bound the visit timestamps (``[start, end)``) in the
+    query itself; a bounded frame leaves out visits without a timestamp.
+    """
+    query = db.collection(CONSUMER_VISITS).where("merchant_id", "==", merchant_id)
+    if start is not None:
+        query = query.where("timestamp", ">=", start)
+    if end is not None:
+        query = query.where("timestamp", "<", end)
+    return VisitFrame.from_dicts(doc.to_dict() for doc in query.select(VISIT_FIELDS).stream())
+
+
+# ---------------------------------------------------------------------------
+# Shared snapshots
+# ---------------------------------------------------------------------------
+
+_snapshots: ContextVar[Optional[dict[tuple, VisitFrame]]] = ContextVar("visit_snapshots", default=None)
+
+
+@contextmanager
+def visit_snapshots():
+    """Share one VisitFrame per merchant across everything ``merchant_visits`` serves in this block.
+
+    Wrap a request or one unit of a batch job. Nested blocks share the
+    outermost block's snapshots.
+    """
+    if _snapshots.get() is not None:
+        yield
+        return
+    token = _snapshots.set({})
+    try:
+        yield
+    finally:
+        _snapshots.reset(token)
+
+
+def merchant_visits(db, merchant_id: str, start: Optional[datetime] = None,
+                    end: Optional[datetime] = None) -> VisitFrame:
+    """The merchant's visits in ``[start, end)``: loaded once per ``visit_snapshots`` block, or fresh outside one."""
+    memo = _snapshots.get()
+    if memo is None:
+        return load_visits(db, merchant_id, start, end)
+    key = (merchant_id, start, end)
+    if key not in memo:
+        memo[key] = load_visits(db, merchant_id, start, end)
+    return memo[key]
@@ -0,0 +1,98 @@
+"""Per consumer x merchant visit stats.
+
+One document per (consumer, merchant) pair in ``consumer_merchant_stats``,
+keyed ``{consumer_id}_{merchant_id}`` like loyalty progress, holding
+``visit_count``, ``first_visit`` and ``last_visit``. It is updated in the
+redemption commit, so reading a customer's visit history summary costs one
+document read instead of streaming every visit they ever made.
+"""
+
+from datetime import datetime
+from typing import Optional
+
+from google.cloud.firestore_v1 import Increment
+
+from .db import CONSUMER_MERCHANT_STATS, CONSUMER_VISITS
+
+# Firestore caps a WriteBatch at 500 writes.
+_BATCH_LIMIT = 400
+
+
+def stats_id(consumer_id: str, merchant_id: str) -> str:
+    return f"{consumer_id}_{merchant_id}"
+
+
+def stats_ref(db, consumer_id: str, merchant_id: str):
+    return db.collection(CONSUMER_MERCHANT_STATS).document(stats_id(consumer_id, merchant_id))
+
+
+def stats_from_snapshot(snap) -> Optional[dict]:
+    """Stats dict from a snapshot, or None for a first-time customer."""
+    if snap is None or not snap.exists:
+        return None
+    return snap.to_dict() or {}
+
+
+def record_visit(writer, ref, stats: Optional[dict], consumer_id: str, merchant_id: str, when: datetime) -> int:
+    """Stage a visit on the stats doc and return the new visit number.
+
+    ``stats`` must come from a read inside the same transaction as *writer*
+    for the returned visit number and the visit bounds to be exact;
+    ``visit_count`` itself is an Increment and stays correct either way.
+    ``first_visit`` and ``last_visit`` only ever widen, so a scan replayed
+    with an older time cannot move ``last_visit`` backwards.
+    """
+    stats = stats or {}
+    first_visit = stats.get("first_visit")
+    last_visit = stats.get("last_visit")
+    writer.set(ref, {
+        "consumer_id": consumer_id,
+        "merchant_id": merchant_id,
+        "visit_count": Increment(1),
+        "first_visit": when if first_visit is None else min(first_visit, when),
+        "last_visit": when if last_visit is None else max(last_visit, when),
+    }, merge=True)
+    return stats.get("visit_count", 0) + 1
+
+
+def get_visit_stats(db, consumer_id: str, merchant_id: str) -> Optional[dict]:
+    """Return the stats for one consumer at one merchant, or None if they never visited."""
+    return stats_from_snapshot(stats_ref(db, consumer_id, merchant_id).get())
+
+
+def rebuild_visit_stats(db) -> int:
+    """Recompute every stats doc from ``consumer_visits``. Returns docs written.
+
+    Backfill / repair job. Visits that land while it runs can be overwritten
+    for their pair, so run it off-peak.
+    """
+    totals: dict[tuple[str, str], dict] = {}
+    for doc in db.collection(CONSUMER_VISITS).stream():
+        data = doc.to_dict()
+        consumer_id = data.get("consumer_id")
+        merchant_id = data.get("merchant_id")
+        if not consumer_id or not merchant_id:
+            continue
+        entry = totals.setdefault((consumer_id, merchant_id), {
+            "consumer_id": consumer_id,
+            "merchant_id": merchant_id,
+            "visit_count": 0,
+            "first_visit": None,
+            "last_visit": None,
+        })
+        entry["visit_count"] += 1
+        ts = data.get("timestamp")
+        if ts is not None:
+            if entry["first_visit"] is None or ts < entry["first_visit"]:
+                entry["first_visit"] = ts
+            if entry["last_visit"] is None or ts > entry["last_visit"]:
+                entry["last_visit"] = ts
+
+    items = list(totals.items())
+    for i in range(0, len(items), _BATCH_LIMIT):
+        batch = db.batch()
+        for (consumer_id, merchant_id), entry in items[i : i + _BATCH_LIMIT]:
+            batch.set(stats_ref(db, consumer_id, merchant_id), entry)
+        batch.commit()
+
+    return len(items)
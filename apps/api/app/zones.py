@@ -1,11 +1,14 @@
 """Zone / Neighborhood endpoints — all public (no auth required)."""
 
+import hashlib
 import math
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
 
-from .db import get_db, ZONES, MERCHANTS, OFFERS, REDEMPTIONS
+from .catalog import catalog
+from .counters import get_redemption_totals
+from .db import get_db, ZONES, MERCHANTS, OFFERS
 from .models import (
     Zone,
     ZoneCenter,
@@ -53,6 +56,32 @@ def find_zone_for_location(lat: float, lng: float) -> str | None:
     return None
 
 
+def _zone_merchants(db, zone_id: str) -> list[tuple[str, dict]]:
+    """(merchant_id, data) of the zone's active merchants, from the live catalog when synced."""
+    if catalog.is_synced(MERCHANTS):
+        return catalog.active_merchants_in_zone(zone_id)
+    docs = (
+        db.collection(MERCHANTS)
+        .where("zone_id", "==", zone_id)
+        .where("status", "==", "active")
+        .stream()
+    )
+    return [(doc.id, doc.to_dict()) for doc in docs]
+
+
+def _merchant_active_offers(db, merchant_id: str) -> list[tuple[str, dict]]:
+    """(offer_id, data) of the merchant's active offers, from the live catalog when synced."""
+    if catalog.is_synced(OFFERS):
+        return catalog.offers(merchant_id, active_only=True)
+    docs = (
+        db.collection(OFFERS)
+        .where("merchant_id", "==", merchant_id)
+        .where("status", "==", OfferStatus.active.value)
+        .stream()
+    )
+    return [(doc.id, doc.to_dict()) for doc in docs]
+
+
 def _get_zone_merchants_and_deals(zone_id: str):
     """Fetch merchants in a zone and their active deals with redemption counts.
 
@@ -61,56 +90,40 @@ def _get_zone_merchants_and_deals(zone_id: str):
     db = get_db()
 
     # Find merchants assigned to this zone
-    merchant_docs = list(
-        db.collection(MERCHANTS)
-        .where("zone_id", "==", zone_id)
-        .where("status", "==", "active")
-        .stream()
+    merchant_rows = _zone_merchants(db, zone_id)
+
+    offers_by_merchant = {m_id: _merchant_active_offers(db, m_id) for m_id, _ in merchant_rows}
+
+    # All-time redemption counts from the sharded totals, in one round trip
+    redemption_counts = get_redemption_totals(
+        db, [o_id for offers in offers_by_merchant.values() for o_id, _ in offers],
     )
 
     merchants: list[ZoneMerchantSummary] = []
     total_deals = 0
 
-    for m_doc in merchant_docs:
-        m_data = m_doc.to_dict()
+    for m_id, m_data in merchant_rows:
         merchant_name = m_data.get("name", "Local Business")
 
-        # Get active offers for this merchant
-        offer_docs = list(
-            db.collection(OFFERS)
-            .where("merchant_id", "==", m_doc.id)
-            .where("status", "==", OfferStatus.active.value)
-            .stream()
-        )
-
         deals: list[ZoneDeal] = []
-        for o_doc in offer_docs:
-            o_data = o_doc.to_dict()
-
-            # Count total redemptions for this offer
-            redemption_count = len(list(
-                db.collection(REDEMPTIONS)
-                .where("offer_id", "==", o_doc.id)
-                .stream()
-            ))
-
+        for o_id, o_data in offers_by_merchant[m_id]:
             deals.append(ZoneDeal(
-                offer_id=o_doc.id,
+                offer_id=o_id,
                 offer_name=o_data.get("name", ""),
                 merchant_name=merchant_name,
                 discount_text=o_data.get("discount_text", ""),
-                redemption_count=redemption_count,
+                redemption_count=redemption_counts.get(o_id, 0),
                 terms=o_data.get("terms"),
             ))
 
         total_deals += len(deals)
         merchants.append(ZoneMerchantSummary(
-            merchant_id=m_doc.id,
+            merchant_id=m_id,
             merchant_name=merchant_name,
             active_deals=deals,
         ))
 
-    return merchants, len(merchant_docs), total_deals
+    return merchants, len(merchant_rows), total_deals
 
 
 # ---------------------------------------------------------------------------
@@ -118,10 +131,22 @@ def _get_zone_merchants_and_deals(zone_id: str):
 # ---------------------------------------------------------------------------
 
 @router.get("", response_model=list[Zone])
-async def list_zones():
-    """List all active zones with merchant and deal counts. Public — no auth."""
+def list_zones(request: Request, response: Response):
+    """List all active zones with merchant and deal counts. Public — no auth.
+
+    While the live catalog is synced the response carries an ETag derived
+    from the catalog version and the zone documents, and a matching
+    If-None-Match gets a 304.
+    """
     db = get_db()
-    docs = db.collection(ZONES).where("status", "==", "active").stream()
+    docs = list(db.collection(ZONES).where("status", "==", "active").stream())
+
+    if catalog.ready:
+        digest = hashlib.sha1(repr([(doc.id, doc.to_dict()) for doc in docs]).encode()).hexdigest()[:16]
+        etag = f'W/"{catalog.version}-{digest}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
 
     zones: list[Zone] = []
     for doc in docs:
@@ -129,22 +154,12 @@ async def list_zones():
         center = data.get("center", {})
 
         # Count merchants & deals dynamically
-        merchant_docs = list(
-            db.collection(MERCHANTS)
-            .where("zone_id", "==", doc.id)
-            .where("status", "==", "active")
-            .stream()
-        )
-        merchant_count = len(merchant_docs)
+        merchant_rows = _zone_merchants(db, doc.id)
+        merchant_count = len(merchant_rows)
 
         deal_count = 0
-        for m_doc in merchant_docs:
-            offer_q = (
-                db.collection(OFFERS)
-                .where("merchant_id", "==", m_doc.id)
-                .where("status", "==", OfferStatus.active.value)
-            )
-            deal_count += len(list(offer_q.stream()))
+        for m_id, _ in merchant_rows:
+            deal_count += len(_merchant_active_offers(db, m_id))
 
         zones.append(Zone(
             id=doc.id,
@@ -162,7 +177,7 @@ async def list_zones():
 
 
 @router.get("/{slug}", response_model=ZoneDetail)
-async def get_zone_detail(slug: str):
+def get_zone_detail(slug: str):
     """Zone detail with merchants and their active deals. Public — no auth."""
     db = get_db()
 
@@ -194,7 +209,7 @@ async def get_zone_detail(slug: str):
 
 
 @router.get("/{slug}/deals", response_model=list[ZoneDeal])
-async def list_zone_deals(slug: str):
+def list_zone_deals(slug: str):
     """All active deals in a zone, sorted by popularity (redemption count). Public."""
     db = get_db()
 
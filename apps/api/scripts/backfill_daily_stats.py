@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""Backfill merchant_daily_stats from redemptions, ledger, visits and rewards.
+
+Run once after deploying the daily rollup (and any time it needs repairing),
+preferably off-peak. Pass a merchant ID to rebuild one merchant only:
+
+    GOOGLE_APPLICATION_CREDENTIALS=/path/to/service-account.json python scripts/backfill_daily_stats.py [merchant_id]
+"""
+
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.daily_stats import rebuild_daily_stats
+from app.db import get_db
+
+
+def main():
+    merchant_id = sys.argv[1] if len(sys.argv) > 1 else None
+    written = rebuild_daily_stats(get_db(), merchant_id)
+    print(f"Wrote {written} merchant daily stats days")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""Backfill offer_redemption_totals from redemptions.
+
+Run once after deploying the all-time redemption totals (and any time they
+need repairing), preferably off-peak. Pass an offer ID to rebuild one offer
+only:
+
+    GOOGLE_APPLICATION_CREDENTIALS=/path/to/service-account.json python scripts/backfill_redemption_totals.py [offer_id]
+"""
+
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.counters import rebuild_redemption_totals
+from app.db import get_db
+
+
+def main():
+    offer_id = sys.argv[1] if len(sys.argv) > 1 else None
+    written = rebuild_redemption_totals(get_db(), offer_id)
+    print(f"Wrote redemption totals for {written} offers")
+
+
+if __name__ == "__main__":
+    main()
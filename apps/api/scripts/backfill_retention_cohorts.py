@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""Backfill retention_cohorts from consumer_visits.
+
+Run once after deploying the materialized retention cohorts (and any time
+they need repairing), preferably off-peak. Pass a merchant ID to rebuild one
+merchant only:
+
+    GOOGLE_APPLICATION_CREDENTIALS=/path/to/service-account.json python scripts/backfill_retention_cohorts.py [merchant_id]
+"""
+
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.cohorts import rebuild_cohorts
+from app.db import get_db
+
+
+def main():
+    merchant_id = sys.argv[1] if len(sys.argv) > 1 else None
+    written = rebuild_cohorts(get_db(), merchant_id)
+    print(f"Wrote {written} retention cohort docs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""Backfill the short_codes index from redemption_tokens.
+
+Run once after deploying the short-code index. Lookups fall back to querying
+tokens for codes that are not indexed yet, so this only saves those reads:
+
+    GOOGLE_APPLICATION_CREDENTIALS=/path/to/service-account.json python scripts/backfill_short_codes.py
+"""
+
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import get_db
+from app.tokens import backfill_short_codes
+
+
+def main():
+    indexed, duplicates = backfill_short_codes(get_db())
+    print(f"Indexed {indexed} short codes")
+    if duplicates:
+        print(f"Codes shared by several tokens (oldest token kept): {', '.join(sorted(set(duplicates)))}")
+
+
+if __name__ == "__main__":
+    main()
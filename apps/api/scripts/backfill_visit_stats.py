@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""Backfill consumer_merchant_stats from consumer_visits.
+
+Run once after deploying the visit stats change (and any time the stats need
+repairing), preferably off-peak:
+
+    GOOGLE_APPLICATION_CREDENTIALS=/path/to/service-account.json python scripts/backfill_visit_stats.py
+"""
+
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import get_db
+from app.visit_stats import rebuild_visit_stats
+
+
+def main():
+    written = rebuild_visit_stats(get_db())
+    print(f"Wrote visit stats for {written} consumer/merchant pairs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Benchmark concurrent request handling against a slow Firestore.
+
+Serves the public offer endpoint (four Firestore round trips when cold) in-process
+against the in-memory Firestore (app/memory_db.py) sleeping ``--latency-ms``
+per RPC, and compares:
+
+- ``threadpool``: the real route, a sync handler run on the worker pool.
+- ``event-loop``: the same handler called from an ``async def`` route, i.e.
+  blocking the event loop the way every route did before app/dal.py.
+
+    python scripts/bench_concurrency.py [--requests 200] [--concurrency 50] [--latency-ms 20]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from app.dal import configure_thread_pool
+from app.main import app, get_public_offer_by_token
+from app.memory_db import MemoryFirestore
+
+TOKEN_ID = "00000000-0000-4000-8000-000000000001"
+
+
+def _seeded_db(latency: float) -> MemoryFirestore:
+    now = datetime.now(timezone.utc)
+    db = MemoryFirestore(latency=latency)
+    db.seed("redemption_tokens", {TOKEN_ID: {
+        "offer_id": "offer-1",
+        "short_code": "BENCH2",
+        "status": "active",
+        "expires_at": now + timedelta(days=30),
+        "is_universal": True,
+    }})
+    db.seed("offers", {"offer-1": {
+        "merchant_id": "merchant-1",
+        "name": "Bench Latte",
+        "discount_text": "$2 off",
+        "cap_daily": 1000,
+        "status": "active",
+    }})
+    db.seed("merchants", {"merchant-1": {"name": "Bench Cafe"}})
+    return db
+
+
+async def _blocking_public_offer(token_id_or_code: str):
+    return get_public_offer_by_token(token_id_or_code)
+
+
+app.add_api_route("/bench/event-loop/{token_id_or_code}", _blocking_public_offer, methods=["GET"])
+
+
+async def _run(path: str, total: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def _one():
+            async with semaphore:
+                resp = await client.get(path)
+                resp.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(_one() for _ in range(total)))
+        return time.perf_counter() - start
+
+
+async def _main(args) -> None:
+    logging.getLogger("boost").setLevel(logging.WARNING)  # no per-request logs
+    configure_thread_pool()
+    db = _seeded_db(args.latency_ms / 1000)
+    with patch("app.main.get_db", return_value=db), patch("app.tokens.get_db", return_value=db):
+        for label, path in (
+            ("event-loop", f"/bench/event-loop/{TOKEN_ID}"),
+            ("threadpool", f"/public/offers/{TOKEN_ID}"),
+        ):
+            elapsed = await _run(path, args.requests, args.concurrency)
+            print(f"{label:>10}: {args.requests} requests in {elapsed:.2f}s ({args.requests / elapsed:.0f} req/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""Copy universal-token "last used" activity onto the token documents.
+
+Run on a schedule (e.g. Cloud Scheduler every 5 minutes). The lookback should
+comfortably exceed the schedule interval so a skipped run loses nothing:
+
+    python scripts/coalesce_token_activity.py [--lookback-minutes 60]
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import get_db
+from app.token_activity import coalesce_token_activity
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lookback-minutes", type=int, default=60, help="activity window to coalesce")
+    args = parser.parse_args()
+
+    since = datetime.now(timezone.utc) - timedelta(minutes=args.lookback_minutes)
+    updated = coalesce_token_activity(get_db(), since)
+    print(f"Updated last use on {updated} tokens")
+
+
+if __name__ == "__main__":
+    main()
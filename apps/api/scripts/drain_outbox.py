@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Drain the outbox of post-request side effects.
+
+Run on a schedule (e.g. Cloud Scheduler triggering a Cloud Run job every
+minute) so events are processed even when no API instance is running its
+in-process worker:
+
+    python scripts/drain_outbox.py [--limit 200] [--max-batches 10]
+"""
+
+import argparse
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app.automations  # noqa: F401  (registers outbox handlers)
+from app.db import get_db
+from app.outbox import DONE, FAILED, PENDING, drain_outbox
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--limit", type=int, default=200, help="events per batch")
+    parser.add_argument("--max-batches", type=int, default=10, help="stop after this many batches")
+    args = parser.parse_args()
+
+    db = get_db()
+    totals = {DONE: 0, PENDING: 0, FAILED: 0, "skipped": 0}
+    for _ in range(args.max_batches):
+        counts = drain_outbox(db, limit=args.limit)
+        for status, n in counts.items():
+            totals[status] += n
+        if sum(counts.values()) < args.limit:
+            break
+
+    print(
+        f"Outbox drained: {totals[DONE]} done, {totals[PENDING]} retrying, "
+        f"{totals[FAILED]} failed, {totals['skipped']} skipped"
+    )
+    return 1 if totals[FAILED] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,7 +5,10 @@ from unittest.mock import MagicMock, patch
 
 import pytest
 from fastapi.testclient import TestClient
+from google.api_core.exceptions import AlreadyExists
+from google.cloud.firestore_v1.watch import ChangeType
 
+from apps.api.app.cache import clear_caches
 from apps.api.app.deps import get_current_user
 from apps.api.app.main import app
 
@@ -61,6 +64,7 @@ class FakeDocRef:
         self.id = doc_id
         self._snapshot = snapshot or FakeDocSnapshot(doc_id, exists=False)
         self.set = MagicMock()
+        self.create = MagicMock()
         self.update = MagicMock()
         self.delete = MagicMock()
 
@@ -69,7 +73,7 @@ class FakeDocRef:
 
 
 class FakeQuery:
-    """Mimics a Firestore query with chaining (where / offset / limit / order_by / stream)."""
+    """Mimics a Firestore query with chaining (where / offset / limit / order_by / select / stream)."""
 
     def __init__(self, docs: list[FakeDocSnapshot] | None = None):
         self._docs = docs or []
@@ -86,6 +90,9 @@ class FakeQuery:
     def order_by(self, field, **kwargs):
         return self
 
+    def select(self, field_paths):
+        return self
+
     def stream(self):
         return iter(self._docs)
 
@@ -118,10 +125,160 @@ class FakeCollection:
     def order_by(self, field, **kwargs):
         return FakeQuery(self._docs)
 
+    def select(self, field_paths):
+        return FakeQuery(self._docs)
+
     def stream(self):
         return iter(self._docs)
 
 
+class FakeWriteBatch:
+    """Mimics a Firestore WriteBatch; replays staged writes onto the refs at commit."""
+
+    def __init__(self):
+        self._writes: list[tuple] = []
+
+    def set(self, ref, data, merge=False):
+        self._writes.append(("set", ref, data, merge))
+
+    def create(self, ref, data):
+        self._writes.append(("create", ref, data, False))
+
+    def update(self, ref, data):
+        self._writes.append(("update", ref, data, False))
+
+    def delete(self, ref):
+        self._writes.append(("delete", ref, None, False))
+
+    def commit(self):
+        # Like Firestore, a create() on an existing doc fails the whole commit.
+        for op, ref, _data, _merge in self._writes:
+            if op == "create" and ref.get().exists:
+                self._writes = []
+                raise AlreadyExists(f"Document already exists: {ref.id}")
+        for op, ref, data, merge in self._writes:
+            if op in ("set", "create"):
+                if merge:
+                    ref.set(data, merge=True)
+                else:
+                    ref.set(data)
+            elif op == "update":
+                ref.update(data)
+            else:
+                ref.delete()
+        writes, self._writes = self._writes, []
+        return writes
+
+
+class FakeTransaction(FakeWriteBatch):
+    """Mimics a Firestore Transaction well enough for ``firestore.transactional``."""
+
+    _max_attempts = 1
+    _read_only = False
+    _id = b"fake-transaction"
+
+    def _clean_up(self):
+        self._writes = []
+
+    def _begin(self, retry_id=None):
+        pass
+
+    def _commit(self):
+        return self.commit()
+
+    def _rollback(self):
+        self._writes = []
+
+
+def fake_get_all(refs, field_paths=None, transaction=None):
+    """Mimics ``db.get_all`` by resolving each reference individually."""
+    return [ref.get() for ref in refs]
+
+
+class FakeChange:
+    """Mimics a Firestore watch DocumentChange."""
+
+    def __init__(self, change_type: ChangeType, document: FakeDocSnapshot):
+        self.type = change_type
+        self.document = document
+
+
+class FakeWatch:
+    """Mimics the Watch handle returned by ``on_snapshot``."""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.is_active = True
+
+    def unsubscribe(self):
+        self.is_active = False
+
+
+class FakeSnapshotFeed:
+    """Mimics ``collection.on_snapshot`` and replays snapshot events to listeners.
+
+    A new listener first receives the current documents, all as ADDED, like
+    Firestore's initial snapshot. ``emit`` then pushes a change set to every
+    active listener; ``drop`` stops them as a terminal stream error would.
+    """
+
+    def __init__(self, docs: list[FakeDocSnapshot] | None = None):
+        self._docs = {doc.id: doc for doc in docs or []}
+        self.watches: list[FakeWatch] = []
+
+    def on_snapshot(self, callback):
+        watch = FakeWatch(callback)
+        self.watches.append(watch)
+        docs = list(self._docs.values())
+        callback(docs, [FakeChange(ChangeType.ADDED, doc) for doc in docs], datetime.now(timezone.utc))
+        return watch
+
+    def emit(self, added=(), modified=(), removed=(), read_time: datetime | None = None):
+        changes = []
+        for change_type, docs in ((ChangeType.ADDED, added), (ChangeType.MODIFIED, modified)):
+            for doc in docs:
+                self._docs[doc.id] = doc
+                changes.append(FakeChange(change_type, doc))
+        for doc_id in removed:
+            changes.append(FakeChange(ChangeType.REMOVED, self._docs.pop(doc_id, FakeDocSnapshot(doc_id))))
+        docs = list(self._docs.values())
+        for watch in self.watches:
+            if watch.is_active:
+                watch.callback(docs, changes, read_time or datetime.now(timezone.utc))
+
+    def drop(self):
+        for watch in self.watches:
+            watch.is_active = False
+
+
+def build_feed_db(feeds: dict[str, FakeSnapshotFeed]) -> MagicMock:
+    """A mock client whose collections are snapshot feeds (for the live catalog)."""
+    db = MagicMock()
+    db.collection.side_effect = lambda name: feeds.setdefault(name, FakeSnapshotFeed())
+    return db
+
+
+def wire_mock_db(db: MagicMock) -> MagicMock:
+    """Attach get_all / batch / transaction fakes to a MagicMock client."""
+    db.get_all.side_effect = fake_get_all
+    db.batch.side_effect = FakeWriteBatch
+    db.transaction.side_effect = lambda **kwargs: FakeTransaction()
+    return db
+
+
+def counter_shards(offer_id: str, count: int, when: datetime | None = None) -> list[FakeDocSnapshot]:
+    """Daily redemption counter shards holding *count* redemptions for *offer_id*."""
+    day = (when or datetime.now(timezone.utc)).strftime("%Y-%m-%d")
+    return [
+        FakeDocSnapshot(f"{offer_id}_{day}_0", {
+            "offer_id": offer_id,
+            "day": day,
+            "shard": 0,
+            "count": count,
+        })
+    ]
+
+
 def build_mock_db(collections: dict[str, FakeCollection] | None = None) -> MagicMock:
     """Build a mock Firestore client.
 
@@ -135,7 +292,7 @@ def build_mock_db(collections: dict[str, FakeCollection] | None = None) -> Magic
 
     db.collection.side_effect = _collection
     db.collections.return_value = []  # used by /health
-    return db
+    return wire_mock_db(db)
 
 
 # ---------------------------------------------------------------------------
@@ -143,6 +300,13 @@ def build_mock_db(collections: dict[str, FakeCollection] | None = None) -> Magic
 # ---------------------------------------------------------------------------
 
 
+@pytest.fixture(autouse=True)
+def _reset_caches():
+    """In-process caches must not leak state between tests."""
+    clear_caches()
+    yield
+
+
 def _make_client_with_user(user_dict):
     """Create a TestClient with a dependency override for auth."""
     app.dependency_overrides[get_current_user] = lambda: user_dict
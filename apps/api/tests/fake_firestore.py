@@ -0,0 +1,41 @@
+"""Counting in-memory Firestore for read-budget tests.
+
+``FakeFirestore`` is the app's in-memory engine (app/memory_db.py): unlike
+the MagicMock-based fakes in conftest, whose queries ignore filters, it
+evaluates queries, transforms, batches and transactions the way Firestore
+does and counts documents the way Firestore bills them, so a test can
+assert how many documents an endpoint touches:
+
+    db = FakeFirestore()
+    db.seed("offers", {"offer-1": {...}})
+    with use_db(db), db.budget(reads=5, writes=3):
+        client.post("/redeem", ...)
+"""
+
+import contextlib
+import sys
+from unittest.mock import patch
+
+from apps.api.app.memory_db import MemoryFirestore
+
+
+class FakeFirestore(MemoryFirestore):
+    """MemoryFirestore with a read/write budget assertion."""
+
+    @contextlib.contextmanager
+    def budget(self, reads: int, writes: int = 0):
+        """Fail if the block reads or writes more documents than allowed."""
+        self.reset_counts()
+        yield self
+        assert self.reads <= reads, f"read {self.reads} documents, budget is {reads}"
+        assert self.writes <= writes, f"wrote {self.writes} documents, budget is {writes}"
+
+
+@contextlib.contextmanager
+def use_db(db):
+    """Point every app module's ``get_db`` at *db*."""
+    with contextlib.ExitStack() as stack:
+        for name, module in list(sys.modules.items()):
+            if name.startswith("apps.api.app.") and hasattr(module, "get_db"):
+                stack.enter_context(patch.object(module, "get_db", return_value=db))
+        yield db
@@ -1,4 +1,4 @@
-"""Tests for the analytics endpoints (retention, deals, LTV)."""
+"""Tests for the analytics endpoints (retention, deals, LTV, time windows)."""
 
 from datetime import datetime, timedelta, timezone
 from unittest.mock import patch
@@ -6,6 +6,7 @@ from unittest.mock import patch
 import pytest
 from fastapi.testclient import TestClient
 
+from apps.api.app.cohorts import rebuild_cohorts, week_start
 from apps.api.app.deps import get_current_user
 from apps.api.app.main import app
 
@@ -18,6 +19,7 @@ from .conftest import (
     FakeQuery,
     build_mock_db,
 )
+from .fake_firestore import FakeFirestore, use_db
 
 MERCHANT_ID = "merchant-001"
 
@@ -68,14 +70,13 @@ def _offer(offer_id: str, name: str, merchant_id: str = MERCHANT_ID, status: str
 
 class TestRetentionEndpoint:
     def _make_client(self, visits, user=STAFF_USER):
-        collections = {
-            "consumer_visits": FakeCollection(docs=visits),
-        }
-        db = build_mock_db(collections)
+        # The endpoint reads the cohort tables; build them from the visits.
+        db = FakeFirestore()
+        db.seed("consumer_visits", {v.id: v.to_dict() for v in visits})
+        rebuild_cohorts(db)
         app.dependency_overrides[get_current_user] = lambda: user
 
-        with patch("apps.api.app.main.get_db", return_value=db), \
-             patch("apps.api.app.analytics.get_db", return_value=db):
+        with use_db(db):
             client = TestClient(app, raise_server_exceptions=False)
             yield client
 
@@ -100,6 +101,42 @@ class TestRetentionEndpoint:
             data = resp.json()
             assert len(data["cohorts"]) >= 1
 
+    def test_return_rates_by_week(self):
+        cohort_week = week_start(_ts(weeks_ago=3)) + timedelta(days=2)  # a Wednesday
+        visits = [
+            _visit("c1", "o1", cohort_week),
+            _visit("c1", "o1", cohort_week + timedelta(weeks=1)),
+            _visit("c1", "o1", cohort_week + timedelta(weeks=1, hours=1)),  # same week, counted once
+            _visit("c2", "o1", cohort_week),
+            _visit("c2", "o1", cohort_week + timedelta(weeks=2)),
+        ]
+        for client in self._make_client(visits):
+            data = client.get(f"/api/v1/merchants/{MERCHANT_ID}/analytics/retention").json()
+            cohort = data["cohorts"][-1]
+            assert cohort["new_customers"] == 2
+            assert cohort["retention_rates"][:2] == [0.5, 0.5]
+
+    def test_weeks_limits_cohorts(self):
+        visits = [_visit(f"c{i}", "o1", _ts(weeks_ago=i)) for i in range(8)]
+        for client in self._make_client(visits):
+            data = client.get(f"/api/v1/merchants/{MERCHANT_ID}/analytics/retention?weeks=3").json()
+            weeks = [c["week_start"] for c in data["cohorts"]]
+            assert len(weeks) == 3
+            assert weeks == sorted(weeks)
+
+    def test_window_limits_cohorts(self):
+        visits = [_visit(f"c{i}", "o1", _ts(weeks_ago=i)) for i in range(8)]
+        start = week_start(_ts(weeks_ago=5)).strftime("%Y-%m-%d")
+        end = week_start(_ts(weeks_ago=2)).strftime("%Y-%m-%d")
+        for client in self._make_client(visits):
+            data = client.get(
+                f"/api/v1/merchants/{MERCHANT_ID}/analytics/retention?start={start}&end={end}"
+            ).json()
+            weeks = [c["week_start"] for c in data["cohorts"]]
+            assert weeks == [
+                week_start(_ts(weeks_ago=n)).strftime("%Y-%m-%d") for n in (5, 4, 3)
+            ]
+
     def test_auth_required(self):
         other_merchant_staff = {
             **STAFF_USER,
@@ -207,3 +244,73 @@ class TestLtvEndpoint:
             buckets_map = {b["bucket_label"]: b["count"] for b in data["buckets"]}
             assert buckets_map["$30–60"] == 1
             assert buckets_map["$10–30"] == 1
+
+
+# ---------------------------------------------------------------------------
+# Test: Time windows
+# ---------------------------------------------------------------------------
+
+
+class TestAnalyticsWindow:
+    """start / end bound the visit queries, so reads scale with the window."""
+
+    def _db(self):
+        db = FakeFirestore()
+        db.seed("offers", {"o1": _offer("o1", "Coffee Deal").to_dict()})
+        visits = [_visit(f"c{i % 5}", "o1", _ts(days_ago=i)) for i in range(60)]
+        db.seed("consumer_visits", {v.id: v.to_dict() for v in visits})
+        return db
+
+    def _get(self, db, path):
+        app.dependency_overrides[get_current_user] = lambda: STAFF_USER
+        try:
+            with use_db(db):
+                client = TestClient(app, raise_server_exceptions=False)
+                db.reset_counts()
+                return client.get(f"/api/v1/merchants/{MERCHANT_ID}{path}")
+        finally:
+            app.dependency_overrides.pop(get_current_user, None)
+
+    def test_ltv_reads_only_the_window(self):
+        db = self._db()
+        start = _ts(days_ago=10).isoformat().replace("+00:00", "Z")
+        resp = self._get(db, f"/analytics/ltv?start={start}")
+
+        counts = {b["bucket_label"]: b["count"] for b in resp.json()["buckets"]}
+        # 10 visits spread over 5 customers: 2 x $12 each
+        assert counts["$10–30"] == 5
+        assert db.reads == 10
+
+    def test_deals_window(self):
+        db = self._db()
+        start = _ts(days_ago=30).strftime("%Y-%m-%d")
+        end = _ts(days_ago=20).strftime("%Y-%m-%d")
+        resp = self._get(db, f"/analytics/deals?start={start}&end={end}")
+
+        deal = resp.json()["deals"][0]
+        assert deal["offer_name"] == "Coffee Deal"
+        assert deal["redemption_count"] == 10
+        # The offer, plus one read per visit in the window
+        assert db.reads == 1 + 10
+
+    def test_insights_cached_per_window(self):
+        db = self._db()
+        self._get(db, "/insights")
+        self._get(db, f"/insights?start={_ts(days_ago=7).strftime('%Y-%m-%d')}")
+
+        assert len(db.documents("insight_cache")) == 2
+
+    def test_insight_windows_share_whole_day_cache_keys(self):
+        db = self._db()
+        day = _ts(days_ago=7).strftime("%Y-%m-%d")
+        self._get(db, f"/insights?start={day}T01:00:00Z")
+        self._get(db, f"/insights?start={day}T13:30:00Z")
+        self._get(db, "/insights?start=2001-01-01&end=2999-01-01")
+        self._get(db, "/insights?start=2002-01-01&end=2998-01-01")
+
+        # One doc per whole-day window; far-off bounds clamp to the same window
+        assert len(db.documents("insight_cache")) == 2
+
+    def test_empty_window_rejected(self):
+        resp = self._get(self._db(), "/analytics/ltv?start=2026-03-02&end=2026-03-01")
+        assert resp.status_code == 400
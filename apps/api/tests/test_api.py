@@ -18,6 +18,8 @@ from .conftest import (
     FakeDocSnapshot,
     FakeQuery,
     build_mock_db,
+    counter_shards,
+    wire_mock_db,
 )
 
 
@@ -285,7 +287,7 @@ class TestOffers:
 
         db = MagicMock()
         db.collection.side_effect = _collection
-        return db
+        return wire_mock_db(db)
 
     def test_create_offer(self):
         _set_user(OWNER_USER)
@@ -403,11 +405,8 @@ class TestRedemption:
         offer_snap = FakeDocSnapshot("offer-001", offer_data)
         token_snap = FakeDocSnapshot("token-001", token_data)
 
-        # Redemption docs for daily cap checking
-        redemption_snaps = [
-            FakeDocSnapshot(f"r-{i}", {"offer_id": "offer-001", "timestamp": NOW})
-            for i in range(today_redemptions)
-        ]
+        # Counter shards for daily cap checking
+        shard_snaps = counter_shards("offer-001", today_redemptions)
 
         redemption_ref = FakeDocRef("redemption-new")
         ledger_ref = FakeDocRef("ledger-new")
@@ -418,14 +417,16 @@ class TestRedemption:
             if name == "redemption_tokens":
                 return FakeCollection(docs=[token_snap])
             if name == "redemptions":
-                return FakeCollection(docs=redemption_snaps, doc_ref=redemption_ref)
+                return FakeCollection(docs=[], doc_ref=redemption_ref)
+            if name == "daily_redemption_counters":
+                return FakeCollection(docs=shard_snaps)
             if name == "ledger_entries":
                 return FakeCollection(docs=[], doc_ref=ledger_ref)
             return FakeCollection()
 
         db = MagicMock()
         db.collection.side_effect = _collection
-        return db
+        return wire_mock_db(db)
 
     def test_redeem_token_success(self):
         _set_user(OWNER_USER)
@@ -433,8 +434,7 @@ class TestRedemption:
         fake_result = ("token-001", TOKEN_DATA)
 
         with patch("apps.api.app.main.get_db", return_value=db), \
-             patch("apps.api.app.main.get_token_by_id_or_code", return_value=fake_result), \
-             patch("apps.api.app.main.mark_token_redeemed"):
+             patch("apps.api.app.main.get_token_by_id_or_code", return_value=fake_result):
             resp = _client().post("/redeem", json={
                 "token": "ABC123",
                 "location": "Main St",
@@ -453,8 +453,7 @@ class TestRedemption:
         fake_result = ("token-001", TOKEN_DATA)
 
         with patch("apps.api.app.main.get_db", return_value=db), \
-             patch("apps.api.app.main.get_token_by_id_or_code", return_value=fake_result), \
-             patch("apps.api.app.main.mark_token_redeemed"):
+             patch("apps.api.app.main.get_token_by_id_or_code", return_value=fake_result):
             resp = _client().post("/redeem", json={
                 "token": "ABC123",
                 "location": "Main St",
@@ -473,8 +472,7 @@ class TestRedemption:
         fake_result = ("token-001", expired_token)
 
         with patch("apps.api.app.main.get_db", return_value=db), \
-             patch("apps.api.app.main.get_token_by_id_or_code", return_value=fake_result), \
-             patch("apps.api.app.main.mark_token_redeemed"):
+             patch("apps.api.app.main.get_token_by_id_or_code", return_value=fake_result):
             resp = _client().post("/redeem", json={
                 "token": "EXPIRED1",
                 "location": "Main St",
@@ -0,0 +1,90 @@
+"""Tests for cached Firebase ID token verification."""
+
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from firebase_admin import _token_gen
+
+from apps.api.app import auth
+from apps.api.app.auth import refresh_signing_keys, token_cache_stats, verify_bearer_token
+
+
+@pytest.fixture()
+def verify():
+    """Patch the Firebase verifier; each token decodes to claims expiring in an hour."""
+    def _decode(token):
+        if token == "bad":
+            raise ValueError("invalid token")
+        return {"uid": f"uid-{token}", "exp": time.time() + 3600, "firebase": {"sign_in_provider": "password"}}
+
+    with patch("apps.api.app.auth._init_firebase_admin"), \
+            patch("apps.api.app.auth.auth.verify_id_token", side_effect=_decode) as mock:
+        yield mock
+
+
+class TestVerifyBearerToken:
+
+    def test_repeat_token_is_verified_once(self, verify):
+        assert verify_bearer_token("Bearer t1")["uid"] == "uid-t1"
+        assert verify_bearer_token("Bearer t1")["uid"] == "uid-t1"
+
+        assert verify.call_count == 1
+        assert token_cache_stats() == {"hits": 1, "misses": 1, "size": 1}
+
+    def test_distinct_tokens_are_verified_separately(self, verify):
+        verify_bearer_token("Bearer t1")
+        verify_bearer_token("Bearer t2")
+        assert verify.call_count == 2
+
+    def test_cached_claims_are_copies(self, verify):
+        verify_bearer_token("Bearer t1")["firebase"]["tenant"] = "x"
+        assert "tenant" not in verify_bearer_token("Bearer t1")["firebase"]
+
+    def test_entry_expires_with_the_token(self, verify):
+        verify_bearer_token("Bearer t1")
+        with patch("apps.api.app.cache.time.monotonic", return_value=time.monotonic() + 3601):
+            verify_bearer_token("Bearer t1")
+        assert verify.call_count == 2
+
+    def test_expired_claims_are_not_cached(self, verify):
+        verify.side_effect = lambda token: {"uid": "u", "exp": time.time() - 1}
+        verify_bearer_token("Bearer t1")
+        verify_bearer_token("Bearer t1")
+        assert verify.call_count == 2
+
+    def test_failures_are_not_cached(self, verify):
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                verify_bearer_token("Bearer bad")
+        assert verify.call_count == 2
+
+    def test_malformed_header(self, verify):
+        with pytest.raises(ValueError):
+            verify_bearer_token("Token t1")
+        verify.assert_not_called()
+
+
+class TestSigningKeys:
+
+    def test_refresh_bypasses_http_cache(self):
+        client = MagicMock()
+        session = client._token_verifier.request.session
+        with patch("apps.api.app.auth._init_firebase_admin"), \
+                patch("apps.api.app.auth.auth._get_client", return_value=client):
+            refresh_signing_keys()
+
+        session.request.assert_called_once()
+        method, url = session.request.call_args[0]
+        assert (method, url) == ("GET", auth.ID_TOKEN_CERT_URL)
+        assert session.request.call_args[1]["headers"] == {"Cache-Control": "no-cache"}
+
+    def test_cert_url_matches_firebase_admin(self):
+        assert auth.ID_TOKEN_CERT_URL == _token_gen.ID_TOKEN_CERT_URI
+
+    def test_refresh_skipped_without_verifier_session(self, caplog):
+        with patch("apps.api.app.auth._init_firebase_admin"), \
+                patch("apps.api.app.auth.auth._get_client", side_effect=AttributeError("moved")):
+            refresh_signing_keys()
+
+        assert "Signing key refresh unavailable" in caplog.text
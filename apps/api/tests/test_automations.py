@@ -281,6 +281,44 @@ class TestRunDaily:
         assert resp.json()["messages_queued"] == 0
 
 
+    def test_run_daily_at_risk_uses_visit_stats(self):
+        """Lapsed repeat customers are found from consumer_merchant_stats."""
+        now = datetime.now(timezone.utc)
+        rules = _make_automation_rules(at_risk=True)
+        config_doc = FakeDocSnapshot("merchant-001", data=_make_loyalty_config_with_automations(automations=rules))
+
+        def _stats(cid, visit_count):
+            return FakeDocSnapshot(f"{cid}_merchant-001", {
+                "consumer_id": cid,
+                "merchant_id": "merchant-001",
+                "visit_count": visit_count,
+                "first_visit": now - timedelta(days=60),
+                "last_visit": now - timedelta(days=30),
+            })
+
+        collections = {
+            "loyalty_configs": FakeCollection(docs=[config_doc]),
+            "merchants": FakeCollection(docs=[FakeDocSnapshot("merchant-001", {"name": "Bean There"})]),
+            "consumer_merchant_stats": FakeCollection(docs=[_stats("c-regular", 4), _stats("c-once", 1)]),
+            "consumers": FakeCollection(docs=[
+                FakeDocSnapshot("c-regular", {"display_name": "Ana", "phone": "+15550001111"}),
+                FakeDocSnapshot("c-once", {"display_name": "Bo", "phone": "+15550002222"}),
+            ]),
+            "automated_messages": FakeCollection(docs=[]),
+        }
+        db = build_mock_db(collections)
+
+        with patch("apps.api.app.automations.get_db", return_value=db):
+            app.dependency_overrides.pop(get_current_user, None)
+            client = TestClient(app, raise_server_exceptions=False)
+            resp = client.post("/api/v1/automations/run-daily")
+
+        assert resp.status_code == 200
+        assert resp.json()["messages_queued"] == 1
+        # Visits are never streamed
+        assert "consumer_visits" not in [c.args[0] for c in db.collection.call_args_list]
+
+
 # ---------------------------------------------------------------------------
 # Automation helpers
 # ---------------------------------------------------------------------------
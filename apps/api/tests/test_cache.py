@@ -0,0 +1,37 @@
+"""Tests for the in-process TTL/LRU cache."""
+
+from unittest.mock import patch
+
+from apps.api.app.cache import TTLCache, clear_caches
+
+
+class TestTTLCache:
+
+    def test_get_set_and_stats(self):
+        cache = TTLCache(maxsize=10, ttl=60)
+        assert cache.get("a") is None
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_entries_expire(self):
+        cache = TTLCache(maxsize=10, ttl=60)
+        with patch("apps.api.app.cache.time.monotonic", return_value=1000.0):
+            cache.set("a", 1)
+        with patch("apps.api.app.cache.time.monotonic", return_value=1061.0):
+            assert cache.get("a") is None
+            assert "a" not in cache
+
+    def test_least_recently_used_is_evicted(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert "a" in cache and "c" in cache and "b" not in cache
+
+    def test_clear_caches_resets_every_cache(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        clear_caches()
+        assert len(cache) == 0
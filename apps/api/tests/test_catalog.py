@@ -0,0 +1,222 @@
+"""Tests for the snapshot-listener catalog of merchants, offers and loyalty configs."""
+
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from apps.api.app.catalog import Catalog, catalog
+from apps.api.app.deps import get_current_user
+from apps.api.app.doc_cache import offer_cache
+from apps.api.app.main import app
+
+from .conftest import (
+    MERCHANT_ADMIN_USER,
+    FakeCollection,
+    FakeDocSnapshot,
+    FakeSnapshotFeed,
+    build_feed_db,
+    build_mock_db,
+)
+from .fake_firestore import FakeFirestore, use_db
+
+NOW = datetime.now(timezone.utc)
+
+
+def _offer(offer_id, merchant_id="merchant-001", status="active", **extra):
+    return FakeDocSnapshot(offer_id, {
+        "merchant_id": merchant_id,
+        "name": f"Offer {offer_id}",
+        "discount_text": "$2 off",
+        "cap_daily": 50,
+        "status": status,
+        "created_at": NOW,
+        "updated_at": NOW,
+        **extra,
+    })
+
+
+def _feeds():
+    return {
+        "merchants": FakeSnapshotFeed([
+            FakeDocSnapshot("merchant-001", {"name": "Cafe", "zone_id": "zone-1", "status": "active"}),
+            FakeDocSnapshot("merchant-002", {"name": "Gone", "zone_id": "zone-1", "status": "deleted"}),
+        ]),
+        "offers": FakeSnapshotFeed([_offer("o1"), _offer("o2", status="paused"), _offer("o3", "merchant-002")]),
+        "loyalty_configs": FakeSnapshotFeed([FakeDocSnapshot("merchant-001", {"stamps_required": 5})]),
+    }
+
+
+@pytest.fixture()
+def live_catalog():
+    """Subscribe the process-wide catalog to fake feeds for one test."""
+    feeds = _feeds()
+    catalog.subscribe(build_feed_db(feeds))
+    yield feeds
+    catalog.close()
+
+
+class TestCatalog:
+
+    def test_not_synced_before_first_snapshot(self):
+        cat = Catalog()
+        assert not cat.ready
+        assert cat.lookup("offers", "o1") == (False, None)
+
+    def test_initial_snapshot_loads_everything(self):
+        cat = Catalog()
+        cat.subscribe(build_feed_db(_feeds()))
+
+        assert cat.ready
+        assert cat.lookup("offers", "o1")[1]["name"] == "Offer o1"
+        assert cat.lookup("offers", "missing") == (True, None)
+        assert [oid for oid, _ in cat.offers("merchant-001")] == ["o1", "o2"]
+        assert [oid for oid, _ in cat.offers("merchant-001", active_only=True)] == ["o1"]
+        assert [mid for mid, _ in cat.active_merchants_in_zone("zone-1")] == ["merchant-001"]
+
+    def test_changes_are_applied_incrementally(self):
+        feeds = _feeds()
+        cat = Catalog()
+        cat.subscribe(build_feed_db(feeds))
+        version = cat.version
+
+        feeds["offers"].emit(
+            added=[_offer("o4")],
+            modified=[_offer("o2"), _offer("o3", "merchant-001")],
+            removed=["o1"],
+        )
+
+        assert cat.version == version + 1
+        assert [oid for oid, _ in cat.offers("merchant-001", active_only=True)] == ["o2", "o3", "o4"]
+        assert cat.offers("merchant-002") == []
+        assert cat.lookup("offers", "o1") == (True, None)
+
+    def test_returned_data_is_a_copy(self):
+        cat = Catalog()
+        cat.subscribe(build_feed_db(_feeds()))
+        cat.lookup("offers", "o1")[1]["name"] = "Changed"
+        cat.offers("merchant-001")[0][1]["name"] = "Changed"
+        assert cat.lookup("offers", "o1")[1]["name"] == "Offer o1"
+
+    def test_lag_is_measured_from_read_time(self):
+        feeds = _feeds()
+        cat = Catalog()
+        cat.subscribe(build_feed_db(feeds))
+
+        feeds["offers"].emit(modified=[_offer("o1")], read_time=datetime.now(timezone.utc) - timedelta(seconds=5))
+
+        stats = cat.stats()
+        assert stats["last_lag_seconds"] >= 5
+        assert stats["max_lag_seconds"] >= 5
+        assert stats["documents"] == {"merchants": 2, "offers": 3, "loyalty_configs": 1}
+        assert stats["approx_bytes"] > 0
+
+    def test_approx_bytes_tracks_changes(self):
+        feeds = _feeds()
+        cat = Catalog()
+        cat.subscribe(build_feed_db(feeds))
+        synced = cat.stats()["approx_bytes"]
+
+        feeds["offers"].emit(modified=[_offer("o1", description="x" * 10_000)])
+        assert cat.stats()["approx_bytes"] >= synced + 10_000
+
+        feeds["offers"].emit(removed=["o1", "o2", "o3"])
+        assert 0 < cat.stats()["approx_bytes"] < synced
+
+    def test_check_resubscribes_stopped_listeners(self):
+        feeds = _feeds()
+        db = build_feed_db(feeds)
+        cat = Catalog()
+        cat.subscribe(db)
+        assert cat.check(db) == 0
+
+        feeds["offers"].drop()
+        feeds["offers"].emit(removed=["o1"])  # missed while the listener was down
+        assert cat.lookup("offers", "o1")[1] is not None
+
+        assert cat.check(db) == 1
+        assert cat.reconnects == 1
+        assert cat.lookup("offers", "o1") == (True, None)
+        assert len(feeds["offers"].watches) == 2
+
+
+class TestCatalogReaders:
+
+    def test_doc_cache_reads_from_catalog(self, live_catalog):
+        db = build_mock_db()
+        assert offer_cache.get(db, "o1")["name"] == "Offer o1"
+        db.collection.assert_not_called()
+
+        live_catalog["offers"].emit(modified=[_offer("o1", name="Renamed")])
+        assert offer_cache.get(db, "o1")["name"] == "Renamed"
+
+    def test_list_offers_served_from_catalog(self, live_catalog):
+        db = build_mock_db({"offers": FakeCollection(docs=[])})
+        app.dependency_overrides[get_current_user] = lambda: MERCHANT_ADMIN_USER
+        try:
+            with patch("apps.api.app.main.get_db", return_value=db):
+                resp = TestClient(app).get("/offers")
+        finally:
+            app.dependency_overrides.pop(get_current_user, None)
+
+        assert resp.status_code == 200
+        assert [o["id"] for o in resp.json()["offers"]] == ["o1", "o2"]
+
+    def test_list_zones_etag(self, live_catalog):
+        db = build_mock_db({
+            "zones": FakeCollection(docs=[FakeDocSnapshot("zone-1", {"name": "Fremont", "slug": "fremont"})]),
+        })
+        client = TestClient(app)
+        with patch("apps.api.app.zones.get_db", return_value=db):
+            first = client.get("/api/v1/zones")
+            etag = first.headers["etag"]
+            cached = client.get("/api/v1/zones", headers={"If-None-Match": etag})
+            live_catalog["offers"].emit(added=[_offer("o5")])
+            changed = client.get("/api/v1/zones", headers={"If-None-Match": etag})
+
+        assert first.json()[0]["merchant_count"] == 1
+        assert first.json()[0]["deal_count"] == 1
+        assert cached.status_code == 304
+        assert changed.status_code == 200
+        assert changed.json()[0]["deal_count"] == 2
+
+
+class TestLocalWrites:
+    """Writes by this instance show up at once, before the listener delivers them."""
+
+    def test_patch_offer_responds_with_the_written_document(self, live_catalog):
+        db = FakeFirestore()
+        db.seed("offers", {"o1": _offer("o1").to_dict()})
+        app.dependency_overrides[get_current_user] = lambda: MERCHANT_ADMIN_USER
+        try:
+            with use_db(db):
+                client = TestClient(app)
+                patched = client.patch("/offers/o1", json={"name": "Renamed", "status": "paused"})
+                listed = client.get("/offers")
+        finally:
+            app.dependency_overrides.pop(get_current_user, None)
+
+        assert patched.status_code == 200
+        assert (patched.json()["name"], patched.json()["status"]) == ("Renamed", "paused")
+        # The catalog (still stale on the fake feed) has the write applied
+        assert {o["id"]: o["name"] for o in listed.json()["offers"]}["o1"] == "Renamed"
+
+    def test_delete_removes_the_catalog_copy(self, live_catalog):
+        offer_cache.put("o1", None, written=True)
+        assert catalog.lookup("offers", "o1") == (True, None)
+        assert [offer_id for offer_id, _ in catalog.offers("merchant-001")] == ["o2"]
+
+    def test_invalidate_evicts_until_the_change_arrives(self, live_catalog):
+        offer_cache.invalidate("o1")
+        assert catalog.lookup("offers", "o1") == (False, None)
+        assert not catalog.is_synced("offers")
+
+        live_catalog["offers"].emit(modified=[_offer("o1", name="Renamed")])
+        assert catalog.lookup("offers", "o1")[1]["name"] == "Renamed"
+        assert catalog.is_synced("offers")
+
+    def test_eviction_expires(self, live_catalog):
+        with patch("apps.api.app.catalog.CATALOG_EVICT_SECONDS", 0):
+            offer_cache.invalidate("o1")
+        assert catalog.lookup("offers", "o1")[1]["name"] == "Offer o1"
@@ -0,0 +1,93 @@
+"""Tests for the materialized retention cohorts."""
+
+from datetime import datetime, timedelta, timezone
+
+from apps.api.app.cohorts import cohort_id, rebuild_cohorts, record_cohort_visit, week_start
+from apps.api.app.visit_stats import get_visit_stats, record_visit, stats_ref
+
+from .fake_firestore import FakeFirestore
+
+# A Wednesday, well clear of week boundaries
+WEEK0 = datetime(2026, 3, 4, 12, tzinfo=timezone.utc)
+MERCHANT_ID = "m-1"
+
+
+def _cohort(db, week):
+    return db.data("retention_cohorts", cohort_id(MERCHANT_ID, week_start(week)))
+
+
+def _replay(db, visits):
+    """Record visits the way the redemption commit does, one commit each."""
+    for consumer_id, ts in visits:
+        stats = get_visit_stats(db, consumer_id, MERCHANT_ID)
+        batch = db.batch()
+        record_visit(batch, stats_ref(db, consumer_id, MERCHANT_ID), stats, consumer_id, MERCHANT_ID, ts)
+        record_cohort_visit(db, batch, stats, MERCHANT_ID, ts)
+        batch.commit()
+        db.seed("consumer_visits", {f"{consumer_id}-{ts.isoformat()}": {
+            "consumer_id": consumer_id, "merchant_id": MERCHANT_ID, "timestamp": ts,
+        }})
+
+
+class TestRecordCohortVisit:
+
+    def test_first_visit_is_a_new_customer(self):
+        db = FakeFirestore()
+        _replay(db, [("c-1", WEEK0), ("c-2", WEEK0 + timedelta(hours=3))])
+
+        cohort = _cohort(db, WEEK0)
+        assert cohort["new_customers"] == 2
+        assert cohort["week_start"] == week_start(WEEK0)
+
+    def test_return_counted_once_per_week(self):
+        db = FakeFirestore()
+        _replay(db, [
+            ("c-1", WEEK0),
+            ("c-1", WEEK0 + timedelta(hours=5)),  # same week as the first visit
+            ("c-1", WEEK0 + timedelta(weeks=1)),
+            ("c-1", WEEK0 + timedelta(weeks=1, hours=2)),
+            ("c-1", WEEK0 + timedelta(weeks=3)),
+        ])
+
+        cohort = _cohort(db, WEEK0)
+        assert cohort["new_customers"] == 1
+        assert cohort["returned_1"] == 1
+        assert "returned_2" not in cohort
+        assert cohort["returned_3"] == 1
+
+    def test_visits_past_the_window_write_nothing(self):
+        db = FakeFirestore()
+        stats = {"visit_count": 4, "first_visit": WEEK0, "last_visit": WEEK0 + timedelta(weeks=2)}
+        batch = db.batch()
+
+        record_cohort_visit(db, batch, stats, MERCHANT_ID, WEEK0 + timedelta(weeks=9))
+
+        assert batch._writes == []
+
+
+class TestRebuild:
+
+    def test_matches_incremental_updates(self):
+        visits = [
+            (f"c-{i}", WEEK0 + timedelta(weeks=i % 3, days=offset, hours=i))
+            for i in range(12)
+            for offset in (0, 4, 9, 15, 30)
+        ]
+        visits.sort(key=lambda v: v[1])
+        incremental = FakeFirestore()
+        _replay(incremental, visits)
+
+        rebuilt = FakeFirestore()
+        rebuilt.seed("consumer_visits", incremental.documents("consumer_visits"))
+        rebuilt.seed("retention_cohorts", {"m-1_2020-01-06": {"merchant_id": MERCHANT_ID, "new_customers": 3}})
+        written = rebuild_cohorts(rebuilt, MERCHANT_ID)
+
+        def _counts(db):
+            return {
+                doc_id: {k: v for k, v in data.items() if v}
+                for doc_id, data in db.documents("retention_cohorts").items()
+            }
+
+        assert written == 3
+        # The stale cohort is removed; the rest match field for field.
+        assert _counts(rebuilt) == _counts(incremental)
@@ -0,0 +1,150 @@
+"""Tests for sharded daily redemption counters and counter reconciliation."""
+
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from apps.api.app.counters import (
+    DAILY_COUNTER_SHARDS,
+    get_daily_redemption_counts,
+    get_redemption_totals,
+    increment_daily_redemptions,
+    rebuild_daily_redemption_counter,
+    rebuild_redemption_totals,
+)
+from apps.api.app.deps import get_current_user
+from apps.api.app.main import app
+
+from .conftest import (
+    MERCHANT_ADMIN_USER,
+    OWNER_USER,
+    FakeCollection,
+    FakeDocSnapshot,
+    FakeWriteBatch,
+    build_mock_db,
+)
+from .fake_firestore import FakeFirestore
+
+NOW = datetime.now(timezone.utc)
+DAY = NOW.strftime("%Y-%m-%d")
+
+
+@pytest.fixture(autouse=True)
+def _cleanup_overrides():
+    yield
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+def _shard(offer_id: str, shard: int, count: int) -> FakeDocSnapshot:
+    return FakeDocSnapshot(f"{offer_id}_{DAY}_{shard}", {
+        "offer_id": offer_id,
+        "day": DAY,
+        "shard": shard,
+        "count": count,
+    })
+
+
+class TestCounterReads:
+
+    def test_counts_sum_across_shards(self):
+        db = build_mock_db({
+            "daily_redemption_counters": FakeCollection(docs=[
+                _shard("offer-a", 0, 3),
+                _shard("offer-a", 7, 4),
+                _shard("offer-b", 2, 1),
+            ]),
+        })
+
+        counts = get_daily_redemption_counts(db, ["offer-a", "offer-b", "offer-c"], NOW)
+
+        assert counts == {"offer-a": 7, "offer-b": 1, "offer-c": 0}
+
+    def test_reads_are_bounded_by_shards(self):
+        db = build_mock_db()
+        get_daily_redemption_counts(db, ["offer-a", "offer-b"], NOW)
+
+        refs = db.get_all.call_args[0][0]
+        assert len(refs) == 2 * DAILY_COUNTER_SHARDS
+        # Counts never stream the redemptions collection
+        assert "redemptions" not in [c.args[0] for c in db.collection.call_args_list]
+
+
+class TestCounterWrites:
+
+    def test_increment_is_staged_on_writer(self):
+        db = build_mock_db()
+        batch = FakeWriteBatch()
+
+        increment_daily_redemptions(db, batch, "offer-a", NOW)
+
+        assert len(batch._writes) == 2
+        op, _ref, data, merge = batch._writes[0]
+        assert op == "set" and merge is True
+        assert data["offer_id"] == "offer-a"
+        assert data["day"] == DAY
+        assert 0 <= data["shard"] < DAILY_COUNTER_SHARDS
+        # And the offer's all-time total
+        op, _ref, data, merge = batch._writes[1]
+        assert op == "set" and merge is True
+        assert data["offer_id"] == "offer-a" and "day" not in data
+
+    def test_rebuild_recounts_redemptions(self):
+        redemptions = [
+            FakeDocSnapshot(f"r-{i}", {"offer_id": "offer-a", "timestamp": NOW})
+            for i in range(5)
+        ]
+        db = build_mock_db({"redemptions": FakeCollection(docs=redemptions)})
+
+        assert rebuild_daily_redemption_counter(db, "offer-a", NOW) == 5
+
+
+class TestRedemptionTotals:
+
+    def test_totals_span_days_and_match_a_rebuild(self):
+        db = FakeFirestore()
+        for i in range(12):
+            batch = db.batch()
+            increment_daily_redemptions(db, batch, "offer-a", NOW - timedelta(days=i))
+            batch.commit()
+            db.seed("redemptions", {f"r-{i}": {"offer_id": "offer-a", "timestamp": NOW - timedelta(days=i)}})
+
+        db.reset_counts()
+        assert get_redemption_totals(db, ["offer-a", "offer-b"]) == {"offer-a": 12, "offer-b": 0}
+        assert db.reads == 2 * DAILY_COUNTER_SHARDS
+
+        assert rebuild_redemption_totals(db) == 1
+        assert get_redemption_totals(db, ["offer-a"]) == {"offer-a": 12}
+
+
+class TestReconcileEndpoint:
+
+    def test_owner_can_reconcile(self):
+        app.dependency_overrides[get_current_user] = lambda: OWNER_USER
+        db = build_mock_db({
+            "offers": FakeCollection(docs=[FakeDocSnapshot("offer-a", {"merchant_id": "merchant-001"})]),
+        })
+
+        with patch("apps.api.app.main.get_db", return_value=db), \
+             patch("apps.api.app.main.rebuild_daily_redemption_counter", return_value=12):
+            resp = TestClient(app).post(f"/offers/offer-a/redemption-counter/reconcile?day={DAY}")
+
+        assert resp.status_code == 200
+        assert resp.json() == {"offer_id": "offer-a", "day": DAY, "count": 12}
+
+    def test_non_owner_forbidden(self):
+        app.dependency_overrides[get_current_user] = lambda: MERCHANT_ADMIN_USER
+        with patch("apps.api.app.main.get_db", return_value=build_mock_db()):
+            resp = TestClient(app, raise_server_exceptions=False).post(
+                "/offers/offer-a/redemption-counter/reconcile"
+            )
+        assert resp.status_code == 403
+
+    def test_bad_day_rejected(self):
+        app.dependency_overrides[get_current_user] = lambda: OWNER_USER
+        with patch("apps.api.app.main.get_db", return_value=build_mock_db()):
+            resp = TestClient(app, raise_server_exceptions=False).post(
+                "/offers/offer-a/redemption-counter/reconcile?day=yesterday"
+            )
+        assert resp.status_code == 400
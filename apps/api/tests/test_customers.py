@@ -13,6 +13,7 @@ from .conftest import (
     FakeCollection,
     FakeQuery,
     build_mock_db,
+    wire_mock_db,
 )
 from apps.api.app.deps import get_current_user
 from apps.api.app.main import app
@@ -89,6 +90,25 @@ class FilterableCollection:
         return iter(results)
 
 
+def _stats_snaps(visits):
+    """consumer_merchant_stats docs matching *visits*, as the backfill would write them."""
+    stats: dict[str, dict] = {}
+    for v in visits:
+        data = v.to_dict()
+        key = f"{data['consumer_id']}_{data['merchant_id']}"
+        entry = stats.setdefault(key, {
+            "consumer_id": data["consumer_id"],
+            "merchant_id": data["merchant_id"],
+            "visit_count": 0,
+            "first_visit": data["timestamp"],
+            "last_visit": data["timestamp"],
+        })
+        entry["visit_count"] += 1
+        entry["first_visit"] = min(entry["first_visit"], data["timestamp"])
+        entry["last_visit"] = max(entry["last_visit"], data["timestamp"])
+    return [FakeDocSnapshot(key, entry) for key, entry in stats.items()]
+
+
 def _build_db_with_visits(visits, consumers, loyalty_config=None, loyalty_progress=None):
     """Build a mock DB with visit + consumer data."""
     from unittest.mock import MagicMock
@@ -96,6 +116,7 @@ def _build_db_with_visits(visits, consumers, loyalty_config=None, loyalty_progre
     db = MagicMock()
     _collections = {
         "consumer_visits": FilterableCollection(visits),
+        "consumer_merchant_stats": FakeCollection(_stats_snaps(visits)),
         "consumers": FakeCollection(consumers),
         "loyalty_configs": FakeCollection([loyalty_config] if loyalty_config else []),
         "loyalty_progress": FakeCollection(loyalty_progress or []),
@@ -106,7 +127,7 @@ def _build_db_with_visits(visits, consumers, loyalty_config=None, loyalty_progre
 
     db.collection.side_effect = lambda name: _collections.get(name, FakeCollection())
     db.collections.return_value = []
-    return db
+    return wire_mock_db(db)
 
 
 # ---- Test: list customers ----
@@ -157,6 +178,20 @@ class TestListCustomers:
             # Check segment counts exist
             assert "segment_counts" in data
 
+    def test_list_customers_batches_profile_reads(self):
+        visits = [
+            _visit_snap(f"c{i}", MERCHANT_ID, "offer-1", NOW - timedelta(days=i), 1)
+            for i in range(1, 21)
+        ]
+        consumers = [_consumer_snap(f"c{i}", f"Customer {i}") for i in range(1, 21)]
+        db = _build_db_with_visits(visits, consumers)
+
+        for client in self._client(STAFF_USER, db):
+            resp = client.get(f"/api/v1/merchants/{MERCHANT_ID}/customers")
+            assert resp.json()["total"] == 20
+        # Consumers and loyalty config: one get_all each, not one read per customer
+        assert db.get_all.call_count == 2
+
     def test_list_customers_segment_filter(self):
         # c1: 6 visits = VIP, c2: 1 visit = new
         visits = [
@@ -0,0 +1,156 @@
+"""Tests for the merchant daily rollup."""
+
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+from apps.api.app.counters import day_start
+from apps.api.app.daily_stats import (
+    DAILY_STATS_SHARDS,
+    get_daily_stats,
+    rebuild_daily_stats,
+    redemption_fields,
+    stage_daily_stats,
+    sum_daily_stats,
+    visit_fields,
+)
+from apps.api.app.deps import get_current_user
+from apps.api.app.main import app
+from apps.api.app.visit_stats import get_visit_stats, record_visit, stats_ref
+
+from .conftest import STAFF_USER
+from .fake_firestore import FakeFirestore, use_db
+
+# A Wednesday, well clear of week boundaries
+WEEK0 = datetime(2026, 3, 4, 12, tzinfo=timezone.utc)
+MERCHANT_ID = "merchant-001"
+
+
+def _replay(db, visits):
+    """Record personal QR redemptions the way the redemption commit does, one commit each."""
+    for i, (consumer_id, offer_id, ts) in enumerate(visits):
+        stats = get_visit_stats(db, consumer_id, MERCHANT_ID)
+        batch = db.batch()
+        record_visit(batch, stats_ref(db, consumer_id, MERCHANT_ID), stats, consumer_id, MERCHANT_ID, ts)
+        stage_daily_stats(db, batch, MERCHANT_ID, ts, redemption_fields({offer_id: 1}, 2.5), visit_fields(stats, ts))
+        batch.commit()
+        db.seed("consumer_visits", {f"v{i}": {
+            "consumer_id": consumer_id, "merchant_id": MERCHANT_ID, "offer_id": offer_id, "timestamp": ts,
+        }})
+        db.seed("redemptions", {f"r{i}": {"merchant_id": MERCHANT_ID, "offer_id": offer_id, "timestamp": ts}})
+        db.seed("ledger_entries", {f"l{i}": {"merchant_id": MERCHANT_ID, "amount": 2.5, "created_at": ts}})
+
+
+def _day(db, when):
+    """The day's stats, summed over its shards."""
+    day = day_start(when)
+    return get_daily_stats(db, MERCHANT_ID, day, day + timedelta(days=1))[0]
+
+
+class TestRecordDailyStats:
+
+    def test_redemption_and_new_customer(self):
+        db = FakeFirestore()
+        _replay(db, [("c-1", "o-1", WEEK0), ("c-2", "o-2", WEEK0 + timedelta(hours=1))])
+
+        day = _day(db, WEEK0)
+        assert (day["visits"], day["redemptions"], day["new_customers"]) == (2, 2, 2)
+        assert day["offers"] == {"o-1": 1, "o-2": 1}
+        assert day["ledger_amount"] == 5.0
+        assert day["date"] == day_start(WEEK0)
+
+    def test_returning_customer_counted_once_per_day_and_week(self):
+        db = FakeFirestore()
+        _replay(db, [
+            ("c-1", "o-1", WEEK0 - timedelta(weeks=1)),
+            ("c-1", "o-1", WEEK0),
+            ("c-1", "o-1", WEEK0 + timedelta(hours=2)),  # same day
+            ("c-1", "o-1", WEEK0 + timedelta(days=1)),  # same week
+        ])
+
+        today, tomorrow = _day(db, WEEK0), _day(db, WEEK0 + timedelta(days=1))
+        assert today["visits"] == 2
+        assert today["returning_customers"] == 1
+        assert today["week_returning_customers"] == 1
+        assert tomorrow["returning_customers"] == 1
+        assert tomorrow["week_returning_customers"] == 0
+
+    def test_increments_spread_over_shards(self):
+        db = FakeFirestore()
+        _replay(db, [(f"c-{i}", "o-1", WEEK0 + timedelta(minutes=i)) for i in range(40)])
+
+        shards = db.documents("merchant_daily_stats")
+        assert len(shards) > 1
+        assert {data["shard"] for data in shards.values()} <= set(range(DAILY_STATS_SHARDS))
+        day = _day(db, WEEK0)
+        assert (day["visits"], day["redemptions"], day["new_customers"]) == (40, 40, 40)
+        assert day["offers"] == {"o-1": 40}
+
+
+class TestRangeAndRebuild:
+
+    def test_rebuild_matches_incremental_updates(self):
+        visits = [
+            (f"c-{i}", f"o-{i % 2}", WEEK0 + timedelta(days=offset, hours=i))
+            for i in range(8)
+            for offset in (0, 1, 6, 9, 20)
+        ]
+        visits.sort(key=lambda v: v[2])
+        incremental = FakeFirestore()
+        _replay(incremental, visits)
+
+        rebuilt = FakeFirestore()
+        for collection in ("consumer_visits", "redemptions", "ledger_entries"):
+            rebuilt.seed(collection, incremental.documents(collection))
+        rebuilt.seed("merchant_daily_stats", {f"{MERCHANT_ID}_2020-01-06_3": {
+            "merchant_id": MERCHANT_ID, "date": datetime(2020, 1, 6, tzinfo=timezone.utc), "shard": 3, "visits": 3,
+        }})
+        rebuild_daily_stats(rebuilt, MERCHANT_ID)
+
+        def _counts(db):
+            return get_daily_stats(db, MERCHANT_ID, datetime(2020, 1, 1, tzinfo=timezone.utc), WEEK0 + timedelta(weeks=4))
+
+        # The stale day is removed; the rest match field for field, one shard per day.
+        assert _counts(rebuilt) == _counts(incremental)
+        assert {data["shard"] for data in rebuilt.documents("merchant_daily_stats").values()} == {0}
+
+    def test_week_totals_are_distinct_customers(self):
+        db = FakeFirestore()
+        monday = day_start(WEEK0) - timedelta(days=2)
+        _replay(db, [
+            ("c-1", "o-1", monday - timedelta(days=3)),
+            ("c-1", "o-1", monday + timedelta(hours=9)),
+            ("c-1", "o-2", monday + timedelta(days=2)),
+            ("c-2", "o-2", monday + timedelta(days=1)),
+            ("c-2", "o-2", monday + timedelta(days=4)),
+        ])
+
+        days = get_daily_stats(db, MERCHANT_ID, monday, monday + timedelta(weeks=1))
+        week = sum_daily_stats(days)
+
+        assert len(days) == 4
+        assert (week["visits"], week["new_customers"], week["week_returning_customers"]) == (4, 1, 1)
+        assert week["offers"] == {"o-1": 1, "o-2": 3}
+        assert week["ledger_amount"] == 10.0
+
+
+class TestDailyEndpoint:
+
+    def test_series_is_zero_filled(self):
+        now = datetime.now(timezone.utc)
+        db = FakeFirestore()
+        _replay(db, [("c-1", "o-1", now - timedelta(days=2)), ("c-1", "o-1", now)])
+        app.dependency_overrides[get_current_user] = lambda: STAFF_USER
+        try:
+            with use_db(db):
+                resp = TestClient(app).get(f"/api/v1/merchants/{MERCHANT_ID}/analytics/daily?days=3")
+        finally:
+            app.dependency_overrides.pop(get_current_user, None)
+
+        days = resp.json()["days"]
+        assert [d["date"] for d in days] == [
+            (now - timedelta(days=n)).strftime("%Y-%m-%d") for n in (2, 1, 0)
+        ]
+        assert [d["visits"] for d in days] == [1, 0, 1]
+        assert days[2]["returning_customers"] == 1
+        assert days[0]["offers"] == {"o-1": 1}
@@ -0,0 +1,47 @@
+"""Tests for the non-blocking data access layer."""
+
+import asyncio
+import inspect
+import threading
+
+import pytest
+from fastapi.routing import APIRoute
+
+from apps.api.app.dal import gather_db, run_db
+from apps.api.app.main import app
+
+
+def test_run_db_runs_off_the_event_loop():
+    async def _call():
+        return threading.get_ident(), await run_db(threading.get_ident)
+
+    loop_thread, worker_thread = asyncio.run(_call())
+    assert loop_thread != worker_thread
+
+
+def test_run_db_passes_arguments():
+    assert asyncio.run(run_db(lambda a, b=0: a + b, 1, b=2)) == 3
+
+
+def test_route_handlers_do_not_block_the_event_loop():
+    # Handlers call the synchronous Firestore client, so they must be plain
+    # functions (run on the worker pool), not coroutines on the event loop.
+    coroutine_routes = [
+        route.path for route in app.routes
+        if isinstance(route, APIRoute) and inspect.iscoroutinefunction(route.endpoint)
+    ]
+    assert coroutine_routes == []
+
+
+def test_gather_db_runs_calls_concurrently():
+    # Each call waits for all three to arrive; sequential execution would time out.
+    barrier = threading.Barrier(3, timeout=5)
+    assert gather_db(*(lambda i=i: (barrier.wait(), i)[1] for i in range(3))) == [0, 1, 2]
+
+
+def test_gather_db_propagates_errors():
+    def _fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        gather_db(lambda: 1, _fail)
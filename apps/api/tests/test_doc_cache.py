@@ -0,0 +1,103 @@
+"""Tests for the process-wide offer / merchant / loyalty config cache."""
+
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from apps.api.app.deps import get_current_user
+from apps.api.app.doc_cache import DocCache, offer_cache
+from apps.api.app.main import app
+
+from .conftest import OWNER_USER, FakeCollection, FakeDocSnapshot, build_mock_db
+
+NOW = datetime.now(timezone.utc)
+
+OFFER_DATA = {
+    "merchant_id": "merchant-001",
+    "name": "Free Latte",
+    "discount_text": "$2 off",
+    "cap_daily": 50,
+    "status": "active",
+    "created_at": NOW,
+    "updated_at": NOW,
+}
+
+
+def _db():
+    return build_mock_db({
+        "offers": FakeCollection(docs=[
+            FakeDocSnapshot("o1", {"name": "Latte"}),
+            FakeDocSnapshot("o2", {"name": "Muffin"}),
+        ]),
+    })
+
+
+class TestDocCache:
+
+    def test_second_get_is_served_from_cache(self):
+        db = _db()
+        cache = DocCache("offers")
+
+        assert cache.get(db, "o1") == {"name": "Latte"}
+        assert cache.get(db, "o1") == {"name": "Latte"}
+        assert db.collection.call_count == 1
+
+    def test_missing_documents_are_cached(self):
+        db = _db()
+        cache = DocCache("offers")
+
+        assert cache.get(db, "missing") is None
+        assert cache.lookup("missing") == (True, None)
+        assert db.collection.call_count == 1
+
+    def test_returned_data_is_a_copy(self):
+        db = _db()
+        cache = DocCache("offers")
+        cache.get(db, "o1")["name"] = "Changed"
+        assert cache.get(db, "o1") == {"name": "Latte"}
+
+    def test_get_many_reads_only_misses(self):
+        db = _db()
+        cache = DocCache("offers")
+        cache.get(db, "o1")
+
+        found = cache.get_many(db, ["o1", "o2", "missing", ""])
+
+        assert found == {"o1": {"name": "Latte"}, "o2": {"name": "Muffin"}}
+        assert db.get_all.call_count == 1
+        assert [ref.id for ref in db.get_all.call_args.args[0]] == ["o2", "auto-id"]
+        assert cache.lookup("missing") == (True, None)
+
+    def test_invalidate_forces_a_read(self):
+        db = _db()
+        cache = DocCache("offers")
+        cache.get(db, "o1")
+        cache.invalidate("o1")
+        cache.get(db, "o1")
+        assert db.collection.call_count == 2
+
+    def test_entries_expire(self):
+        db = _db()
+        cache = DocCache("offers", ttl=60)
+        cache.get(db, "o1")
+        with patch("apps.api.app.cache.time.monotonic", return_value=10**9):
+            assert cache.lookup("o1") == (False, None)
+
+
+class TestInvalidation:
+
+    def test_update_offer_refreshes_cached_offer(self):
+        offer_cache.put("offer-001", OFFER_DATA)
+        updated = FakeDocSnapshot("offer-001", {**OFFER_DATA, "name": "Free Mocha"})
+        db = build_mock_db({"offers": FakeCollection(docs=[updated])})
+
+        app.dependency_overrides[get_current_user] = lambda: OWNER_USER
+        try:
+            with patch("apps.api.app.main.get_db", return_value=db):
+                resp = TestClient(app).patch("/offers/offer-001", json={"name": "Free Mocha"})
+        finally:
+            app.dependency_overrides.pop(get_current_user, None)
+
+        assert resp.status_code == 200
+        assert resp.json()["name"] == "Free Mocha"
@@ -0,0 +1,132 @@
+"""Tests for Idempotency-Key handling on /redeem and /consumer/claim."""
+
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+from google.api_core.exceptions import AlreadyExists
+
+from apps.api.app.deps import get_current_consumer, get_current_user
+from apps.api.app.idempotency import idempotency_id
+from apps.api.app.main import app
+
+from .conftest import (
+    OWNER_USER,
+    FakeCollection,
+    FakeDocRef,
+    FakeDocSnapshot,
+    build_mock_db,
+    counter_shards,
+)
+
+NOW = datetime.now(timezone.utc)
+
+OFFER_DATA = {
+    "merchant_id": "merchant-001",
+    "name": "Free Latte",
+    "discount_text": "$2 off any coffee",
+    "cap_daily": 50,
+    "value_per_redemption": 2.0,
+    "status": "active",
+}
+
+TOKEN = ("token-001", {
+    "offer_id": "offer-001",
+    "short_code": "ABC123",
+    "status": "active",
+    "expires_at": NOW + timedelta(days=30),
+    "is_universal": True,
+})
+
+REDEEM_BODY = {"token": "ABC123", "location": "Main St", "method": "scan"}
+
+
+@pytest.fixture(autouse=True)
+def _cleanup_overrides():
+    yield
+    app.dependency_overrides.pop(get_current_user, None)
+    app.dependency_overrides.pop(get_current_consumer, None)
+
+
+def _redeem_db(stored=None):
+    collections = {
+        "offers": FakeCollection(docs=[FakeDocSnapshot("offer-001", OFFER_DATA)]),
+        "daily_redemption_counters": FakeCollection(docs=counter_shards("offer-001", 0)),
+    }
+    if stored is not None:
+        doc_id = idempotency_id("redeem", OWNER_USER["uid"], "retry-key-1")
+        collections["idempotency_keys"] = FakeCollection(docs=[FakeDocSnapshot(doc_id, {"response": stored})])
+    return build_mock_db(collections)
+
+
+def _redeem(db, key="retry-key-1"):
+    app.dependency_overrides[get_current_user] = lambda: OWNER_USER
+    with patch("apps.api.app.main.get_db", return_value=db), \
+         patch("apps.api.app.main.get_token_by_id_or_code", return_value=TOKEN) as lookup:
+        resp = TestClient(app, raise_server_exceptions=False).post(
+            "/redeem", json=REDEEM_BODY, headers={"Idempotency-Key": key},
+        )
+    return resp, lookup
+
+
+class TestRedeemIdempotency:
+
+    def test_retry_replays_response_without_writes(self):
+        db = _redeem_db()
+
+        first, _ = _redeem(db)
+        second, lookup = _redeem(db)
+
+        assert first.json()["success"] is True
+        assert second.json() == first.json()
+        lookup.assert_not_called()
+        assert db.batch.call_count == 1  # only the first request committed
+
+    def test_replay_from_firestore_record(self):
+        stored = {"success": True, "message": "Redemption successful!", "redemption_id": "r-1"}
+        db = _redeem_db(stored=stored)
+
+        resp, lookup = _redeem(db)
+
+        assert resp.json()["redemption_id"] == "r-1"
+        lookup.assert_not_called()
+        db.batch.assert_not_called()
+
+    def test_concurrent_duplicate_is_reported_as_recorded(self):
+        db = _redeem_db()
+        batch = MagicMock()
+        batch.commit.side_effect = AlreadyExists("redemption exists")
+        db.batch.side_effect = None
+        db.batch.return_value = batch
+
+        resp, _ = _redeem(db)
+
+        assert resp.json()["success"] is True
+        assert resp.json()["message"] == "Redemption already recorded"
+
+    def test_blank_key_rejected(self):
+        resp, _ = _redeem(_redeem_db(), key=" ")
+        assert resp.status_code == 400
+
+
+class TestClaimIdempotency:
+
+    def test_claim_retry_replays(self):
+        app.dependency_overrides[get_current_consumer] = lambda: {"uid": "consumer-001", "role": "consumer"}
+        claim_ref = FakeDocRef("claim-new")
+        db = build_mock_db({
+            "consumers": FakeCollection(docs=[FakeDocSnapshot("consumer-001", {"display_name": "Sam"})]),
+            "offers": FakeCollection(docs=[FakeDocSnapshot("offer-001", OFFER_DATA)]),
+            "consumer_claims": FakeCollection(docs=[], doc_ref=claim_ref),
+        })
+
+        with patch("apps.api.app.consumer.get_db", return_value=db):
+            client = TestClient(app, raise_server_exceptions=False)
+            first = client.post("/api/v1/consumer/claim/offer-001", headers={"Idempotency-Key": "claim-key-1"})
+            second = client.post("/api/v1/consumer/claim/offer-001", headers={"Idempotency-Key": "claim-key-1"})
+
+        assert first.status_code == 200
+        assert second.json() == first.json()
+        claim_ref.create.assert_called_once()
+        claim_ref.set.assert_not_called()
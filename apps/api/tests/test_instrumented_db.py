@@ -0,0 +1,121 @@
+"""Tests for per-request Firestore accounting."""
+
+import contextvars
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from apps.api.app.dal import gather_db
+from apps.api.app.deps import get_current_user
+from apps.api.app.instrumented_db import InstrumentedClient, current_stats, start_request_stats
+from apps.api.app.main import app
+from apps.api.app.metrics import FIRESTORE_READS, reset_metrics
+
+from .conftest import OWNER_USER, FakeCollection, FakeDocSnapshot, build_mock_db
+
+NOW = datetime.now(timezone.utc)
+
+
+def _db():
+    return InstrumentedClient(build_mock_db({
+        "offers": FakeCollection(docs=[
+            FakeDocSnapshot("o1", {"name": "Latte"}),
+            FakeDocSnapshot("o2", {"name": "Muffin"}),
+        ]),
+    }))
+
+
+class TestInstrumentedClient:
+
+    def test_counts_point_reads_and_get_all(self):
+        db = _db()
+        stats = start_request_stats()
+
+        db.collection("offers").document("o1").get()
+        db.get_all([db.collection("offers").document(i) for i in ("o1", "o2", "o3")])
+
+        assert (stats.reads, stats.writes, stats.queries) == (4, 0, 0)
+        assert stats.seconds >= 0
+
+    def test_counts_query_results(self):
+        db = _db()
+        stats = start_request_stats()
+
+        docs = list(db.collection("offers").where("status", "==", "active").limit(10).stream())
+        list(db.collection("missing").stream())
+
+        assert [d.id for d in docs] == ["o1", "o2"]
+        # Two documents, plus one read for the empty query.
+        assert (stats.reads, stats.queries) == (3, 2)
+
+    def test_counts_writes(self):
+        db = _db()
+        stats = start_request_stats()
+
+        ref = db.collection("offers").document("o1")
+        ref.update({"name": "Mocha"})
+        batch = db.batch()
+        batch.set(ref, {"name": "Tea"})
+        batch.delete(db.collection("offers").document("o2"))
+        batch.commit()
+
+        assert stats.writes == 3
+        # Refs reach the underlying batch unwrapped.
+        ref._target.set.assert_called_once_with({"name": "Tea"})
+
+    def test_snapshot_references_are_counted(self):
+        db = _db()
+        stats = start_request_stats()
+
+        for snap in db.collection("offers").stream():
+            snap.reference.update({"seen": True})
+
+        assert stats.writes == 2
+
+    def test_nothing_recorded_outside_a_request(self):
+        db = _db()
+
+        def _background():
+            db.collection("offers").document("o1").get()
+            return current_stats()
+
+        assert contextvars.Context().run(_background) is None
+
+    def test_gather_db_records_into_the_caller_request(self):
+        db = _db()
+        stats = start_request_stats()
+
+        gather_db(
+            lambda: db.collection("offers").document("o1").get(),
+            lambda: db.collection("offers").document("o2").get(),
+            lambda: db.collection("offers").document("o3").get(),
+        )
+
+        assert stats.reads == 3
+
+
+class TestRequestAccounting:
+
+    def test_server_timing_header_and_route_totals(self):
+        reset_metrics()
+        offer = {
+            "merchant_id": "merchant-001", "name": "Latte", "discount_text": "$2 off", "cap_daily": 50,
+            "status": "active", "created_at": NOW, "updated_at": NOW,
+        }
+        db = InstrumentedClient(build_mock_db({"offers": FakeCollection(docs=[FakeDocSnapshot("o1", offer)])}))
+        app.dependency_overrides[get_current_user] = lambda: OWNER_USER
+        try:
+            with patch("apps.api.app.main.get_db", return_value=db):
+                resp = TestClient(app).get("/offers/o1")
+        finally:
+            app.dependency_overrides.pop(get_current_user, None)
+
+        assert resp.status_code == 200
+        timing = resp.headers["server-timing"]
+        assert timing.startswith("db;dur=")
+        # The offer, then today's counter shards in one get_all.
+        reads = FIRESTORE_READS.value(route="/offers/{offer_id}")
+        assert reads > 1
+        assert f"reads={reads} writes=0" in timing
+        reset_metrics()
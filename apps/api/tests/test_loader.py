@@ -0,0 +1,50 @@
+"""Tests for the request-scoped document loader."""
+
+from apps.api.app.loader import DocLoader
+
+from .conftest import FakeCollection, FakeDocSnapshot, build_mock_db
+
+
+def _db():
+    return build_mock_db({
+        "consumers": FakeCollection(docs=[
+            FakeDocSnapshot("c1", {"display_name": "Ann"}),
+            FakeDocSnapshot("c2", {"display_name": "Ben"}),
+        ]),
+        "offers": FakeCollection(docs=[FakeDocSnapshot("o1", {"name": "Latte"})]),
+    })
+
+
+class TestDocLoader:
+
+    def test_primed_keys_resolve_in_one_call_per_collection(self):
+        db = _db()
+        loader = DocLoader(db)
+        loader.prime("consumers", ["c1", "c2", "missing"])
+        loader.prime("offers", ["o1"])
+
+        assert loader.get("consumers", "c1") == {"display_name": "Ann"}
+        assert loader.get("consumers", "missing") is None
+        assert loader.get("offers", "o1") == {"name": "Latte"}
+        assert db.get_all.call_count == 2
+
+    def test_memoises_per_request(self):
+        db = _db()
+        loader = DocLoader(db)
+        loader.get("consumers", "c1")
+        loader.get("consumers", "c1")
+        loader.get_many("consumers", ["c1"])
+        assert db.get_all.call_count == 1
+
+    def test_chunks_large_batches(self):
+        db = _db()
+        loader = DocLoader(db, chunk_size=2)
+        found = loader.get_many("consumers", ["c1", "c2", "c3", "c4", "c5"])
+        assert set(found) == {"c1", "c2"}
+        assert db.get_all.call_count == 3
+
+    def test_blank_ids_are_ignored(self):
+        db = _db()
+        assert DocLoader(db).get("consumers", "") is None
+        assert DocLoader(db).get_many("consumers", ["", None]) == {}
+        db.get_all.assert_not_called()
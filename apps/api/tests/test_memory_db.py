@@ -0,0 +1,186 @@
+"""Tests for the in-memory Firestore engine."""
+
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from google.api_core.exceptions import AlreadyExists, NotFound
+from google.cloud.firestore_v1 import DELETE_FIELD, Increment, transactional
+
+from apps.api.app import db as db_module
+from apps.api.app.instrumented_db import InstrumentedClient
+from apps.api.app.memory_db import MemoryFirestore
+
+NOW = datetime.now(timezone.utc)
+
+
+def _db(**kwargs) -> MemoryFirestore:
+    db = MemoryFirestore(**kwargs)
+    db.seed("visits", {
+        f"v{i}": {"consumer_id": f"c{i % 3}", "n": i, "timestamp": NOW - timedelta(days=i)} for i in range(9)
+    })
+    db.seed("visits", {"no-ts": {"consumer_id": "c0", "n": 99}})
+    return db
+
+
+class TestQueries:
+
+    def test_where_order_by_limit_offset(self):
+        db = _db()
+        docs = list(
+            db.collection("visits")
+            .where("consumer_id", "==", "c0")
+            .order_by("timestamp", direction="DESCENDING")
+            .offset(1)
+            .limit(2)
+            .stream()
+        )
+        # c0 visits are 0, 3, 6 (newest first); "no-ts" lacks the order field.
+        assert [d.get("n") for d in docs] == [3, 6]
+
+    def test_range_and_in_filters(self):
+        db = _db()
+        query = db.collection("visits").where("n", ">=", 2).where("n", "<", 5)
+        assert sorted(d.get("n") for d in query.stream()) == [2, 3, 4]
+
+        query = db.collection("visits").where("consumer_id", "in", ["c1", "c2"])
+        assert len(query.get()) == 6
+
+    def test_reads_are_counted_like_firestore(self):
+        db = _db()
+        list(db.collection("visits").where("n", "<", 3).stream())
+        list(db.collection("visits").where("n", ">", 100).stream())
+        db.get_all([db.collection("visits").document(i) for i in ("v1", "v2", "missing")])
+
+        # 3 results, 1 for the empty query, 3 for get_all (missing ones too).
+        assert (db.reads, db.queries) == (7, 2)
+
+    def test_select_projects_fields(self):
+        db = _db()
+        docs = db.collection("visits").where("n", "<", 2).select(["consumer_id"]).get()
+        assert [d.to_dict() for d in docs] == [{"consumer_id": "c0"}, {"consumer_id": "c1"}]
+
+
+class TestWrites:
+
+    def test_update_applies_transforms_and_dotted_paths(self):
+        db = _db()
+        ref = db.collection("visits").document("v1")
+        ref.update({"n": Increment(10), "meta.source": "scan", "consumer_id": DELETE_FIELD})
+
+        assert db.data("visits", "v1")["n"] == 11
+        assert db.data("visits", "v1")["meta"] == {"source": "scan"}
+        assert "consumer_id" not in db.data("visits", "v1")
+
+    def test_set_merge_keeps_other_fields(self):
+        db = _db()
+        db.collection("visits").document("v1").set({"n": Increment(1), "extra": True}, merge=True)
+        assert db.data("visits", "v1")["consumer_id"] == "c1"
+        assert db.data("visits", "v1")["n"] == 2
+
+    def test_create_and_update_preconditions(self):
+        db = _db()
+        with pytest.raises(AlreadyExists):
+            db.collection("visits").document("v1").create({"n": 0})
+        with pytest.raises(NotFound):
+            db.collection("visits").document("nope").update({"n": 0})
+
+    def test_batch_is_atomic(self):
+        db = _db()
+        batch = db.batch()
+        batch.set(db.collection("visits").document("new"), {"n": 100})
+        batch.create(db.collection("visits").document("v1"), {"n": 0})
+
+        with pytest.raises(AlreadyExists):
+            batch.commit()
+        assert db.data("visits", "new") is None
+        assert db.writes == 0
+
+
+class TestTransactions:
+
+    def test_conflicting_write_aborts_and_retries(self):
+        db = _db()
+        ref = db.collection("visits").document("v1")
+        attempts = []
+
+        @transactional
+        def _bump(transaction):
+            snap = ref.get(transaction=transaction)
+            if not attempts:
+                # A concurrent writer lands between the read and the commit
+                ref.update({"n": 50})
+            attempts.append(1)
+            transaction.update(ref, {"n": snap.get("n") + 1})
+
+        _bump(db.transaction())
+
+        assert len(attempts) == 2
+        assert db.data("visits", "v1")["n"] == 51
+
+    def test_works_through_the_instrumented_client(self):
+        db = InstrumentedClient(_db())
+        ref = db.collection("visits").document("v1")
+
+        @transactional
+        def _bump(transaction):
+            snap = ref.get(transaction=transaction)
+            transaction.update(ref, {"n": snap.get("n") + 1})
+
+        _bump(db.transaction())
+        assert db.data("visits", "v1")["n"] == 2
+
+
+class TestLatencyAndListeners:
+
+    def test_each_rpc_pays_the_latency(self):
+        db = _db(latency=0.02)
+        started = time.perf_counter()
+        db.collection("visits").document("v1").get()
+        db.get_all([db.collection("visits").document("v2"), db.collection("visits").document("v3")])
+        elapsed = time.perf_counter() - started
+
+        assert db.rpcs == 2
+        assert elapsed >= 0.04
+
+    def test_on_snapshot_delivers_initial_docs_and_changes(self):
+        db = _db()
+        events = []
+        watch = db.collection("visits").where("consumer_id", "==", "c1").on_snapshot(
+            lambda docs, changes, read_time: events.append(sorted((c.type.name, c.document.id) for c in changes))
+        )
+        db.collection("visits").document("v1").update({"n": 7})
+        db.collection("visits").document("v4").delete()
+        watch.unsubscribe()
+        db.collection("visits").document("v7").delete()
+
+        assert events[0] == [("ADDED", "v1"), ("ADDED", "v4"), ("ADDED", "v7")]
+        assert events[1:] == [[("MODIFIED", "v1")], [("REMOVED", "v4")]]
+
+    def test_commits_only_reevaluate_watches_on_their_collection(self, monkeypatch):
+        db = _db()
+        watch = db.collection("visits").on_snapshot(lambda docs, changes, read_time: None)
+        evaluated = []
+        original = watch._query._results
+        monkeypatch.setattr(watch._query, "_results", lambda: evaluated.append(1) or original())
+
+        db.collection("offers").document("o1").set({"name": "Coffee"})
+        assert evaluated == []
+        db.collection("visits").document("v1").update({"n": 7})
+        assert evaluated == [1]
+
+
+class TestGetDb:
+
+    def test_memory_backend_selected_by_env(self, monkeypatch):
+        monkeypatch.setenv("FIRESTORE_BACKEND", "memory")
+        monkeypatch.setenv("MEMORY_DB_LATENCY_MS", "5")
+        db_module.get_db.cache_clear()
+        try:
+            client = db_module.get_db()
+        finally:
+            db_module.get_db.cache_clear()
+
+        assert isinstance(client, InstrumentedClient)
+        assert isinstance(client._target, MemoryFirestore)
+        assert client.latency == 0.005
@@ -0,0 +1,114 @@
+"""Tests for the request metrics middleware and the /metrics endpoint."""
+
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from apps.api.app.deps import get_current_user
+from apps.api.app.main import app
+from apps.api.app.metrics import (
+    IN_FLIGHT,
+    REQUEST_LATENCY,
+    REQUESTS,
+    Counter,
+    Histogram,
+    render,
+    reset_metrics,
+)
+
+from .conftest import OWNER_USER, FakeCollection, FakeDocSnapshot, build_mock_db
+
+NOW = datetime.now(timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def _reset_metrics():
+    reset_metrics()
+    yield
+    reset_metrics()
+
+
+class TestPrimitives:
+
+    def test_counter_samples(self):
+        counter = Counter("things_total", "Things.")
+        counter.inc(route="/a", status="200")
+        counter.inc(2, route="/a", status="200")
+        assert counter.samples() == ['things_total{route="/a",status="200"} 3']
+
+    def test_histogram_buckets_are_cumulative(self):
+        hist = Histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+        hist.observe(0.05, route="/a")
+        hist.observe(0.5, route="/a")
+        hist.observe(5, route="/a")
+
+        samples = hist.samples()
+        assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in samples
+        assert 'latency_seconds_bucket{route="/a",le="1.0"} 2' in samples
+        assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in samples
+        assert 'latency_seconds_count{route="/a"} 3' in samples
+
+    def test_label_values_are_escaped(self):
+        counter = Counter("things_total", "Things.")
+        counter.inc(route='/"x"')
+        assert counter.samples() == ['things_total{route="/\\"x\\""} 1']
+
+
+class TestMiddleware:
+
+    def test_requests_are_labelled_by_route_template(self):
+        merchant = {"name": "Cafe", "email": "cafe@test.com", "locations": ["Main St"], "created_at": NOW}
+        db = build_mock_db({"merchants": FakeCollection(docs=[FakeDocSnapshot("m-1", merchant)])})
+        app.dependency_overrides[get_current_user] = lambda: OWNER_USER
+        try:
+            with patch("apps.api.app.main.get_db", return_value=db):
+                client = TestClient(app)
+                client.get("/merchants/m-1")
+                client.get("/merchants/m-2")
+        finally:
+            app.dependency_overrides.pop(get_current_user, None)
+
+        assert REQUESTS.value(method="GET", route="/merchants/{merchant_id}", status="200") == 1
+        assert REQUESTS.value(method="GET", route="/merchants/{merchant_id}", status="404") == 1
+        assert REQUEST_LATENCY.count(method="GET", route="/merchants/{merchant_id}") == 2
+        assert IN_FLIGHT.value() == 0
+
+    def test_unmatched_paths_share_one_label(self):
+        client = TestClient(app)
+        client.get("/no/such/path")
+        client.get("/another/missing/path")
+        assert REQUESTS.value(method="GET", route="unmatched", status="404") == 2
+
+
+class TestMetricsEndpoint:
+
+    def test_exposes_prometheus_text(self):
+        client = TestClient(app)
+        client.get("/no/such/path")
+
+        resp = client.get("/metrics")
+
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/plain")
+        body = resp.text
+        assert "# TYPE http_request_duration_seconds histogram" in body
+        assert 'http_requests_total{method="GET",route="unmatched",status="404"} 1' in body
+        assert 'cache_hits_total{cache="id_tokens"}' in body
+        assert "catalog_ready 0" in body
+
+    def test_token_required_when_configured(self, monkeypatch):
+        monkeypatch.setenv("METRICS_TOKEN", "s3cret")
+        client = TestClient(app)
+        assert client.get("/metrics").status_code == 401
+        assert client.get("/metrics", headers={"Authorization": "Bearer s3cret"}).status_code == 200
+
+    def test_render_survives_failing_collector(self):
+        from apps.api.app import metrics
+
+        def _broken():
+            raise RuntimeError("boom")
+
+        with patch.object(metrics, "_collectors", [_broken]):
+            assert "http_requests_total" in render()
@@ -0,0 +1,125 @@
+"""Tests for the outbox and the post-redemption side-effect handler."""
+
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from apps.api.app import outbox
+from apps.api.app.automations import REDEMPTION_COMPLETED, run_redemption_side_effects
+from apps.api.app.outbox import DONE, FAILED, PENDING, drain_outbox, register_handler
+
+from .conftest import FakeCollection, FakeDocRef, FakeDocSnapshot, build_mock_db
+
+NOW = datetime.now(timezone.utc)
+
+
+@pytest.fixture()
+def handlers():
+    """Isolate handler registrations made by a test."""
+    saved = dict(outbox._HANDLERS)
+    yield
+    outbox._HANDLERS.clear()
+    outbox._HANDLERS.update(saved)
+
+
+def _event(kind="test.event", attempts=0, status=PENDING, due=NOW):
+    return FakeDocSnapshot("evt-1", {
+        "kind": kind,
+        "payload": {"n": 1},
+        "status": status,
+        "attempts": attempts,
+        "next_attempt_at": due,
+    })
+
+
+class TestDrain:
+
+    def test_runs_handler_and_marks_done(self, handlers):
+        seen = []
+        register_handler("test.event")(lambda db, payload: seen.append(payload))
+        db = build_mock_db({"outbox": FakeCollection(docs=[_event()])})
+
+        counts = drain_outbox(db, now=NOW)
+
+        assert seen == [{"n": 1}]
+        assert counts[DONE] == 1
+
+    def test_failure_is_retried(self, handlers):
+        def _boom(db, payload):
+            raise RuntimeError("sms gateway down")
+
+        register_handler("test.event")(_boom)
+        db = build_mock_db({"outbox": FakeCollection(docs=[_event()])})
+
+        assert drain_outbox(db, now=NOW)[PENDING] == 1
+
+    def test_gives_up_after_max_attempts(self, handlers):
+        def _boom(db, payload):
+            raise RuntimeError("still down")
+
+        register_handler("test.event")(_boom)
+        event = _event(attempts=outbox.MAX_ATTEMPTS - 1)
+        db = build_mock_db({"outbox": FakeCollection(docs=[event])})
+
+        assert drain_outbox(db, now=NOW)[FAILED] == 1
+
+    def test_leased_event_is_skipped(self, handlers):
+        handler = MagicMock()
+        register_handler("test.event")(handler)
+        event = _event(due=NOW + timedelta(seconds=30))
+        db = build_mock_db({"outbox": FakeCollection(docs=[event])})
+
+        assert drain_outbox(db, now=NOW)["skipped"] == 1
+        handler.assert_not_called()
+
+
+class TestRedemptionSideEffects:
+
+    def _payload(self, **overrides):
+        return {
+            "redemption_id": "red-1",
+            "merchant_id": "merchant-001",
+            "consumer_id": "consumer-001",
+            "offer_id": "offer-001",
+            "redeemed_at": NOW,
+            "claimed_since": NOW.replace(hour=0),
+            "visit_number": 1,
+            "consumer_name": "Sam",
+            "consumer_phone": "+15550000000",
+            "current_stamps": 1,
+            "reward_description": None,
+            **overrides,
+        }
+
+    def test_first_visit_message_uses_deterministic_id(self):
+        config = FakeDocSnapshot("merchant-001", {
+            "stamps_required": 5,
+            "automations": [{"trigger": "first_visit", "enabled": True, "message_template": "Hi {customer_name}"}],
+        })
+        claim = FakeDocSnapshot("claim-1", {"redeemed": False})
+        message_ref = FakeDocRef("red-1_first_visit")
+        messages = MagicMock()
+        messages.document.return_value = message_ref
+        messages.where.return_value.where.return_value.where.return_value.where.return_value.stream.return_value = []
+
+        def _collection(name):
+            if name == "loyalty_configs":
+                return FakeCollection(docs=[config])
+            if name == "consumer_claims":
+                return FakeCollection(docs=[claim])
+            if name == "automated_messages":
+                return messages
+            return FakeCollection()
+
+        db = build_mock_db()
+        db.collection.side_effect = _collection
+
+        run_redemption_side_effects(db, self._payload())
+
+        claim.reference.update.assert_called_once_with({"redeemed": True})
+        messages.document.assert_called_once_with("red-1_first_visit")
+        assert message_ref.set.call_args[0][0]["message_body"] == "Hi Sam"
+
+    def test_registered_for_redemption_events(self):
+        assert outbox._HANDLERS[REDEMPTION_COMPLETED] is run_redemption_side_effects
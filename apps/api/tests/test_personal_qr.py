@@ -19,6 +19,8 @@ from .conftest import (
     FakeDocSnapshot,
     FakeQuery,
     build_mock_db,
+    counter_shards,
+    wire_mock_db,
 )
 
 NOW = datetime.now(timezone.utc)
@@ -171,10 +173,7 @@ class TestConsumerClaim:
         offer_snap = FakeDocSnapshot("offer-001", OFFER_DATA)
         merchant_snap = FakeDocSnapshot("merchant-001", MERCHANT_DATA)
 
-        redemption_snaps = [
-            FakeDocSnapshot(f"r-{i}", {"offer_id": "offer-001", "timestamp": NOW})
-            for i in range(today_redemptions)
-        ]
+        shard_snaps = counter_shards("offer-001", today_redemptions)
         claim_snaps = existing_claims or []
 
         claim_ref = FakeDocRef("claim-new")
@@ -186,15 +185,15 @@ class TestConsumerClaim:
                 return FakeCollection(docs=[offer_snap])
             if name == "merchants":
                 return FakeCollection(docs=[merchant_snap])
-            if name == "redemptions":
-                return FakeCollection(docs=redemption_snaps)
+            if name == "daily_redemption_counters":
+                return FakeCollection(docs=shard_snaps)
             if name == "consumer_claims":
                 return FakeCollection(docs=claim_snaps, doc_ref=claim_ref)
             return FakeCollection()
 
         db = MagicMock()
         db.collection.side_effect = _collection
-        return db
+        return wire_mock_db(db)
 
     def test_claim_success(self):
         _set_consumer()
@@ -312,10 +311,7 @@ class TestPersonalQRRedemption:
         offer_snap = FakeDocSnapshot("offer-001", OFFER_DATA)
         consumer_snap = FakeDocSnapshot("consumer-uid-001", CONSUMER_PROFILE)
 
-        redemption_snaps = [
-            FakeDocSnapshot(f"r-{i}", {"offer_id": "offer-001", "timestamp": NOW})
-            for i in range(today_redemptions)
-        ]
+        shard_snaps = counter_shards("offer-001", today_redemptions)
 
         consumer_redemption_snaps = [
             FakeDocSnapshot(f"cr-{i}", {
@@ -326,13 +322,15 @@ class TestPersonalQRRedemption:
             for i in range(existing_consumer_redemptions)
         ]
 
-        visit_snaps = [
-            FakeDocSnapshot(f"v-{i}", {
+        stats_snaps = [
+            FakeDocSnapshot("consumer-uid-001_merchant-001", {
                 "consumer_id": "consumer-uid-001",
                 "merchant_id": "merchant-001",
+                "visit_count": visits,
+                "first_visit": NOW - timedelta(days=30),
+                "last_visit": NOW - timedelta(days=1),
             })
-            for i in range(visits)
-        ]
+        ] if visits else []
 
         visit_ref = FakeDocRef("visit-new")
         redemption_ref = FakeDocRef("redemption-new")
@@ -359,12 +357,10 @@ class TestPersonalQRRedemption:
                 if field == "consumer_id":
                     # Consumer-specific query
                     return FakeQuery(consumer_redemption_snaps)
-                else:
-                    # Daily cap query (offer_id)
-                    return FakeQuery(redemption_snaps)
+                return FakeQuery([])
 
             def stream(self):
-                return iter(redemption_snaps)
+                return iter([])
 
         def _collection(name):
             if name == "offers":
@@ -373,8 +369,12 @@ class TestPersonalQRRedemption:
                 return FakeCollection(docs=[consumer_snap])
             if name == "redemptions":
                 return SmartRedemptionCollection()
+            if name == "daily_redemption_counters":
+                return FakeCollection(docs=shard_snaps)
             if name == "consumer_visits":
-                return FakeCollection(docs=visit_snaps, doc_ref=visit_ref)
+                return FakeCollection(docs=[], doc_ref=visit_ref)
+            if name == "consumer_merchant_stats":
+                return FakeCollection(docs=stats_snaps)
             if name == "consumer_claims":
                 return FakeCollection(docs=[claim_snap])
             if name == "ledger_entries":
@@ -383,7 +383,7 @@ class TestPersonalQRRedemption:
 
         db = MagicMock()
         db.collection.side_effect = _collection
-        return db
+        return wire_mock_db(db)
 
     def _make_qr(self, consumer_uid="consumer-uid-001", offer_id="offer-001", ts=None):
         """Generate a valid personal QR string."""
@@ -409,6 +409,25 @@ class TestPersonalQRRedemption:
             assert body["visit_number"] == 1
             assert body["offer_name"] == "Free Latte"
 
+    def test_personal_qr_writes_commit_once(self):
+        """All redemption writes go out in one commit, with no re-reads."""
+        _set_staff()
+        db = self._make_personal_redeem_db()
+        qr = self._make_qr()
+
+        with patch("apps.api.app.main.get_db", return_value=db):
+            resp = _client().post("/redeem", json={
+                "token": qr,
+                "location": "Main St",
+                "method": "scan",
+            })
+        assert resp.json()["success"] is True
+        # One transaction (the visit stats doc is re-read in it), no extra batches
+        assert db.transaction.call_count == 1
+        db.batch.assert_not_called()
+        # offer + counter shards, consumer/loyalty docs, transactional re-read
+        assert db.get_all.call_count == 3
+
     def test_personal_qr_visit_number_increments(self):
         """Visit number should be previous_visits + 1."""
         _set_staff()
@@ -472,6 +491,7 @@ class TestPersonalQRRedemption:
 
         db = MagicMock()
         db.collection.side_effect = _collection
+        wire_mock_db(db)
 
         with patch("apps.api.app.main.get_db", return_value=db):
             resp = _client().post("/redeem", json={
@@ -532,10 +552,10 @@ class TestPersonalQRRedemption:
 
         db = MagicMock()
         db.collection.side_effect = _collection
+        wire_mock_db(db)
 
         with patch("apps.api.app.main.get_db", return_value=db), \
-             patch("apps.api.app.main.get_token_by_id_or_code", return_value=("token-001", token_data)), \
-             patch("apps.api.app.main.mark_token_redeemed"):
+             patch("apps.api.app.main.get_token_by_id_or_code", return_value=("token-001", token_data)):
             resp = _client().post("/redeem", json={
                 "token": "ABC123",
                 "location": "Main St",
@@ -0,0 +1,81 @@
+"""Tests for the universal points engine."""
+
+from datetime import datetime, timezone
+
+from apps.api.app.points import (
+    UNIVERSAL_REWARD_THRESHOLD,
+    award_points,
+    stage_points,
+)
+
+from .conftest import FakeCollection, FakeDocRef, FakeDocSnapshot, FakeWriteBatch, build_mock_db
+
+NOW = datetime.now(timezone.utc)
+
+
+def _db(points_by_consumer):
+    refs = {
+        cid: FakeDocRef(cid, FakeDocSnapshot(cid, {"global_points": points}))
+        for cid, points in points_by_consumer.items()
+    }
+    reward_ref = FakeDocRef("reward-new")
+
+    class _Consumers(FakeCollection):
+        def document(self, doc_id=None):
+            return refs[doc_id]
+
+    db = build_mock_db({
+        "consumers": _Consumers(),
+        "rewards": FakeCollection(doc_ref=reward_ref),
+    })
+    return db, refs, reward_ref
+
+
+class TestStagePoints:
+
+    def test_below_threshold_only_updates_balance(self):
+        db, refs, reward_ref = _db({"c1": 100})
+        writer = FakeWriteBatch()
+
+        assert stage_points(db, writer, refs["c1"].get(), 50, NOW) == 0
+        writer.commit()
+
+        refs["c1"].update.assert_called_once_with({"global_points": 150})
+        reward_ref.set.assert_not_called()
+
+    def test_crossing_threshold_converts_points(self):
+        db, refs, reward_ref = _db({"c1": UNIVERSAL_REWARD_THRESHOLD - 10})
+        writer = FakeWriteBatch()
+
+        assert stage_points(db, writer, refs["c1"].get(), 50, NOW) == 1
+        writer.commit()
+
+        refs["c1"].update.assert_called_once_with({"global_points": 40})
+        assert reward_ref.set.call_args[0][0]["is_universal"] is True
+
+    def test_missing_consumer(self):
+        db, _, _ = _db({})
+        writer = FakeWriteBatch()
+        assert stage_points(db, writer, FakeDocSnapshot("ghost", exists=False), 50, NOW) is None
+        assert writer.commit() == []
+
+
+class TestAwardPoints:
+
+    def test_awards_in_one_transaction(self):
+        db, refs, reward_ref = _db({"referrer": 480, "referred": 0})
+        extra_ref = FakeDocRef("referral")
+
+        result = award_points(
+            db, {"referrer": 100, "referred": 50}, NOW,
+            stage=lambda txn: txn.set(extra_ref, {"status": "completed"}),
+        )
+
+        assert result == {"referrer": 1, "referred": 0}
+        assert db.transaction.call_count == 1
+        assert db.get_all.call_count == 1
+        db.batch.assert_not_called()
+        refs["referrer"].update.assert_called_once_with({"global_points": 80})
+        refs["referred"].update.assert_called_once_with({"global_points": 50})
+        reward_ref.set.assert_called_once()
+        extra_ref.set.assert_called_once()
@@ -0,0 +1,219 @@
+"""Firestore read/write budgets for the hot endpoints.
+
+Each test runs an endpoint against a fixed seeded dataset in the counting
+FakeFirestore and fails if it reads or writes more documents than its
+budget. A change that adds a query per row, or drops a batched read back to
+one read per document, shows up here before it shows up on the bill.
+Budgets are the current cost; lower them when an endpoint gets cheaper.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from apps.api.app.cohorts import rebuild_cohorts
+from apps.api.app.consumer import sign_personal_qr
+from apps.api.app.counters import DAILY_COUNTER_SHARDS, rebuild_redemption_totals
+from apps.api.app.daily_stats import get_daily_stats
+from apps.api.app.deps import get_current_user
+from apps.api.app.main import app
+
+from .conftest import MERCHANT_ADMIN_USER, STAFF_USER
+from .fake_firestore import FakeFirestore, use_db
+
+NOW = datetime.now(timezone.utc)
+MERCHANT_ID = "merchant-001"
+CONSUMER_USER = {"uid": "consumer-000", "role": "consumer"}
+
+# Dataset size: 3 offers, 20 customers with 3 visits each.
+OFFER_IDS = ["offer-001", "offer-002", "offer-003"]
+CONSUMER_IDS = [f"consumer-{i:03d}" for i in range(20)]
+VISITS_PER_CONSUMER = 3
+VISIT_COUNT = len(CONSUMER_IDS) * VISITS_PER_CONSUMER
+TOKEN_ID = "11111111-2222-3333-4444-555555555555"
+
+
+def _seeded_db() -> FakeFirestore:
+    db = FakeFirestore()
+    db.seed("zones", {"zone-1": {
+        "name": "Downtown", "slug": "downtown", "city": "Seattle", "status": "active",
+        "center": {"lat": 47.6, "lng": -122.3}, "radius_miles": 2.0,
+    }})
+    db.seed("merchants", {MERCHANT_ID: {
+        "name": "Corner Cafe", "email": "cafe@test.com", "locations": ["Main St"], "status": "active",
+        "zone_id": "zone-1", "created_at": NOW - timedelta(days=90),
+    }})
+    db.seed("offers", {oid: {
+        "merchant_id": MERCHANT_ID, "name": f"Deal {i}", "discount_text": "$2 off", "cap_daily": 100,
+        "status": "active", "value_per_redemption": 2.0, "created_at": NOW - timedelta(days=60),
+        "updated_at": NOW - timedelta(days=60),
+    } for i, oid in enumerate(OFFER_IDS)})
+    db.seed("loyalty_configs", {MERCHANT_ID: {
+        "merchant_id": MERCHANT_ID, "stamps_required": 5, "reward_description": "Free coffee",
+        "double_stamp_days": [], "program_type": "stamps",
+    }})
+    db.seed("redemption_tokens", {TOKEN_ID: {
+        "offer_id": "offer-001", "short_code": "ABC123", "qr_data": "https://boost/r/ABC123", "status": "active",
+        "is_universal": True, "expires_at": NOW + timedelta(days=30), "created_at": NOW - timedelta(days=1),
+    }})
+    db.seed("short_codes", {"ABC123": {"token_id": TOKEN_ID}})
+
+    consumers, visits, redemptions, stats, progress = {}, {}, {}, {}, {}
+    for c, uid in enumerate(CONSUMER_IDS):
+        consumers[uid] = {"display_name": f"Customer {c}", "email": f"{uid}@test.com", "global_points": 150}
+        first = NOW - timedelta(days=7 * (c % 6) + 10)
+        for n in range(VISITS_PER_CONSUMER):
+            ts = first + timedelta(days=3 * n)
+            offer_id = OFFER_IDS[(c + n) % len(OFFER_IDS)]
+            visits[f"visit-{uid}-{n}"] = {
+                "consumer_id": uid, "merchant_id": MERCHANT_ID, "offer_id": offer_id, "visit_number": n + 1,
+                "points_earned": 50, "stamp_earned": True, "timestamp": ts,
+            }
+            redemptions[f"red-{uid}-{n}"] = {
+                "offer_id": offer_id, "merchant_id": MERCHANT_ID, "consumer_id": uid, "method": "scan",
+                "location": "Main St", "value": 2.0, "timestamp": ts,
+            }
+        stats[f"{uid}_{MERCHANT_ID}"] = {
+            "consumer_id": uid, "merchant_id": MERCHANT_ID, "visit_count": VISITS_PER_CONSUMER,
+            "first_visit": first, "last_visit": first + timedelta(days=3 * (VISITS_PER_CONSUMER - 1)),
+        }
+        progress[f"{uid}_{MERCHANT_ID}"] = {
+            "consumer_id": uid, "merchant_id": MERCHANT_ID, "current_stamps": VISITS_PER_CONSUMER,
+            "total_stamps": VISITS_PER_CONSUMER, "rewards_earned": 0, "rewards_redeemed": 0,
+        }
+    db.seed("consumers", consumers)
+    db.seed("consumer_visits", visits)
+    db.seed("redemptions", redemptions)
+    db.seed("consumer_merchant_stats", stats)
+    db.seed("loyalty_progress", progress)
+    rebuild_cohorts(db)
+    rebuild_redemption_totals(db)
+    return db
+
+
+@pytest.fixture
+def db():
+    db = _seeded_db()
+    with use_db(db):
+        yield db
+
+
+def _client(user):
+    app.dependency_overrides[get_current_user] = lambda: user
+    return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def _clear_overrides():
+    yield
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+class TestRedeemBudgets:
+
+    def test_universal_token(self, db):
+        client = _client(STAFF_USER)
+        # Short code index + token + offer and today's counter shards in one
+        # get_all; redemption, ledger, token activity, daily and all-time
+        # counters and the daily rollup in one batch.
+        with db.budget(reads=13, writes=6):
+            resp = client.post("/redeem", json={"token": "ABC123", "method": "scan", "location": "Main St"})
+        assert resp.json()["success"] is True
+        assert len(db.documents("redemptions")) == VISIT_COUNT + 1
+        assert get_daily_stats(db, MERCHANT_ID, NOW, NOW + timedelta(days=1))[0]["redemptions"] == 1
+
+    def test_personal_qr(self, db):
+        client = _client(STAFF_USER)
+        ts = int(NOW.timestamp())
+        qr = f"boost://claim/consumer-000/offer-001/{ts}/{sign_personal_qr('consumer-000', 'offer-001', ts)}"
+        # Offer + shards, the duplicate check, consumer/config/progress, then the
+        # stats and consumer docs plus shards again inside the transaction;
+        # ten documents written in its single commit, eleven when the visit
+        # is the customer's first return in a week.
+        with db.budget(reads=27, writes=11):
+            resp = client.post("/redeem", json={"token": qr, "method": "scan", "location": "Main St"})
+        assert resp.json()["success"] is True
+        assert db.data("consumer_merchant_stats", f"consumer-000_{MERCHANT_ID}")["visit_count"] == 4
+        assert get_daily_stats(db, MERCHANT_ID, NOW, NOW + timedelta(days=1))[0]["visits"] == 1
+
+    def test_cached_offer_is_not_reread(self, db):
+        client = _client(STAFF_USER)
+        body = {"token": "ABC123", "method": "scan", "location": "Main St"}
+        client.post("/redeem", json=body)
+        # Token id and offer now come from process caches: only the token and
+        # the counter shards are read.
+        with db.budget(reads=11, writes=6):
+            client.post("/redeem", json=body)
+
+
+class TestOfferBudgets:
+
+    def test_public_offer(self, db):
+        client = TestClient(app)
+        # Short code index, token, offer, merchant and today's counter shards.
+        with db.budget(reads=14):
+            resp = client.get("/public/offers/ABC123")
+        assert resp.status_code == 200
+        assert resp.json()["merchant_name"] == "Corner Cafe"
+
+    def test_list_offers(self, db):
+        client = _client(MERCHANT_ADMIN_USER)
+        # One query, then one get_all for every offer's counter shards.
+        with db.budget(reads=len(OFFER_IDS) * 11):
+            resp = client.get("/offers")
+        assert len(resp.json()["offers"]) == len(OFFER_IDS)
+
+
+class TestConsumerBudgets:
+
+    def test_wallet(self, db):
+        client = _client(CONSUMER_USER)
+        # Profile, four small queries, then merchant/offer/config lookups.
+        with db.budget(reads=12):
+            resp = client.get("/api/v1/consumer/wallet")
+        assert resp.status_code == 200
+        assert len(resp.json()["visit_history"]) == VISITS_PER_CONSUMER
+
+
+class TestMerchantBudgets:
+
+    def test_customer_list(self, db):
+        client = _client(MERCHANT_ADMIN_USER)
+        # Streams every visit, then the listed customers' profiles and progress.
+        with db.budget(reads=VISIT_COUNT + 2 * len(CONSUMER_IDS) + 1):
+            resp = client.get(f"/api/v1/merchants/{MERCHANT_ID}/customers")
+        assert resp.json()["total"] == len(CONSUMER_IDS)
+
+    def test_retention(self, db):
+        client = _client(MERCHANT_ADMIN_USER)
+        # One materialized cohort doc per week shown (six by default).
+        with db.budget(reads=6):
+            resp = client.get(f"/api/v1/merchants/{MERCHANT_ID}/analytics/retention")
+        assert sum(c["new_customers"] for c in resp.json()["cohorts"]) == len(CONSUMER_IDS)
+
+    @pytest.mark.parametrize("report,extra", [("ltv", 0), ("deals", len(OFFER_IDS))])
+    def test_analytics(self, db, report, extra):
+        client = _client(MERCHANT_ADMIN_USER)
+        # Each report scans the merchant's visits once.
+        with db.budget(reads=VISIT_COUNT + extra):
+            resp = client.get(f"/api/v1/merchants/{MERCHANT_ID}/analytics/{report}")
+        assert resp.status_code == 200
+
+
+class TestZoneBudgets:
+
+    def test_list_zones(self, db):
+        client = TestClient(app)
+        # Catalog not synced: zones, the zone's merchants, each merchant's offers.
+        with db.budget(reads=2 + len(OFFER_IDS)):
+            resp = client.get("/api/v1/zones")
+        assert resp.json()[0]["deal_count"] == len(OFFER_IDS)
+
+    def test_zone_deals(self, db):
+        client = TestClient(app)
+        # Each deal's all-time total shards, however many redemptions it has.
+        with db.budget(reads=2 + len(OFFER_IDS) + len(OFFER_IDS) * DAILY_COUNTER_SHARDS):
+            resp = client.get("/api/v1/zones/downtown/deals")
+        assert sum(d["redemption_count"] for d in resp.json()) == VISIT_COUNT
+
@@ -0,0 +1,254 @@
+"""Tests for the single-commit redemption engine and batch redemption ingestion."""
+
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from google.api_core.exceptions import AlreadyExists
+
+from apps.api.app.deps import get_current_user
+from apps.api.app.main import _batch_redemption_id, app
+from apps.api.app.redeem import (
+    CAP_REACHED_MESSAGE,
+    RESERVATION_HEADROOM,
+    commit_redemption,
+    read_offer_with_daily_count,
+)
+
+from .conftest import (
+    STAFF_USER,
+    FakeCollection,
+    FakeDocRef,
+    FakeDocSnapshot,
+    build_mock_db,
+    counter_shards,
+)
+
+NOW = datetime.now(timezone.utc)
+
+
+def _db(today_count=0, extra=None):
+    collections = {
+        "offers": FakeCollection(docs=[FakeDocSnapshot("offer-001", {"cap_daily": 50})]),
+        "daily_redemption_counters": FakeCollection(docs=counter_shards("offer-001", today_count)),
+    }
+    collections.update(extra or {})
+    return build_mock_db(collections)
+
+
+def _stage_into(ref):
+    def _stage(writer, _snaps):
+        writer.set(ref, {"offer_id": "offer-001"})
+    return _stage
+
+
+class TestReadOfferWithDailyCount:
+
+    def test_single_round_trip(self):
+        db = _db(today_count=4)
+
+        offer_data, count = read_offer_with_daily_count(db, "offer-001", NOW)
+
+        assert offer_data["cap_daily"] == 50
+        assert count == 4
+        assert db.get_all.call_count == 1
+
+    def test_cached_offer_reads_only_the_counter(self):
+        db = _db(today_count=4)
+        read_offer_with_daily_count(db, "offer-001", NOW)
+
+        offer_data, count = read_offer_with_daily_count(db, "offer-001", NOW)
+
+        assert offer_data["cap_daily"] == 50
+        assert count == 4
+        refs = db.get_all.call_args.args[0]
+        assert "offer-001" not in [ref.id for ref in refs]
+
+    def test_missing_offer(self):
+        db = _db()
+        offer_data, count = read_offer_with_daily_count(db, "offer-missing", NOW)
+        assert offer_data is None
+        assert count == 0
+
+
+class TestCommitRedemption:
+
+    def test_far_from_cap_uses_one_batch(self):
+        db = _db()
+        ref = FakeDocRef("redemption-new")
+
+        result = commit_redemption(
+            db, offer_id="offer-001", cap_daily=RESERVATION_HEADROOM + 10,
+            today_count=0, now=NOW, stage=_stage_into(ref),
+        )
+
+        assert result is None
+        assert db.batch.call_count == 1
+        db.transaction.assert_not_called()
+        ref.set.assert_called_once()
+
+    def test_near_cap_rechecks_in_transaction(self):
+        # The caller read a stale count; the transaction sees the cap is full.
+        db = _db(today_count=5)
+        ref = FakeDocRef("redemption-new")
+
+        result = commit_redemption(
+            db, offer_id="offer-001", cap_daily=5,
+            today_count=4, now=NOW, stage=_stage_into(ref),
+        )
+
+        assert result == CAP_REACHED_MESSAGE
+        db.batch.assert_not_called()
+        ref.set.assert_not_called()
+
+    def test_near_cap_commits_in_transaction(self):
+        db = _db(today_count=1)
+        ref = FakeDocRef("redemption-new")
+
+        result = commit_redemption(
+            db, offer_id="offer-001", cap_daily=5,
+            today_count=1, now=NOW, stage=_stage_into(ref),
+        )
+
+        assert result is None
+        assert db.transaction.call_count == 1
+        ref.set.assert_called_once()
+
+    def test_guard_rejects_redeemed_single_use_token(self):
+        token = FakeDocSnapshot("token-001", {"status": "redeemed"})
+        db = _db(extra={"redemption_tokens": FakeCollection(docs=[token])})
+        ref = FakeDocRef("redemption-new")
+
+        result = commit_redemption(
+            db, offer_id="offer-001", cap_daily=100,
+            today_count=0, now=NOW, stage=_stage_into(ref),
+            guard_refs=[db.collection("redemption_tokens").document("token-001")],
+            guard=lambda snaps: "already redeemed" if snaps[0].to_dict()["status"] == "redeemed" else None,
+        )
+
+        assert result == "already redeemed"
+        ref.set.assert_not_called()
+
+
+# =====================================================================
+# POST /redeem/batch
+# =====================================================================
+
+OFFER_DATA = {
+    "merchant_id": "merchant-001",
+    "name": "Free Latte",
+    "discount_text": "$2 off any coffee",
+    "cap_daily": 50,
+    "value_per_redemption": 2.0,
+    "status": "active",
+}
+
+TOKEN = ("token-001", {
+    "offer_id": "offer-001",
+    "short_code": "ABC123",
+    "status": "active",
+    "expires_at": NOW + timedelta(days=30),
+    "is_universal": True,
+})
+
+
+@pytest.fixture()
+def staff():
+    app.dependency_overrides[get_current_user] = lambda: STAFF_USER
+    yield
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+def _item(key, ts=None, token="ABC123"):
+    return {
+        "token": token,
+        "location": "Basement bar",
+        "method": "scan",
+        "idempotency_key": key,
+        "client_timestamp": (ts or NOW - timedelta(minutes=10)).isoformat(),
+    }
+
+
+def _batch_db(today_count=0, cap_daily=50, recorded=()):
+    counter_ref = FakeDocRef("counter")
+    db = build_mock_db({
+        "offers": FakeCollection(docs=[FakeDocSnapshot("offer-001", {**OFFER_DATA, "cap_daily": cap_daily})]),
+        # No shard docs at count 0, so every shard resolves to counter_ref
+        "daily_redemption_counters": FakeCollection(
+            docs=counter_shards("offer-001", today_count) if today_count else [], doc_ref=counter_ref,
+        ),
+        "redemptions": FakeCollection(docs=[FakeDocSnapshot(rid, {}) for rid in recorded]),
+    })
+    return db, counter_ref
+
+
+def _post(db, items):
+    with patch("apps.api.app.main.get_db", return_value=db), \
+         patch("apps.api.app.main.get_token_by_id_or_code", return_value=TOKEN) as lookup:
+        resp = TestClient(app, raise_server_exceptions=False).post("/redeem/batch", json={"items": items})
+    return resp, lookup
+
+
+class TestRedeemBatch:
+
+    def test_groups_scans_into_one_commit(self, staff):
+        db, counter_ref = _batch_db()
+
+        resp, lookup = _post(db, [_item(f"scan-key-{i}") for i in range(3)])
+
+        body = resp.json()
+        assert resp.status_code == 200
+        assert body["succeeded"] == 3 and body["failed"] == 0
+        assert lookup.call_count == 1  # token resolved once
+        assert db.batch.call_count == 1
+        db.transaction.assert_not_called()
+        # One aggregated counter increment for the group
+        assert counter_ref.set.call_count == 1
+        assert counter_ref.set.call_args[0][0]["count"].value == 3
+
+    def test_replays_are_idempotent(self, staff):
+        db, _ = _batch_db(recorded=[_batch_redemption_id(STAFF_USER["uid"], "scan-key-old")])
+
+        resp, _ = _post(db, [_item("scan-key-old"), _item("scan-key-new"), _item("scan-key-new")])
+
+        results = resp.json()["results"]
+        assert [r["idempotency_key"] for r in results] == ["scan-key-old", "scan-key-new", "scan-key-new"]
+        assert results[0]["message"] == "Already recorded"
+        assert results[1] == results[2]
+        assert results[1]["redemption_id"] == _batch_redemption_id(STAFF_USER["uid"], "scan-key-new")
+
+    def test_stale_and_future_scans_rejected(self, staff):
+        db, _ = _batch_db()
+
+        resp, _ = _post(db, [
+            _item("scan-key-old", ts=NOW - timedelta(days=30)),
+            _item("scan-key-future", ts=NOW + timedelta(hours=1)),
+        ])
+
+        assert resp.json()["failed"] == 2
+
+    def test_group_at_cap_fails_per_scan(self, staff):
+        db, _ = _batch_db(today_count=5, cap_daily=5)
+
+        resp, _ = _post(db, [_item(f"scan-key-{i}") for i in range(2)])
+
+        results = resp.json()["results"]
+        assert all(r["message"] == CAP_REACHED_MESSAGE for r in results)
+        db.batch.assert_not_called()
+
+    def test_replay_ids_are_scoped_to_the_user(self):
+        assert _batch_redemption_id("staff-1", "scan-key") != _batch_redemption_id("staff-2", "scan-key")
+
+    def test_per_scan_commit_errors_reported_per_item(self, staff):
+        db, _ = _batch_db(today_count=5, cap_daily=5)
+        outcomes = [AlreadyExists("recorded"), RuntimeError("deadline exceeded")]
+
+        with patch("apps.api.app.main._redeem_universal_token", side_effect=outcomes):
+            resp, _ = _post(db, [_item("scan-key-0"), _item("scan-key-1", ts=NOW - timedelta(minutes=5))])
+
+        results = resp.json()["results"]
+        assert resp.status_code == 200
+        assert results[0]["success"] and results[0]["message"] == "Already recorded"
+        assert results[0]["redemption_id"] == _batch_redemption_id(STAFF_USER["uid"], "scan-key-0")
+        assert results[1] == {**results[1], "success": False, "message": "Could not record this scan, please retry"}
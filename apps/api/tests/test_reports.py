@@ -6,8 +6,10 @@ from unittest.mock import patch, MagicMock
 import pytest
 from fastapi.testclient import TestClient
 
+from apps.api.app.daily_stats import rebuild_daily_stats
 from apps.api.app.deps import get_current_user
 from apps.api.app.main import app
+from apps.api.app.reports import _week_start
 
 from .conftest import (
     STAFF_USER,
@@ -19,6 +21,7 @@ from .conftest import (
     FakeQuery,
     build_mock_db,
 )
+from .fake_firestore import FakeFirestore, use_db
 
 MERCHANT_ID = "merchant-001"
 
@@ -217,6 +220,43 @@ class TestGenerateWeeklyReports:
 
         assert resp.status_code == 200
 
+    def test_generate_reports_from_daily_stats(self):
+        """Weekly numbers come from the daily rollup; insights from one pass over the visits."""
+        week = _week_start(datetime.now(timezone.utc))
+        db = FakeFirestore()
+        db.seed("merchants", {MERCHANT_ID: _merchant().to_dict()})
+        db.seed("offers", {"offer-1": _offer("offer-1", "Latte Deal").to_dict(),
+                           "offer-2": _offer("offer-2", "Muffin Deal").to_dict()})
+        visits = [
+            _visit("c1", "offer-1", week - timedelta(weeks=2)),
+            _visit("c3", "offer-1", week - timedelta(days=3)),
+            _visit("c1", "offer-2", week + timedelta(minutes=1)),
+            _visit("c1", "offer-2", week + timedelta(minutes=2)),
+            _visit("c2", "offer-1", week + timedelta(minutes=3)),
+        ]
+        db.seed("consumer_visits", {v.id: v.to_dict() for v in visits})
+        db.seed("redemptions", {f"r-{v.id}": {
+            "merchant_id": MERCHANT_ID, "offer_id": v.to_dict()["offer_id"], "timestamp": v.to_dict()["timestamp"],
+        } for v in visits})
+        rebuild_daily_stats(db, MERCHANT_ID)
+
+        with use_db(db):
+            app.dependency_overrides.pop(get_current_user, None)
+            client = TestClient(app)
+            db.reset_counts()
+            resp = client.post("/api/v1/reports/weekly")
+
+        assert resp.json()["reports_generated"] == 1
+        # merchants, existing-report check, daily stats, visits, offers
+        assert db.queries == 5
+        report = next(iter(db.documents("weekly_reports").values()))
+        assert report["total_visits"] == 3
+        assert (report["new_customers"], report["returning_customers"]) == (1, 1)
+        assert report["top_deal"] == "Muffin Deal"
+        assert report["return_rate"] == 0.5
+        # Last week: c3 was new, so the return rate went up
+        assert report["return_rate_trend"] == "up"
+
 
 # ---------------------------------------------------------------------------
 # GET /api/v1/merchants/{merchant_id}/reports
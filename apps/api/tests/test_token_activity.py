@@ -0,0 +1,124 @@
+"""Tests for sharded universal-token activity and its coalescing."""
+
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from apps.api.app.deps import get_current_user
+from apps.api.app.main import app
+from apps.api.app.token_activity import coalesce_token_activity, record_token_use
+
+from .conftest import (
+    OWNER_USER,
+    FakeCollection,
+    FakeDocRef,
+    FakeDocSnapshot,
+    FakeWriteBatch,
+    build_mock_db,
+    counter_shards,
+)
+
+NOW = datetime.now(timezone.utc)
+
+
+def _activity(token_id, shard, minutes_ago, location="Main St"):
+    return FakeDocSnapshot(f"{token_id}_{shard}", {
+        "token_id": token_id,
+        "shard": shard,
+        "last_redeemed_at": NOW - timedelta(minutes=minutes_ago),
+        "last_redeemed_by_location": location,
+    })
+
+
+def test_record_token_use_writes_an_activity_shard():
+    activity_ref = FakeDocRef("shard")
+    db = build_mock_db({"token_activity": FakeCollection(doc_ref=activity_ref)})
+    batch = FakeWriteBatch()
+
+    record_token_use(db, batch, "token-001", "Main St", NOW)
+    batch.commit()
+
+    data = activity_ref.set.call_args[0][0]
+    assert data["token_id"] == "token-001"
+    assert data["last_redeemed_at"] == NOW
+    assert activity_ref.set.call_args[1] == {"merge": True}
+
+
+def test_replay_never_moves_a_shard_backwards():
+    activity_ref = FakeDocRef("shard", _activity("token-001", 0, 30))
+    db = build_mock_db({"token_activity": FakeCollection(doc_ref=activity_ref)})
+
+    batch = FakeWriteBatch()
+    record_token_use(db, batch, "token-001", "Old St", NOW - timedelta(hours=1), replay=True)
+    batch.commit()
+    activity_ref.set.assert_not_called()
+
+    batch = FakeWriteBatch()
+    record_token_use(db, batch, "token-001", "New St", NOW - timedelta(minutes=5), replay=True)
+    batch.commit()
+    assert activity_ref.set.call_args[0][0]["last_redeemed_by_location"] == "New St"
+
+
+class TestCoalesceTokenActivity:
+
+    def _db(self, token_last_use, activity):
+        token_ref = FakeDocRef("token-001", FakeDocSnapshot("token-001", {"last_redeemed_at": token_last_use}))
+        db = build_mock_db({
+            "token_activity": FakeCollection(docs=activity),
+            "redemption_tokens": FakeCollection(doc_ref=token_ref),
+        })
+        return db, token_ref
+
+    def test_newest_shard_wins_with_one_write_per_token(self):
+        db, token_ref = self._db(NOW - timedelta(hours=2), [
+            _activity("token-001", 0, 30, "Old St"),
+            _activity("token-001", 3, 1, "New St"),
+        ])
+
+        assert coalesce_token_activity(db, NOW - timedelta(hours=1)) == 1
+        token_ref.update.assert_called_once_with({
+            "last_redeemed_at": NOW - timedelta(minutes=1),
+            "last_redeemed_by_location": "New St",
+        })
+
+    def test_never_moves_last_use_backwards(self):
+        db, token_ref = self._db(NOW, [_activity("token-001", 0, 5)])
+
+        assert coalesce_token_activity(db, NOW - timedelta(hours=1)) == 0
+        token_ref.update.assert_not_called()
+
+
+def test_universal_redemption_leaves_token_doc_alone():
+    token_ref = FakeDocRef("token-001")
+    activity_ref = FakeDocRef("shard")
+    db = build_mock_db({
+        "offers": FakeCollection(docs=[FakeDocSnapshot("offer-001", {
+            "merchant_id": "merchant-001",
+            "name": "Free Latte",
+            "discount_text": "$2 off",
+            "cap_daily": 50,
+            "status": "active",
+        })]),
+        "daily_redemption_counters": FakeCollection(docs=counter_shards("offer-001", 0)),
+        "redemption_tokens": FakeCollection(doc_ref=token_ref),
+        "token_activity": FakeCollection(doc_ref=activity_ref),
+    })
+    token = ("token-001", {
+        "offer_id": "offer-001",
+        "status": "active",
+        "expires_at": NOW + timedelta(days=30),
+        "is_universal": True,
+    })
+
+    app.dependency_overrides[get_current_user] = lambda: OWNER_USER
+    try:
+        with patch("apps.api.app.main.get_db", return_value=db), \
+             patch("apps.api.app.main.get_token_by_id_or_code", return_value=token):
+            resp = TestClient(app).post("/redeem", json={"token": "ABC123", "location": "Main St", "method": "scan"})
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+
+    assert resp.json()["success"] is True
+    token_ref.update.assert_not_called()
+    assert activity_ref.set.call_args[0][0]["last_redeemed_by_location"] == "Main St"
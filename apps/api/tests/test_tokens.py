@@ -0,0 +1,122 @@
+"""Tests for universal token creation and short-code resolution."""
+
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import pytest
+from google.api_core.exceptions import AlreadyExists
+
+from apps.api.app.tokens import backfill_short_codes, create_tokens, get_token_by_id_or_code
+
+from .conftest import FakeCollection, FakeDocRef, FakeDocSnapshot, build_mock_db
+
+TOKEN_DATA = {"offer_id": "offer-001", "short_code": "ABC234", "status": "active"}
+
+
+def _lookup_db(indexed=True, tokens=None):
+    tokens = tokens if tokens is not None else [FakeDocSnapshot("token-001", TOKEN_DATA)]
+    index = [FakeDocSnapshot("ABC234", {"token_id": "token-001"})] if indexed else []
+    return build_mock_db({
+        "redemption_tokens": FakeCollection(docs=tokens),
+        "short_codes": FakeCollection(docs=index),
+    })
+
+
+class TestGetTokenByShortCode:
+
+    def test_resolves_through_index(self):
+        db = _lookup_db()
+        with patch("apps.api.app.tokens.get_db", return_value=db):
+            assert get_token_by_id_or_code("abc234") == ("token-001", TOKEN_DATA)
+
+    def test_second_lookup_skips_index(self):
+        db = _lookup_db()
+        with patch("apps.api.app.tokens.get_db", return_value=db):
+            get_token_by_id_or_code("ABC234")
+            get_token_by_id_or_code("ABC234")
+
+        names = [c.args[0] for c in db.collection.call_args_list]
+        assert names.count("short_codes") == 1
+        assert names.count("redemption_tokens") == 2  # token data itself is always fresh
+
+    def test_unindexed_code_falls_back_and_indexes(self):
+        index_ref = FakeDocRef("ABC234")
+        db = build_mock_db({
+            "redemption_tokens": FakeCollection(docs=[FakeDocSnapshot("token-001", TOKEN_DATA)]),
+            "short_codes": FakeCollection(doc_ref=index_ref),
+        })
+        with patch("apps.api.app.tokens.get_db", return_value=db):
+            assert get_token_by_id_or_code("ABC234")[0] == "token-001"
+
+        index_ref.create.assert_called_once()
+        assert index_ref.create.call_args[0][0]["token_id"] == "token-001"
+
+    def test_unknown_code(self):
+        db = _lookup_db(indexed=False, tokens=[])
+        with patch("apps.api.app.tokens.get_db", return_value=db):
+            assert get_token_by_id_or_code("ZZZ999") is None
+
+
+class TestCreateTokens:
+
+    def _db(self, taken=()):
+        token_ref = FakeDocRef("token-new")
+        db = build_mock_db({
+            "offers": FakeCollection(docs=[FakeDocSnapshot("offer-001", {"name": "Latte"})]),
+            "redemption_tokens": FakeCollection(doc_ref=token_ref),
+            "short_codes": FakeCollection(docs=[FakeDocSnapshot(code, {"token_id": "other"}) for code in taken]),
+        })
+        return db, token_ref
+
+    def test_token_and_index_written_in_one_batch(self):
+        db, token_ref = self._db()
+        with patch("apps.api.app.tokens.get_db", return_value=db), \
+             patch("apps.api.app.tokens.generate_short_code", return_value="NEW234"):
+            tokens = create_tokens("offer-001")
+
+        assert tokens[0]["short_code"] == "NEW234"
+        assert db.batch.call_count == 1
+        assert token_ref.set.call_args[0][0]["short_code"] == "NEW234"
+
+    def test_collision_retries_with_fresh_code(self):
+        db, token_ref = self._db(taken=["TAKEN2"])
+        with patch("apps.api.app.tokens.get_db", return_value=db), \
+             patch("apps.api.app.tokens.generate_short_code", side_effect=["TAKEN2", "FRESH2"]):
+            tokens = create_tokens("offer-001")
+
+        assert tokens[0]["short_code"] == "FRESH2"
+        token_ref.set.assert_called_once()
+        assert token_ref.set.call_args[0][0]["short_code"] == "FRESH2"
+
+    def test_gives_up_after_repeated_collisions(self):
+        db, token_ref = self._db(taken=["TAKEN2"])
+        with patch("apps.api.app.tokens.get_db", return_value=db), \
+             patch("apps.api.app.tokens.generate_short_code", return_value="TAKEN2"), \
+             pytest.raises(RuntimeError):
+            create_tokens("offer-001")
+        token_ref.set.assert_not_called()
+
+
+def test_backfill_keeps_oldest_token_for_shared_code():
+    old = FakeDocSnapshot("token-old", {**TOKEN_DATA, "created_at": datetime(2024, 1, 1, tzinfo=timezone.utc)})
+    new = FakeDocSnapshot("token-new", {**TOKEN_DATA, "created_at": datetime(2025, 1, 1, tzinfo=timezone.utc)})
+    index_ref = FakeDocRef("ABC234")
+    created = []
+
+    def _create(data):
+        if created:
+            raise AlreadyExists("taken")
+        created.append(data)
+    index_ref.create.side_effect = _create
+    index_ref._snapshot = FakeDocSnapshot("ABC234", {"token_id": "token-old"})
+
+    db = build_mock_db({
+        "redemption_tokens": FakeCollection(docs=[new, old]),
+        "short_codes": FakeCollection(doc_ref=index_ref),
+    })
+
+    indexed, duplicates = backfill_short_codes(db)
+
+    assert indexed == 1
+    assert created[0]["token_id"] == "token-old"
+    assert duplicates == ["ABC234"]
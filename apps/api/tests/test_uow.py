@@ -0,0 +1,63 @@
+"""Tests for the request-scoped unit of work."""
+
+from google.cloud.firestore_v1 import Increment
+
+from apps.api.app.uow import UnitOfWork
+
+from .conftest import FakeCollection, FakeDocSnapshot, FakeWriteBatch, build_mock_db
+
+
+def _db():
+    return build_mock_db({
+        "consumers": FakeCollection(docs=[FakeDocSnapshot("c-1", {"global_points": 40})]),
+        "loyalty_configs": FakeCollection(docs=[FakeDocSnapshot("m-1", {"stamps_required": 5})]),
+    })
+
+
+class TestReads:
+
+    def test_load_is_one_round_trip(self):
+        db = _db()
+        uow = UnitOfWork(db)
+
+        uow.load(("consumers", "c-1"), ("loyalty_configs", "m-1"), ("loyalty_progress", "c-1_m-1"))
+
+        assert db.get_all.call_count == 1
+        assert uow.get("consumers", "c-1") == {"global_points": 40}
+        assert uow.get("loyalty_progress", "c-1_m-1") is None
+        # Already-loaded documents are served from memory
+        assert db.get_all.call_count == 1
+
+    def test_reads_see_pending_writes(self):
+        uow = UnitOfWork(_db())
+
+        uow.update("consumers", "c-1", {"global_points": Increment(50)})
+        uow.set("loyalty_progress", "c-1_m-1", {"current_stamps": 1})
+
+        assert uow.get("consumers", "c-1")["global_points"] == 90
+        assert uow.get("loyalty_progress", "c-1_m-1") == {"current_stamps": 1}
+
+
+class TestCommit:
+
+    def test_writes_commit_in_one_batch(self):
+        db = _db()
+        uow = UnitOfWork(db)
+        uow.create("redemptions", {"offer_id": "o-1"})
+        uow.set("loyalty_progress", "c-1_m-1", {"current_stamps": 1})
+        uow.update("consumers", "c-1", {"global_points": Increment(50)})
+
+        uow.commit()
+
+        assert db.batch.call_count == 1
+        assert len(uow) == 3
+
+    def test_apply_restages_on_retry(self):
+        uow = UnitOfWork(_db())
+        uow.create("redemptions", {"offer_id": "o-1"})
+
+        first, second = FakeWriteBatch(), FakeWriteBatch()
+        uow.apply(first)
+        uow.apply(second)
+
+        assert len(first._writes) == len(second._writes) == 1
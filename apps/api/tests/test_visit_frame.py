@@ -0,0 +1,136 @@
+"""Tests for the columnar visit analytics, against straightforward reference loops."""
+
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from apps.api.app.visit_frame import VisitFrame, merchant_visits, visit_snapshots
+
+from .fake_firestore import FakeFirestore
+
+NOW = datetime(2026, 3, 4, 12, tzinfo=timezone.utc)
+
+
+def _visits(seed: int, n: int = 400) -> list[dict]:
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(n):
+        rows.append({
+            "consumer_id": f"c{rng.randrange(40)}",
+            "offer_id": rng.choice(["o1", "o2", "o3", None]),
+            "timestamp": NOW - timedelta(days=rng.randrange(120), seconds=rng.randrange(86400)),
+        })
+    # Exact 14 / 30 day gaps and missing fields exercise the boundaries
+    rows += [
+        {"consumer_id": "edge", "offer_id": "o1", "timestamp": NOW - timedelta(days=40)},
+        {"consumer_id": "edge", "offer_id": "o2", "timestamp": NOW - timedelta(days=26)},
+        {"consumer_id": "edge", "offer_id": "o2", "timestamp": NOW + timedelta(days=4)},
+        {"consumer_id": "no-ts", "offer_id": "o1", "timestamp": None},
+        {"consumer_id": None, "offer_id": "o1", "timestamp": NOW},
+    ]
+    return rows
+
+
+def _reference_returns(rows, offer_id, windows):
+    consumer_ts: dict[str, list[datetime]] = {}
+    for r in rows:
+        if r["consumer_id"] and r["timestamp"]:
+            consumer_ts.setdefault(r["consumer_id"], []).append(r["timestamp"])
+    for ts in consumer_ts.values():
+        ts.sort()
+    on_offer = [r for r in rows if r["offer_id"] == offer_id and r["consumer_id"] and r["timestamp"]]
+    seen, returned = set(), {w: 0 for w in windows}
+    for r in on_offer:
+        if r["consumer_id"] in seen:
+            continue
+        seen.add(r["consumer_id"])
+        later = [t for t in consumer_ts[r["consumer_id"]] if t > r["timestamp"]]
+        if later:
+            days = (later[0] - r["timestamp"]).days
+            for w in windows:
+                returned[w] += days <= w
+    return {"redemptions": len(on_offer), "unique_customers": len(seen), "returned": returned}
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_offer_returns_match_reference(seed):
+    rows = _visits(seed)
+    result = VisitFrame.from_dicts(rows).offer_returns(windows=(14, 30))
+
+    for offer_id in ("o1", "o2", "o3"):
+        assert result[offer_id] == _reference_returns(rows, offer_id, (14, 30))
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_segments_match_reference(seed):
+    rows = _visits(seed)
+    last: dict[str, datetime] = {}
+    count: dict[str, int] = {}
+    for r in rows:
+        cid, ts = r["consumer_id"], r["timestamp"]
+        if cid and ts:
+            count[cid] = count.get(cid, 0) + 1
+            last[cid] = max(last.get(cid, ts), ts)
+    expected = {"new": 0, "returning": 0, "vip": 0, "at_risk": 0, "lost": 0}
+    for cid, ts in last.items():
+        days = (NOW - ts).days
+        if count[cid] == 1 and days <= 14:
+            expected["new"] += 1
+        elif days > 30:
+            expected["lost"] += 1
+        elif days > 14:
+            expected["at_risk"] += 1
+        elif count[cid] >= 5:
+            expected["vip"] += 1
+        else:
+            expected["returning"] += 1
+
+    assert VisitFrame.from_dicts(rows).segments(NOW) == expected
+
+
+def test_ltv_histogram_counts_visits_without_timestamps():
+    rows = [{"consumer_id": "a", "timestamp": None}] + [{"consumer_id": "b", "timestamp": NOW}] * 3
+    # a: 1 visit = $12; b: 3 visits = $36
+    assert VisitFrame.from_dicts(rows).ltv_histogram([0, 10, 30, 60, float("inf")], 12.0) == [0, 1, 1, 0]
+
+
+def test_cohorts_count_each_return_week_once():
+    monday = datetime(2026, 3, 2, tzinfo=timezone.utc)
+    rows = [
+        {"consumer_id": "a", "timestamp": monday + timedelta(days=2)},
+        {"consumer_id": "a", "timestamp": monday + timedelta(days=8)},
+        {"consumer_id": "a", "timestamp": monday + timedelta(days=9)},
+        {"consumer_id": "b", "timestamp": monday + timedelta(days=6, hours=23)},
+        {"consumer_id": "c", "timestamp": monday + timedelta(days=7)},
+    ]
+    cohorts = VisitFrame.from_dicts(rows).cohorts(retention_weeks=5)
+
+    assert set(cohorts) == {monday, monday + timedelta(weeks=1)}
+    assert cohorts[monday]["new_customers"] == 2
+    assert cohorts[monday]["returned_1"] == 1
+    assert cohorts[monday + timedelta(weeks=1)]["new_customers"] == 1
+
+
+def test_merchant_visits_loaded_once_per_snapshot_block():
+    db = FakeFirestore()
+    db.seed("consumer_visits", {
+        f"v{i}": {"consumer_id": f"c{i}", "merchant_id": "m-1", "offer_id": "o1", "timestamp": NOW, "points_earned": 5}
+        for i in range(4)
+    })
+
+    with visit_snapshots():
+        first = merchant_visits(db, "m-1")
+        with visit_snapshots():
+            assert merchant_visits(db, "m-1") is first
+    assert db.queries == 1
+    assert merchant_visits(db, "m-1") is not first
+    assert db.queries == 2
+    assert len(first) == 4
+
+
+def test_empty_frame():
+    frame = VisitFrame.from_dicts([])
+    assert frame.offer_returns() == {}
+    assert frame.cohorts(5) == {}
+    assert sum(frame.segments(NOW).values()) == 0
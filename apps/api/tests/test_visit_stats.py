@@ -0,0 +1,68 @@
+"""Tests for per consumer x merchant visit stats."""
+
+from datetime import datetime, timedelta, timezone
+
+from apps.api.app.visit_stats import rebuild_visit_stats, record_visit
+
+from .conftest import FakeCollection, FakeDocRef, FakeDocSnapshot, FakeWriteBatch, build_mock_db
+
+NOW = datetime.now(timezone.utc)
+
+
+class TestRecordVisit:
+
+    def test_first_visit(self):
+        batch = FakeWriteBatch()
+        ref = FakeDocRef("c-1_m-1")
+
+        assert record_visit(batch, ref, None, "c-1", "m-1", NOW) == 1
+
+        _op, _ref, data, merge = batch._writes[0]
+        assert merge is True
+        assert data["first_visit"] == NOW and data["last_visit"] == NOW
+
+    def test_repeat_visit_keeps_first_visit(self):
+        batch = FakeWriteBatch()
+        first = NOW - timedelta(days=10)
+        stats = {"visit_count": 3, "first_visit": first, "last_visit": NOW - timedelta(days=2)}
+
+        assert record_visit(batch, FakeDocRef("c-1_m-1"), stats, "c-1", "m-1", NOW) == 4
+        assert batch._writes[0][2]["first_visit"] == first
+
+    def test_replayed_visit_never_moves_bounds_inwards(self):
+        batch = FakeWriteBatch()
+        first, last = NOW - timedelta(days=10), NOW - timedelta(days=2)
+        stats = {"visit_count": 3, "first_visit": first, "last_visit": last}
+
+        record_visit(batch, FakeDocRef("c-1_m-1"), stats, "c-1", "m-1", NOW - timedelta(days=5))
+        record_visit(batch, FakeDocRef("c-1_m-1"), stats, "c-1", "m-1", NOW - timedelta(days=20))
+
+        assert batch._writes[0][2]["first_visit"] == first and batch._writes[0][2]["last_visit"] == last
+        assert batch._writes[1][2]["first_visit"] == NOW - timedelta(days=20)
+        assert batch._writes[1][2]["last_visit"] == last
+
+
+class TestRebuild:
+
+    def test_rebuild_aggregates_visits(self):
+        def _visit(i, cid, days_ago):
+            return FakeDocSnapshot(f"v-{i}", {
+                "consumer_id": cid,
+                "merchant_id": "m-1",
+                "timestamp": NOW - timedelta(days=days_ago),
+            })
+
+        visits = [_visit(1, "c-1", 9), _visit(2, "c-1", 1), _visit(3, "c-2", 4)]
+        stats_ref = FakeDocRef("stats")
+        db = build_mock_db({
+            "consumer_visits": FakeCollection(docs=visits),
+            "consumer_merchant_stats": FakeCollection(doc_ref=stats_ref),
+        })
+
+        assert rebuild_visit_stats(db) == 2
+
+        written = {c.args[0]["consumer_id"]: c.args[0] for c in stats_ref.set.call_args_list}
+        assert written["c-1"]["visit_count"] == 2
+        assert written["c-1"]["first_visit"] == NOW - timedelta(days=9)
+        assert written["c-1"]["last_visit"] == NOW - timedelta(days=1)
+        assert written["c-2"]["visit_count"] == 1
@@ -0,0 +1,86 @@
+"""Tests for the consumer wallet endpoint."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+
+from apps.api.app.deps import get_current_consumer
+from apps.api.app.main import app
+
+from .conftest import FakeCollection, FakeDocSnapshot, build_mock_db
+
+NOW = datetime.now(timezone.utc)
+
+CONSUMER_USER = {"uid": "consumer-001", "role": "consumer"}
+
+
+@pytest.fixture(autouse=True)
+def _consumer():
+    app.dependency_overrides[get_current_consumer] = lambda: CONSUMER_USER
+    yield
+    app.dependency_overrides.pop(get_current_consumer, None)
+
+
+def _wallet_db(consumer_exists=True):
+    return build_mock_db({
+        "consumers": FakeCollection(docs=[
+            FakeDocSnapshot("consumer-001", {"global_points": 120}, exists=consumer_exists),
+        ]),
+        "consumer_claims": FakeCollection(docs=[
+            FakeDocSnapshot("claim-1", {"qr_data": "q1", "short_code": "S1", "expires_at": NOW + timedelta(hours=2),
+                                        "offer_name": "Latte", "merchant_name": "Cafe"}),
+            FakeDocSnapshot("claim-2", {"qr_data": "q2", "expires_at": NOW - timedelta(hours=2)}),
+        ]),
+        "consumer_visits": FakeCollection(docs=[
+            FakeDocSnapshot("v1", {"merchant_id": "merchant-001", "offer_id": "offer-001", "timestamp": NOW,
+                                   "visit_number": 2, "points_earned": 50}),
+            FakeDocSnapshot("v2", {"merchant_id": "merchant-001", "offer_id": "offer-001", "timestamp": NOW,
+                                   "visit_number": 1, "points_earned": 50}),
+        ]),
+        "loyalty_progress": FakeCollection(docs=[
+            FakeDocSnapshot("consumer-001_merchant-001", {"merchant_id": "merchant-001", "current_stamps": 3}),
+        ]),
+        "rewards": FakeCollection(docs=[
+            FakeDocSnapshot("reward-1", {"merchant_id": "merchant-001", "description": "Free cookie",
+                                         "status": "earned", "earned_at": NOW}),
+            FakeDocSnapshot("reward-2", {"merchant_id": None, "is_universal": True, "description": "$5",
+                                         "status": "earned", "earned_at": NOW}),
+        ]),
+        "merchants": FakeCollection(docs=[FakeDocSnapshot("merchant-001", {"name": "Corner Cafe"})]),
+        "offers": FakeCollection(docs=[FakeDocSnapshot("offer-001", {"name": "Free Latte"})]),
+        "loyalty_configs": FakeCollection(docs=[
+            FakeDocSnapshot("merchant-001", {"stamps_required": 5, "reward_description": "Free cookie"}),
+        ]),
+    })
+
+
+def _get_wallet(db):
+    with patch("apps.api.app.consumer.get_db", return_value=db):
+        return TestClient(app, raise_server_exceptions=False).get("/api/v1/consumer/wallet")
+
+
+class TestWallet:
+
+    def test_wallet_contents(self):
+        resp = _get_wallet(_wallet_db())
+
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["total_points"] == 120
+        assert [c["short_code"] for c in body["active_claims"]] == ["S1"]
+        assert [v["visit_number"] for v in body["visit_history"]] == [2, 1]
+        assert body["visit_history"][0]["merchant_name"] == "Corner Cafe"
+        assert body["visit_history"][0]["offer_name"] == "Free Latte"
+        assert body["merchant_loyalty"][0]["visits_until_reward"] == 2
+        assert {r["merchant_name"] for r in body["rewards"]} == {"Corner Cafe", "Any Boost merchant"}
+
+    def test_name_lookups_are_batched(self):
+        db = _wallet_db()
+        _get_wallet(db)
+        # merchants, offers, loyalty configs: one get_all each, however many rows
+        assert db.get_all.call_count == 3
+
+    def test_missing_profile(self):
+        assert _get_wallet(_wallet_db(consumer_exists=False)).status_code == 404